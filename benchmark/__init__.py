@@ -1,3 +1,13 @@
-from .benchmark_generator import BenchmarkGenerator
+# `BenchmarkGenerator` requires geosindex: it is only imported when it is
+# used, so that the other benchmark modules (e.g. `synthetic_data`, used
+# by the tests) can be imported without it
 
-__all__ = ['BenchmarkGenerator']
\ No newline at end of file
+
+def __getattr__(name):
+    if name == 'BenchmarkGenerator':
+        from .benchmark_generator import BenchmarkGenerator
+        return BenchmarkGenerator
+    raise AttributeError("module %r has no attribute %r" % (__name__, name))
+
+
+__all__ = ['BenchmarkGenerator']
@@ -40,6 +40,7 @@ def single_query_test(
         geos_index_storage_backend=geos_index_storage_backend,
         geos_index_save_path=geos_index_save_path,
         geos_index_secondary_type=geos_index_secondary_type,
+        profile=True,
     )
 
     start = time.time()
@@ -59,6 +60,8 @@ def single_query_test(
 
     end = time.time()
     print(f"Total Time: {end - start}, data size: {result[0].size}")
+    # Timings of the phases of the query (parsed by process_log.py)
+    print(f"Profile: {ts.last_query_profile.to_json_line()}")
     print()
     return end - start
 
@@ -0,0 +1,120 @@
+"""
+Import-time benchmark of openpmd_viewer.
+
+`import openpmd_viewer` is timed in fresh Python processes (the median of
+several runs is reported), and the slowest top-level imports are listed
+with `python -X importtime`. The script exits with a non-zero status when
+the median import time exceeds the target (e.g. for CI), or when one of
+the heavy packages that should only be imported on demand (pandas,
+matplotlib, ...) is imported at startup.
+
+Usage
+-----
+python benchmark/import_time.py [--target 0.5] [--repeat 5]
+"""
+import os
+import sys
+import argparse
+import importlib.util
+import subprocess
+import numpy as np
+
+# Packages that must not be imported by `import openpmd_viewer`
+DEFERRED_MODULES = [ 'pandas', 'tqdm', 'geosindex', 'matplotlib',
+                     'ipywidgets', 'openpmd_api', 'h5py' ]
+# openpmd_viewer only imports scipy on demand, but `import numba` imports
+# it at startup: scipy is thus only checked when numba is not installed
+if importlib.util.find_spec( 'numba' ) is None:
+    DEFERRED_MODULES.append( 'scipy' )
+
+# Root directory of the repository (so that the source tree is imported)
+_ROOT_DIR = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+
+_TIMED_IMPORT = """
+import time
+start = time.perf_counter()
+import openpmd_viewer
+print( time.perf_counter() - start )
+"""
+
+_LOADED_MODULES = """
+import sys
+import openpmd_viewer
+print( ' '.join( sorted(sys.modules) ) )
+"""
+
+
+def _run( code, *options ):
+    """
+    Run `code` in a fresh Python process, from a directory where only
+    the repository is added to the path, and return its outputs
+    """
+    env = dict( os.environ )
+    env['PYTHONPATH'] = os.pathsep.join(
+        [ path for path in [_ROOT_DIR, env.get('PYTHONPATH')] if path ] )
+    # Run from the parent directory of the repository, so that its
+    # top-level files do not shadow the standard library
+    process = subprocess.run( [sys.executable, *options, '-c', code],
+        cwd=os.path.dirname(_ROOT_DIR), env=env, check=True,
+        stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        universal_newlines=True )
+    return process.stdout, process.stderr
+
+
+def measure_import_time( repeat=5 ):
+    """
+    Return the import times (in seconds) of openpmd_viewer,
+    in `repeat` fresh processes
+    """
+    return [ float( _run(_TIMED_IMPORT)[0].split()[-1] )
+             for _ in range(repeat) ]
+
+
+def loaded_deferred_modules():
+    """
+    Return the packages of DEFERRED_MODULES that are
+    imported by `import openpmd_viewer`
+    """
+    modules = set( _run(_LOADED_MODULES)[0].split() )
+    return [ name for name in DEFERRED_MODULES if name in modules ]
+
+
+def slowest_imports( n=10 ):
+    """
+    Return the `n` modules with the largest cumulative import time,
+    as a list of (cumulative time in seconds, module name)
+    """
+    timings = []
+    for line in _run( 'import openpmd_viewer', '-X', 'importtime' )[1] \
+            .splitlines():
+        if not line.startswith( 'import time:' ) or 'cumulative' in line:
+            continue
+        _, cumulative, name = line.split( '|' )
+        timings.append( ( int(cumulative) * 1.e-6, name.strip() ) )
+    return sorted( timings, reverse=True )[:n]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Import-time benchmark')
+    parser.add_argument('--target', type=float, default=0.5,
+        help='maximal median import time (seconds)')
+    parser.add_argument('--repeat', type=int, default=5,
+        help='number of measurements')
+    args = parser.parse_args()
+
+    times = measure_import_time( args.repeat )
+    median = float( np.median(times) )
+    print( 'import openpmd_viewer: %.3f s (median of %d, min %.3f s)'
+           % (median, len(times), min(times)) )
+    for cumulative, name in slowest_imports():
+        print( '  %8.3f s  %s' % (cumulative, name) )
+
+    status = 0
+    loaded = loaded_deferred_modules()
+    if loaded:
+        print( 'Imported at startup: %s' % ', '.join(loaded) )
+        status = 1
+    if median > args.target:
+        print( 'The import time exceeds the target (%.3f s)' % args.target )
+        status = 1
+    sys.exit( status )
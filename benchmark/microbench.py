@@ -0,0 +1,355 @@
+"""
+Microbenchmarks of the core kernels, with results stored per commit.
+
+Each benchmark is a setup function, registered with `@benchmark(sizes)`,
+which prepares the data for a given size and returns the function to be
+timed. The results of a run are written to
+`<results_dir>/<commit>.json`, and two runs can be compared: the
+kernels that became slower by more than a threshold are flagged (and
+the comparison exits with a non-zero status, e.g. for CI).
+
+Usage
+-----
+python benchmark/microbench.py run [--quick] [--filter histogram]
+python benchmark/microbench.py compare results/microbench/abc123.json \
+    results/microbench/def456.json --threshold 1.2
+"""
+import os
+import sys
+import json
+import time
+import timeit
+import platform
+import argparse
+import tempfile
+import subprocess
+from collections import OrderedDict
+from types import SimpleNamespace
+import numpy as np
+
+# Make `openpmd_viewer` and `benchmark` importable when run as a script
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Registered benchmarks: name -> (setup function, sizes)
+BENCHMARKS = OrderedDict()
+
+
+def benchmark( sizes ):
+    """
+    Decorator that registers a setup function `setup(size, workdir)`,
+    which returns the function to be timed (without arguments)
+    """
+    def register( setup ):
+        BENCHMARKS[ setup.__name__ ] = (setup, sizes)
+        return setup
+    return register
+
+
+def _synthetic_series( n_particles, workdir, writer ):
+    """
+    Write a synthetic dataset (see synthetic_data.py) in `workdir`
+    and return its path
+    """
+    from benchmark.synthetic_data import SyntheticDataset
+    path = os.path.join( workdir, '%s_%d' % (writer, n_particles) )
+    if not os.path.exists( path ):
+        dataset = SyntheticDataset( n_particles=n_particles, n_blocks=64,
+                                    field_shape=(8, 8, 16) )
+        dataset.write( path, writer=writer,
+                       file_format='bp' if writer == 'openpmd-api' else 'h5' )
+    return path
+
+
+@benchmark( sizes=[10**5, 10**6] )
+def gc_get_data( size, workdir ):
+    import openpmd_api as io
+    from openpmd_viewer.openpmd_timeseries.data_reader.io_reader \
+        .particle_reader import gc_get_data
+    from openpmd_viewer.openpmd_timeseries.data_reader.io_reader \
+        .utilities import chunk_to_slice
+    path = _synthetic_series( size, workdir, 'openpmd-api' )
+    series = io.Series( os.path.join(path, 'data_%T.bp'),
+                        io.Access.read_only )
+    component = series.iterations[0].particles['electrons']['position']['x']
+    # Read every other block
+    chunks = component.available_chunks()[::2]
+    chunk_slices = [ chunk_to_slice(chunk)[0] for chunk in chunks ]
+    length = sum( s.stop - s.start for s in chunk_slices )
+    return lambda: gc_get_data( series, component, length, chunk_slices )
+
+
+@benchmark( sizes=[10**5, 10**6] )
+def apply_selection( size, workdir ):
+    from openpmd_viewer import OpenPMDTimeSeries
+    from openpmd_viewer.openpmd_timeseries.utilities import apply_selection
+    ts = OpenPMDTimeSeries( _synthetic_series(size, workdir, 'h5py'),
+                            backend='h5py' )
+    x, ux = ts.get_particle( ['x', 'ux'], iteration=0 )
+    select = { 'x': [ np.percentile(x, 10), np.percentile(x, 60) ],
+               'ux': [ np.percentile(ux, 20), None ] }
+    return lambda: apply_selection( 0, ts.data_reader, [x, ux], select,
+                                    'electrons', ts.extensions )
+
+
+@benchmark( sizes=[10**5, 10**7] )
+def histogram_cic_1d( size, workdir ):
+    from openpmd_viewer.openpmd_timeseries.utilities import histogram_cic_1d
+    rng = np.random.default_rng( 0 )
+    q, w = rng.standard_normal( size ), rng.random( size )
+    return lambda: histogram_cic_1d( q, w, 150, -3., 3. )
+
+
+@benchmark( sizes=[10**5, 10**7] )
+def histogram_cic_2d( size, workdir ):
+    from openpmd_viewer.openpmd_timeseries.utilities import histogram_cic_2d
+    rng = np.random.default_rng( 0 )
+    q1, q2 = rng.standard_normal( size ), rng.standard_normal( size )
+    w = rng.random( size )
+    return lambda: histogram_cic_2d( q1, q2, w, 150, -3., 3., 150, -3., 3. )
+
+
+@benchmark( sizes=[64, 256] )
+def construct_3d_from_circ( size, workdir ):
+    from openpmd_viewer.openpmd_timeseries.utilities import \
+        construct_3d_from_circ
+    from openpmd_viewer.openpmd_timeseries.data_order import RZorder
+    # Grid of size (nr, nz) = (size, size), with 2 modes
+    nr, nz, nmodes = size, size, 2
+    rng = np.random.default_rng( 0 )
+    Fcirc = rng.random( (2 * nmodes - 1, nr, nz) )
+    dr = 1.e-6
+    rmax = (nr - 0.5) * dr
+    x = np.linspace( -rmax, rmax, 2 * nr )
+    F3d = np.zeros( (2 * nr, 2 * nr, nz) )
+    modes = np.arange( nmodes )
+    def reconstruct():
+        F3d[...] = 0.
+        construct_3d_from_circ( F3d, Fcirc, x, x, modes, 2 * nr, 2 * nr,
+            nz, nr, nmodes, 1. / dr, rmax, RZorder.mrz )
+    return reconstruct
+
+
+@benchmark( sizes=[10**5, 10**6] )
+def get_extraction_indices( size, workdir ):
+    from openpmd_viewer import ParticleTracker
+    rng = np.random.default_rng( 0 )
+    pid = rng.permutation( size ).astype( np.uint64 )
+    # Track 10% of the particles (without reading them from a file)
+    tracker = ParticleTracker.__new__( ParticleTracker )
+    tracker.selected_pid = np.sort( pid[: size // 10] )
+    tracker.N_selected = len( tracker.selected_pid )
+    tracker.preserve_particle_index = False
+    return lambda: tracker.get_extraction_indices( pid )
+
+
+@benchmark( sizes=[10**2, 10**4] )
+def find_optimal_strategy( size, workdir ):
+    from openpmd_viewer import OpenPMDTimeSeries
+    rng = np.random.default_rng( 0 )
+    # Blocks (sorted by position in the file), separated by random gaps
+    starts = np.cumsum( rng.integers(1000, 100000, size) )
+    ends = starts + rng.integers(1, 1000, size)
+    sorted_blocks = [ (i, SimpleNamespace(start=int(s), end=int(e)))
+                      for i, (s, e) in enumerate(zip(starts, ends)) ]
+    # Same parameters as in OpenPMDTimeSeries.__init__
+    planner = SimpleNamespace( max_level=999, max_read_length=10000000000,
+        k=3.35*10e-9, b=6.2*10e-4, sorted_blocks=sorted_blocks )
+    def find_strategy():
+        planner.read_strategy = []
+        OpenPMDTimeSeries.find_optimal_strategy( planner, 0, size - 1, 0 )
+    return find_strategy
+
+
+@benchmark( sizes=[10**5, 10**7] )
+def emittance_from_coord( size, workdir ):
+    from openpmd_viewer.addons.pic.lpa_diagnostics import \
+        emittance_from_coord
+    rng = np.random.default_rng( 0 )
+    x, y, ux, uy = rng.standard_normal( (4, size) )
+    w = rng.random( size )
+    return lambda: emittance_from_coord( x, y, ux, uy, w )
+
+
+@benchmark( sizes=[10**5, 10**7] )
+def w_median( size, workdir ):
+    from openpmd_viewer.addons.pic.lpa_diagnostics import w_median
+    rng = np.random.default_rng( 0 )
+    a = rng.standard_normal( size )
+    w = rng.random( size )
+    return lambda: w_median( a, w )
+
+
+@benchmark( sizes=[10**5, 10**7] )
+def w_std( size, workdir ):
+    from openpmd_viewer.addons.pic.lpa_diagnostics import w_std
+    rng = np.random.default_rng( 0 )
+    a = rng.standard_normal( size )
+    w = rng.random( size )
+    return lambda: w_std( a, w )
+
+
+def time_function( function, repeat=5, min_time=0.2 ):
+    """
+    Time `function` (after one warm-up call, e.g. for numba compilation)
+
+    The number of calls per measurement is chosen so that each of the
+    `repeat` measurements lasts at least `min_time` seconds in total.
+
+    Returns
+    -------
+    A dictionary with the minimum and median time per call, in seconds
+    """
+    function()
+    timer = timeit.Timer( function )
+    number, _ = timer.autorange()
+    number = max( 1, int(np.ceil( number * min_time / 0.2 )) )
+    times = np.array( timer.repeat( repeat=repeat, number=number ) ) / number
+    return { 'min': float(times.min()), 'median': float(np.median(times)),
+             'number': number, 'repeat': repeat }
+
+
+def run_suite( names=None, quick=False, repeat=5, min_time=0.2,
+               verbose=True ):
+    """
+    Run the registered benchmarks
+
+    Parameters
+    ----------
+    names: list of strings, optional
+        Run only the benchmarks whose name contains one of these strings
+
+    quick: bool
+        Only run the smallest size of each benchmark
+
+    Returns
+    -------
+    A dictionary {'<name>[<size>]': timings}. Benchmarks whose
+    dependencies are not installed are skipped.
+    """
+    results = OrderedDict()
+    with tempfile.TemporaryDirectory() as workdir:
+        for name, (setup, sizes) in BENCHMARKS.items():
+            if names and not any( n in name for n in names ):
+                continue
+            for size in ( sizes[:1] if quick else sizes ):
+                key = '%s[%d]' % (name, size)
+                try:
+                    function = setup( size, workdir )
+                except ImportError as e:
+                    if verbose:
+                        print( '%-36s skipped (%s)' % (key, e) )
+                    break
+                results[key] = time_function( function, repeat, min_time )
+                if verbose:
+                    print( '%-36s %12.6f s' % (key, results[key]['min']) )
+    return results
+
+
+def get_commit():
+    """
+    Return the hash of the current commit (with the suffix '-dirty'
+    if the tree has uncommitted changes), or 'unknown'
+    """
+    root = os.path.dirname( os.path.dirname(os.path.abspath(__file__)) )
+    try:
+        commit = subprocess.check_output( ['git', 'rev-parse', '--short',
+            'HEAD'], cwd=root, stderr=subprocess.DEVNULL ).decode().strip()
+        status = subprocess.check_output( ['git', 'status', '--porcelain',
+            '--untracked-files=no'], cwd=root ).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+    return commit + ( '-dirty' if status else '' )
+
+
+def save_results( results, results_dir, commit=None ):
+    """
+    Save the results of a run in `<results_dir>/<commit>.json`,
+    along with a description of the machine, and return the file name
+    """
+    if commit is None:
+        commit = get_commit()
+    os.makedirs( results_dir, exist_ok=True )
+    filename = os.path.join( results_dir, '%s.json' % commit )
+    record = { 'commit': commit,
+               'date': time.strftime( '%Y-%m-%dT%H:%M:%S' ),
+               'machine': { 'node': platform.node(),
+                            'processor': platform.processor(),
+                            'cpu_count': os.cpu_count(),
+                            'python': platform.python_version(),
+                            'numpy': np.__version__ },
+               'results': results }
+    with open( filename, 'w' ) as f:
+        json.dump( record, f, indent=2 )
+    return filename
+
+
+def compare_results( base, new, threshold=1.2 ):
+    """
+    Compare two runs (dictionaries loaded from the result files)
+
+    Returns
+    -------
+    A list of tuples (key, base time, new time, ratio, flag), where the
+    flag is 'SLOWER' when the ratio new/base exceeds `threshold`,
+    'faster' when it is below 1/threshold, and '' otherwise
+    (based on the minimum time per call)
+    """
+    rows = []
+    for key, timings in new['results'].items():
+        if key not in base['results']:
+            continue
+        t_base = base['results'][key]['min']
+        t_new = timings['min']
+        ratio = t_new / t_base
+        flag = ''
+        if ratio > threshold:
+            flag = 'SLOWER'
+        elif ratio < 1. / threshold:
+            flag = 'faster'
+        rows.append( (key, t_base, t_new, ratio, flag) )
+    return rows
+
+
+def format_report( rows, base_commit, new_commit ):
+    """
+    Return the comparison (see `compare_results`) as a text table
+    """
+    lines = [ '%-36s %12s %12s %8s' % ('benchmark', base_commit,
+                                       new_commit, 'ratio') ]
+    for key, t_base, t_new, ratio, flag in rows:
+        lines.append( '%-36s %12.6f %12.6f %8.2f %s'
+                      % (key, t_base, t_new, ratio, flag) )
+    return '\n'.join( lines )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Microbenchmark Suite')
+    subparsers = parser.add_subparsers(dest='command')
+    run_parser = subparsers.add_parser('run', help='run the benchmarks')
+    run_parser.add_argument('--filter', type=str, help='comma-separated substrings of the benchmark names', default=None)
+    run_parser.add_argument('--quick', action='store_true', help='only run the smallest sizes')
+    run_parser.add_argument('--repeat', type=int, help='number of measurements', default=5)
+    run_parser.add_argument('--results_dir', type=str, help='directory of the result files', default='results/microbench')
+    compare_parser = subparsers.add_parser('compare', help='compare two runs')
+    compare_parser.add_argument('base', type=str, help='result file of the reference run')
+    compare_parser.add_argument('new', type=str, help='result file of the new run')
+    compare_parser.add_argument('--threshold', type=float, help='slowdown ratio that is flagged', default=1.2)
+
+    args = parser.parse_args()
+    if args.command == 'run':
+        results = run_suite(
+            names=args.filter.split(',') if args.filter else None,
+            quick=args.quick, repeat=args.repeat )
+        print( 'Results saved in %s'
+               % save_results(results, args.results_dir) )
+    elif args.command == 'compare':
+        with open( args.base ) as f:
+            base = json.load( f )
+        with open( args.new ) as f:
+            new = json.load( f )
+        rows = compare_results( base, new, args.threshold )
+        print( format_report( rows, base['commit'], new['commit'] ) )
+        if any( flag == 'SLOWER' for *_, flag in rows ):
+            sys.exit( 1 )
+    else:
+        parser.print_help()
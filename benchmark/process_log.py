@@ -1,5 +1,6 @@
 import os
 import re
+import json
 import argparse
 import pandas as pd
 
@@ -37,11 +38,19 @@ def extract_data_from_log(log_file):
     apply_particle_level_select_array_time_elapsed = []
     total_time_elapsed = None
     data_size = None
+    bytes_read = None
+    chunk_count = None
+    flush_count = None
+    profile = None
 
     with open(log_file, 'r') as file:
         lines = file.readlines()
         for line in lines:
-            if 'target_percentage' in line:
+            if line.startswith('Profile: '):
+                # Profile: {"query": "get_particle", "total_time": ..., "spans": {...}, "counters": {...}}
+                profile = json.loads(line[len('Profile: '):])
+
+            elif 'target_percentage' in line:
                 target_percentage = float(line.split()[1])
 
             elif 'current_percentage' in line:
@@ -175,6 +184,32 @@ def extract_data_from_log(log_file):
                     total_time_elapsed = float(regex_result[0][0])
                     data_size = int(regex_result[0][1])
     
+    # Structured profile (recorded by `OpenPMDTimeSeries(..., profile=True)`)
+    # This replaces the timings parsed from the older "Time elapsed" lines
+    if profile is not None:
+        spans = profile['spans']
+        counters = profile['counters']
+
+        def span_time(*names):
+            times = [spans[name]['time'] for name in names if name in spans]
+            return sum(times) if times else None
+
+        query_index_time_elapsed = span_time('query_index')
+        remove_duplication_time_elapsed = span_time('intersect_blocks')
+        sort_block_metadata_time_elapsed = span_time('plan.sort_blocks')
+        find_optimal_read_solution_time_elapsed = span_time('plan.find_strategy')
+        generate_select_array_time_elapsed = span_time('plan.direct_block', 'plan.direct_slice')
+        get_target_data_time_elapsed = [span_time('read') or 0.]
+        get_support_data_time_elapsed = [span_time('read.support') or 0.]
+        data_calculation_time_elapsed = [span_time('offset') or 0.]
+        data_apply_select_time_elapsed = [span_time('select') or 0.]
+        apply_particle_level_select_array_time_elapsed = [span_time('gather') or 0.]
+        query_result_size = counters.get('query_result_size')
+        chunk_range_size = counters.get('n_read_ranges')
+        bytes_read = counters.get('bytes_read')
+        chunk_count = counters.get('n_chunks')
+        flush_count = counters.get('n_flushes')
+
     return {
         'query_seq': query_seq,
         'target_percentage': target_percentage,
@@ -202,6 +237,9 @@ def extract_data_from_log(log_file):
 
         'query_result_size': query_result_size,
         'chunk_range_size': chunk_range_size,
+        'bytes_read': bytes_read,
+        'chunk_count': chunk_count,
+        'flush_count': flush_count,
         'current_percentage': current_percentage,
         'iteration': iteration,
         'species': species,
@@ -0,0 +1,161 @@
+"""
+Replay an I/O trace recorded with
+openpmd_viewer.openpmd_timeseries.data_reader.io_tracer.IOTracer
+under a different read plan, and estimate the speedup offline.
+
+A linear cost model is fitted on the flushes of the trace:
+    latency = a + b * bytes + c * n_chunks
+The chunks are then regrouped according to a coalescing policy (chunks
+of the same 1D record that are less than `gap` elements apart are merged)
+and a flush policy, and the cost of the new plan is estimated with the
+model.
+
+Usage
+-----
+python replay_trace.py trace.npz --gap 1000 --flush record
+"""
+import argparse
+import numpy as np
+from openpmd_viewer.openpmd_timeseries.data_reader.io_tracer import load_trace
+
+FLUSH_POLICIES = ['original', 'chunk', 'record', 'single']
+
+
+def get_flushes( chunks ):
+    """
+    Return, for each flush of the trace, its latency,
+    its number of bytes and its number of chunks
+    """
+    groups, first, n_chunks = np.unique( chunks['flush_group'],
+                            return_index=True, return_counts=True )
+    nbytes = np.bincount( np.searchsorted(groups, chunks['flush_group']),
+                          weights=chunks['nbytes'] )
+    return chunks['latency'][first], nbytes, n_chunks
+
+
+def fit_cost_model( chunks ):
+    """
+    Fit latency = a + b * bytes + c * n_chunks on the flushes of the trace
+
+    Returns
+    -------
+    A tuple (a, b, c) of non-negative coefficients
+    """
+    latency, nbytes, n_chunks = get_flushes( chunks )
+    A = np.stack( [np.ones_like(latency), nbytes, n_chunks], axis=1 )
+    coefficients = np.linalg.lstsq( A, latency, rcond=None )[0]
+    return tuple( np.clip(coefficients, 0, None) )
+
+
+def coalesce( chunks, gap ):
+    """
+    Merge the 1D chunks of the same record and flush group whose
+    distance is at most `gap` elements (the elements in between are
+    read as well). Chunks with more than one dimension are kept as is.
+
+    Returns
+    -------
+    A structured array with the same layout as `chunks`
+    """
+    merged = []
+    keys = np.stack( [chunks['flush_group'], chunks['record'],
+                      chunks['offset'][:, 0]] )
+    for chunk in chunks[ np.lexsort( keys[::-1] ) ]:
+        previous = merged[-1] if merged else None
+        if chunk['ndim'] == 1 and previous is not None \
+                and previous['ndim'] == 1 \
+                and previous['record'] == chunk['record'] \
+                and previous['flush_group'] == chunk['flush_group']:
+            previous_end = previous['offset'][0] + previous['count'][0]
+            if chunk['offset'][0] - previous_end <= gap:
+                itemsize = chunk['nbytes'] // max( chunk['count'][0], 1 )
+                end = max( previous_end,
+                           chunk['offset'][0] + chunk['count'][0] )
+                previous['count'][0] = end - previous['offset'][0]
+                previous['nbytes'] = previous['count'][0] * itemsize
+                continue
+        merged.append( chunk.copy() )
+    return np.array( merged, dtype=chunks.dtype )
+
+
+def regroup_flushes( chunks, flush ):
+    """
+    Return a copy of `chunks` where `flush_group` follows the policy
+    `flush` (see FLUSH_POLICIES)
+    """
+    chunks = chunks.copy()
+    if flush == 'chunk':
+        chunks['flush_group'] = np.arange( len(chunks) )
+    elif flush == 'record':
+        chunks['flush_group'] = chunks['record']
+    elif flush == 'single':
+        chunks['flush_group'] = 0
+    elif flush != 'original':
+        raise ValueError( 'Unknown flush policy: %s (available: %s)'
+                          % (flush, ', '.join(FLUSH_POLICIES)) )
+    return chunks
+
+
+def estimate_time( chunks, model ):
+    """
+    Estimate the total read time of `chunks` with the cost model `model`
+    """
+    a, b, c = model
+    _, nbytes, n_chunks = get_flushes( chunks )
+    return float( np.sum( a + b * nbytes + c * n_chunks ) )
+
+
+def replay( chunks, gap=0, flush='original', model=None ):
+    """
+    Estimate the read time of the trace and of the modified read plan
+
+    Returns
+    -------
+    A dictionary with the measured and modelled times of the trace, the
+    modelled time of the new plan, the estimated speedup and the numbers
+    of chunks and flushes of both plans
+    """
+    if model is None:
+        model = fit_cost_model( chunks )
+    # Flushes are regrouped first, so that coalescing can merge
+    # chunks that used to be in different flushes
+    plan = coalesce( regroup_flushes( chunks, flush ), gap )
+    measured = float( np.sum( get_flushes(chunks)[0] ) )
+    modelled = estimate_time( chunks, model )
+    replayed = estimate_time( plan, model )
+    return { 'model': model,
+             'measured_time': measured,
+             'modelled_time': modelled,
+             'replayed_time': replayed,
+             'speedup': modelled / replayed if replayed > 0 else np.inf,
+             'n_chunks': (len(chunks), len(plan)),
+             'n_flushes': (len(np.unique(chunks['flush_group'])),
+                           len(np.unique(plan['flush_group']))),
+             'bytes_read': (int(chunks['nbytes'].sum()),
+                            int(plan['nbytes'].sum())) }
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='I/O trace replay')
+    parser.add_argument('trace', type=str, help='trace file (.npz)')
+    parser.add_argument('--gap', type=int, default=0,
+        help='maximal gap (in elements) between coalesced chunks')
+    parser.add_argument('--flush', type=str, default='original',
+        choices=FLUSH_POLICIES, help='flush policy of the new plan')
+    args = parser.parse_args()
+
+    chunks, record_names = load_trace( args.trace )
+    result = replay( chunks, gap=args.gap, flush=args.flush )
+
+    print('records: %d, chunks: %d, flushes: %d'
+          % (len(record_names), result['n_chunks'][0],
+             result['n_flushes'][0]))
+    print('cost model: %.3e s + %.3e s/byte + %.3e s/chunk'
+          % result['model'])
+    print('measured time: %.6f s (model: %.6f s)'
+          % (result['measured_time'], result['modelled_time']))
+    print('replayed plan: %d chunks, %d flushes, %d bytes'
+          % (result['n_chunks'][1], result['n_flushes'][1],
+             result['bytes_read'][1]))
+    print('estimated time: %.6f s, speedup: %.2f'
+          % (result['replayed_time'], result['speedup']))
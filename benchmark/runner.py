@@ -0,0 +1,313 @@
+"""
+In-process benchmark runner.
+
+The queries (in the `selected_N_queries.csv` format of select_n.py) are
+loaded once, and each of them is run with every requested strategy (the
+test types of batchTest.py) within a single Python process, so that the
+interpreter startup, the loading of geosindex and the construction of
+the OpenPMDTimeSeries are not included in the measured latency.
+
+In `cold` mode, the page cache is dropped before each query, with a
+configurable hook (by default, writing to /proc/sys/vm/drop_caches,
+which requires root privileges). The results are written directly as
+a tidy table (one row per query and strategy) in CSV or Parquet format.
+
+Usage
+-----
+python benchmark/runner.py --bpfile /nvme/gc/diag2 \
+    --index /data/gc/rocksdb-index/GEOSIndex/cmake-build-debug/diag2 \
+    --query_path results/10g_iteration_500/selected_20_queries.csv \
+    --test_types 1,2,3 --mode cold --output results/runner.parquet
+"""
+import os
+import ast
+import copy
+import time
+import argparse
+import subprocess
+import pandas as pd
+from openpmd_viewer import OpenPMDTimeSeries
+
+# Parameters of the index, for each configuration of batchTest.py
+# (secondary index, direct block read, read groups)
+_GEOS_CONFIGS = [
+    ('none', False, True, False),
+    ('none', False, False, True),
+    ('minmax', True, False, False),
+    ('minmax', True, False, True),
+    ('minmax', True, True, False),
+]
+_INDEX_TYPES = ['minmax', 'rtree']
+
+
+def _geos_strategy( index_type, storage, config, skip_offset=False ):
+    secondary_type, use_secondary, direct_block_read, read_groups = config
+    return {
+        'geos_index': True,
+        'geos_index_type': index_type,
+        'geos_index_storage_backend': storage,
+        'geos_index_secondary_type': secondary_type,
+        'geos_index_use_secondary': use_secondary,
+        'geos_index_direct_block_read': direct_block_read,
+        'geos_index_read_groups': read_groups,
+        'skip_offset': skip_offset }
+
+
+# The strategies, indexed by the test type of batchTest.py
+# - 1: original openPMD-viewer method
+# - 2 to 11: file index, 12 to 21: RocksDB index
+#   (for each configuration, Min-Max index then R-tree)
+# - 22 to 26: file index, without reading the position offset
+STRATEGIES = { 1: {'geos_index': False} }
+for i_storage, storage in enumerate(['file', 'rocksdb']):
+    for i_config, config in enumerate(_GEOS_CONFIGS):
+        for i_type, index_type in enumerate(_INDEX_TYPES):
+            STRATEGIES[ 2 + 10*i_storage + 2*i_config + i_type ] = \
+                _geos_strategy( index_type, storage, config )
+for test_type in range(22, 27):
+    config = _GEOS_CONFIGS[ (test_type - 22) // 2 ]
+    index_type = _INDEX_TYPES[ (test_type - 22) % 2 ]
+    STRATEGIES[test_type] = _geos_strategy(
+        index_type, 'file', config, skip_offset=True )
+
+# Arguments of OpenPMDTimeSeries (the other ones are passed to get_particle)
+_SERIES_ARGS = [ 'geos_index', 'geos_index_type',
+                 'geos_index_storage_backend', 'geos_index_secondary_type' ]
+
+# Labels used in the results (same as in process_log.py)
+_LABELS = { 'minmax': 'Min-Max', 'rtree': 'Rtree', 'none': 'None',
+            'file': 'File', 'rocksdb': 'RocksDB' }
+
+
+def drop_page_cache():
+    """
+    Default hook of the `cold` mode: flush and drop the page cache
+    (requires root privileges)
+    """
+    os.sync()
+    with open( '/proc/sys/vm/drop_caches', 'w' ) as f:
+        f.write( '3\n' )
+
+
+def command_hook( command ):
+    """
+    Return a hook that runs the shell command `command`
+    (e.g. 'sync; echo 3 | sudo tee /proc/sys/vm/drop_caches')
+    """
+    def hook():
+        subprocess.run( command, shell=True, check=True,
+                        stdout=subprocess.DEVNULL )
+    return hook
+
+
+def load_queries( query_path ):
+    """
+    Load the queries selected by select_n.py
+
+    Returns
+    -------
+    A list of dictionaries with the keys 'query_seq', 'target_percentage',
+    'select_set' (list of variables) and 'envelope' (dictionary)
+    """
+    df = pd.read_csv( query_path, header=[0] )
+    return [ { 'query_seq': query_seq,
+               'target_percentage': row['target_percentage'],
+               'select_set': list( ast.literal_eval(row['select_set']) ),
+               'envelope': ast.literal_eval(row['envelope']) }
+             for query_seq, (_, row) in enumerate( df.iterrows() ) ]
+
+
+class BenchmarkRunner( object ):
+    """
+    Run sets of queries with several strategies in the same process
+    """
+
+    def __init__( self, bp_file_path, index_path=None, iteration=500,
+                  species='electrons', limit_memory_usage=None,
+                  block_meta_path=None, backend='openpmd-api' ):
+        """
+        Initialize a BenchmarkRunner
+
+        Parameters
+        ----------
+        bp_file_path: string
+            The path to the openPMD data
+
+        index_path: string, optional
+            The path to the index (required by all the strategies
+            except the original method, i.e. test type 1)
+
+        iteration: int
+            The iteration at which the queries are made
+
+        species: string
+            The species that is queried
+
+        limit_memory_usage, block_meta_path: optional
+            Passed to `get_particle` (original method only)
+
+        backend: string
+            The backend of the OpenPMDTimeSeries
+        """
+        self.bp_file_path = bp_file_path
+        self.index_path = index_path
+        self.iteration = iteration
+        self.species = species
+        self.limit_memory_usage = limit_memory_usage
+        self.block_meta_path = block_meta_path
+        self.backend = backend
+        # One OpenPMDTimeSeries per configuration of the index
+        self._series = {}
+
+    def get_series( self, strategy ):
+        """
+        Return the OpenPMDTimeSeries for `strategy` (created once)
+        """
+        series_args = { key: strategy[key] for key in _SERIES_ARGS
+                        if key in strategy }
+        key = tuple( sorted(series_args.items()) )
+        if key not in self._series:
+            if series_args.get( 'geos_index', False ):
+                if self.index_path is None:
+                    raise ValueError( 'The index path is required '
+                                      'for the indexed strategies.' )
+                series_args['geos_index_save_path'] = self.index_path
+            self._series[key] = OpenPMDTimeSeries( self.bp_file_path,
+                backend=self.backend, profile=True, **series_args )
+        return self._series[key]
+
+    def run_query( self, query, test_type ):
+        """
+        Run `query` with the strategy `test_type` and return one
+        row of results (dictionary)
+        """
+        strategy = STRATEGIES[test_type]
+        ts = self.get_series( strategy )
+        kwargs = { key: value for key, value in strategy.items()
+                   if key not in _SERIES_ARGS }
+        if test_type == 1:
+            kwargs['limit_memory_usage'] = self.limit_memory_usage
+            kwargs['block_meta_path'] = self.block_meta_path
+
+        start = time.perf_counter()
+        result = ts.get_particle( var_list=query['select_set'],
+            iteration=self.iteration, species=self.species,
+            select=copy.deepcopy( query['envelope'] ), **kwargs )
+        total_time = time.perf_counter() - start
+
+        row = { 'test_type': test_type,
+                'query_seq': query['query_seq'],
+                'target_percentage': query['target_percentage'],
+                'select_set': str( tuple(query['select_set']) ),
+                'envelope': str( query['envelope'] ),
+                'index_type': _LABELS.get(
+                    strategy.get('geos_index_type') ),
+                'storage': _LABELS.get(
+                    strategy.get('geos_index_storage_backend') ),
+                'secondary': _LABELS.get(
+                    strategy.get('geos_index_secondary_type') ),
+                'direct_block_read':
+                    strategy.get('geos_index_direct_block_read'),
+                'read_groups': strategy.get('geos_index_read_groups'),
+                'skip_offset': strategy.get('skip_offset', False),
+                'total_time': total_time,
+                'query_result_size': result[0].size }
+        profile = ts.last_query_profile
+        for name, span in profile.spans.items():
+            row[ name.replace('.', '_') + '_time' ] = span['time']
+        row.update( profile.counters )
+        row.update( profile.annotations )
+        return row
+
+    def run( self, queries, test_types, mode='warm', hook=drop_page_cache,
+             repeat=1, verbose=True ):
+        """
+        Run every query with every strategy
+
+        Parameters
+        ----------
+        queries: list of dictionaries
+            The queries (see `load_queries`)
+
+        test_types: list of int
+            The strategies (keys of STRATEGIES)
+
+        mode: string
+            'warm': each query is run once before being measured
+            'cold': `hook` is called before each measured query
+
+        hook: callable
+            Function that drops the page cache (`cold` mode)
+
+        repeat: int
+            The number of measurements of each query and strategy
+
+        Returns
+        -------
+        A pandas DataFrame, with one row per measurement
+        """
+        if mode not in ['warm', 'cold']:
+            raise ValueError( 'Unknown mode: %s (available: warm, cold)'
+                              % mode )
+        rows = []
+        for test_type in test_types:
+            for query in queries:
+                if mode == 'warm':
+                    self.run_query( query, test_type )
+                for i_repeat in range(repeat):
+                    if mode == 'cold':
+                        hook()
+                    row = self.run_query( query, test_type )
+                    row['mode'] = mode
+                    row['repeat'] = i_repeat
+                    rows.append( row )
+                    if verbose:
+                        print( 'Test type %d, query %d: %.6f s, %d results'
+                               % (test_type, query['query_seq'],
+                                  row['total_time'],
+                                  row['query_result_size']) )
+        return pd.DataFrame( rows )
+
+
+def write_results( df, output_path ):
+    """
+    Write the results in Parquet format (if `output_path` ends with
+    .parquet) or in CSV format (otherwise)
+    """
+    if output_path.endswith( '.parquet' ):
+        df.to_parquet( output_path, index=False )
+    else:
+        df.to_csv( output_path, index=False )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='In-process Benchmark Runner')
+    parser.add_argument('--bpfile', type=str, help='bp file path')
+    parser.add_argument('--index', type=str, help='geoindex path', default=None)
+    parser.add_argument('--iteration', type=int, help='iteration number', default=500)
+    parser.add_argument('--species', type=str, help='species', default='electrons')
+    parser.add_argument('--query_path', type=str, help='selected queries (csv)', default='results/10g_iteration_500/selected_20_queries.csv')
+    parser.add_argument('--test_types', type=str, help='comma-separated test types', default='1')
+    parser.add_argument('--mode', type=str, help='warm or cold page cache', default='warm', choices=['warm', 'cold'])
+    parser.add_argument('--drop_cache_cmd', type=str, help='shell command that drops the page cache (cold mode)', default=None)
+    parser.add_argument('--repeat', type=int, help='number of measurements per query', default=1)
+    parser.add_argument('--limit_memory_usage', type=str, help='limit memory usage', default=None)
+    parser.add_argument('--block_meta_path', type=str, help='block meta path', default=None)
+    parser.add_argument('--output', type=str, help='output file (.csv or .parquet)', default='results/runner.csv')
+
+    args = parser.parse_args()
+    if not args.bpfile:
+        raise ValueError("bpfile is required")
+
+    hook = drop_page_cache
+    if args.drop_cache_cmd is not None:
+        hook = command_hook( args.drop_cache_cmd )
+
+    runner = BenchmarkRunner( args.bpfile, args.index,
+        iteration=args.iteration, species=args.species,
+        limit_memory_usage=args.limit_memory_usage,
+        block_meta_path=args.block_meta_path )
+    df = runner.run( load_queries(args.query_path),
+        [ int(test_type) for test_type in args.test_types.split(',') ],
+        mode=args.mode, hook=hook, repeat=args.repeat )
+    write_results( df, args.output )
@@ -0,0 +1,605 @@
+"""
+Generator of synthetic openPMD datasets, so that the performance tests
+and the benchmarks can run on any machine.
+
+The particles are drawn from a mixture of Gaussian clusters (each with
+its own drift momentum), and are written in blocks: when they are
+sorted along z, each block covers a slab of the box (as with a domain
+decomposition), which is the favorable case for the block indices.
+The fields are either 3D cartesian or thetaMode, and are also written
+in blocks along their first axis.
+
+The data can be written with openpmd-api (ADIOS2 '.bp', HDF5 '.h5' or
+'.json') or directly with h5py (HDF5, when openpmd-api is not installed).
+A set of queries, in the format of select_n.py, can also be generated,
+for use with benchmark/runner.py.
+
+Usage
+-----
+python benchmark/synthetic_data.py --output /tmp/synthetic \
+    --n_particles 1000000 --n_blocks 64 --iterations 0,100 \
+    --queries /tmp/synthetic_queries.csv
+"""
+import os
+import argparse
+import numpy as np
+from scipy import constants
+
+# Particle variables and their openPMD record components
+PARTICLE_RECORDS = { 'x': ('position', 'x'), 'y': ('position', 'y'),
+                     'z': ('position', 'z'), 'ux': ('momentum', 'x'),
+                     'uy': ('momentum', 'y'), 'uz': ('momentum', 'z') }
+
+# Dimensions (L, M, T, I, theta, N, J) of the records
+_UNIT_DIMENSION = { 'position': (1., 0., 0., 0., 0., 0., 0.),
+                    'positionOffset': (1., 0., 0., 0., 0., 0., 0.),
+                    'momentum': (1., 1., -1., 0., 0., 0., 0.),
+                    'weighting': (0., 0., 0., 0., 0., 0., 0.),
+                    'id': (0., 0., 0., 0., 0., 0., 0.),
+                    'mass': (0., 1., 0., 0., 0., 0., 0.),
+                    'charge': (0., 0., 1., 1., 0., 0., 0.),
+                    'E': (1., 1., -3., -1., 0., 0., 0.),
+                    'rho': (-3., 0., 1., 1., 0., 0., 0.) }
+
+
+def block_sizes( n_total, n_blocks, jitter, rng ):
+    """
+    Split `n_total` elements into `n_blocks` blocks. With `jitter` = 0
+    the blocks have the same size; with `jitter` = 1 their sizes are
+    random.
+    """
+    p = (1. - jitter) / n_blocks + jitter * rng.dirichlet( np.ones(n_blocks) )
+    sizes = np.floor( p * n_total ).astype( np.int64 )
+    sizes[ :n_total - sizes.sum() ] += 1
+    return sizes
+
+
+def make_particles( n_particles, box_min, box_max, n_clusters,
+                    cluster_width, sort_axis, rng ):
+    """
+    Draw the particles of one species
+
+    Parameters
+    ----------
+    n_particles: int
+        The number of macroparticles
+
+    box_min, box_max: arrays of 3 floats
+        The bounds of the box (x, y, z), in meters
+
+    n_clusters: int
+        The number of Gaussian clusters (0 for a uniform distribution)
+
+    cluster_width: float
+        The standard deviation of the clusters, relative to the box size
+
+    sort_axis: string or None
+        Axis ('x', 'y' or 'z') along which the particles are sorted
+        (None for a random order)
+
+    Returns
+    -------
+    A dictionary of arrays, with the keys of PARTICLE_RECORDS and 'w'
+    (positions in meters, momenta as gamma*beta)
+    """
+    box_size = box_max - box_min
+    if n_clusters == 0:
+        position = box_min + box_size * rng.random( (n_particles, 3) )
+        drift = np.zeros( (n_particles, 3) )
+    else:
+        centers = box_min + box_size * rng.random( (n_clusters, 3) )
+        drifts = np.zeros( (n_clusters, 3) )
+        drifts[:, 2] = 10. * rng.random( n_clusters )
+        cluster = rng.integers( 0, n_clusters, n_particles )
+        position = centers[cluster] + cluster_width * box_size * \
+            rng.standard_normal( (n_particles, 3) )
+        # Periodic wrapping into the box
+        position = box_min + np.mod( position - box_min, box_size )
+        drift = drifts[cluster]
+    momentum = drift + 0.1 * rng.standard_normal( (n_particles, 3) )
+    if sort_axis is not None:
+        order = np.argsort( position[:, 'xyz'.index(sort_axis)],
+                            kind='stable' )
+        position = position[order]
+        momentum = momentum[order]
+    particles = { 'w': 1.e5 * (0.5 + rng.random(n_particles)) }
+    for i, coord in enumerate('xyz'):
+        particles[coord] = np.ascontiguousarray( position[:, i] )
+        particles['u' + coord] = np.ascontiguousarray( momentum[:, i] )
+    return particles
+
+
+def make_field( shape, rng ):
+    """
+    Return a smooth field (a product of sines) with some noise
+    """
+    grids = np.meshgrid( *[ np.linspace(0, np.pi, n) for n in shape ],
+                         indexing='ij' )
+    F = np.ones( shape )
+    for i, grid in enumerate(grids):
+        F *= np.sin( (i + 1) * grid + 0.5 )
+    return F + 0.01 * rng.standard_normal( shape )
+
+
+class SyntheticDataset( object ):
+    """
+    Description and generator of a synthetic openPMD time series
+    """
+
+    def __init__( self, n_particles=100000, n_blocks=16, block_jitter=0.,
+                  n_clusters=4, cluster_width=0.05, sort_axis='z',
+                  field_geometry='3dcartesian', field_shape=(32, 32, 64),
+                  n_modes=2, n_field_blocks=4, iterations=(0,),
+                  species='electrons', cell_size=1.e-6, dt=1.e-15, seed=0,
+                  dtype=np.float64, position_offset=0. ):
+        """
+        Initialize a SyntheticDataset
+
+        Parameters
+        ----------
+        n_particles: int
+            The number of macroparticles (per iteration)
+
+        n_blocks: int
+            The number of blocks in which the particles are written
+
+        block_jitter: float between 0 and 1
+            The irregularity of the block sizes (0: identical sizes)
+
+        n_clusters, cluster_width, sort_axis:
+            The spatial distribution of the particles (see
+            `make_particles`)
+
+        field_geometry: string
+            Either '3dcartesian' (fields E and rho, on a 3D grid of shape
+            `field_shape`) or 'thetaMode' (fields E and rho with `n_modes`
+            azimuthal modes, on an (r, z) grid of shape `field_shape[-2:]`)
+
+        n_field_blocks: int
+            The number of blocks along the first axis of the fields
+
+        iterations: list of int
+            The iterations that are written (the clusters drift along z
+            from one iteration to the next)
+
+        species: string
+            The name of the particle species
+
+        cell_size, dt: floats
+            The size of the cells and the timestep, in SI units
+
+        seed: int
+            The seed of the random generator
+
+        dtype: numpy floating type
+            The type in which the particle and field data is written
+            (e.g. np.float32, as in many PIC outputs)
+
+        position_offset: float
+            The (constant) positionOffset of the particles, in meters:
+            the position record contains the positions minus this offset
+        """
+        self.n_particles = n_particles
+        self.n_blocks = n_blocks
+        self.block_jitter = block_jitter
+        self.n_clusters = n_clusters
+        self.cluster_width = cluster_width
+        self.sort_axis = sort_axis
+        if field_geometry not in ['3dcartesian', 'thetaMode']:
+            raise ValueError( 'Unknown field geometry: %s '
+                '(available: 3dcartesian, thetaMode)' % field_geometry )
+        self.field_geometry = field_geometry
+        self.field_shape = tuple( field_shape )
+        self.n_modes = n_modes
+        self.n_field_blocks = n_field_blocks
+        self.iterations = list( iterations )
+        self.species = species
+        self.cell_size = cell_size
+        self.dt = dt
+        self.seed = seed
+        self.dtype = np.dtype( dtype )
+        self.position_offset = position_offset
+
+        # Extent of the box, in meters
+        if field_geometry == '3dcartesian':
+            nx, ny, nz = self.field_shape
+            self.box_min = -0.5 * cell_size * np.array( [nx, ny, 0.] )
+            self.box_max = 0.5 * cell_size * np.array( [nx, ny, 2 * nz] )
+        else:
+            nr, nz = self.field_shape[-2:]
+            self.box_min = cell_size * np.array( [-nr, -nr, 0.] )
+            self.box_max = cell_size * np.array( [nr, nr, nz] )
+
+    def get_particles( self, iteration ):
+        """
+        Return the particles at `iteration` (see `make_particles`)
+        """
+        rng = np.random.default_rng( self.seed )
+        particles = make_particles( self.n_particles, self.box_min,
+            self.box_max, self.n_clusters, self.cluster_width,
+            self.sort_axis, rng )
+        # Drift along z
+        particles['z'] += iteration * self.dt * constants.c * \
+            particles['uz'] / np.sqrt( 1 + particles['uz']**2 )
+        return { var: data.astype( self.dtype, copy=False )
+                 for var, data in particles.items() }
+
+    def get_particle_blocks( self ):
+        """
+        Return the sizes of the particle blocks
+        """
+        rng = np.random.default_rng( self.seed + 1 )
+        return block_sizes( self.n_particles, self.n_blocks,
+                            self.block_jitter, rng )
+
+    def get_fields( self, iteration ):
+        """
+        Return a dictionary of the field components at `iteration`:
+        {'E/x': array, ..., 'rho': array} ('E/r', 'E/t', 'E/z' in
+        thetaMode, where the arrays have the shape (2*n_modes-1, nr, nz))
+        """
+        rng = np.random.default_rng( self.seed + 2 + iteration )
+        if self.field_geometry == '3dcartesian':
+            shape = self.field_shape
+            components = 'xyz'
+        else:
+            shape = (2 * self.n_modes - 1,) + self.field_shape[-2:]
+            components = 'rtz'
+        fields = { 'E/' + coord: 1.e9 * make_field( shape, rng )
+                   for coord in components }
+        fields['rho'] = make_field( shape, rng )
+        return { name: data.astype( self.dtype, copy=False )
+                 for name, data in fields.items() }
+
+    def get_field_metadata( self ):
+        """
+        Return the geometry, axis labels, spacing, offset,
+        position and geometry parameters of the fields
+        """
+        if self.field_geometry == '3dcartesian':
+            return ( 'cartesian', ['x', 'y', 'z'], [self.cell_size] * 3,
+                     list(self.box_min), [0.5, 0.5, 0.5], None )
+        return ( 'thetaMode', ['r', 'z'], [self.cell_size] * 2, [0., 0.],
+                 [0.5, 0.], 'm=%d;imag=+' % self.n_modes )
+
+    def write( self, path, writer='openpmd-api', file_format='bp' ):
+        """
+        Write the dataset in the directory `path`
+
+        Parameters
+        ----------
+        path: string
+            The output directory (created if needed)
+
+        writer: string
+            Either 'openpmd-api' or 'h5py'
+
+        file_format: string
+            The extension of the files, with openpmd-api
+            ('bp', 'h5' or 'json'); always 'h5' with h5py
+
+        Returns
+        -------
+        The path to the directory
+        """
+        os.makedirs( path, exist_ok=True )
+        if writer == 'openpmd-api':
+            self._write_openpmd_api( path, file_format )
+        elif writer == 'h5py':
+            self._write_h5py( path )
+        else:
+            raise ValueError( 'Unknown writer: %s '
+                              '(available: openpmd-api, h5py)' % writer )
+        return path
+
+    def _write_openpmd_api( self, path, file_format ):
+        import openpmd_api as io
+        series = io.Series( os.path.join(path, 'data_%T.' + file_format),
+                            io.Access.create )
+        series.set_software( 'openPMD-viewer synthetic data' )
+        block_starts = np.concatenate( [[0],
+                            np.cumsum(self.get_particle_blocks())] )
+        geometry, labels, spacing, offset, position, geometry_parameters \
+            = self.get_field_metadata()
+        for iteration in self.iterations:
+            it = series.iterations[iteration]
+            it.time = iteration * self.dt
+            it.dt = self.dt
+            it.time_unit_SI = 1.
+
+            # Fields
+            fields = self.get_fields( iteration )
+            for field_name in ['E', 'rho']:
+                mesh = it.meshes[field_name]
+                mesh.geometry = getattr( io.Geometry, geometry )
+                if geometry_parameters is not None:
+                    mesh.set_attribute( 'geometryParameters',
+                                        geometry_parameters )
+                mesh.axis_labels = labels
+                mesh.grid_spacing = spacing
+                mesh.grid_global_offset = offset
+                mesh.grid_unit_SI = 1.
+                mesh.data_order = 'C'
+                mesh.unit_dimension = self._io_unit_dimension( io,
+                    _UNIT_DIMENSION[field_name] )
+                for name, data in fields.items():
+                    if name.split('/')[0] != field_name:
+                        continue
+                    if name == 'rho':
+                        rc = mesh[io.Mesh_Record_Component.SCALAR]
+                    else:
+                        rc = mesh[name.split('/')[1]]
+                    rc.position = position
+                    rc.reset_dataset( io.Dataset(data.dtype,
+                                                 list(data.shape)) )
+                    for start, stop in self._field_blocks( data.shape ):
+                        chunk = np.ascontiguousarray(
+                            data[:, start:stop] if geometry == 'thetaMode'
+                            else data[start:stop] )
+                        chunk_offset = [0] * data.ndim
+                        chunk_offset[ int(geometry == 'thetaMode') ] = start
+                        rc.store_chunk( chunk, chunk_offset,
+                                        list(chunk.shape) )
+
+            # Particles
+            particles = self.get_particles( iteration )
+            species = it.particles[self.species]
+            n = self.n_particles
+            mass = constants.m_e
+            records = dict( PARTICLE_RECORDS )
+            records['w'] = ('weighting', io.Record_Component.SCALAR)
+            for var, (record_name, comp_name) in records.items():
+                data = particles[var]
+                if record_name == 'momentum':
+                    data = data * mass * constants.c
+                elif record_name == 'position':
+                    data = data - self.dtype.type( self.position_offset )
+                record = species[record_name]
+                record.unit_dimension = self._io_unit_dimension( io,
+                    _UNIT_DIMENSION[record_name] )
+                rc = record[comp_name]
+                rc.reset_dataset( io.Dataset(data.dtype, [n]) )
+                for start, stop in zip( block_starts[:-1], block_starts[1:] ):
+                    if stop > start:
+                        rc.store_chunk( np.ascontiguousarray(
+                            data[start:stop]), [int(start)],
+                            [int(stop - start)] )
+            ids = np.arange( n, dtype=np.uint64 )
+            rc = species['id'][io.Record_Component.SCALAR]
+            rc.reset_dataset( io.Dataset(ids.dtype, [n]) )
+            rc.store_chunk( ids )
+            species['positionOffset'].unit_dimension = \
+                self._io_unit_dimension( io, _UNIT_DIMENSION['positionOffset'] )
+            for coord in 'xyz':
+                rc = species['positionOffset'][coord]
+                rc.reset_dataset( io.Dataset(np.dtype('float64'), [n]) )
+                rc.make_constant( float(self.position_offset) )
+            for record_name, value in [ ('mass', mass),
+                                        ('charge', -constants.e) ]:
+                species[record_name].unit_dimension = \
+                    self._io_unit_dimension( io, _UNIT_DIMENSION[record_name] )
+                rc = species[record_name][io.Record_Component.SCALAR]
+                rc.reset_dataset( io.Dataset(np.dtype('float64'), [n]) )
+                rc.make_constant( value )
+            it.close()
+        series.close()
+
+    @staticmethod
+    def _io_unit_dimension( io, dimension ):
+        units = [ io.Unit_Dimension.L, io.Unit_Dimension.M,
+                  io.Unit_Dimension.T, io.Unit_Dimension.I,
+                  io.Unit_Dimension.theta, io.Unit_Dimension.N,
+                  io.Unit_Dimension.J ]
+        return { unit: power for unit, power in zip(units, dimension)
+                 if power != 0 }
+
+    def _field_blocks( self, shape ):
+        """
+        Return the ranges (start, stop) of the field blocks,
+        along the first spatial axis
+        """
+        axis = int( self.field_geometry == 'thetaMode' )
+        starts = np.linspace( 0, shape[axis], self.n_field_blocks + 1 )
+        starts = starts.astype( np.int64 )
+        return [ (int(start), int(stop)) for start, stop
+                 in zip(starts[:-1], starts[1:]) if stop > start ]
+
+    def _write_h5py( self, path ):
+        import h5py
+        particle_blocks = self.get_particle_blocks()
+        geometry, labels, spacing, offset, position, geometry_parameters \
+            = self.get_field_metadata()
+        for iteration in self.iterations:
+            filename = os.path.join( path, 'data%08d.h5' % iteration )
+            with h5py.File( filename, 'w' ) as f:
+                f.attrs['openPMD'] = np.bytes_( '1.1.0' )
+                f.attrs['openPMDextension'] = np.uint32( 0 )
+                f.attrs['basePath'] = np.bytes_( '/data/%T/' )
+                f.attrs['meshesPath'] = np.bytes_( 'meshes/' )
+                f.attrs['particlesPath'] = np.bytes_( 'particles/' )
+                f.attrs['iterationEncoding'] = np.bytes_( 'fileBased' )
+                f.attrs['iterationFormat'] = np.bytes_( 'data%T.h5' )
+                f.attrs['software'] = np.bytes_(
+                    'openPMD-viewer synthetic data' )
+                it = f.create_group( '/data/%d' % iteration )
+                it.attrs['time'] = iteration * self.dt
+                it.attrs['dt'] = self.dt
+                it.attrs['timeUnitSI'] = 1.
+
+                # Fields
+                fields = self.get_fields( iteration )
+                meshes = it.create_group( 'meshes' )
+                for field_name in ['E', 'rho']:
+                    data = fields.get( field_name )
+                    if data is None:
+                        mesh = meshes.create_group( field_name )
+                    else:
+                        mesh = self._h5py_dataset( meshes, field_name, data,
+                                                   self._h5py_field_chunks )
+                    mesh.attrs['geometry'] = np.bytes_( geometry )
+                    if geometry_parameters is not None:
+                        mesh.attrs['geometryParameters'] = \
+                            np.bytes_( geometry_parameters )
+                    mesh.attrs['axisLabels'] = np.array(
+                        [ np.bytes_(label) for label in labels ] )
+                    mesh.attrs['dataOrder'] = np.bytes_( 'C' )
+                    mesh.attrs['gridSpacing'] = np.array( spacing )
+                    mesh.attrs['gridGlobalOffset'] = np.array( offset )
+                    mesh.attrs['gridUnitSI'] = 1.
+                    mesh.attrs['unitDimension'] = \
+                        np.array( _UNIT_DIMENSION[field_name] )
+                    mesh.attrs['timeOffset'] = 0.
+                    mesh.attrs['fieldSmoothing'] = np.bytes_( 'none' )
+                    if data is not None:
+                        mesh.attrs['position'] = np.array( position )
+                        continue
+                    for name, data in fields.items():
+                        if name.split('/')[0] == field_name:
+                            dset = self._h5py_dataset( mesh,
+                                name.split('/')[1], data,
+                                self._h5py_field_chunks )
+                            dset.attrs['position'] = np.array( position )
+
+                # Particles
+                particles = self.get_particles( iteration )
+                species = it.create_group( 'particles/' + self.species )
+                n = self.n_particles
+                # HDF5 chunks have a fixed size: use the largest block
+                chunks = lambda shape: ( max(int(particle_blocks.max()), 1), )
+                mass = constants.m_e
+                for var, (record_name, comp_name) in \
+                        PARTICLE_RECORDS.items():
+                    data = particles[var]
+                    if record_name == 'momentum':
+                        data = data * mass * constants.c
+                    elif record_name == 'position':
+                        data = data - self.dtype.type( self.position_offset )
+                    record = species.require_group( record_name )
+                    self._h5py_dataset( record, comp_name, data, chunks )
+                self._h5py_dataset( species, 'weighting', particles['w'],
+                                    chunks )
+                self._h5py_dataset( species, 'id',
+                    np.arange(n, dtype=np.uint64), chunks )
+                offset_record = species.create_group( 'positionOffset' )
+                for coord in 'xyz':
+                    self._h5py_constant( offset_record, coord,
+                                         float(self.position_offset), n )
+                self._h5py_constant( species, 'mass', mass, n )
+                self._h5py_constant( species, 'charge', -constants.e, n )
+                for record_name in species.keys():
+                    record = species[record_name]
+                    record.attrs['unitDimension'] = \
+                        np.array( _UNIT_DIMENSION[record_name] )
+                    record.attrs['timeOffset'] = 0.
+                    record.attrs['macroWeighted'] = np.uint32( 0 )
+                    record.attrs['weightingPower'] = 0.
+
+    def _h5py_field_chunks( self, shape ):
+        axis = int( self.field_geometry == 'thetaMode' )
+        chunks = list( shape )
+        chunks[axis] = max( shape[axis] // self.n_field_blocks, 1 )
+        return tuple( chunks )
+
+    @staticmethod
+    def _h5py_dataset( group, name, data, chunks ):
+        dset = group.create_dataset( name, data=data,
+                                     chunks=chunks(data.shape) )
+        dset.attrs['unitSI'] = 1.
+        return dset
+
+    @staticmethod
+    def _h5py_constant( group, name, value, n ):
+        constant = group.create_group( name )
+        constant.attrs['value'] = value
+        constant.attrs['shape'] = np.array( [n], dtype=np.uint64 )
+        constant.attrs['unitSI'] = 1.
+        return constant
+
+    def write_queries( self, filename, iteration=None, n_queries=10,
+                       target_percentages=(0.001, 0.01, 0.1),
+                       select_sets=(('x',), ('x', 'ux'), ('ux', 'uy', 'uz')) ):
+        """
+        Write a set of queries in the format of select_n.py
+        (see benchmark/runner.py)
+
+        For each target percentage and each set of selected variables,
+        `n_queries` envelopes are centered on random particles, with
+        the same fraction of the particles along each variable.
+
+        Returns
+        -------
+        A pandas DataFrame with the queries
+        """
+        import pandas as pd
+        if iteration is None:
+            iteration = self.iterations[0]
+        particles = self.get_particles( iteration )
+        rng = np.random.default_rng( self.seed + 3 )
+        rows = []
+        for target_percentage in target_percentages:
+            for select_set in select_sets:
+                # Fraction of the particles along each variable
+                fraction = target_percentage ** (1. / len(select_set))
+                for i_query in range(n_queries):
+                    center = rng.integers( self.n_particles )
+                    inside = np.ones( self.n_particles, dtype=bool )
+                    envelope = {}
+                    for var in select_set:
+                        values = np.sort( particles[var] )
+                        rank = np.searchsorted( values, particles[var][center] )
+                        half = 0.5 * fraction * self.n_particles
+                        lower = values[ max( int(rank - half), 0 ) ]
+                        upper = values[ min( int(rank + half),
+                                             self.n_particles - 1 ) ]
+                        envelope[var] = [ float(lower), float(upper) ]
+                        # (Same strict bounds as in `get_particle`)
+                        inside &= (particles[var] > lower) & \
+                                  (particles[var] < upper)
+                    rows.append( { 'target_percentage': target_percentage,
+                        'current_percentage': inside.mean(),
+                        'iteration': iteration, 'species': self.species,
+                        'select_set': str( tuple(sorted(select_set)) ),
+                        'expand_set': str( tuple(sorted(select_set)) ),
+                        'envelope': str( envelope ) } )
+        df = pd.DataFrame( rows )
+        df.to_csv( filename, index=False )
+        return df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Synthetic openPMD Data Generator')
+    parser.add_argument('--output', type=str, help='output directory')
+    parser.add_argument('--writer', type=str, help='openpmd-api or h5py', default='openpmd-api', choices=['openpmd-api', 'h5py'])
+    parser.add_argument('--format', type=str, help='file extension (openpmd-api)', default='bp')
+    parser.add_argument('--n_particles', type=int, help='number of particles', default=100000)
+    parser.add_argument('--n_blocks', type=int, help='number of particle blocks', default=16)
+    parser.add_argument('--block_jitter', type=float, help='irregularity of the block sizes (0 to 1)', default=0.)
+    parser.add_argument('--n_clusters', type=int, help='number of clusters (0: uniform)', default=4)
+    parser.add_argument('--cluster_width', type=float, help='relative width of the clusters', default=0.05)
+    parser.add_argument('--sort_axis', type=str, help='x, y, z or none', default='z')
+    parser.add_argument('--field_geometry', type=str, help='3dcartesian or thetaMode', default='3dcartesian')
+    parser.add_argument('--field_shape', type=str, help='comma-separated shape of the fields', default='32,32,64')
+    parser.add_argument('--n_modes', type=int, help='number of azimuthal modes (thetaMode)', default=2)
+    parser.add_argument('--n_field_blocks', type=int, help='number of field blocks', default=4)
+    parser.add_argument('--iterations', type=str, help='comma-separated iterations', default='0')
+    parser.add_argument('--species', type=str, help='species', default='electrons')
+    parser.add_argument('--seed', type=int, help='random seed', default=0)
+    parser.add_argument('--queries', type=str, help='output file for the queries (csv)', default=None)
+    parser.add_argument('--n_queries', type=int, help='number of queries per group', default=10)
+
+    args = parser.parse_args()
+    if not args.output:
+        raise ValueError("output is required")
+
+    dataset = SyntheticDataset( n_particles=args.n_particles,
+        n_blocks=args.n_blocks, block_jitter=args.block_jitter,
+        n_clusters=args.n_clusters, cluster_width=args.cluster_width,
+        sort_axis=None if args.sort_axis == 'none' else args.sort_axis,
+        field_geometry=args.field_geometry,
+        field_shape=[ int(n) for n in args.field_shape.split(',') ],
+        n_modes=args.n_modes, n_field_blocks=args.n_field_blocks,
+        iterations=[ int(i) for i in args.iterations.split(',') ],
+        species=args.species, seed=args.seed )
+    dataset.write( args.output, writer=args.writer, file_format=args.format )
+    if args.queries is not None:
+        dataset.write_queries( args.queries, n_queries=args.n_queries )
@@ -16,6 +16,9 @@ import scipy.constants as const
 from scipy.optimize import curve_fit
 from openpmd_viewer.openpmd_timeseries.utilities import sanitize_slicing
 from openpmd_viewer.openpmd_timeseries.plotter import check_matplotlib
+from openpmd_viewer.openpmd_timeseries.profiler import profiled_query
+from openpmd_viewer.openpmd_timeseries.numba_wrapper import jit, \
+    parallel_jit, prange, numba_installed
 from scipy.signal import hilbert
 try:
     import matplotlib.pyplot as plt
@@ -24,9 +27,20 @@ except ImportError:
     pass
 
 
+# Particle quantities needed by each diagnostic of `get_beam_summary`
+BEAM_DIAGNOSTICS = {
+    'energy_spread': ['ux', 'uy', 'uz', 'w', 'mass'],
+    'mean_gamma': ['ux', 'uy', 'uz', 'w'],
+    'divergence': ['ux', 'uy', 'uz', 'w'],
+    'emittance': ['x', 'y', 'ux', 'uy', 'w'],
+    'charge': ['w', 'charge'],
+    'current': ['z', 'ux', 'uy', 'uz', 'w', 'charge'] }
+
+
 class LpaDiagnostics( OpenPMDTimeSeries ):
 
-    def __init__( self, path_to_dir, check_all_files=True, backend=None ):
+    def __init__( self, path_to_dir, check_all_files=True, backend=None,
+                  streaming=False, stream_options=None, **kwargs ):
         """
         Initialize an OpenPMD time series with various methods to diagnose the
         data
@@ -49,9 +63,23 @@ class LpaDiagnostics( OpenPMDTimeSeries ):
             Backend to be used for data reading. Can be `openpmd-api`
             or `h5py`. If not provided will use `openpmd-api` if available
             and `h5py` otherwise.
+
+        streaming: bool, optional
+            Whether to read the iterations while they are produced
+            (see OpenPMDTimeSeries), e.g. with
+            `ts.iterate( ts.get_charge, species='electrons' )`
+
+        stream_options: dict or string, optional
+            The JSON options of the openpmd-api Series, for `streaming`
+
+        kwargs: dict, optional
+            The other arguments of OpenPMDTimeSeries
+            (e.g. `memory_budget`, `dtype` or `geos_index`)
         """
         OpenPMDTimeSeries.__init__( self, path_to_dir,
-                                    check_all_files=check_all_files, backend=backend )
+                                    check_all_files=check_all_files, backend=backend,
+                                    streaming=streaming,
+                                    stream_options=stream_options, **kwargs )
 
     def get_energy_spread( self, t=None, iteration=None, species=None,
                         select=None, center='mean', width='std', property='energy' ):
@@ -299,8 +327,8 @@ class LpaDiagnostics( OpenPMDTimeSeries ):
         # Get particle data
         w, q = self.get_particle( var_list=['w', 'charge'], species=species,
             select=select, t=t, iteration=iteration )
-        # Calculate charge
-        charge = np.sum(w * q)
+        # Calculate charge (with a double-precision sum, also for float32 data)
+        charge = np.sum(w * q, dtype=np.float64)
         # Return the result
         return( charge )
 
@@ -546,6 +574,133 @@ class LpaDiagnostics( OpenPMDTimeSeries ):
         # Return the current and bin centers
         return(current, info)
 
+    @profiled_query
+    def get_beam_summary( self, t=None, iteration=None, species=None,
+                          select=None, diagnostics=None, bins=100 ):
+        """
+        Calculate several beam diagnostics at once, by reading the
+        particle quantities that they need only once and by computing
+        the shared intermediate quantities (gamma, weighted moments)
+        only once.
+
+        Parameters
+        ----------
+        t : float (in seconds), optional
+            Time at which to obtain the data (if this does not correspond to
+            an existing iteration, the closest existing iteration will be used)
+            Either `t` or `iteration` should be given by the user.
+
+        iteration : int or list of int
+            The iteration(s) at which to obtain the data
+            Either `t` or `iteration` should be given by the user.
+
+        species : string
+            Particle species to use for calculations
+
+        select : dict, optional
+            Either None or a dictionary of rules
+            to select the particles, of the form
+            'x' : [-4., 10.]   (Particles having x between -4 and 10 meters)
+            'z' : [0, 100] (Particles having z between 0 and 100 meters)
+
+        diagnostics : list of strings, optional
+            The diagnostics to compute, among 'energy_spread', 'mean_gamma',
+            'divergence', 'emittance', 'charge' and 'current' (all of them
+            by default). They correspond to the default arguments of the
+            methods `get_<diagnostic>` (e.g. `get_energy_spread`: mean
+            and standard deviation of the energy in MeV).
+
+        bins : int, optional
+            Number of bins along the z-axis for the current
+
+        Returns
+        -------
+        A dictionary whose keys are the elements of `diagnostics`, and
+        whose values are the results of the corresponding methods
+        (except for 'current', for which only the array of the current
+        is returned).
+        If `iteration` is a list, the values are arrays (or, for 'current',
+        lists of arrays) with one element per iteration, and the
+        dictionary also contains the keys 'iteration' and 't'.
+        """
+        if diagnostics is None:
+            diagnostics = list( BEAM_DIAGNOSTICS.keys() )
+        for name in diagnostics:
+            if name not in BEAM_DIAGNOSTICS:
+                raise ValueError( 'Unknown diagnostic: %s (available: %s)'
+                    % (name, ', '.join(BEAM_DIAGNOSTICS.keys())) )
+
+        # Time series: one summary per iteration
+        if iteration is not None and np.ndim(iteration) == 1:
+            summaries = [ self.get_beam_summary( iteration=i,
+                species=species, select=select, diagnostics=diagnostics,
+                bins=bins ) for i in iteration ]
+            # (The iterations exist, since `get_particle` checks them)
+            result = { 'iteration': np.array( iteration ),
+                       't': self.t[ np.searchsorted( self.iterations,
+                                                     iteration ) ] }
+            for name in diagnostics:
+                values = [ summary[name] for summary in summaries ]
+                result[name] = values if name == 'current' \
+                    else np.array( values )
+            return result
+
+        # Read the union of the quantities that are needed (once)
+        var_list = []
+        for name in diagnostics:
+            for quantity in BEAM_DIAGNOSTICS[name]:
+                if quantity not in var_list:
+                    var_list.append( quantity )
+        data = dict( zip( var_list, self.get_particle( var_list=var_list,
+            t=t, iteration=iteration, species=species, select=select ) ) )
+        w = data['w']
+        empty = len(w) == 0
+
+        # Shared intermediate quantities
+        if 'uz' in data and not empty:
+            gamma = np.sqrt( 1 + data['ux'] ** 2 + data['uy'] ** 2
+                                + data['uz'] ** 2 )
+        if {'energy_spread', 'mean_gamma'} & set(diagnostics) and not empty:
+            gamma_mean, gamma_std = w_ave_std( gamma, w )
+
+        summary = {}
+        for name in diagnostics:
+            if name == 'energy_spread':
+                if empty:
+                    summary[name] = (np.nan, np.nan)
+                    continue
+                m = data['mass']
+                factor = const.c ** 2 / const.e * 1e-6
+                if np.all( m == m[0] ):
+                    # Uniform mass: the energy is linear in gamma
+                    summary[name] = ( (gamma_mean - 1) * m[0] * factor,
+                                      gamma_std * m[0] * factor )
+                else:
+                    summary[name] = w_ave_std( (gamma - 1) * m * factor, w )
+            elif name == 'mean_gamma':
+                summary[name] = (np.nan, np.nan) if empty \
+                    else (gamma_mean, gamma_std)
+            elif name == 'divergence':
+                summary[name] = (np.nan, np.nan) if empty else (
+                    w_std( np.arctan2(data['ux'], data['uz']), w ),
+                    w_std( np.arctan2(data['uy'], data['uz']), w ) )
+            elif name == 'emittance':
+                summary[name] = emittance_from_coord( data['x'], data['y'],
+                    data['ux'], data['uy'], w )
+            elif name == 'charge':
+                summary[name] = np.sum( w * data['charge'], dtype=np.float64 )
+            elif name == 'current':
+                if empty:
+                    summary[name] = np.zeros( bins )
+                    continue
+                z = data['z']
+                len_z = np.max(z) - np.min(z)
+                vz = data['uz'] / gamma * const.c
+                vzq_sum, _ = np.histogram( z, bins=bins,
+                                           weights=(vz * w * data['charge']) )
+                summary[name] = np.abs( vzq_sum * bins / len_z )
+        return summary
+
     def get_laser_envelope( self, t=None, iteration=None, pol=None,
                             laser_propagation='z',
                             m='all', theta=0, slice_across=None,
@@ -1125,46 +1280,287 @@ def w_std( a, weights ):
     Float with the weighted standard deviation.
     Returns nan if input array is empty
     """
+    return w_ave_std( a, weights )[1]
+
+
+def w_ave_std( a, weights ):
+    """
+    Calculate the weighted average and standard deviation of array `a`
+    at once (see `w_ave` and `w_std`)
+
+    Returns
+    -------
+    A tuple of floats (average, standard deviation)
+    Returns nan if input array is empty
+    """
     # Check if input contains data
     if not np.any(weights) and not np.any(a):
         # If input is empty return NaN
-        return np.nan
-    else:
-        # Calculate the weighted standard deviation
-        average = np.average(a, weights=weights)
-        variance = np.average((a - average) ** 2, weights=weights)
-        return( np.sqrt(variance) )
+        return np.nan, np.nan
+    _, average, _, variance, _, _ = w_moments( a, a, weights )
+    return average, np.sqrt(variance)
 
-def w_median(a, weights):
+
+def w_moments( a, b, weights ):
     """
-    Compute the weighted median of a 1D numpy array.
+    Calculate the weighted first and second moments of two arrays
+    in a single pass over the data
+
+    Parameters
+    ----------
+    a, b : 1d arrays
+        The two quantities (e.g. x and ux)
+
+    weights : 1d array
+        An array of weights for the values in a and b.
+
+    Returns
+    -------
+    A tuple of floats with: the sum of the weights, the weighted average
+    of `a` and `b`, the weighted variance of `a` and `b`, and the
+    weighted covariance of `a` and `b`.
+    Returns nan for the moments if the sum of the weights is zero
+    """
+    a = np.ravel(a)
+    b = np.ravel(b)
+    weights = np.ravel(weights)
+    if a.size == 0:
+        return 0., np.nan, np.nan, np.nan, np.nan, np.nan
+    # (The moments are accumulated in double precision, also for float32 data)
+    a = np.ascontiguousarray( a, dtype=np.float64 )
+    b = np.ascontiguousarray( b, dtype=np.float64 )
+    weights = np.ascontiguousarray( weights, dtype=np.float64 )
+    if numba_installed:
+        return _w_moments_kernel( a, b, weights )
+    # Without numba: several passes, with numpy
+    sum_w = np.sum( weights )
+    if sum_w == 0:
+        return 0., np.nan, np.nan, np.nan, np.nan, np.nan
+    a_ave = np.average( a, weights=weights )
+    b_ave = np.average( b, weights=weights )
+    da = a - a_ave
+    db = b - b_ave
+    return sum_w, a_ave, b_ave, np.average( da ** 2, weights=weights ), \
+        np.average( db ** 2, weights=weights ), \
+        np.average( da * db, weights=weights )
+
+
+@parallel_jit
+def _w_moments_kernel( a, b, w ):
+    """
+    Single-pass weighted moments (see `w_moments`). The sums are computed
+    with respect to the first values of `a` and `b` (shifted data), which
+    avoids the cancellation of the naive formulas when the spread is
+    small compared to the average.
+    """
+    a0 = a[0]
+    b0 = b[0]
+    sum_w = 0.
+    sum_a = 0.
+    sum_b = 0.
+    sum_aa = 0.
+    sum_bb = 0.
+    sum_ab = 0.
+    for i in prange( len(w) ):
+        da = a[i] - a0
+        db = b[i] - b0
+        wi = w[i]
+        sum_w += wi
+        sum_a += wi * da
+        sum_b += wi * db
+        sum_aa += wi * da * da
+        sum_bb += wi * db * db
+        sum_ab += wi * da * db
+    if sum_w == 0:
+        return 0., np.nan, np.nan, np.nan, np.nan, np.nan
+    mean_a = sum_a / sum_w
+    mean_b = sum_b / sum_w
+    var_a = max( sum_aa / sum_w - mean_a * mean_a, 0. )
+    var_b = max( sum_bb / sum_w - mean_b * mean_b, 0. )
+    cov_ab = sum_ab / sum_w - mean_a * mean_b
+    return sum_w, a0 + mean_a, b0 + mean_b, var_a, var_b, cov_ab
+
+
+def w_quantile( a, weights, quantile ):
+    """
+    Compute a weighted quantile of a 1D numpy array.
+
+    The quantile is defined as in `w_median` (linear interpolation
+    between the centers of the cumulated weights of the sorted values),
+    but it is found by successive partitions of the data around pivot
+    values (as in quickselect), instead of a full sort.
+
     Parameters
     ----------
     a : ndarray
         Input array (one dimension).
     weights : ndarray
         Array with the weights of the same size of `data`.
+    quantile : float
+        Number between 0 and 1 (e.g. 0.5 for the median)
     Returns
     -------
-    median : float
-        The output value.
+    The output value (float).
     """
-    quantile = .5
-    if not isinstance(a, np.matrix):
-        a = np.asarray(a)
-    if not isinstance(weights, np.matrix):
-        weights = np.asarray(weights)
+    a = np.asarray(a)
+    weights = np.asarray(weights)
     if a.shape != weights.shape:
         raise TypeError("the length of data and weights must be the same")
+    a = np.ravel(a)
+    weights = np.ravel(weights)
+    target = quantile * np.sum(weights)
+    if a.size == 0:
+        return np.nan
+    if numba_installed:
+        # Partition copies of the data in place
+        return _w_quantile_kernel( np.array( a, dtype=np.float64 ),
+            np.array( weights, dtype=np.float64 ), target )
+    # Without numba: partitions with numpy masks
+    # The values that remain candidates, the total weight of the values
+    # below them, and the value (and weight) that follows them
+    below = 0.
+    next_value = None
+    while a.size > 1024:
+        # Pivot: median of three values, and partition around it
+        pivot = np.median( a[[0, a.size // 2, -1]] )
+        lower = (a <= pivot)
+        if np.all( lower ):
+            lower = (a < pivot)
+            if not np.any( lower ):
+                # All the candidates are equal
+                return pivot
+        upper = np.logical_not( lower )
+        lower_weight = np.sum( weights[lower] )
+        # First value of the upper part
+        i_first = np.argmin( np.where( upper, a, np.inf ) )
+        first_value = a[i_first]
+        first_weight = weights[i_first]
+        if target < below + lower_weight:
+            # The quantile is within the lower part
+            next_value = (first_value, first_weight)
+            a, weights = a[lower], weights[lower]
+        elif target >= below + lower_weight + 0.5 * first_weight:
+            # The quantile is within the upper part
+            below += lower_weight
+            a, weights = a[upper], weights[upper]
+        else:
+            # The quantile is between the last value of the lower part
+            # and the first value of the upper part
+            i_last = np.argmax( np.where( lower, a, -np.inf ) )
+            last_center = below + lower_weight - 0.5 * weights[i_last]
+            first_center = below + lower_weight + 0.5 * first_weight
+            return np.interp( target, [last_center, first_center],
+                              [a[i_last], first_value] )
+    # Sort the remaining candidates
     ind_sorted = np.argsort(a)
     sorted_data = a[ind_sorted]
     sorted_weights = weights[ind_sorted]
+    centers = below + np.cumsum(sorted_weights) - 0.5 * sorted_weights
+    if next_value is not None:
+        sorted_data = np.append( sorted_data, next_value[0] )
+        centers = np.append( centers,
+            below + np.sum(sorted_weights) + 0.5 * next_value[1] )
+    return np.interp(target, centers, sorted_data)
+
+
+@jit
+def _w_quantile_kernel( a, w, target ):
+    """
+    Weighted quickselect (see `w_quantile`): `a` and `w` are partitioned
+    in place, until the value whose cumulated weight reaches `target`
+    is found
+    """
+    lo = 0
+    hi = len(a)
+    below = 0.
+    has_next = False
+    next_value = 0.
+    next_weight = 0.
+    while hi - lo > 32:
+        # Pivot: median of three values
+        p1 = a[lo]
+        p2 = a[(lo + hi) // 2]
+        p3 = a[hi - 1]
+        pivot = max( min(p1, p2), min( max(p1, p2), p3 ) )
+        # Partition: values <= pivot first (or < pivot, if all are <= pivot)
+        strict = False
+        for attempt in range(2):
+            split = lo
+            lower_weight = 0.
+            for j in range( lo, hi ):
+                if a[j] < pivot or (not strict and a[j] == pivot):
+                    a[split], a[j] = a[j], a[split]
+                    w[split], w[j] = w[j], w[split]
+                    lower_weight += w[split]
+                    split += 1
+            if split < hi:
+                break
+            strict = True
+        if split == lo:
+            # All the candidates are equal
+            return pivot
+        # First value of the upper part, last value of the lower part
+        i_first = split
+        for j in range( split + 1, hi ):
+            if a[j] < a[i_first]:
+                i_first = j
+        first_value = a[i_first]
+        first_weight = w[i_first]
+        if target < below + lower_weight:
+            # The quantile is within the lower part
+            has_next = True
+            next_value = first_value
+            next_weight = first_weight
+            hi = split
+        elif target >= below + lower_weight + 0.5 * first_weight:
+            # The quantile is within the upper part
+            below += lower_weight
+            lo = split
+        else:
+            # The quantile is between the last value of the lower part
+            # and the first value of the upper part
+            i_last = lo
+            for j in range( lo + 1, split ):
+                if a[j] > a[i_last]:
+                    i_last = j
+            last_center = below + lower_weight - 0.5 * w[i_last]
+            first_center = below + lower_weight + 0.5 * first_weight
+            if first_center == last_center:
+                return a[i_last]
+            return a[i_last] + (first_value - a[i_last]) * \
+                (target - last_center) / (first_center - last_center)
+    # Sort the remaining candidates
+    n = hi - lo + has_next
+    ind_sorted = np.argsort( a[lo:hi] )
+    sorted_data = np.empty( n )
+    centers = np.empty( n )
+    cumulated = below
+    for i in range( hi - lo ):
+        weight = w[lo + ind_sorted[i]]
+        sorted_data[i] = a[lo + ind_sorted[i]]
+        centers[i] = cumulated + 0.5 * weight
+        cumulated += weight
+    if has_next:
+        sorted_data[n - 1] = next_value
+        centers[n - 1] = cumulated + 0.5 * next_weight
+    return np.interp( target, centers, sorted_data )
+
 
-    Sn = np.cumsum(sorted_weights)
-    # Center and normalize the cumsum (i.e. divide by the total sum)
-    Pn = (Sn - 0.5 * sorted_weights) / Sn[-1]
-    # Get the value of the weighted median
-    return np.interp(quantile, Pn, sorted_data)
+def w_median(a, weights):
+    """
+    Compute the weighted median of a 1D numpy array.
+    Parameters
+    ----------
+    a : ndarray
+        Input array (one dimension).
+    weights : ndarray
+        Array with the weights of the same size of `data`.
+    Returns
+    -------
+    median : float
+        The output value.
+    """
+    return w_quantile(a, weights, .5)
 
 def w_mad(a, w):
     """
@@ -1184,6 +1580,76 @@ def w_mad(a, w):
     mad = w_median(np.abs(a - med), w)
     return mad
 
+
+class QuantileSketch( object ):
+    """
+    Approximate weighted quantiles of a stream of values (e.g. the
+    particles of a huge beam, read in batches), in bounded memory.
+
+    The values are summarized by at most `compression` centroids (average
+    value and total weight of neighboring values). As long as no more
+    than `compression` values have been added, the quantiles are exact
+    (same definition as `w_quantile`).
+
+    Usage
+    -----
+    sketch = QuantileSketch()
+    for batch in batches:
+        sketch.update( gamma_of_batch, w_of_batch )
+    median = sketch.quantile( 0.5 )
+    """
+
+    def __init__( self, compression=1000 ):
+        self.compression = compression
+        self.values = np.zeros( 0 )
+        self.weights = np.zeros( 0 )
+
+    def update( self, a, weights ):
+        """
+        Add the values `a`, with the weights `weights`
+        """
+        values = np.concatenate( [self.values, np.ravel(a)] )
+        weights = np.concatenate( [self.weights, np.ravel(weights)] )
+        order = np.argsort( values, kind='stable' )
+        self.values = values[order]
+        self.weights = weights[order]
+        if len(self.values) > self.compression:
+            self._compress()
+
+    def merge( self, other ):
+        """
+        Add the values summarized by the QuantileSketch `other`
+        """
+        self.update( other.values, other.weights )
+
+    def _compress( self ):
+        # Group the sorted values in `compression` groups of equal weight
+        cumulated = np.cumsum( self.weights )
+        total = cumulated[-1]
+        if total <= 0:
+            return
+        group = np.minimum( ( (cumulated - 0.5 * self.weights) / total
+                              * self.compression ).astype(np.int64),
+                            self.compression - 1 )
+        weights = np.bincount( group, weights=self.weights,
+                               minlength=self.compression )
+        sums = np.bincount( group, weights=self.weights * self.values,
+                            minlength=self.compression )
+        nonzero = weights > 0
+        self.weights = weights[nonzero]
+        self.values = sums[nonzero] / self.weights
+
+    def quantile( self, quantile ):
+        """
+        Return the (approximate) weighted quantile `quantile` (in [0, 1])
+        """
+        if len(self.values) == 0:
+            return np.nan
+        centers = np.cumsum(self.weights) - 0.5 * self.weights
+        return np.interp( quantile * np.sum(self.weights), centers,
+                          self.values )
+
+
 def gaussian_profile( x, x0, E0, w0 ):
     """
     Returns a Gaussian profile with amplitude E0 and waist w0.
@@ -1234,16 +1700,8 @@ def emittance_from_coord(x, y, ux, uy, w):
     emit_y : float
         emittance in the y direction (m*rad)
     """
-    xm = w_ave( x, w )
-    xsq = w_ave( (x - xm) ** 2, w )
-    ym = w_ave( y, w )
-    ysq = w_ave( (y - ym) ** 2, w )
-    uxm = w_ave( ux, w )
-    uxsq = w_ave( (ux - uxm) ** 2, w )
-    uym = w_ave( uy, w )
-    uysq = w_ave( (uy - uym) ** 2, w )
-    xux = w_ave( (x - xm) * (ux - uxm), w )
-    yuy = w_ave( (y - ym) * (uy - uym), w )
+    _, _, _, xsq, uxsq, xux = w_moments( x, ux, w )
+    _, _, _, ysq, uysq, yuy = w_moments( y, uy, w )
     emit_x = ( abs(xsq * uxsq - xux ** 2) )**.5
     emit_y = ( abs(ysq * uysq - yuy ** 2) )**.5
     return emit_x, emit_y
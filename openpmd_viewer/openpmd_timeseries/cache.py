@@ -0,0 +1,116 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines the LRUCache class, a thread-safe least-recently-used cache
+whose capacity is given in bytes, which is used to keep data in memory
+between successive calls (e.g. the modes of thetaMode fields).
+
+Copyright 2024, openPMD-viewer contributors
+License: 3-Clause-BSD-LBNL
+"""
+import sys
+import threading
+from collections import OrderedDict
+import numpy as np
+
+
+def get_nbytes( value ):
+    """
+    Return the approximate memory footprint of `value` (in bytes),
+    counting the arrays that it contains (in tuples, lists and dicts)
+    """
+    if isinstance( value, np.ndarray ):
+        return value.nbytes
+    elif isinstance( value, (tuple, list) ):
+        return sum( get_nbytes(item) for item in value )
+    elif isinstance( value, dict ):
+        return sum( get_nbytes(item) for item in value.values() )
+    else:
+        return sys.getsizeof( value )
+
+
+class LRUCache( object ):
+    """
+    Least-recently-used cache, bounded by the total size of its entries.
+
+    When a new entry does not fit, the least recently used entries are
+    evicted. Entries that are larger than the capacity are not stored.
+    """
+
+    def __init__( self, max_bytes ):
+        """
+        Initialize an LRUCache object
+
+        Parameters
+        ----------
+        max_bytes: int
+            The maximum total size of the entries (a value of 0
+            deactivates the cache)
+        """
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get( self, key, default=None ):
+        """
+        Return the entry for `key` (marking it as recently used),
+        or `default` if it is not in the cache
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            self._entries.move_to_end( key )
+            return self._entries[key][0]
+
+    def put( self, key, value ):
+        """
+        Store `value` under `key`, and evict the least recently
+        used entries if the capacity is exceeded
+        """
+        nbytes = get_nbytes( value )
+        with self._lock:
+            if key in self._entries:
+                self.nbytes -= self._entries.pop( key )[1]
+            if nbytes > self.max_bytes:
+                return
+            self._entries[key] = (value, nbytes)
+            self.nbytes += nbytes
+            while self.nbytes > self.max_bytes:
+                _, (_, evicted_nbytes) = self._entries.popitem( last=False )
+                self.nbytes -= evicted_nbytes
+
+    def pop( self, key, default=None ):
+        """
+        Remove the entry for `key` and return it
+        (or `default` if it is not in the cache)
+        """
+        with self._lock:
+            if key not in self._entries:
+                return default
+            value, nbytes = self._entries.pop( key )
+            self.nbytes -= nbytes
+            return value
+
+    def clear( self ):
+        """
+        Remove all the entries
+        """
+        with self._lock:
+            self._entries.clear()
+            self.nbytes = 0
+
+    def keys( self ):
+        """
+        Return the keys of the entries, from least to most recently used
+        """
+        with self._lock:
+            return list( self._entries.keys() )
+
+    def __contains__( self, key ):
+        with self._lock:
+            return key in self._entries
+
+    def __len__( self ):
+        with self._lock:
+            return len( self._entries )
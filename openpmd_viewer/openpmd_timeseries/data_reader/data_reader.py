@@ -8,32 +8,73 @@ Copyright 2020, openPMD-viewer contributors
 Authors: Remi Lehe
 License: 3-Clause-BSD-LBNL
 """
+import copy
+import importlib.util
+import json
 import numpy as np
 import os
 import re
+from ..cache import LRUCache
+from ..utilities import recombine_circ_modes
+from ..profiler import span
 
+# The backends are detected without being imported (importing openpmd-api
+# or h5py takes a significant fraction of the startup time): the modules
+# of a backend are only imported when a DataReader uses it.
 available_backends = []
-
-try:
-    import openpmd_api as io
-    from . import io_reader
+if importlib.util.find_spec('openpmd_api') is not None:
     available_backends.append('openpmd-api')
-except ImportError as e:
-    print(e)
-    pass
-
-try:
-    from . import h5py_reader
+if importlib.util.find_spec('h5py') is not None:
     available_backends.append('h5py')
-except ImportError as e:
-    print(e)
-    pass
+
+# Set by `load_backend`
+io = None
+io_reader = None
+h5py_reader = None
 
 if len(available_backends) == 0:
     raise ImportError('No openPMD backend found.\n'
         'Please install either `h5py` or `openpmd-api`:\n'
         'e.g. with `pip install h5py` or `pip install openpmd-api`')
 
+
+def load_backend( backend ):
+    """
+    Import the modules of `backend` ('h5py' or 'openpmd-api'),
+    if this was not done yet
+    """
+    global io, io_reader, h5py_reader
+    if backend == 'openpmd-api' and io_reader is None:
+        import openpmd_api as io
+        from . import io_reader
+    elif backend == 'h5py' and h5py_reader is None:
+        from . import h5py_reader
+
+def get_series_name( path_to_dir ):
+    """
+    Return the name of the openpmd-api series of the files of the
+    directory `path_to_dir`, in which the iteration number is replaced
+    with the wildcard %T (e.g. 'diags/data%T.h5')
+    """
+    # guess file ending from first file in directory
+    first_file_name = None
+    for file_name in os.listdir( path_to_dir ):
+        if file_name.split(os.extsep)[-1] in io.file_extensions:
+            first_file_name = file_name
+    if first_file_name is None:
+        raise RuntimeError(
+            "Found no valid files in directory {0}.\n"
+            "Please check that this is the path to the openPMD files."
+            "(valid files must have one of the following extensions: {1})"
+            .format(path_to_dir, io.file_extensions))
+
+    # match last occurance of integers and replace with %T wildcards
+    # examples: data00000100.h5 diag4_00000500.h5 io12.0.bp
+    #           te42st.1234.yolo.json scan7_run14_data123.h5
+    file_path = re.sub(r'(\d+)(\.(?!\d).+$)', r'%T\2', first_file_name)
+    return os.path.join( path_to_dir, file_path )
+
+
 class DataReader( object ):
     """
     Class that performs various type of access the openPMD file.
@@ -44,11 +85,30 @@ class DataReader( object ):
     available on the current environment.
     """
 
-    def __init__(self, backend):
+    def __init__(self, backend, circ_modes_cache_size=512*2**20,
+                 memory_map=False):
         """
         Initialize the DataReader class.
+
+        Parameters
+        ----------
+        backend: string
+            Either 'h5py' or 'openpmd-api'
+
+        circ_modes_cache_size: int, optional
+            Maximum total size (in bytes) of the thetaMode mode arrays that
+            are kept in memory, so that changing `theta` or `m` does not
+            re-read the data.
+
+        memory_map: bool, optional
+            (Only for the 'h5py' backend)
+            Whether `read_field_cartesian` returns read-only views of the
+            memory-mapped files, for the datasets that are stored
+            contiguously, instead of reading the data.
         """
         self.backend = backend
+        self.circ_modes_cache = LRUCache( circ_modes_cache_size )
+        self.memory_map = memory_map
 
         # Point to the correct reader module
         if self.backend == 'h5py':
@@ -57,6 +117,7 @@ class DataReader( object ):
             pass
         else:
             raise RuntimeError('Unknown backend: %s' % self.backend)
+        load_backend( self.backend )
 
     def list_iterations(self, path_to_dir):
         """
@@ -74,6 +135,9 @@ class DataReader( object ):
         an array of integers which correspond to the iteration of each file
         (in sorted order)
         """
+        # The data that is kept in memory may correspond to other files
+        self.circ_modes_cache.clear()
+
         if self.backend == 'h5py':
             iterations, iteration_to_file = \
                 h5py_reader.list_files( path_to_dir )
@@ -88,33 +152,10 @@ class DataReader( object ):
                     "please install the `openpmd-api` package."
                     .format(path_to_dir))
         elif self.backend == 'openpmd-api':
-            # guess file ending from first file in directory
-            first_file_name = None
-
-            is_single_file = os.path.isfile(path_to_dir)
-            if is_single_file:
-                first_file_name = path_to_dir
+            if os.path.isfile(path_to_dir):
+                series_name = path_to_dir
             else:
-                for file_name in os.listdir( path_to_dir ):
-                    if file_name.split(os.extsep)[-1] in io.file_extensions:
-                        first_file_name = file_name
-            if first_file_name is None:
-                raise RuntimeError(
-                    "Found no valid files in directory {0}.\n"
-                    "Please check that this is the path to the openPMD files."
-                    "(valid files must have one of the following extensions: {1})"
-                    .format(path_to_dir, io.file_extensions))
-
-            if is_single_file:
-                file_path = path_to_dir
-                series_name = file_path
-            else:
-                # match last occurance of integers and replace with %T wildcards
-                # examples: data00000100.h5 diag4_00000500.h5 io12.0.bp
-                #           te42st.1234.yolo.json scan7_run14_data123.h5
-                file_path = re.sub(r'(\d+)(\.(?!\d).+$)', r'%T\2', first_file_name)
-                series_name = os.path.join( path_to_dir, file_path)
-
+                series_name = get_series_name( path_to_dir )
             self.series = io.Series(
                 series_name,
                 io.Access.read_only )
@@ -122,6 +163,57 @@ class DataReader( object ):
 
         return iterations
 
+    def open_stream(self, path, options=None):
+        """
+        Open a series for linear (streaming) reading with openpmd-api,
+        so that its iterations can be read while they are produced
+        (see `read_stream_iterations`)
+
+        Parameter
+        ---------
+        path : string
+            Either the name of the series (e.g. an ADIOS2 SST stream such
+            as 'diags/simData.sst', or a BP file 'diags/simData.bp'),
+            or a directory that contains one file per iteration
+
+        options : dict or string, optional
+            The JSON options of the openpmd-api Series (e.g. the ADIOS2
+            engine parameters, such as `OpenTimeoutSecs`)
+        """
+        if self.backend != 'openpmd-api':
+            raise RuntimeError('Reading a stream requires the '
+                               '`openpmd-api` backend.')
+        # The data that is kept in memory may correspond to other files
+        self.circ_modes_cache.clear()
+
+        if os.path.isdir(path) and \
+                path.split(os.extsep)[-1] not in io.file_extensions:
+            series_name = get_series_name( path )
+        else:
+            series_name = path
+        if options is None:
+            options = {}
+        if not isinstance(options, str):
+            options = json.dumps(options)
+        self.series = io.Series( series_name, io.Access.read_linear, options )
+
+    def read_stream_iterations(self):
+        """
+        Iterate over the iterations of the stream opened by `open_stream`,
+        in the order in which they are produced. (This waits for the
+        next iteration, until the end of the stream.)
+
+        Each iteration is closed, and its data released, when the
+        next one is requested.
+
+        Returns
+        -------
+        An iterator over the iteration numbers (int)
+        """
+        for it in self.series.read_iterations():
+            yield int( it.iteration_index )
+            it.close()
+
     def read_openPMD_params(self, iteration, extract_parameters=True):
         """
         Extract the time and some openPMD parameters from a file
@@ -152,7 +244,8 @@ class DataReader( object ):
                     self.series, iteration, extract_parameters)
 
     def read_field_cartesian( self, iteration, field, coord, axis_labels,
-                          slice_relative_position, slice_across ):
+                          slice_relative_position, slice_across, region=None,
+                          output_type=None ):
         """
         Extract a given field from an openPMD file in the openPMD format,
         when the geometry is cartesian (1d, 2d or 3d).
@@ -186,6 +279,15 @@ class DataReader( object ):
            0 : middle of the simulation box
            1 : upper edge of the simulation box
 
+        region : dict or None
+           Region of interest, in physical units
+           (e.g. {'x': [xmin, xmax], 'z': [zmin, zmax]}).
+           Only the corresponding hyperslab is read.
+
+        output_type : a numpy floating type, or None
+           The type of the returned array
+           (when None, the type in which the data is stored is kept)
+
         Returns
         -------
         A tuple with
@@ -193,18 +295,22 @@ class DataReader( object ):
            info : a FieldMetaInformation object
            (contains information about the grid; see the corresponding docstring)
         """
-        if self.backend == 'h5py':
-            filename = self.iteration_to_file[iteration]
-            return h5py_reader.read_field_cartesian(
-                filename, iteration, field, coord, axis_labels,
-                slice_relative_position, slice_across )
-        elif self.backend == 'openpmd-api':
-            return io_reader.read_field_cartesian(
-                self.series, iteration, field, coord, axis_labels,
-                slice_relative_position, slice_across )
+        with span('read'):
+            if self.backend == 'h5py':
+                filename = self.iteration_to_file[iteration]
+                return h5py_reader.read_field_cartesian(
+                    filename, iteration, field, coord, axis_labels,
+                    slice_relative_position, slice_across, region,
+                    self.memory_map, output_type )
+            elif self.backend == 'openpmd-api':
+                return io_reader.read_field_cartesian(
+                    self.series, iteration, field, coord, axis_labels,
+                    slice_relative_position, slice_across, region,
+                    output_type )
 
     def read_field_circ( self, iteration, field, coord, slice_relative_position,
-                        slice_across, m=0, theta=0., max_resolution_3d=None ):
+                        slice_across, m=0, theta=0., max_resolution_3d=None,
+                        output_type=np.float64 ):
         """
         Extract a given field from an openPMD file in the openPMD format,
         when the geometry is thetaMode
@@ -250,6 +356,10 @@ class DataReader( object ):
             transverse resolution, respectively. This is useful for
             performance reasons, particularly for 3D visualization.
 
+        output_type : a numpy floating type, or None
+            The type of the returned array (when None, the type in which
+            the modes are stored is kept)
+
         Returns
         -------
         A tuple with
@@ -258,17 +368,31 @@ class DataReader( object ):
            info : a FieldMetaInformation object
            (contains information about the grid; see the corresponding docstring)
         """
-        if self.backend == 'h5py':
-            filename = self.iteration_to_file[iteration]
-            return h5py_reader.read_field_circ(
-                filename, iteration, field, coord, slice_relative_position,
-                slice_across, m, theta, max_resolution_3d )
-        elif self.backend == 'openpmd-api':
-            return io_reader.read_field_circ(
-                self.series, iteration, field, coord, slice_relative_position,
-                slice_across, m, theta, max_resolution_3d )
-
-    def read_species_data( self, iteration, species, record_comp, extensions, read_chunk_range=None, skip_offset=False):
+        # Read all the modes, unless they are already in memory
+        key = ( iteration, field, coord )
+        circ_modes = self.circ_modes_cache.get( key )
+        if circ_modes is None:
+            with span('read'):
+                if self.backend == 'h5py':
+                    filename = self.iteration_to_file[iteration]
+                    circ_modes = h5py_reader.read_circ_modes(
+                        filename, iteration, field, coord )
+                elif self.backend == 'openpmd-api':
+                    circ_modes = io_reader.read_circ_modes(
+                        self.series, iteration, field, coord )
+            # Protect the cached array against in-place modifications
+            circ_modes[0].flags.writeable = False
+            self.circ_modes_cache.put( key, circ_modes )
+
+        # Recombine the modes (on a copy of the cached meta-information)
+        Fcirc, info, coord_order = circ_modes
+        with span('recombine'):
+            return recombine_circ_modes( Fcirc, copy.deepcopy(info),
+                coord_order, m, theta, slice_across, slice_relative_position,
+                max_resolution_3d, output_type )
+
+    def read_species_data( self, iteration, species, record_comp, extensions, read_chunk_range=None, skip_offset=False,
+                           output_type=np.float64 ):
         """
         Extract a given species' record_comp
 
@@ -286,15 +410,57 @@ class DataReader( object ):
 
         extensions: list of strings
             The extensions that the current OpenPMDTimeSeries complies with
+
+        output_type: a numpy floating type, or None
+            The type of the returned array (the identifiers are always
+            returned as uint64). When None, the type in which the data
+            is stored is kept.
         """
-        print(f"read data from disk: {record_comp}")
         if self.backend == 'h5py':
             filename = self.iteration_to_file[iteration]
             return h5py_reader.read_species_data(
-                    filename, iteration, species, record_comp, extensions )
+                    filename, iteration, species, record_comp, extensions,
+                    read_chunk_range, output_type )
         elif self.backend == 'openpmd-api':
             return io_reader.read_species_data(
-                    self.series, iteration, species, record_comp, extensions, read_chunk_range, skip_offset)
+                    self.series, iteration, species, record_comp, extensions, read_chunk_range, skip_offset,
+                    output_type )
+
+    def read_species_data_iterations( self, iterations, species,
+            record_comps, extensions, skip_offset=False,
+            iterations_per_flush=None, output_type=np.float64 ):
+        """
+        Extract the given species' record_comps at each of the `iterations`
+
+        With openpmd-api, the loads of all the iterations (or of groups
+        of `iterations_per_flush` iterations) share a single flush.
+
+        Returns
+        -------
+        A dictionary whose keys are the iterations and whose values are
+        lists of 1darrays (one per element of `record_comps`)
+        """
+        if self.backend == 'h5py':
+            return { iteration: [ self.read_species_data( iteration,
+                         species, record_comp, extensions,
+                         output_type=output_type )
+                         for record_comp in record_comps ]
+                     for iteration in iterations }
+        elif self.backend == 'openpmd-api':
+            return io_reader.read_species_data_iterations( self.series,
+                iterations, species, record_comps, extensions,
+                skip_offset, iterations_per_flush, output_type )
+
+    def read_species_size( self, iteration, species ):
+        """
+        Return the number of macroparticles of `species` at `iteration`
+        (read from the metadata only)
+        """
+        if self.backend == 'h5py':
+            filename = self.iteration_to_file[iteration]
+            return h5py_reader.read_species_size( filename, iteration, species )
+        elif self.backend == 'openpmd-api':
+            return io_reader.read_species_size( self.series, iteration, species )
 
     def read_species_support_data( self, iteration, species, record_comp, extensions, read_chunk_range=None, skip_offset=False):
         return io_reader.read_species_support_data(
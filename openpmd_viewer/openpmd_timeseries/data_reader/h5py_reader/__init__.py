@@ -1,8 +1,10 @@
-from .particle_reader import read_species_data
+from .particle_reader import read_species_data, read_species_size
 from .params_reader import read_openPMD_params
 from .field_reader import read_field_cartesian, \
-    read_field_circ, get_grid_parameters
+    read_field_circ, read_circ_modes, get_grid_parameters
 from .utilities import list_files
 
-__all__ = ['read_species_data', 'read_openPMD_params', 'list_files',
-    'read_field_cartesian', 'read_field_circ', 'get_grid_parameters']
+__all__ = ['read_species_data', 'read_species_size',
+    'read_openPMD_params', 'list_files',
+    'read_field_cartesian', 'read_field_circ', 'read_circ_modes',
+    'get_grid_parameters']
@@ -11,11 +11,13 @@ License: 3-Clause-BSD-LBNL
 
 import h5py
 import numpy as np
-from scipy import constants
-from .utilities import get_data, join_infile_path
+from .utilities import get_data, get_shape, is_scalar_record, \
+    join_infile_path
+from ...profiler import released
 
 
-def read_species_data(filename, iteration, species, record_comp, extensions):
+def read_species_data(filename, iteration, species, record_comp, extensions,
+                      read_chunk_range=None, output_type=np.float64):
     """
     Extract a given species' record_comp
 
@@ -36,6 +38,15 @@ def read_species_data(filename, iteration, species, record_comp, extensions):
 
     extensions: list of strings
         The extensions that the current OpenPMDTimeSeries complies with
+
+    read_chunk_range: list of tuples (start, end, step), optional
+        The ranges of particle indices to read (the data of all the
+        ranges is concatenated). When None, all the particles are read.
+
+    output_type: a numpy floating type, or None
+        The type of the returned array (the identifiers are always
+        returned as uint64). When None, the type in which the data is
+        stored is kept (if it is a floating type).
     """
     # Open the HDF5 file
     dfile = h5py.File( filename, 'r' )
@@ -59,11 +70,13 @@ def read_species_data(filename, iteration, species, record_comp, extensions):
     # Extract the right dataset
     species_grp = dfile[
         join_infile_path(base_path, particles_path, species) ]
+    dset = species_grp[ opmd_record_comp ]
     if opmd_record_comp == 'id':
         output_type = np.uint64
-    else:
+    elif output_type is None and isinstance( dset, h5py.Dataset ) \
+            and not np.issubdtype( dset.dtype, np.floating ):
         output_type = np.float64
-    data = get_data( species_grp[ opmd_record_comp ], output_type=output_type )
+    data = get_data_ranges( dset, read_chunk_range, output_type=output_type )
 
     # For ED-PIC: if the data is weighted for a full macroparticle,
     # divide by the weight with the proper power
@@ -74,22 +87,67 @@ def read_species_data(filename, iteration, species, record_comp, extensions):
         macro_weighted = record_dset.attrs['macroWeighted']
         weighting_power = record_dset.attrs['weightingPower']
         if (macro_weighted == 1) and (weighting_power != 0):
-            w = get_data( species_grp[ 'weighting' ] )
+            w = get_data_ranges( species_grp[ 'weighting' ], read_chunk_range )
             data *= w ** (-weighting_power)
+            released( w.nbytes )
 
     # - Return positions, with an offset
     if record_comp in ['x', 'y', 'z']:
-        offset = get_data(species_grp['positionOffset/%s' % record_comp])
+        offset = get_data_ranges(
+            species_grp['positionOffset/%s' % record_comp], read_chunk_range)
         data += offset
+        released( offset.nbytes )
     # - Return momentum in normalized units
     elif record_comp in ['ux', 'uy', 'uz' ]:
-        m = get_data(species_grp['mass'])
+        m = get_data_ranges(species_grp['mass'], read_chunk_range)
         # Normalize only if the particle mass is non-zero
         if np.all( m != 0 ):
-            norm_factor = 1. / (m * constants.c)
+            from scipy.constants import c
+            norm_factor = 1. / (m * c)
             data *= norm_factor
+        released( m.nbytes )
 
     # Close the file
     dfile.close()
     # Return the data
     return(data)
+
+
+def get_data_ranges(dset, read_chunk_range, output_type=None):
+    """
+    Extract the data of a 1D (possibly constant) dataset, restricted
+    to the ranges of indices `read_chunk_range` (list of tuples
+    (start, end, step)), which are concatenated.
+    When `read_chunk_range` is None, the full dataset is read.
+    """
+    if read_chunk_range is None:
+        return get_data( dset, output_type=output_type )
+    if len(read_chunk_range) == 0:
+        return np.zeros( 0, dtype=output_type or np.float64 )
+    data_list = [ get_data( dset, output_type=output_type,
+                            region=[(start, end)] )
+                  for start, end, _ in read_chunk_range ]
+    if len(data_list) == 1:
+        return data_list[0]
+    data = np.concatenate( data_list )
+    released( sum( d.nbytes for d in data_list ) - data.nbytes )
+    return data
+
+
+def read_species_size(filename, iteration, species):
+    """
+    Return the number of macroparticles of a species,
+    without reading the particle data
+    """
+    with h5py.File( filename, 'r' ) as dfile:
+        base_path = '/data/{0}'.format( iteration )
+        particles_path = dfile.attrs['particlesPath'].decode()
+        species_grp = dfile[
+            join_infile_path(base_path, particles_path, species) ]
+        for record_name, record in species_grp.items():
+            if record_name == 'particlePatches':
+                continue
+            if not is_scalar_record(record):
+                record = next(iter(record.values()))
+            return int( get_shape(record)[0] )
+    return 0
@@ -9,8 +9,11 @@ Authors: Remi Lehe, Axel Huebl
 License: 3-Clause-BSD-LBNL
 """
 import os
+import time
 import h5py
 import numpy as np
+from ... import profiler
+from ..io_tracer import active_tracer, traced_record
 
 
 def list_files(path_to_dir):
@@ -84,7 +87,30 @@ def is_scalar_record(record):
     return(scalar)
 
 
-def get_data(dset, i_slice=None, pos_slice=None, output_type=None):
+def map_dataset(dset):
+    """
+    Map the data of an h5py.Dataset to memory, without reading it
+
+    Returns:
+    --------
+    A read-only np.memmap of the dataset, or None when the data is not
+    stored contiguously in the file (chunked or compressed datasets,
+    datasets that are not allocated, external or virtual datasets, or
+    files that are not opened with the default driver)
+    """
+    if dset.chunks is not None or dset.size == 0 or dset.is_virtual \
+            or dset.external is not None or dset.file.driver != 'sec2' \
+            or dset.dtype.kind not in 'iufc':
+        return None
+    offset = dset.id.get_offset()
+    if offset is None:
+        return None
+    return np.memmap( dset.file.filename, dtype=dset.dtype, mode='r',
+                      offset=offset, shape=dset.shape )
+
+
+def get_data(dset, i_slice=None, pos_slice=None, output_type=None,
+             region=None, memory_map=False):
     """
     Extract the data from a (possibly constant) dataset
     Slice the data according to the parameters i_slice and pos_slice
@@ -104,6 +130,17 @@ def get_data(dset, i_slice=None, pos_slice=None, output_type=None):
     output_type: a numpy type
        The type to which the returned array should be converted
 
+    region: list of tuples of int, optional
+       The range of indices (start, stop) to be read along each dimension.
+       When None, the full extent of each dimension is read.
+
+    memory_map: bool, optional
+       Whether to return a read-only view of the memory-mapped file instead
+       of reading the data, when the dataset is stored contiguously (see
+       `map_dataset`). The pages of the file are then only read when the
+       data is accessed. The type conversion and the scaling by `unitSI`,
+       if any, are only applied to the selected slice or region.
+
     Returns:
     --------
     An np.ndarray (non-constant dataset) or a single double (constant dataset)
@@ -118,6 +155,9 @@ def get_data(dset, i_slice=None, pos_slice=None, output_type=None):
     # Case of a constant dataset
     if isinstance(dset, h5py.Group):
         shape = dset.attrs['shape']
+        # Restrict the shape to the region
+        if region is not None:
+            shape = [ stop - start for start, stop in region ]
         # Restrict the shape if slicing is enabled
         if pos_slice is not None:
             shape = [ x for index, x in enumerate(shape) if
@@ -127,8 +167,19 @@ def get_data(dset, i_slice=None, pos_slice=None, output_type=None):
 
     # Case of a non-constant dataset
     elif isinstance(dset, h5py.Dataset):
-        if pos_slice is None:
-            data = dset[...]
+        tracer = active_tracer()
+        if tracer is not None:
+            t_start = time.perf_counter()
+        if region is not None:
+            # Read only the hyperslab of the region (h5py reads
+            # the selected hyperslab directly from the file)
+            list_index = [ slice(start, stop) for start, stop in region ]
+            if pos_slice is not None:
+                for count, dir_index in enumerate(pos_slice):
+                    list_index[dir_index] = i_slice[count]
+            tuple_index = tuple(list_index)
+        elif pos_slice is None:
+            tuple_index = Ellipsis
         else:
             # Get largest element of pos_slice
             max_pos = max(pos_slice)
@@ -141,17 +192,53 @@ def get_data(dset, i_slice=None, pos_slice=None, output_type=None):
                 list_index[dir_index] = i_slice[count]
             # Convert list_index into a tuple
             tuple_index = tuple(list_index)
+        mapped_dset = None
+        if memory_map:
+            mapped_dset = map_dataset( dset )
+        if mapped_dset is not None:
+            # Slice the memory-mapped file (no data is read at this point)
+            data = mapped_dset[tuple_index]
+            profiler.count('n_mapped_chunks')
+        else:
             # Slice dset according to tuple_index
             data = dset[tuple_index]
-
+            profiler.count('n_chunks')
+            profiler.count('bytes_read', data.nbytes)
+            if tracer is not None:
+                # Hyperslab that was read, in the indices of the full dataset
+                offset = [ 0 ] * dset.ndim
+                extent = list( dset.shape )
+                if region is not None:
+                    offset = [ start for start, stop in region ]
+                    extent = [ stop - start for start, stop in region ]
+                if pos_slice is not None:
+                    for index, dir_index in enumerate(pos_slice):
+                        offset[dir_index] = i_slice[index]
+                        extent[dir_index] = 1
+                with traced_record( dset.name ):
+                    tracer.add_flush( [(offset, extent)], [data.nbytes],
+                                      t_start, time.perf_counter() )
+
+    # The memory-mapped data is read-only: it is copied by the conversions
+    mapped = isinstance(data, np.memmap)
+    if not mapped:
+        profiler.allocated(data.nbytes)
     # Convert to the right type
     if (output_type is not None) and (data.dtype != output_type):
+        if not mapped:
+            profiler.released(data.nbytes)
         data = data.astype( output_type )
+        profiler.allocated(data.nbytes)
+        mapped = False
     # Scale by the conversion factor
     if np.issubdtype(data.dtype, np.floating) or \
         np.issubdtype(data.dtype, np.complexfloating):
         if dset.attrs['unitSI'] != 1.0:
-            data *= dset.attrs['unitSI']
+            if mapped:
+                data = data * dset.attrs['unitSI']
+                profiler.allocated(data.nbytes)
+            else:
+                data *= dset.attrs['unitSI']
 
     return(data)
 
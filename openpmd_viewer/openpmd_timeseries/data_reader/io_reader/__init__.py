@@ -1,7 +1,10 @@
-from .particle_reader import read_species_data, read_species_support_data
+from .particle_reader import read_species_data, read_species_support_data, \
+    read_species_size, read_species_data_iterations
 from .params_reader import read_openPMD_params
 from .field_reader import read_field_cartesian, \
-    read_field_circ, get_grid_parameters
+    read_field_circ, read_circ_modes, get_grid_parameters
 
 __all__ = ['read_species_data', 'read_openPMD_params', 'read_field_cartesian',
-           'read_field_circ', 'get_grid_parameters', 'read_species_support_data']
+           'read_field_circ', 'read_circ_modes', 'get_grid_parameters',
+           'read_species_support_data', 'read_species_size',
+           'read_species_data_iterations']
@@ -10,14 +10,17 @@ License: 3-Clause-BSD-LBNL
 
 import numpy as np
 
-from .utilities import get_data
+from .utilities import get_data, join_infile_path
+from ..io_tracer import traced_record
 from ...data_order import RZorder, order_error_msg
 from openpmd_viewer.openpmd_timeseries.field_metainfo import FieldMetaInformation
-from openpmd_viewer.openpmd_timeseries.utilities import construct_3d_from_circ
+from openpmd_viewer.openpmd_timeseries.utilities import recombine_circ_modes, \
+    region_to_index_range
 
 
 def read_field_cartesian( series, iteration, field_name, component_name,
-                          axis_labels, slice_relative_position, slice_across ):
+                          axis_labels, slice_relative_position, slice_across,
+                          region=None, output_type=None ):
     """
     Extract a given field from a file in the openPMD format,
     when the geometry is cartesian (1d, 2d or 3d).
@@ -54,6 +57,14 @@ def read_field_cartesian( series, iteration, field_name, component_name,
        0 : middle of the simulation box
        1 : upper edge of the simulation box
 
+    region : dict or None
+       Region of interest, of the form {'x': [xmin, xmax], 'z': [zmin, zmax]}
+       (in meters). Only the corresponding hyperslab is read.
+
+    output_type : a numpy floating type, or None
+       The type of the returned array
+       (when None, the type in which the data is stored is kept)
+
     Returns
     -------
     A tuple with
@@ -69,15 +80,30 @@ def read_field_cartesian( series, iteration, field_name, component_name,
         component = next(field.items())[1]
     else:
         component = field[component_name]
+    if field.scalar:
+        field_path = field_name
+    else:
+        field_path = join_infile_path( field_name, component_name )
 
     # Dimensions of the grid
-    shape = component.shape
+    shape = list( component.shape )
     # FIXME here and in h5py reader, we need to invert the order on 'F'
-    grid_spacing = field.grid_spacing
-    global_offset = field.grid_global_offset
+    grid_spacing = list( field.grid_spacing )
+    global_offset = list( field.grid_global_offset )
     grid_unit_SI = field.grid_unit_SI
     grid_position = component.position
 
+    # Region of interest: restrict the range of indices along each axis
+    # (except along the slicing directions, which use the full box)
+    index_range = None
+    if region is not None:
+        region = { axis: bounds for axis, bounds in region.items()
+                   if slice_across is None or axis not in slice_across }
+        index_range = region_to_index_range( region, axis_labels, shape,
+            grid_spacing, global_offset, grid_unit_SI, grid_position )
+        global_offset = [ offset + start * spacing for offset, spacing,
+            (start, stop) in zip(global_offset, grid_spacing, index_range) ]
+
     # Slice selection
     #   TODO put in general utilities
     if slice_across is not None:
@@ -97,8 +123,6 @@ def read_field_cartesian( series, iteration, field_name, component_name,
 
         # Remove metainformation relative to the slicing index
         # Successive pops starting from last coordinate to slice
-        shape = [ x for index, x in enumerate(shape)
-                  if index not in list_slicing_index ]
         grid_spacing = [ x for index, x in enumerate(grid_spacing)
                          if index not in list_slicing_index ]
         global_offset = [ x for index, x in enumerate(global_offset)
@@ -108,11 +132,16 @@ def read_field_cartesian( series, iteration, field_name, component_name,
 
         axes = { i: axis_labels[i] for i in range(len(axis_labels)) }
         # Extract data
-        F = get_data( series, component, list_i_cell, list_slicing_index )
-        info = FieldMetaInformation( axes, shape, grid_spacing, global_offset,
-                grid_unit_SI, grid_position )
+        with traced_record( field_path ):
+            F = get_data( series, component, list_i_cell,
+                          list_slicing_index, output_type=output_type,
+                          region=index_range )
+        info = FieldMetaInformation( axes, F.shape, grid_spacing,
+                global_offset, grid_unit_SI, grid_position )
     else:
-        F = get_data( series, component )
+        with traced_record( field_path ):
+            F = get_data( series, component, output_type=output_type,
+                          region=index_range )
         axes = { i: axis_labels[i] for i in range(len(axis_labels)) }
         info = FieldMetaInformation( axes, F.shape,
             grid_spacing, global_offset,
@@ -178,6 +207,37 @@ def read_field_circ( series, iteration, field_name, component_name,
        info : a FieldMetaInformation object
        (contains information about the grid; see the corresponding docstring)
     """
+    Fcirc, info, coord_order = read_circ_modes(
+        series, iteration, field_name, component_name )
+    return recombine_circ_modes( Fcirc, info, coord_order, m, theta,
+        slice_across, slice_relative_position, max_resolution_3d )
+
+
+def read_circ_modes( series, iteration, field_name, component_name ):
+    """
+    Read all the azimuthal modes of a given thetaMode field
+
+    Parameters
+    ----------
+    series: openpmd_api.Series
+        An open, readable openPMD-api series object
+
+    iteration: integer
+        Iteration from which parameters should be extracted
+
+    field_name : string, optional
+       Which field to extract
+
+    component_name : string, optional
+       Which component of the field to extract
+
+    Returns
+    -------
+    A tuple with
+       Fcirc : a 3darray containing all the modes
+       info : a FieldMetaInformation object of the (r, z) grid
+       coord_order : the RZorder of the axes of `Fcirc`
+    """
     it = series.iterations[iteration]
 
     # Extract the dataset and and corresponding group
@@ -186,6 +246,10 @@ def read_field_circ( series, iteration, field_name, component_name,
         component = next(field.items())[1]
     else:
         component = field[component_name]
+    if field.scalar:
+        field_path = field_name
+    else:
+        field_path = join_infile_path( field_name, component_name )
 
     # Extract the metainformation
     #   FIXME here and in h5py reader, we need to invert the order on 'F' for
@@ -204,152 +268,14 @@ def read_field_circ( series, iteration, field_name, component_name,
     else:
         raise Exception(order_error_msg)
 
-    # Nm, Nr, Nz = component.shape
     info = FieldMetaInformation( coord_labels, N_pair,
         field.grid_spacing, field.grid_global_offset,
         field.grid_unit_SI, component.position, thetaMode=True )
 
-    # Convert to a 3D Cartesian array if theta is None
-    if theta is None:
-
-        # Get cylindrical info
-        rmax = info.rmax
-        inv_dr = 1./info.dr
+    with traced_record( field_path ):
         Fcirc = get_data( series, component )  # (Extracts all modes)
-        if m == 'all':
-            modes = [ mode for mode in range(0, int(Nm / 2) + 1) ]
-        else:
-            modes = [ m ]
-        modes = np.array( modes, dtype='int' )
-        nmodes = len(modes)
-
-        # If necessary, reduce resolution of 3D reconstruction
-        if max_resolution_3d is not None:
-            max_res_lon, max_res_transv = max_resolution_3d
-            if Nz > max_res_lon:
-                # Calculate excess of elements along z
-                excess_z = int(np.round(Nz/max_res_lon))
-                # Preserve only one every excess_z elements
-                if coord_order is RZorder.mrz:
-                    Fcirc = Fcirc[:, :, ::excess_z]
-                elif coord_order is RZorder.mzr:
-                    Fcirc = Fcirc[:, ::excess_z, :]
-                else:
-                    raise Exception(order_error_msg)
-                # Update info accordingly
-                info.z = info.z[::excess_z]
-                info.dz = info.z[1] - info.z[0]
-            if Nr > max_res_transv/2:
-                # Calculate excess of elements along r
-                excess_r = int(np.round(Nr/(max_res_transv/2)))
-                # Preserve only one every excess_r elements
-                if coord_order is RZorder.mrz:
-                    Fcirc = Fcirc[:, ::excess_r, :]
-                elif coord_order is RZorder.mzr:
-                    Fcirc = Fcirc[:, :, ::excess_r]
-                else:
-                    raise Exception(order_error_msg)
-                # Update info and necessary parameters accordingly
-                info.r = info.r[::excess_r]
-                info.dr = info.r[1] - info.r[0]
-                inv_dr = 1./info.dr
-                # Update Nr after reducing radial resolution.
-                if coord_order is RZorder.mrz:
-                    Nr = Fcirc.shape[1]
-                elif coord_order is RZorder.mzr:
-                    Nr = Fcirc.shape[2]
-                else:
-                    raise Exception(order_error_msg)
-
-        # Convert cylindrical data to Cartesian data
-        info._convert_cylindrical_to_3Dcartesian()
-        nx, ny, nz = len(info.x), len(info.y), len(info.z)
-        F_total = np.zeros( (nx, ny, nz) )
-        construct_3d_from_circ( F_total, Fcirc, info.x, info.y, modes,
-            nx, ny, nz, Nr, nmodes, inv_dr, rmax, coord_order)
-
-    else:
-
-        # Extract the modes and recombine them properly
-        if coord_order is RZorder.mrz:
-            F_total = np.zeros( (2 * Nr, Nz ) )
-        elif coord_order is RZorder.mzr:
-            F_total = np.zeros( (Nz, 2 * Nr ) )
-        else:
-            raise Exception(order_error_msg)
-        if m == 'all':
-            # Sum of all the modes
-            # - Prepare the multiplier arrays
-            mult_above_axis = [1]
-            mult_below_axis = [1]
-            for mode in range(1, int(Nm / 2) + 1):
-                cos = np.cos( mode * theta )
-                sin = np.sin( mode * theta )
-                mult_above_axis += [cos, sin]
-                mult_below_axis += [ (-1) ** mode * cos, (-1) ** mode * sin ]
-            mult_above_axis = np.array( mult_above_axis )
-            mult_below_axis = np.array( mult_below_axis )
-            # - Sum the modes
-            F = get_data( series, component )  # (Extracts all modes)
-            if coord_order is RZorder.mrz:
-                F_total[Nr:, :] = np.tensordot( mult_above_axis,
-                                                F, axes=(0, 0) )[:, :]
-                F_total[:Nr, :] = np.tensordot( mult_below_axis,
-                                                F, axes=(0, 0) )[::-1, :]
-            elif coord_order is RZorder.mzr:
-                F_total[:, Nr:] = np.tensordot( mult_above_axis,
-                                                F, axes=(0, 0) )[:, :]
-                F_total[:, :Nr] = np.tensordot( mult_below_axis,
-                                                F, axes=(0, 0) )[:, ::-1]
-            else:
-                raise Exception(order_error_msg)
-        elif m == 0:
-            # Extract mode 0
-            F = get_data( series, component, 0, 0 )
-            if coord_order is RZorder.mrz:
-                F_total[Nr:, :] = F[:, :]
-                F_total[:Nr, :] = F[::-1, :]
-            elif coord_order is RZorder.mzr:
-                F_total[:, Nr:] = F[:, :]
-                F_total[:, :Nr] = F[:, ::-1]
-            else:
-                raise Exception(order_error_msg)
-        else:
-            # Extract higher mode
-            cos = np.cos( m * theta )
-            sin = np.sin( m * theta )
-            F_cos = get_data( series, component, 2 * m - 1, 0 )
-            F_sin = get_data( series, component, 2 * m, 0 )
-            F = cos * F_cos + sin * F_sin
-            if coord_order is RZorder.mrz:
-                F_total[Nr:, :] = F[:, :]
-                F_total[:Nr, :] = (-1) ** m * F[::-1, :]
-            elif coord_order is RZorder.mzr:
-                F_total[:, Nr:] = F[:, :]
-                F_total[:, :Nr] = (-1) ** m * F[:, ::-1]
-            else:
-                raise Exception(order_error_msg)
-
-    # Perform slicing if needed
-    if slice_across is not None:
-        # Slice field and clear metadata
-        inverted_axes_dict = {info.axes[key]: key for key in info.axes.keys()}
-        for count, slice_across_item in enumerate(slice_across):
-            slicing_index = inverted_axes_dict[slice_across_item]
-            coord_array = getattr( info, slice_across_item )
-            # Number of cells along the slicing direction
-            n_cells = len(coord_array)
-            # Index of the slice (prevent stepping out of the array)
-            i_cell = int( 0.5 * (slice_relative_position[count] + 1.) * n_cells )
-            i_cell = max( i_cell, 0 )
-            i_cell = min( i_cell, n_cells - 1)
-            F_total = np.take( F_total, [i_cell], axis=slicing_index )
-        F_total = np.squeeze(F_total)
-        # Remove the sliced labels from the FieldMetaInformation
-        for slice_across_item in slice_across:
-            info._remove_axis(slice_across_item)
 
-    return F_total, info
+    return Fcirc, info, coord_order
 
 
 # FIXME this looks like it can be generalized from already read meta-data
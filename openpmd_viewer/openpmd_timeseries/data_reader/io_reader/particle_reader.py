@@ -10,12 +10,14 @@ License: 3-Clause-BSD-LBNL
 """
 import time
 import numpy as np
-from scipy import constants
-from .utilities import get_data
+from .utilities import get_data, convert_data, PendingRead, flush_reads
+from ...profiler import span, count, allocated, released
+from ..io_tracer import active_tracer, traced_record
 
 
 def read_species_data(series, iteration, species_name, component_name,
-                      extensions, read_chunk_range=None, skip_offset=False):
+                      extensions, read_chunk_range=None, skip_offset=False,
+                      output_type=np.float64):
     """
     Extract a given species' record_comp
 
@@ -36,27 +38,15 @@ def read_species_data(series, iteration, species_name, component_name,
 
     extensions: list of strings
         The extensions that the current OpenPMDTimeSeries complies with
+
+    output_type: a numpy floating type, or None
+        The type of the returned array (see `get_output_type`)
     """
     it = series.iterations[iteration]
 
     # Translate the record component to the openPMD format
-    dict_record_comp = {'x': ['position', 'x'],
-                        'y': ['position', 'y'],
-                        'z': ['position', 'z'],
-                        'ux': ['momentum', 'x'],
-                        'uy': ['momentum', 'y'],
-                        'uz': ['momentum', 'z'],
-                        'w': ['weighting', None]}
-    
-    if component_name in dict_record_comp:
-        ompd_record_name, ompd_record_comp_name = \
-            dict_record_comp[component_name]
-    elif component_name.find('/') != -1:
-        ompd_record_name, ompd_record_comp_name = \
-            component_name.split('/')
-    else:
-        ompd_record_name = component_name
-        ompd_record_comp_name = None
+    ompd_record_name, ompd_record_comp_name = \
+        translate_component_name(component_name)
 
     # Extract the right dataset
     species = it.particles[species_name]
@@ -66,15 +56,11 @@ def read_species_data(series, iteration, species_name, component_name,
     else:
         component = record[ompd_record_comp_name]
 
-    if ompd_record_name == 'id':
-        output_type = np.uint64
-    else:
-        output_type = np.float64
+    output_type = get_output_type(ompd_record_name, component, output_type)
 
-    start = time.time()
-    data = get_data_new( series, component, output_type=output_type, read_chunk_range=read_chunk_range)
-    end = time.time()
-    print(f"get target data: {component_name}. Time elapsed: ", end - start)
+    with span('read'):
+        data = get_data_new( series, component, output_type=output_type, read_chunk_range=read_chunk_range,
+                             record_name=join_record_name(species_name, ompd_record_name, ompd_record_comp_name))
 
     if skip_offset:
         return data
@@ -87,39 +73,41 @@ def read_species_data(series, iteration, species_name, component_name,
         weighting_power = record.get_attribute('weightingPower')
         if (macro_weighted == 1) and (weighting_power != 0):
             w_component = next(species['weighting'].items())[1]
-            w = get_data_new(series, w_component, read_chunk_range=read_chunk_range)
+            with span('read.support'):
+                w = get_data_new(series, w_component, read_chunk_range=read_chunk_range,
+                                 record_name=join_record_name(species_name, 'weighting'))
             data *= w ** (-weighting_power)
+            released(w.nbytes)
 
     # - Return positions, with an offset
     if component_name in ['x', 'y', 'z']:
-        start = time.time()
-        offset = get_data_new(series, species['positionOffset'][component_name], read_chunk_range=read_chunk_range)
-        end = time.time()
-        print(f"get position offset for read {component_name}. Time elapsed: ", end - start)
-
-        start = time.time()
-        data += offset
-        end = time.time()
-        print("data += offset. Time elapsed: ", end - start)
+        with span('read.support'):
+            offset = get_data_new(series, species['positionOffset'][component_name], read_chunk_range=read_chunk_range,
+                                  record_name=join_record_name(species_name, 'positionOffset', component_name))
+
+        with span('offset'):
+            data += offset
+        released(offset.nbytes)
         del offset
 
     # - Return momentum in normalized units
     elif component_name in ['ux', 'uy', 'uz' ]:
         mass_component = next(species['mass'].items())[1]
-        start = time.time()
-        m = get_data_new(series, mass_component, read_chunk_range=read_chunk_range)
-        end = time.time()
-        print(f"get mass read for {component_name}. Time elapsed: ", end - start)
-
-        start = time.time()
-        # Normalize only if the particle mass is non-zero
-        if np.all( m != 0 ):
-            m *= constants.c
-            temp = np.full_like(m, 1.0)
-            temp /= m
-            data *= temp
-        end = time.time()
-        print("data *= norm_factor. Time elapsed: ", end - start)
+        with span('read.support'):
+            m = get_data_new(series, mass_component, read_chunk_range=read_chunk_range,
+                             record_name=join_record_name(species_name, 'mass'))
+
+        with span('offset'):
+            # Normalize only if the particle mass is non-zero
+            if np.all( m != 0 ):
+                from scipy.constants import c
+                m *= c
+                temp = np.full_like(m, 1.0)
+                allocated(temp.nbytes, 'temporary')
+                temp /= m
+                data *= temp
+                released(temp.nbytes)
+        released(m.nbytes)
         del m
 
     # Return the data
@@ -131,23 +119,8 @@ def read_species_support_data(series, iteration, species_name, component_name,
     it = series.iterations[iteration]
 
     # Translate the record component to the openPMD format
-    dict_record_comp = {'x': ['position', 'x'],
-                        'y': ['position', 'y'],
-                        'z': ['position', 'z'],
-                        'ux': ['momentum', 'x'],
-                        'uy': ['momentum', 'y'],
-                        'uz': ['momentum', 'z'],
-                        'w': ['weighting', None]}
-
-    if component_name in dict_record_comp:
-        ompd_record_name, ompd_record_comp_name = \
-            dict_record_comp[component_name]
-    elif component_name.find('/') != -1:
-        ompd_record_name, ompd_record_comp_name = \
-            component_name.split('/')
-    else:
-        ompd_record_name = component_name
-        ompd_record_comp_name = None
+    ompd_record_name, ompd_record_comp_name = \
+        translate_component_name(component_name)
 
     # Extract the right dataset
     species = it.particles[species_name]
@@ -161,58 +134,276 @@ def read_species_support_data(series, iteration, species_name, component_name,
         weighting_power = record.get_attribute('weightingPower')
         if (macro_weighted == 1) and (weighting_power != 0):
             w_component = next(species['weighting'].items())[1]
-            w = get_data_new(series, w_component, read_chunk_range=read_chunk_range)
+            with span('read.support'):
+                w = get_data_new(series, w_component, read_chunk_range=read_chunk_range,
+                                 record_name=join_record_name(species_name, 'weighting'))
             return w ** (-weighting_power)
 
     # - Return positions, with an offset
     if component_name in ['x', 'y', 'z']:
-        start = time.time()
-        offset = get_data_new(series, species['positionOffset'][component_name], read_chunk_range=read_chunk_range)
-        end = time.time()
-        print(f"get position offset for read {component_name}. Time elapsed: ", end - start)
+        with span('read.support'):
+            offset = get_data_new(series, species['positionOffset'][component_name], read_chunk_range=read_chunk_range,
+                                  record_name=join_record_name(species_name, 'positionOffset', component_name))
 
         return offset
 
     # - Return momentum in normalized units
     elif component_name in ['ux', 'uy', 'uz' ]:
         mass_component = next(species['mass'].items())[1]
-        start = time.time()
-        m = get_data_new(series, mass_component, read_chunk_range=read_chunk_range)
-        end = time.time()
-        print(f"get mass read for {component_name}. Time elapsed: ", end - start)
+        with span('read.support'):
+            m = get_data_new(series, mass_component, read_chunk_range=read_chunk_range,
+                             record_name=join_record_name(species_name, 'mass'))
 
         # Normalize only if the particle mass is non-zero
         return m
 
+def read_species_data_iterations(series, iterations, species_name,
+                                 component_names, extensions,
+                                 skip_offset=False, iterations_per_flush=None,
+                                 output_type=np.float64):
+    """
+    Extract several record components of a given species at several
+    iterations, with a single flush for all the iterations (or for each
+    group of `iterations_per_flush` iterations), instead of one flush
+    per chunk and per record component as `read_species_data`
+
+    Parameters
+    ----------
+    series: openpmd_api.Series
+        An open, readable openPMD-api series object
+
+    iterations: list of integers
+        Iterations from which the data should be extracted
+
+    species_name: string
+        The name of the species to extract (in the openPMD file)
+
+    component_names: list of strings
+        The record components to extract (see `read_species_data`)
+
+    extensions, skip_offset, output_type:
+        See `read_species_data`
+
+    iterations_per_flush: int, optional
+        The number of iterations whose loads share a flush
+        (default: all of them)
+
+    Returns
+    -------
+    A dictionary whose keys are the iterations and whose values are
+    lists of 1darrays (one per element of `component_names`)
+    """
+    if iterations_per_flush is None:
+        iterations_per_flush = max(1, len(iterations))
+
+    result = {}
+    for i_group in range(0, len(iterations), iterations_per_flush):
+        group = iterations[i_group:i_group + iterations_per_flush]
+        # Enqueue the loads of the record components and of the
+        # records that are needed to convert them, at each iteration
+        # (reads[iteration][i_component][role] = (component, pending read))
+        reads = {}
+        pending_reads = []
+        with span('read'):
+            for iteration in group:
+                species = series.iterations[iteration].particles[species_name]
+                reads[iteration] = []
+                for component_name in component_names:
+                    ompd_record_name, ompd_record_comp_name = \
+                        translate_component_name(component_name)
+                    component_reads = {}
+                    for role, record_name, comp_name in \
+                        get_required_components(species, component_name,
+                            ompd_record_name, ompd_record_comp_name,
+                            extensions, skip_offset):
+                        record = species[record_name]
+                        if comp_name is None:
+                            component = next(record.items())[1]
+                        else:
+                            component = record[comp_name]
+                        pending = PendingRead(component, [0],
+                            list(component.shape),
+                            record_name=join_record_name(
+                                species_name, record_name, comp_name))
+                        component_reads[role] = (component, pending)
+                        pending_reads.append(pending)
+                    reads[iteration].append(component_reads)
+            flush_reads(series, pending_reads)
+
+        for iteration in group:
+            species = series.iterations[iteration].particles[species_name]
+            result[iteration] = []
+            for component_name, component_reads in \
+                    zip(component_names, reads.pop(iteration)):
+                ompd_record_name, _ = translate_component_name(component_name)
+                arrays = {}
+                for role, (component, pending) in component_reads.items():
+                    allocated(pending.data.nbytes)
+                    arrays[role] = convert_data(pending.data, component,
+                        get_output_type(ompd_record_name, component,
+                                        output_type)
+                        if role == 'data' else None)
+                result[iteration].append( convert_species_data(
+                    arrays, species[ompd_record_name]) )
+    return result
+
+
+def convert_species_data(arrays, record):
+    """
+    Return the record component `arrays['data']`, converted with the
+    other arrays of `arrays` (see `get_required_components`), in the
+    same way as in `read_species_data`
+    """
+    data = arrays.pop('data')
+    with span('offset'):
+        # For ED-PIC: divide by the weight with the proper power
+        if 'weighting' in arrays:
+            weighting_power = record.get_attribute('weightingPower')
+            data *= arrays['weighting'] ** (-weighting_power)
+        # Positions, with an offset
+        if 'offset' in arrays:
+            data += arrays['offset']
+        # Momentum in normalized units
+        if 'mass' in arrays:
+            # Normalize only if the particle mass is non-zero
+            m = arrays['mass']
+            if np.all( m != 0 ):
+                from scipy.constants import c
+                data *= 1. / (m * c)
+    released(sum( array.nbytes for array in arrays.values() ))
+    return data
+
+
+def get_required_components(species, component_name, ompd_record_name,
+                            ompd_record_comp_name, extensions, skip_offset):
+    """
+    Return the record components that are read by
+    `read_species_data_iterations` for the quantity `component_name`
+    of `species`, as a list of tuples
+    (role, record name, component name), where the role is either
+    'data' (the record component itself), 'weighting' (ED-PIC weighting),
+    'offset' (position offset) or 'mass' (momentum normalization)
+    """
+    components = [('data', ompd_record_name, ompd_record_comp_name)]
+    if skip_offset:
+        return components
+    if 'ED-PIC' in extensions and ompd_record_name != 'weighting':
+        record = species[ompd_record_name]
+        macro_weighted = record.get_attribute('macroWeighted')
+        weighting_power = record.get_attribute('weightingPower')
+        if (macro_weighted == 1) and (weighting_power != 0):
+            components.append(('weighting', 'weighting', None))
+    if component_name in ['x', 'y', 'z']:
+        components.append(('offset', 'positionOffset', component_name))
+    elif component_name in ['ux', 'uy', 'uz']:
+        components.append(('mass', 'mass', None))
+    return components
+
+
+def get_output_type(ompd_record_name, component, output_type):
+    """
+    Return the type to which the data of the record component `component`
+    is converted, for the requested `output_type` (a numpy floating type,
+    or None to keep the type in which the data is stored): the
+    identifiers are always uint64, and the other non-floating types
+    are converted to float64
+    """
+    if ompd_record_name == 'id':
+        return np.uint64
+    if output_type is None and not np.issubdtype(component.dtype, np.floating):
+        return np.float64
+    return output_type
+
+
+def translate_component_name(component_name):
+    """
+    Return the openPMD record name and record component name
+    (None for scalar records) of the particle quantity `component_name`
+    (e.g. 'x', 'uz', 'w', or 'record/component')
+    """
+    dict_record_comp = {'x': ['position', 'x'],
+                        'y': ['position', 'y'],
+                        'z': ['position', 'z'],
+                        'ux': ['momentum', 'x'],
+                        'uy': ['momentum', 'y'],
+                        'uz': ['momentum', 'z'],
+                        'w': ['weighting', None]}
+
+    if component_name in dict_record_comp:
+        ompd_record_name, ompd_record_comp_name = \
+            dict_record_comp[component_name]
+    elif component_name.find('/') != -1:
+        ompd_record_name, ompd_record_comp_name = \
+            component_name.split('/')
+    else:
+        ompd_record_name = component_name
+        ompd_record_comp_name = None
+    return ompd_record_name, ompd_record_comp_name
+
+
+def read_species_size(series, iteration, species_name):
+    """
+    Return the number of macroparticles of a species,
+    without reading the particle data
+    """
+    species = series.iterations[iteration].particles[species_name]
+    for record_name, record in species.items():
+        if record_name == 'particlePatches':
+            continue
+        component = next(record.items())[1]
+        return int(component.shape[0])
+    return 0
+
+
+def join_record_name(*names):
+    """
+    Return the name of a record component (e.g. 'electrons/position/x'),
+    used to identify the chunks in I/O traces
+    """
+    return '/'.join(name for name in names if name)
+
+
 def tuple_to_slice(read_chunk_range):
     return tuple(map(lambda s: slice(s[0], s[1], s[2]), read_chunk_range))
 
 
 def gc_get_data(series, component, length, chunk_slices, output_type=None):
     data = np.full(length, 0, component.dtype)
+    allocated(data.nbytes)
     # raw_data_list = list()
     offset = 0
+    tracer = active_tracer()
     for chunk_slice in chunk_slices:
-        # start = time.time()
         x = component[chunk_slice]
-        series.flush()
+        if tracer is None:
+            series.flush()
+        else:
+            t_start = time.perf_counter()
+            series.flush()
+            tracer.add_flush([([chunk_slice.start], [x.size])],
+                             [x.nbytes], t_start, time.perf_counter())
         read_slice = slice(offset, offset + x.size, None)
         offset += x.size
         data[read_slice] = x
         # raw_data_list.append(x)
-        # end = time.time()
-        # print(x.size, end - start)
+    count('n_chunks', len(chunk_slices))
+    count('n_flushes', len(chunk_slices))
+    count('bytes_read', data.nbytes)
     # data = np.concatenate(raw_data_list)
     # print(data.shape)
     if (output_type is not None) and (data.dtype != output_type):
+        released(data.nbytes)
         data = data.astype( output_type )
+        allocated(data.nbytes)
     return data
 
-def get_data_new(series, record_component, i_slice=None, pos_slice=None, output_type=None, read_chunk_range=None):
-    if not read_chunk_range:
-        return get_data(series, record_component, i_slice, pos_slice, output_type)
-    else:
-        chunk_slices = tuple_to_slice(read_chunk_range)
-        length = sum([chunk_range[1] - chunk_range[0] for chunk_range in read_chunk_range])
-        return gc_get_data(series, record_component, length, chunk_slices, output_type)
+def get_data_new(series, record_component, i_slice=None, pos_slice=None, output_type=None, read_chunk_range=None,
+                 record_name=None):
+    with traced_record(record_name):
+        if not read_chunk_range:
+            return get_data(series, record_component, i_slice, pos_slice, output_type)
+        else:
+            chunk_slices = tuple_to_slice(read_chunk_range)
+            length = sum([chunk_range[1] - chunk_range[0] for chunk_range in read_chunk_range])
+            return gc_get_data(series, record_component, length, chunk_slices, output_type)
 
@@ -8,8 +8,10 @@ Copyright 2015-2016, openPMD-viewer contributors
 Authors: Remi Lehe, Axel Huebl
 License: 3-Clause-BSD-LBNL
 """
-import numpy as np
 import time
+import numpy as np
+from ... import profiler
+from ..io_tracer import active_tracer
 
 def chunk_to_slice(chunk):
     """
@@ -22,7 +24,7 @@ def chunk_to_slice(chunk):
 
 
 def get_data(series, record_component, i_slice=None, pos_slice=None,
-             output_type=None):
+             output_type=None, region=None):
     """
     Extract the data from a (possibly constant) dataset
     Slice the data according to the parameters i_slice and pos_slice
@@ -44,6 +46,10 @@ def get_data(series, record_component, i_slice=None, pos_slice=None,
     output_type: a numpy type
        The type to which the returned array should be converted
 
+    region: list of tuples of int, optional
+       The range of indices (start, stop) to be read along each dimension.
+       When None, the full extent of each dimension is read.
+
     Returns:
     --------
     An np.ndarray (non-constant dataset) or a single double (constant dataset)
@@ -56,97 +62,37 @@ def get_data(series, record_component, i_slice=None, pos_slice=None,
     if i_slice is not None and not isinstance(i_slice, list):
         i_slice = [i_slice]
 
-    # ADIOS2: Actual chunks, all other: one chunk
-    chunks = record_component.available_chunks()
-
-    # read whole data set
-    if pos_slice is None:
-        # mask invalid regions with NaN
-        #   note: full_like triggers a full read, thus we avoid it #340
-        data = np.full(record_component.shape, np.nan, record_component.dtype)
-        for k, chunk in enumerate(chunks):
-            start = time.time()
-            chunk_slice = chunk_to_slice(chunk)
-
-            # skip empty slices
-            # https://github.com/ornladios/ADIOS2
-            volume = 1
-            for csl in chunk_slice:
-                volume *= csl.stop - csl.start
-            if volume == 0:
-                continue
-
-            # read only valid region
-            x = record_component[chunk_slice]
-            series.flush()
-            data[chunk_slice] = x
-            # print("chunk:", k, "read in", time.time() - start, "s", "start:", chunk_slice[0].start, "end:", chunk_slice[0].stop)
-    # slice: read only part of the data set
+    # Build the requested hyperslab: the full dataset (or the region),
+    # reduced to a single index along the sliced directions
+    full_shape = record_component.shape
+    if region is None:
+        start = [0] * len(full_shape)
+        stop = list(full_shape)
     else:
-        full_shape = record_component.shape
-
-        slice_shape = list(full_shape)      # copy
-        pos_slice_sorted = pos_slice.copy() # copy for in-place sort
-        pos_slice_sorted.sort(reverse=True)
-        for dir_index in pos_slice_sorted:  # remove indices in list
-            del slice_shape[dir_index]
-
-        # mask invalid regions with NaN
-        data = np.full(slice_shape, np.nan, dtype=record_component.dtype)
-
-        # build requested ND slice with respect to full data
-        s = []
-        for d in range(len(full_shape)):
-            if d in pos_slice:
-                s.append(i_slice[pos_slice.index(d)]) # one index in such directions
-            else: # all indices in other direction
-                s.append(slice(None, None, None))
-        s = tuple(s)
-
-        # now we check which chunks contribute to the slice
-        for chunk in chunks:
-            skip_this_chunk = False
-            s_valid = list(s)  # same as s but reduced to valid regions in chunk
-            s_target = []  # starts and stops in sliced array
-            chunk_slice = chunk_to_slice(chunk)
-
-            # skip empty slices
-            # https://github.com/ornladios/ADIOS2
-            volume = 1
-            for csl in chunk_slice:
-                volume *= csl.stop - csl.start
-            if volume == 0:
-                continue
-
-            # read only valid region
-            for d, slice_d in enumerate(s):
-                start = chunk_slice[d].start
-                stop = chunk_slice[d].stop
-                if isinstance(slice_d, int):
-                    # Nothing to do for s_target (dimension sliced out)
-                    # Nothing to do for s_valid (dimension index is set)
-                    if slice_d < start or slice_d >= stop:
-                        # chunk not in slice line/plane
-                        skip_this_chunk = True
-                else:
-                    if slice_d.start is None or slice_d.start < start:
-                        s_valid[d] = slice(start, s_valid[d].stop)
-                    if slice_d.stop is None or slice_d.stop > stop:
-                        s_valid[d] = slice(s_valid[d].start, stop)
-                    s_target.append(slice(start, stop))
-
-            s_valid = tuple(s_valid)
-            s_target = tuple(s_target)
-
-            # read
-            if not skip_this_chunk:
-                x = record_component[s_valid]
-                series.flush()
-                data[s_target] = x
+        start = [ index_range[0] for index_range in region ]
+        stop = [ index_range[1] for index_range in region ]
+    if pos_slice is not None:
+        for dir_index, i_cell in zip(pos_slice, i_slice):
+            start[dir_index] = i_cell
+            stop[dir_index] = i_cell + 1
+
+    data = read_hyperslab(series, record_component, start, stop,
+                          squeeze_axes=pos_slice)
+
+    profiler.allocated(data.nbytes)
+    return convert_data(data, record_component, output_type)
 
+
+def convert_data(data, record_component, output_type=None):
+    """
+    Convert the raw data of a record component to `output_type`
+    (if not None), and scale it to SI units
+    """
     # Convert to the right type
     if (output_type is not None) and (data.dtype != output_type):
+        profiler.released(data.nbytes)
         data = data.astype( output_type )
+        profiler.allocated(data.nbytes)
     # Scale by the conversion factor
     if record_component.unit_SI != 1.0:
         if np.issubdtype(data.dtype, np.floating) or \
@@ -158,6 +104,173 @@ def get_data(series, record_component, i_slice=None, pos_slice=None,
     return data
 
 
+def read_hyperslab(series, record_component, start, stop, squeeze_axes=None):
+    """
+    Read the hyperslab [start, stop) of a record component
+
+    Only the chunks that intersect the hyperslab are loaded. The
+    intersections are computed for all chunks at once, and all the loads
+    are enqueued before a single `series.flush()`.
+    Regions of the hyperslab that are not covered by any chunk are set
+    to NaN (or 0 for non-floating-point data).
+
+    Parameters:
+    -----------
+    series: openpmd_api.Series
+        An open, readable openPMD-api series object
+
+    record_component: an openPMD.Record_Component
+
+    start, stop: lists of int
+        The first index and the index past the last one,
+        along each dimension of the dataset
+
+    squeeze_axes: list of int, optional
+        Dimensions (of length 1 in the hyperslab) that are removed
+        from the returned array
+
+    Returns:
+    --------
+    An np.ndarray with the shape `stop - start`
+    (minus the dimensions in `squeeze_axes`)
+    """
+    pending = PendingRead(record_component, start, stop)
+    flush_reads(series, [pending])
+    data = pending.data
+
+    # Remove the sliced dimensions
+    if squeeze_axes:
+        data = data.reshape([ n for d, n in enumerate(data.shape)
+                              if d not in squeeze_axes ])
+
+    return data
+
+
+class PendingRead(object):
+    """
+    Read of the hyperslab [start, stop) of a record component whose
+    chunk loads are enqueued, but not flushed yet: several reads (e.g.
+    of different iterations) can then share a single `series.flush()`,
+    done by `flush_reads`, after which `data` contains the hyperslab.
+    """
+
+    def __init__(self, record_component, start, stop, record_name=None):
+        """
+        Enqueue the loads of the chunks of `record_component` that
+        intersect the hyperslab [start, stop) (see `read_hyperslab`)
+
+        record_name: string, optional
+            The name of the record component in I/O traces
+            (by default, that of the enclosing `traced_record`)
+        """
+        start = np.asarray(start, dtype=np.int64)
+        stop = np.asarray(stop, dtype=np.int64)
+        ndim = len(start)
+        slab_shape = tuple((stop - start).tolist())
+        self.record_name = record_name
+
+        # ADIOS2: Actual chunks, all other: one chunk
+        chunks = record_component.available_chunks()
+        offsets = np.array([chunk.offset for chunk in chunks],
+                           dtype=np.int64).reshape(len(chunks), ndim)
+        extents = np.array([chunk.extent for chunk in chunks],
+                           dtype=np.int64).reshape(len(chunks), ndim)
+
+        # Intersect all the chunks with the hyperslab
+        # (this also skips empty chunks, see https://github.com/ornladios/ADIOS2)
+        lower = np.maximum(offsets, start)
+        upper = np.minimum(offsets + extents, stop)
+        intersects = np.all(upper > lower, axis=1)
+        lower = lower[intersects]
+        upper = upper[intersects]
+
+        # Allocate without prefilling; only regions that are not covered
+        # by any chunk are masked (NaN), which avoids a full extra pass
+        #   note: full_like triggers a full read, thus we avoid it #340
+        self.data = np.empty(slab_shape, dtype=record_component.dtype)
+        self.targets = [ tuple( slice(lo, up) for lo, up in
+                         zip((l - start).tolist(), (u - start).tolist()) )
+                         for l, u in zip(lower, upper) ]
+        self.covered_volume = int(np.prod(upper - lower, axis=1).sum())
+        # (Overlapping chunks can leave a gap even if the volumes match)
+        if self.covered_volume != int(np.prod(slab_shape)) or \
+                boxes_overlap(lower, upper):
+            # Missing (or overlapping) chunks: find the uncovered region
+            covered = np.zeros(slab_shape, dtype=bool)
+            for target in self.targets:
+                covered[target] = True
+            if np.issubdtype(self.data.dtype, np.floating) or \
+                np.issubdtype(self.data.dtype, np.complexfloating):
+                self.data[~covered] = np.nan
+            else:
+                self.data[~covered] = 0
+
+        # Enqueue all the loads
+        self.chunks = [ (l.tolist(), (u - l).tolist())
+                        for l, u in zip(lower, upper) ]
+        self.loaded = [ record_component.load_chunk(offset, extent)
+                        for offset, extent in self.chunks ]
+
+
+def boxes_overlap(lower, upper):
+    """
+    Return whether any two of the boxes [lower[i], upper[i]) overlap
+
+    The boxes are sorted along the first axis, so that each box is only
+    compared with the next boxes that start before its end along this axis.
+
+    Parameters:
+    -----------
+    lower, upper: 2darrays of int
+        The corners of the boxes, of shape (number of boxes, ndim)
+    """
+    order = np.argsort(lower[:, 0], kind='stable')
+    lower = lower[order]
+    upper = upper[order]
+    ends = np.searchsorted(lower[:, 0], upper[:, 0], side='left')
+    for i in range(len(lower)):
+        if ends[i] > i + 1:
+            others = slice(i + 1, ends[i])
+            if np.any(np.all(np.maximum(lower[others], lower[i]) <
+                             np.minimum(upper[others], upper[i]), axis=1)):
+                return True
+    return False
+
+
+def flush_reads(series, pending_reads):
+    """
+    Flush the loads of all the PendingRead objects `pending_reads` at
+    once, and copy the loaded chunks into their `data`
+    """
+    if any( len(pending.loaded) > 0 for pending in pending_reads ):
+        tracer = active_tracer()
+        if tracer is None:
+            series.flush()
+        else:
+            t_start = time.perf_counter()
+            series.flush()
+            chunks = []
+            nbytes = []
+            record_names = []
+            for pending in pending_reads:
+                for offset, extent in pending.chunks:
+                    chunks.append( (offset, extent) )
+                    nbytes.append( int(np.prod(extent)) *
+                                   pending.data.itemsize )
+                    record_names.append( pending.record_name )
+            tracer.add_flush( chunks, nbytes, t_start, time.perf_counter(),
+                              record_names=record_names )
+        profiler.count('n_flushes')
+    for pending in pending_reads:
+        for target, x in zip(pending.targets, pending.loaded):
+            pending.data[target] = x
+        # (The buffers of openpmd-api are not needed anymore)
+        pending.loaded = []
+        profiler.count('n_chunks', len(pending.chunks))
+        profiler.count('bytes_read',
+                       pending.covered_volume * pending.data.itemsize)
+
+
 def join_infile_path(*paths):
     """
     Join path components using '/' as separator.
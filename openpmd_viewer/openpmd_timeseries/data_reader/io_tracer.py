@@ -0,0 +1,185 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines the IOTracer class, which records every chunk request made
+by the data readers (record, offset, count, bytes, latency and flush
+group), so that read patterns can be analyzed and replayed offline
+(see benchmark/replay_trace.py).
+
+Usage
+-----
+with IOTracer() as tracer:
+    ts.get_particle(['x', 'ux'], species='electrons', iteration=500)
+tracer.save('trace.npz')
+
+Copyright 2024, openPMD-viewer contributors
+License: 3-Clause-BSD-LBNL
+"""
+import time
+import threading
+import numpy as np
+
+# Maximal number of dimensions of the recorded chunks
+MAX_DIM = 4
+
+# Layout of one chunk request in the trace
+chunk_dtype = np.dtype([
+    ('record', np.int32),         # index in the list of record names
+    ('ndim', np.int8),
+    ('offset', np.int64, (MAX_DIM,)),
+    ('count', np.int64, (MAX_DIM,)),
+    ('nbytes', np.int64),
+    ('latency', np.float64),      # duration of the flush that served it (s)
+    ('flush_group', np.int64),    # chunks with the same value share a flush
+    ('t_start', np.float64),      # start of the flush, since tracing began
+])
+
+# The tracer that is currently recording (if any)
+_active_tracer = None
+
+
+class IOTracer( object ):
+    """
+    Recorder of the chunk requests of the data readers.
+
+    While the tracer is active (i.e. inside its `with` block), the
+    openpmd-api and h5py readers report each chunk that they load,
+    together with the flush that served it.
+    """
+
+    def __init__( self ):
+        self.record_names = []
+        self._record_index = {}
+        self._rows = []
+        self._n_flushes = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+        self._t0 = None
+
+    def __enter__( self ):
+        global _active_tracer
+        self._previous_tracer = _active_tracer
+        self._t0 = time.perf_counter()
+        _active_tracer = self
+        return self
+
+    def __exit__( self, *exc_info ):
+        global _active_tracer
+        _active_tracer = self._previous_tracer
+        return False
+
+    def add_flush( self, chunks, nbytes, t_start, t_end, record_names=None ):
+        """
+        Register the chunks that were served by one flush
+
+        Parameters
+        ----------
+        chunks: list of tuples (offset, count)
+            The offset and extent of each chunk (lists of int)
+
+        nbytes: list of int
+            The number of bytes of each chunk
+
+        t_start, t_end: floats
+            The result of `time.perf_counter()` before and after the flush
+
+        record_names: list of strings, optional
+            The record of each chunk, when the flush serves several
+            records (by default, that of the enclosing `traced_record`;
+            this is also used for the chunks whose name is None)
+        """
+        default_name = getattr( self._local, 'record_name', None ) or ''
+        if record_names is None:
+            record_names = [ default_name ] * len( chunks )
+        with self._lock:
+            flush_group = self._n_flushes
+            self._n_flushes += 1
+            for (offset, count), n, record_name in \
+                    zip( chunks, nbytes, record_names ):
+                record_name = record_name or default_name
+                if record_name not in self._record_index:
+                    self._record_index[record_name] = len(self.record_names)
+                    self.record_names.append( record_name )
+                record = self._record_index[record_name]
+                ndim = len(offset)
+                self._rows.append( (record, ndim,
+                    list(offset) + [0] * (MAX_DIM - ndim),
+                    list(count) + [0] * (MAX_DIM - ndim), n,
+                    t_end - t_start, flush_group, t_start - self._t0) )
+
+    def to_array( self ):
+        """
+        Return the trace as a numpy structured array (see `chunk_dtype`)
+        """
+        with self._lock:
+            return np.array( self._rows, dtype=chunk_dtype )
+
+    def save( self, filename ):
+        """
+        Save the trace in a compressed numpy file (.npz),
+        which can be read with `load_trace`
+        """
+        np.savez_compressed( filename, chunks=self.to_array(),
+                             records=np.array(self.record_names, dtype=str) )
+
+
+class _RecordName( object ):
+    """Context manager that sets the record name of the traced chunks"""
+    __slots__ = ('tracer', 'name', 'previous')
+
+    def __init__( self, tracer, name ):
+        self.tracer = tracer
+        self.name = name
+
+    def __enter__( self ):
+        self.previous = getattr( self.tracer._local, 'record_name', None )
+        self.tracer._local.record_name = self.name
+        return self
+
+    def __exit__( self, *exc_info ):
+        self.tracer._local.record_name = self.previous
+        return False
+
+
+class _NoRecordName( object ):
+    """Context manager that does nothing (when no tracer is active)"""
+    __slots__ = ()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc_info ):
+        return False
+
+
+_no_record_name = _NoRecordName()
+
+
+def active_tracer():
+    """
+    Return the IOTracer that is currently recording, or None
+    """
+    return _active_tracer
+
+
+def traced_record( name ):
+    """
+    Return a context manager that attributes the chunks that are
+    read within it to the record `name` (e.g. 'electrons/position/x')
+    """
+    if _active_tracer is None:
+        return _no_record_name
+    return _RecordName( _active_tracer, name )
+
+
+def load_trace( filename ):
+    """
+    Load a trace saved by `IOTracer.save`
+
+    Returns
+    -------
+    A tuple (chunks, record_names) where `chunks` is a structured array
+    (see `chunk_dtype`) and `record_names` a list of strings
+    """
+    with np.load( filename ) as f:
+        return f['chunks'], [ str(name) for name in f['records'] ]
@@ -57,7 +57,13 @@ class FieldMetaInformation(object):
         than ymin, ymax, xmin, xmax: these values are shifted by half a cell.
         The reason for this is that imshow plots a finite-width square for each
         value of the field array.)
+
+    Only the scalars that define the grid (first point, spacing and number
+    of points along each axis) are stored: the arrays of coordinates (e.g.
+    `x`) and `imshow_extent` are computed when they are first accessed,
+    and cropping the grid only updates these scalars.
     """
+    __slots__ = ['axes', '_grids', '_coords', '_attributes']
 
     def __init__(self, axes, shape, grid_spacing,
                  global_offset, grid_unitSI, position, thetaMode=False):
@@ -68,27 +74,83 @@ class FieldMetaInformation(object):
         """
         # Register important initial information
         self.axes = axes
+        # Grid of each axis, arrays of coordinates that have been computed,
+        # and attributes that were set explicitly (e.g. `info.x = ...`)
+        self._grids = {}
+        self._coords = {}
+        self._attributes = {}
 
         # Create the elements
         for axis in sorted(axes.keys()):
-            # Create the coordinates along this axis
+            # Define the coordinates along this axis
             step = grid_spacing[axis] * grid_unitSI
             n_points = shape[axis]
             start = global_offset[axis] * grid_unitSI + position[axis] * step
             end = start + (n_points - 1) * step
-            axis_points = np.linspace(start, end, n_points, endpoint=True)
-            # Create the points below the axis if thetaMode is true
-            if axes[axis] == 'r' and thetaMode:
-                axis_points = np.concatenate((-axis_points[::-1], axis_points))
-                start = -end
-            # Register the results in the object
-            axis_name = axes[axis]
-            setattr(self, axis_name, axis_points)
-            setattr(self, 'd' + axis_name, step)
-            setattr(self, axis_name + 'min', axis_points[0])
-            setattr(self, axis_name + 'max', axis_points[-1])
+            # Include the points below the axis if thetaMode is true
+            mirrored = (axes[axis] == 'r' and thetaMode)
+            self._grids[ axes[axis] ] = AxisGrid( start, end, step,
+                                                  n_points, mirrored )
+
+    def __getattr__(self, name):
+        """
+        Return the coordinates (e.g. `x`), the resolution (`dx`), the
+        bounds (`xmin`, `xmax`) of an axis, or `imshow_extent`
+        (Only called when `name` is not a slot of the object.)
+        """
+        if name in FieldMetaInformation.__slots__:
+            # Slot that has not been set yet (e.g. during unpickling)
+            raise AttributeError(name)
+        if name in self._attributes:
+            return self._attributes[name]
+        if name == 'imshow_extent' and len(self.axes) == 2:
+            return self._generate_imshow_extent()
+        for label, grid in self._grids.items():
+            if name == label:
+                if label not in self._coords:
+                    self._coords[label] = grid.points()
+                return self._coords[label]
+            elif name == 'd' + label:
+                return grid.step
+            elif name == label + 'min':
+                return grid.point(0)
+            elif name == label + 'max':
+                return grid.point(len(grid) - 1)
+        raise AttributeError("'FieldMetaInformation' object has "
+                             "no attribute '%s'" % name)
+
+    def __setattr__(self, name, value):
+        if name in FieldMetaInformation.__slots__:
+            object.__setattr__(self, name, value)
+        else:
+            self._attributes[name] = value
+
+    def __delattr__(self, name):
+        if name in FieldMetaInformation.__slots__:
+            object.__delattr__(self, name)
+        elif name in self._attributes:
+            del self._attributes[name]
+        else:
+            raise AttributeError(name)
+
+    def __dir__(self):
+        names = list(object.__dir__(self)) + list(self._attributes)
+        for label in self._grids:
+            names += [label, 'd' + label, label + 'min', label + 'max']
+        if len(self.axes) == 2:
+            names.append('imshow_extent')
+        return sorted(set(names))
+
+    def __getstate__(self):
+        # (The dictionaries are copied, so that a copy of the object
+        # can be cropped without modifying the original object.)
+        return {'axes': dict(self.axes), '_grids': dict(self._grids),
+                '_attributes': dict(self._attributes)}
 
-        self._generate_imshow_extent()
+    def __setstate__(self, state):
+        for name, value in state.items():
+            object.__setattr__(self, name, value)
+        object.__setattr__(self, '_coords', {})
 
 
     def restrict_to_1Daxis(self, axis):
@@ -114,30 +176,47 @@ class FieldMetaInformation(object):
 
     def _generate_imshow_extent(self):
         """
-        Generate the list `imshow_extent`, which can be used directly
+        Generate the array `imshow_extent`, which can be used directly
         as the argument `extent` of matplotlib's `imshow` command
         """
-        if len(self.axes) == 2:
-            self.imshow_extent = []
-            for label in [self.axes[1], self.axes[0]]:
-                coord_min = getattr( self, label+'min' )
-                coord_max = getattr( self, label+'max' )
-                coord_step = getattr( self, 'd'+label )
-                self.imshow_extent += [ coord_min - 0.5*coord_step,
-                                   coord_max + 0.5*coord_step ]
-            self.imshow_extent = np.array(self.imshow_extent)
-        else:
-            if hasattr(self, 'imshow_extent'):
-                delattr(self, 'imshow_extent')
+        imshow_extent = []
+        for label in [self.axes[1], self.axes[0]]:
+            coord_min = getattr( self, label+'min' )
+            coord_max = getattr( self, label+'max' )
+            coord_step = getattr( self, 'd'+label )
+            imshow_extent += [ coord_min - 0.5*coord_step,
+                               coord_max + 0.5*coord_step ]
+        return np.array(imshow_extent)
+
+
+    def _forget_axis(self, axis):
+        """
+        Remove the computed coordinates of `axis`, and the attributes
+        of this axis that were set explicitly
+        """
+        self._coords.pop(axis, None)
+        for name in [axis, 'd' + axis, axis + 'min', axis + 'max']:
+            self._attributes.pop(name, None)
+
+
+    def _restrict_axis(self, axis, i_start, i_stop, i_step=1):
+        """
+        Keep only the grid points with indices i_start <= i < i_stop
+        along the axis `axis` (one every `i_step` points)
+        """
+        self._grids[axis] = self._grids[axis].restrict(
+            slice(i_start, i_stop, i_step))
+        self._forget_axis(axis)
 
 
     def _remove_axis(self, obsolete_axis):
         """
         Remove the axis `obsolete_axis` from the MetaInformation object
         """
-        delattr(self, obsolete_axis)
-        delattr(self, obsolete_axis + 'min')
-        delattr(self, obsolete_axis + 'max')
+        if obsolete_axis not in self._grids:
+            raise AttributeError(obsolete_axis)
+        del self._grids[obsolete_axis]
+        self._forget_axis(obsolete_axis)
         # Rebuild the dictionary `axes`, by including the axis
         # label in the same order, but omitting obsolete_axis
         ndim = len(self.axes)
@@ -145,8 +224,6 @@ class FieldMetaInformation(object):
             self.axes[i] for i in range(ndim) \
             if self.axes[i] != obsolete_axis ]))
 
-        self._generate_imshow_extent()
-
 
     def _convert_cylindrical_to_3Dcartesian(self):
         """
@@ -159,23 +236,83 @@ class FieldMetaInformation(object):
             raise ValueError('_convert_cylindrical_to_3Dcartesian'
                 ' can only be applied to a timeseries in thetaMode geometry')
 
-        # Create x and y arrays
-        self.x = self.r.copy()
-        self.y = self.r.copy()
-        del self.r
-
-        # Create dx and dy
-        self.dx = self.dr
-        self.dy = self.dr
-        del self.dr
-
-        # Create xmin, xmax, ymin, ymax
-        self.xmin = self.rmin
-        self.ymin = self.rmin
-        del self.rmin
-        self.xmax = self.rmax
-        self.ymax = self.rmax
-        del self.rmax
+        # The x and y axes have the same grid as r
+        grid = self._grids.pop('r')
+        self._forget_axis('r')
+        self._grids['x'] = grid
+        self._grids['y'] = grid
 
         # Change axes
         self.axes = {0:'x', 1:'y', 2:'z'}
+
+
+class AxisGrid(object):
+    """
+    Regularly-spaced grid points along one axis of a FieldMetaInformation
+
+    The points are those of `np.linspace(start, end, n_points)` (mirrored
+    below the axis, i.e. preceded by their opposites in reverse order,
+    if `mirrored` is True), restricted to the indices in `indices`.
+    """
+    __slots__ = ['start', 'end', 'step', 'n_points', 'mirrored', 'indices']
+
+    def __init__(self, start, end, step, n_points, mirrored=False,
+                 indices=None):
+        self.start = start
+        self.end = end
+        self.step = step
+        self.n_points = n_points
+        self.mirrored = mirrored
+        if indices is None:
+            indices = range( 2*n_points if mirrored else n_points )
+        self.indices = indices
+
+    def __len__(self):
+        return len(self.indices)
+
+    def _linspace_point(self, i):
+        """
+        Return the point i of np.linspace(start, end, n_points)
+        (computed in the same way as numpy, so that it is identical)
+        """
+        if i == self.n_points - 1 and i > 0:
+            return self.end
+        elif self.n_points == 1:
+            return self.start
+        return i * ((self.end - self.start) / (self.n_points - 1)) \
+            + self.start
+
+    def point(self, i):
+        """
+        Return the coordinate of the grid point i
+        """
+        j = self.indices[i]
+        if self.mirrored:
+            if j < self.n_points:
+                return -self._linspace_point( self.n_points - 1 - j )
+            j -= self.n_points
+        return self._linspace_point(j)
+
+    def points(self):
+        """
+        Return the array of the coordinates of the grid points
+        """
+        points = np.linspace( self.start, self.end, self.n_points,
+                              endpoint=True )
+        if self.mirrored:
+            points = np.concatenate( (-points[::-1], points) )
+        indices = self.indices
+        if indices == range(len(points)):
+            return points
+        stop = indices.stop if indices.stop >= 0 else None
+        return points[ indices.start:stop:indices.step ]
+
+    def restrict(self, index):
+        """
+        Return the grid restricted to the points `index` (slice)
+        """
+        indices = self.indices[index]
+        step = self.step * index.step if index.step is not None \
+            else self.step
+        return AxisGrid( self.start, self.end, step, self.n_points,
+                         self.mirrored, indices )
@@ -0,0 +1,322 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines the FieldPyramid class, which stores block-averaged
+(i.e. downsampled) versions of the fields in a sidecar HDF5 file,
+so that `get_field` can read a coarse level instead of the full
+resolution data when the result is only used for plotting.
+
+Copyright 2024, openPMD-viewer contributors
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+from .field_metainfo import FieldMetaInformation
+
+
+def block_average( F, factors ):
+    """
+    Average the array `F` over blocks of `factors[i]` points along
+    each axis `i`. Trailing points that do not fill a complete block
+    are discarded.
+
+    Parameters
+    ----------
+    F: ndarray
+        The array to be downsampled
+
+    factors: list of int
+        The number of points that are averaged along each axis
+
+    Returns
+    -------
+    An ndarray of shape `F.shape[i] // factors[i]`
+    """
+    # Trim the points that do not fill a complete block
+    trimmed = tuple( slice(0, (n // f) * f) for n, f in zip(F.shape, factors) )
+    F = F[trimmed]
+    # Split each axis into (blocks, points per block) and average
+    split_shape = []
+    for n, f in zip(F.shape, factors):
+        split_shape += [ n // f, f ]
+    averaged_axes = tuple( range(1, 2 * F.ndim, 2) )
+    return F.reshape(split_shape).mean(axis=averaged_axes)
+
+
+def build_pyramid_levels( F, min_size=64 ):
+    """
+    Build successive levels of a field pyramid, by halving the
+    resolution along every axis that has more than `min_size` points.
+
+    Parameters
+    ----------
+    F: ndarray
+        The full-resolution field
+
+    min_size: int, optional
+        Axes that have `min_size` points or less are not downsampled further
+
+    Returns
+    -------
+    A list of tuples (factors, level) where `factors` contains the
+    cumulated downsampling factor along each axis (with respect to `F`)
+    """
+    levels = []
+    factors = np.ones( F.ndim, dtype=int )
+    level = F
+    while any( n > min_size for n in level.shape ):
+        step = [ 2 if n > min_size else 1 for n in level.shape ]
+        level = block_average( level, step )
+        factors = factors * np.array( step )
+        levels.append( (factors.copy(), level) )
+    return levels
+
+
+def downsampling_factors( shape, axes, max_resolution ):
+    """
+    Return, for each axis, the smallest integer factor that leaves
+    at most `max_resolution` points along this axis (i.e. the number of
+    points divided by `max_resolution`, rounded up)
+
+    Parameters
+    ----------
+    shape: tuple of int
+        The shape of the full-resolution array
+
+    axes: dict
+        The labels of the axes of the array (e.g. {0:'x', 1:'z'})
+
+    max_resolution: int or dict
+        Either a maximum number of points along every axis, or a
+        dictionary with the maximum number of points for some axes
+        (e.g. {'x': 400, 'z': 800}; axes that are not in the dictionary
+        are not downsampled)
+
+    Returns
+    -------
+    A list of int (one per axis)
+    """
+    factors = []
+    for i_axis, n in enumerate(shape):
+        if isinstance( max_resolution, dict ):
+            n_max = max_resolution.get( axes[i_axis], None )
+        else:
+            n_max = max_resolution
+        if n_max is None or n <= n_max:
+            factors.append( 1 )
+        else:
+            factors.append( -( -n // int(n_max) ) )
+    return factors
+
+
+def downsample_field( F, info, max_resolution ):
+    """
+    Block-average the field `F` (in memory) so that it has at most
+    `max_resolution` points along each axis, and return
+    the corresponding FieldMetaInformation
+
+    Parameters
+    ----------
+    F: ndarray
+        The field array
+
+    info: a FieldMetaInformation object
+        The meta-information of `F`
+
+    max_resolution: int or dict
+        See the docstring of `downsampling_factors`
+
+    Returns
+    -------
+    A tuple with the downsampled array and its FieldMetaInformation
+    """
+    factors = downsampling_factors( F.shape, info.axes, max_resolution )
+    if all( f == 1 for f in factors ):
+        return F, info
+    F = block_average( F, factors )
+    # Build the grid of the block centers
+    spacing = []
+    offset = []
+    for i_axis in range(F.ndim):
+        label = info.axes[i_axis]
+        step = getattr( info, 'd' + label )
+        spacing.append( factors[i_axis] * step )
+        offset.append( getattr( info, label + 'min' )
+                       + 0.5 * (factors[i_axis] - 1) * step )
+    new_info = FieldMetaInformation( dict(info.axes), F.shape, spacing,
+                offset, 1., [0.] * F.ndim )
+    return F, new_info
+
+
+class FieldPyramid( object ):
+    """
+    Sidecar HDF5 file that contains block-averaged levels of the fields
+    of a timeseries, for fast interactive visualization.
+
+    The layout of the file is:
+    /<iteration>/<field_label>/level_<k>
+    where `field_label` is e.g. 'rho' or 'Ex', and where each level
+    has an attribute `factors` (the downsampling factor along each axis).
+    The grid metadata of the full-resolution field are stored as
+    attributes of the group /<iteration>/<field_label>.
+    """
+
+    def __init__( self, filename ):
+        """
+        Initialize a FieldPyramid object
+
+        Parameters
+        ----------
+        filename: string
+            The path to the sidecar HDF5 file (created if it does not exist)
+        """
+        self.filename = filename
+
+    def _open( self, mode='r' ):
+        try:
+            import h5py
+        except ImportError:
+            raise ImportError('Field pyramids require `h5py`.\n'
+                'Please install it, e.g. with `pip install h5py`.')
+        return h5py.File( self.filename, mode )
+
+    def write( self, iteration, field_label, F, axis_labels, grid_spacing,
+               global_offset, grid_unitSI, position, min_size=64 ):
+        """
+        Compute the levels of the field `F` and store them in the file
+
+        Parameters
+        ----------
+        iteration: int
+            The iteration of the field
+
+        field_label: string
+            The name of the field component (e.g. 'rho', 'Ex')
+
+        F: ndarray
+            The full-resolution field
+
+        axis_labels, grid_spacing, global_offset, grid_unitSI, position:
+            The grid metadata, as defined in the openPMD standard
+
+        min_size: int, optional
+            Axes that have `min_size` points or less are not downsampled
+        """
+        levels = build_pyramid_levels( F, min_size )
+        with self._open('a') as f:
+            path = '%d/%s' % (iteration, field_label)
+            if path in f:
+                del f[path]
+            group = f.create_group( path )
+            group.attrs['shape'] = F.shape
+            group.attrs['axis_labels'] = [ str(a) for a in axis_labels ]
+            group.attrs['grid_spacing'] = grid_spacing
+            group.attrs['global_offset'] = global_offset
+            group.attrs['grid_unitSI'] = grid_unitSI
+            group.attrs['position'] = position
+            for k, (factors, level) in enumerate(levels):
+                dset = group.create_dataset( 'level_%d' % k, data=level )
+                dset.attrs['factors'] = factors
+
+    def has_field( self, iteration, field_label ):
+        """
+        Return whether the file contains levels for this field
+        """
+        try:
+            with self._open() as f:
+                return '%d/%s' % (iteration, field_label) in f
+        except (OSError, IOError):
+            return False
+
+    def read( self, iteration, field_label, max_resolution,
+              slice_across=None, slice_relative_position=None ):
+        """
+        Read the coarsest level whose downsampling factors divide the
+        factors required by `max_resolution`, along the axes of the
+        returned array. Block-averaging this level with the remaining
+        factors (as done by `get_field`, see `downsample_field`) thus
+        gives the same result as downsampling the full-resolution field.
+
+        Parameters
+        ----------
+        iteration: int
+            The iteration of the field
+
+        field_label: string
+            The name of the field component (e.g. 'rho', 'Ex')
+
+        max_resolution: int or dict
+            See the docstring of `downsampling_factors`
+
+        slice_across, slice_relative_position: lists or None
+            See the docstring of `get_field`
+
+        Returns
+        -------
+        A tuple with
+           F : a ndarray containing the requested (downsampled) field
+           info : a FieldMetaInformation object
+        """
+        with self._open() as f:
+            group = f[ '%d/%s' % (iteration, field_label) ]
+            full_shape = tuple( group.attrs['shape'] )
+            axis_labels = [ str(a) for a in group.attrs['axis_labels'] ]
+            axes = { i: axis_labels[i] for i in range(len(axis_labels)) }
+            # Only the axes that remain after slicing are downsampled
+            if slice_across is None:
+                kept_axes = list( range(len(axis_labels)) )
+            else:
+                kept_axes = [ i for i in range(len(axis_labels))
+                              if axis_labels[i] not in slice_across ]
+            target = downsampling_factors( full_shape, axes, max_resolution )
+
+            # Pick the coarsest level whose factors divide the target
+            # factors along the kept axes, and which is not downsampled
+            # along the sliced axes (the full-resolution data is
+            # identified by the level name None)
+            best_name = None
+            best_reduction = 1
+            for name, dset in group.items():
+                factors = dset.attrs['factors']
+                if all( target[i] % factors[i] == 0 if i in kept_axes
+                        else factors[i] == 1
+                        for i in range(len(axis_labels)) ):
+                    reduction = np.prod( [factors[i] for i in kept_axes] )
+                    if reduction > best_reduction:
+                        best_name = name
+                        best_reduction = reduction
+            if best_name is None:
+                return None
+
+            dset = group[best_name]
+            factors = dset.attrs['factors']
+            shape = list( dset.shape )
+            grid_spacing = [ s * fac for s, fac in
+                             zip(group.attrs['grid_spacing'], factors) ]
+            global_offset = list( group.attrs['global_offset'] )
+            position = [ (p + 0.5 * (fac - 1)) / fac for p, fac in
+                         zip(group.attrs['position'], factors) ]
+            grid_unitSI = group.attrs['grid_unitSI']
+
+            if slice_across is None:
+                F = dset[...]
+            else:
+                index = [ slice(None) ] * len(shape)
+                for count, slice_across_item in enumerate(slice_across):
+                    slicing_index = axis_labels.index( slice_across_item )
+                    n_cells = shape[ slicing_index ]
+                    # Index of the slice (prevent stepping out of the array)
+                    i_cell = int( 0.5 * (slice_relative_position[count] + 1.)
+                                  * n_cells )
+                    i_cell = max( i_cell, 0 )
+                    i_cell = min( i_cell, n_cells - 1)
+                    index[ slicing_index ] = i_cell
+                F = dset[ tuple(index) ]
+                shape = [ shape[i] for i in kept_axes ]
+                grid_spacing = [ grid_spacing[i] for i in kept_axes ]
+                global_offset = [ global_offset[i] for i in kept_axes ]
+                position = [ position[i] for i in kept_axes ]
+                axes = { j: axis_labels[i] for j, i in enumerate(kept_axes) }
+
+        info = FieldMetaInformation( axes, shape, grid_spacing, global_offset,
+                                     grid_unitSI, position )
+        return F, info
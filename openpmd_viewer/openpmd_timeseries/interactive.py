@@ -9,16 +9,37 @@ Authors: Remi Lehe, Axel Huebl
 License: 3-Clause-BSD-LBNL
 """
 import math
+import asyncio
+import importlib.util
 from functools import partial
-try:
-    from ipywidgets import widgets, __version__
-    ipywidgets_version = int(__version__[0])
-    from IPython.core.display import display, clear_output
-    import matplotlib
-    import matplotlib.pyplot as plt
-    dependencies_installed = True
-except ImportError:
-    dependencies_installed = False
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from .prefetch import IterationPrefetcher, open_reader
+# The dependencies are only imported when the slider is created
+# (see `import_dependencies`), since they are slow to import
+dependencies_installed = all(
+    importlib.util.find_spec(package) is not None
+    for package in ['ipywidgets', 'IPython', 'matplotlib'] )
+widgets = None
+ipywidgets_version = None
+display = None
+clear_output = None
+matplotlib = None
+plt = None
+
+
+def import_dependencies():
+    """
+    Import ipywidgets, IPython and matplotlib, if this was not done yet
+    """
+    global widgets, ipywidgets_version, display, clear_output, \
+        matplotlib, plt
+    if widgets is None:
+        from ipywidgets import widgets, __version__
+        ipywidgets_version = int(__version__[0])
+        from IPython.core.display import display, clear_output
+        import matplotlib
+        import matplotlib.pyplot as plt
 
 
 class InteractiveViewer(object):
@@ -27,7 +48,8 @@ class InteractiveViewer(object):
         pass
 
     def slider(self, figsize=(6, 5), fields_figure=0, particles_figure=1,
-               exclude_particle_records=['charge', 'mass'], **kw):
+               exclude_particle_records=['charge', 'mass'], prefetch=True,
+               prefetch_cache_size='1GB', asynchronous=True, **kw):
         """
         Navigate the simulation using a slider
 
@@ -45,6 +67,21 @@ class InteractiveViewer(object):
             List of particle quantities that should not be displayed
             in the slider (typically because they are less interesting)
 
+        prefetch: bool
+            Whether to read the fields and particles of the adjacent
+            iterations in the background (see IterationPrefetcher), so
+            that stepping through the iterations shows them immediately
+
+        prefetch_cache_size: int or string
+            The capacity of the cache of the prefetched data
+            (in bytes, or as a string such as '1GB')
+
+        asynchronous: bool
+            Whether to read the data outside of the widget callbacks
+            (see LatestRequestExecutor): the notebook stays responsive
+            while reading, and only the latest state of the widgets
+            is plotted, e.g. when dragging the iteration slider
+
         kw: dict
             Extra arguments to pass to matplotlib's imshow (e.g. cmap, etc.).
             This will be applied both to the particle plots and field plots.
@@ -55,6 +92,26 @@ class InteractiveViewer(object):
         if not dependencies_installed:
             raise RuntimeError("Failed to load the openPMD-viewer slider.\n"
                 "(Make sure that ipywidgets and matplotlib are installed.)")
+        import_dependencies()
+
+        # The iteration of each read is determined by the callbacks, and
+        # the reads of the worker thread (see below) use a series of their
+        # own: they do not change the iteration that is viewed, which the
+        # callbacks of the buttons read and modify
+        reader = open_reader(self) if asynchronous else self
+        # Read the adjacent iterations in the background
+        if getattr(self, '_prefetcher', None) is not None:
+            self._prefetcher.stop()
+        self._prefetcher = None
+        if prefetch:
+            self._prefetcher = IterationPrefetcher(self, prefetch_cache_size,
+                                                   reader=reader)
+        prefetcher = self._prefetcher
+        # Read the data requested by the widgets on a worker thread
+        if getattr(self, '_refresher', None) is not None:
+            self._refresher.shutdown()
+        self._refresher = LatestRequestExecutor(asynchronous)
+        refresher = self._refresher
 
         # -----------------------
         # Define useful functions
@@ -82,25 +139,6 @@ class InteractiveViewer(object):
                     do_refresh = True
             # Do the refresh
             if do_refresh:
-                plt.figure(fld_figure_button.value, figsize=figsize)
-                plt.clf()
-
-                # When working in inline mode, in an ipython notebook,
-                # clear the output (prevents the images from stacking
-                # in the notebook)
-                if 'inline' in matplotlib.get_backend():
-                    if ipywidgets_version < 7:
-                        clear_output()
-                    else:
-                        import warnings
-                        warnings.warn(
-                        "\n\nIt seems that you are using ipywidgets 7 and "
-                        "`%matplotlib inline`. \nThis can cause issues when "
-                        "using `slider`.\nIn order to avoid this, you "
-                        "can either:\n- use `%matplotlib notebook`\n- or "
-                        "downgrade to ipywidgets 6 (with `pip` or `conda`).",
-                        UserWarning)
-
                 # Handle plotting options
                 kw_fld = kw.copy()
                 vmin, vmax = fld_color_button.get_range()
@@ -117,14 +155,56 @@ class InteractiveViewer(object):
                 else:
                     slice_across = slice_across_button.value
 
-                # Call the method get_field
-                self.get_field( iteration=self.current_iteration, plot=True,
-                    field=fieldtype_button.value, coord=coord_button.value,
+                # Arguments of the method get_field
+                field_kw = dict( field=fieldtype_button.value,
+                    coord=coord_button.value,
                     m=convert_to_int(mode_button.value),
                     slice_relative_position=slicing_button.value,
                     theta=theta_button.value,
-                    slice_across=slice_across,
-                    plot_range=plot_range, **kw_fld )
+                    slice_across=slice_across )
+                iteration = self.current_iteration
+                current_i = self._current_i
+
+                def read():
+                    "Read the field (on the worker thread of `refresher`)"
+                    if prefetcher is None:
+                        reader.memory_budget = self.memory_budget
+                        return reader.get_field( iteration=iteration,
+                                                 **field_kw )
+                    return prefetcher.get( 'field', iteration, **field_kw )
+
+                def draw( result ):
+                    "Plot the field (only for the latest request)"
+                    plt.figure(fld_figure_button.value, figsize=figsize)
+                    # Update the previous plot in place, except in inline
+                    # mode, where the figure is redrawn
+                    update = 'inline' not in matplotlib.get_backend()
+                    if not update:
+                        plt.clf()
+
+                    # When working in inline mode, in an ipython notebook,
+                    # clear the output (prevents the images from stacking
+                    # in the notebook)
+                    if 'inline' in matplotlib.get_backend():
+                        if ipywidgets_version < 7:
+                            clear_output()
+                        else:
+                            import warnings
+                            warnings.warn(
+                            "\n\nIt seems that you are using ipywidgets 7 and "
+                            "`%matplotlib inline`. \nThis can cause issues when "
+                            "using `slider`.\nIn order to avoid this, you "
+                            "can either:\n- use `%matplotlib notebook`\n- or "
+                            "downgrade to ipywidgets 6 (with `pip` or `conda`).",
+                            UserWarning)
+
+                    F, info = result
+                    self._current_i = current_i
+                    self._plot_field( F, info, field_kw['field'],
+                        field_kw['coord'], slice_across, field_kw['m'],
+                        plot_range, update=update, **kw_fld )
+
+                refresher.submit( 'field', read, draw )
 
         def refresh_ptcl(change=None, force=False):
             """
@@ -148,15 +228,6 @@ class InteractiveViewer(object):
                     do_refresh = True
             # Do the refresh
             if do_refresh:
-                plt.figure(ptcl_figure_button.value, figsize=figsize)
-                plt.clf()
-
-                # When working in inline mode, in an ipython notebook,
-                # clear the output (prevents the images from stacking
-                # in the notebook)
-                if 'inline' in matplotlib.get_backend():
-                    clear_output()
-
                 # Handle plotting options
                 kw_ptcl = kw.copy()
                 vmin, vmax = ptcl_color_button.get_range()
@@ -169,23 +240,53 @@ class InteractiveViewer(object):
 
                 if ptcl_yaxis_button.value == 'None':
                     # 1D histogram
-                    self.get_particle( iteration=self.current_iteration,
-                        var_list=[ptcl_xaxis_button.value],
-                        select=ptcl_select_widget.to_dict(),
-                        species=ptcl_species_button.value, plot=True,
-                        nbins=ptcl_bins_button.value,
-                        plot_range=plot_range,
-                        use_field_mesh=ptcl_use_field_button.value, **kw_ptcl )
+                    var_list = [ptcl_xaxis_button.value]
                 else:
                     # 2D histogram
-                    self.get_particle( iteration=self.current_iteration,
-                        var_list=[ptcl_xaxis_button.value,
-                            ptcl_yaxis_button.value],
-                        select=ptcl_select_widget.to_dict(),
-                        species=ptcl_species_button.value, plot=True,
-                        nbins=ptcl_bins_button.value,
-                        plot_range=plot_range,
-                        use_field_mesh=ptcl_use_field_button.value, **kw_ptcl )
+                    var_list = [ptcl_xaxis_button.value,
+                                ptcl_yaxis_button.value]
+                species = ptcl_species_button.value
+                # Read the weights along with the plotted quantities
+                with_weights = 'w' in self.avail_record_components[species]
+                ptcl_kw = dict( species=species,
+                    var_list=var_list + ['w'] * with_weights,
+                    select=ptcl_select_widget.to_dict() )
+                nbins = ptcl_bins_button.value
+                use_field_mesh = ptcl_use_field_button.value
+                iteration = self.current_iteration
+                current_i = self._current_i
+
+                def read():
+                    "Read the particles (on the worker thread of `refresher`)"
+                    if prefetcher is None:
+                        reader.memory_budget = self.memory_budget
+                        return reader.get_particle( iteration=iteration,
+                                                    **ptcl_kw )
+                    return prefetcher.get( 'particle', iteration, **ptcl_kw )
+
+                def draw( data_list ):
+                    "Plot the particles (only for the latest request)"
+                    plt.figure(ptcl_figure_button.value, figsize=figsize)
+                    update = 'inline' not in matplotlib.get_backend()
+                    if not update:
+                        plt.clf()
+
+                    # When working in inline mode, in an ipython notebook,
+                    # clear the output (prevents the images from stacking
+                    # in the notebook)
+                    if 'inline' in matplotlib.get_backend():
+                        clear_output()
+
+                    if with_weights:
+                        w = data_list[-1]
+                    else:
+                        w = np.ones_like( data_list[0] )
+                    self._current_i = current_i
+                    self._plot_particles( data_list[:len(var_list)], w,
+                        var_list, species, iteration, nbins, plot_range,
+                        use_field_mesh, 'cic', update=update, **kw_ptcl )
+
+                refresher.submit( 'particle', read, draw )
 
         def refresh_field_type(change):
             """
@@ -544,6 +645,77 @@ class InteractiveViewer(object):
             plt.ion()
 
 
+class LatestRequestExecutor(object):
+    """
+    Run the reads requested by the widgets of the slider on a worker
+    thread, and plot their results in the event loop of the notebook.
+
+    The requests are grouped by kind (e.g. 'field' and 'particle'): a new
+    request supersedes the previous one of the same kind, which is
+    cancelled if it has not started yet, and whose result is dropped
+    otherwise. Only the result of the latest request is plotted.
+    When no event loop is running (or with `asynchronous=False`),
+    the requests are run synchronously.
+    """
+
+    def __init__(self, asynchronous=True):
+        self.asynchronous = asynchronous
+        # A single thread, since the reads share the same file handles
+        self._executor = ThreadPoolExecutor(max_workers=1)
+        self._generation = {}
+        self._futures = {}
+
+    def submit(self, kind, read, draw):
+        """
+        Call `read()` on the worker thread, then `draw(result)`
+        if no request of the same kind was submitted in the meantime
+        """
+        generation = self._generation.get(kind, 0) + 1
+        self._generation[kind] = generation
+        previous_future = self._futures.pop(kind, None)
+        if previous_future is not None:
+            previous_future.cancel()
+
+        loop = None
+        if self.asynchronous:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                pass
+        if loop is None:
+            draw(read())
+            return
+
+        future = self._executor.submit(read)
+        self._futures[kind] = future
+
+        def done(future):
+            if not future.cancelled():
+                loop.call_soon_threadsafe(
+                    self._finish, kind, generation, future, draw)
+        future.add_done_callback(done)
+
+    def _finish(self, kind, generation, future, draw):
+        """
+        Plot the result of `future` (in the event loop), unless the
+        request is stale
+        """
+        if self._generation[kind] != generation:
+            return
+        self._futures.pop(kind, None)
+        # (Errors of the read are raised here)
+        draw(future.result())
+
+    def shutdown(self):
+        """
+        Cancel the pending requests and stop the worker thread
+        """
+        for future in self._futures.values():
+            future.cancel()
+        self._futures = {}
+        self._executor.shutdown(wait=False)
+
+
 def convert_to_int(m):
     """
     Convert the string m to an int, except if m is 'all' or None
@@ -7,19 +7,24 @@ Copyright 2015-2016, openPMD-viewer contributors
 Authors: Remi Lehe, Axel Huebl
 License: 3-Clause-BSD-LBNL
 """
-import time
-import geosindex
+import copy
 import numpy as np
-import pandas as pd
-from scipy import constants
-from tqdm import tqdm
+# geosindex, pandas, scipy and tqdm are imported by the code paths that
+# use them (e.g. `geos_index=True`), so that importing openpmd_viewer
+# stays fast and does not require geosindex
 
 from .data_reader import DataReader, available_backends
 from .interactive import InteractiveViewer
 from .particle_tracker import ParticleTracker
 from .plotter import Plotter
+from .profiler import profiled_query, span, count, allocated, released, \
+    annotate
+from .field_pyramid import FieldPyramid, downsample_field
+from .particle_raster import ParticleRaster, default_batch_size
+from .cache import LRUCache
 from .utilities import apply_selection, fit_bins_to_grid, try_array, \
-    sanitize_slicing, combine_cylindrical_components
+    sanitize_slicing, combine_cylindrical_components, \
+    crop_field_to_region, parse_memory_size, save_iteration_result
 
 # Define a custom Exception
 class OpenPMDException(Exception):
@@ -34,6 +39,8 @@ class OpenPMDTimeSeries(InteractiveViewer):
     For more details, see the docstring of the following methods:
     - get_field
     - get_particle
+    - get_particle_iterations
+    - render_particles
     - slider
     """
 
@@ -43,7 +50,15 @@ class OpenPMDTimeSeries(InteractiveViewer):
                     geos_index_storage_backend = "file", 
                     geos_index_save_path=None,
                     geos_index_secondary_type = "none",
-                    key_generation_function=None):
+                    key_generation_function=None,
+                    field_pyramid=None,
+                    profile=False,
+                    memory_budget=None,
+                    result_cache_size=0,
+                    streaming=False,
+                    stream_options=None,
+                    memory_map=False,
+                    dtype=None):
         """
         Initialize an openPMD time series
 
@@ -65,6 +80,77 @@ class OpenPMDTimeSeries(InteractiveViewer):
             Backend to be used for data reading. Can be `openpmd-api`
             or `h5py`. If not provided will use `openpmd-api` if available
             and `h5py` otherwise.
+
+        field_pyramid: string, optional
+            Path to a sidecar HDF5 file that contains downsampled
+            versions of the fields (see `build_field_pyramid`).
+            When provided, `get_field(..., max_resolution=...)` reads
+            the coarsest suitable level from this file.
+
+        profile: bool, optional
+            Whether to record the timings of the phases (index query, read,
+            select, ...) and the amount of data read by `get_particle` and
+            `get_field`. The profile of the last call is then available as
+            `last_query_profile` (see the QueryProfile class). This can also
+            be switched on and off later, through the attribute `profile`.
+
+        memory_budget: int or string, optional
+            The maximal amount of memory (in bytes, or as a string such as
+            '64GB') that `get_particle` may use. When reading all the
+            particles at once would exceed it, the particles are read and
+            selected in batches of contiguous ranges; if this is not
+            possible (no selection, or a selected output that does not
+            fit in the budget), an OpenPMDException is raised instead of
+            running out of memory. This can also be changed later, through
+            the attribute `memory_budget`.
+
+        result_cache_size: int or string, optional
+            The capacity (in bytes, or as a string such as '2GB') of the
+            cache of the results of `get_particle`. Each selected particle
+            quantity is cached separately, so that calls with overlapping
+            `var_list` (and the same iteration, species and selection)
+            share the cached quantities. By default (0), no result is
+            cached. See also `clear_result_cache`.
+
+        streaming: bool, optional
+            Whether to read the series linearly, while it is produced (e.g.
+            by a running simulation), instead of a finished series. This
+            requires the `openpmd-api` backend. `path_to_dir` can then also
+            be the name of an ADIOS2 stream (e.g. 'diags/simData.sst' for
+            SST, or 'diags/simData.bp' for a BP file that is being
+            written). The iterations are then read with `iterate` or
+            `stream_iterations`, as they become available.
+
+        stream_options: dict or string, optional
+            (Only used when `streaming` is True)
+            The JSON options of the openpmd-api Series, e.g.
+            {'adios2': {'engine': {'parameters': {'OpenTimeoutSecs': '60'}}}}
+            to set how long the reader waits for the writer.
+
+        memory_map: bool, optional
+            (Only for the `h5py` backend)
+            Whether `get_field` returns a read-only view of the memory-mapped
+            file, instead of reading the data, when the field is stored
+            contiguously (i.e. neither chunked nor compressed) in a cartesian
+            geometry. Only the pages of the file that are accessed (e.g. the
+            slice that is plotted) are then read, and they are kept in the
+            page cache of the operating system between calls. The type
+            conversion and the scaling by `unitSI`, if any, are applied
+            to the requested slice only (which is then a copy).
+
+        dtype: string, optional
+            The floating-point type of the arrays returned by `get_particle`
+            and `get_field`: 'float32', 'float64', or 'native' (the type in
+            which the data is stored). By default (None), the particle data
+            is returned as float64, and the fields in the type in which
+            they are stored (float64 for the reconstructed thetaMode fields).
+            For data stored as float32, 'native' or 'float32' halve the
+            memory used. The selection of the particles (`select`) is
+            always evaluated in double precision. This can also be changed
+            later, through the attribute `dtype` (which is also used by
+            `get_particle_iterations` and `render_particles`), or for one
+            call with the argument `dtype` of `get_particle`, `get_field`
+            and `iterate`.
         """
         # Check backend
         if backend is None:
@@ -73,9 +159,41 @@ class OpenPMDTimeSeries(InteractiveViewer):
             raise RuntimeError("Invalid backend requested: {0}\n"
                     "The available backends are: {1}"
                     .format(backend, available_backends) )
+        if memory_map and backend != 'h5py':
+            raise RuntimeError("`memory_map` requires the h5py backend.")
         self.backend = backend
+        # (The arguments are kept to open the same series again, e.g. on
+        # the worker thread of the IterationPrefetcher)
+        self._init_kwargs = dict( path_to_dir=path_to_dir,
+            check_all_files=check_all_files, backend=backend,
+            geos_index=geos_index, geos_index_type=geos_index_type,
+            geos_index_storage_backend=geos_index_storage_backend,
+            geos_index_save_path=geos_index_save_path,
+            geos_index_secondary_type=geos_index_secondary_type,
+            key_generation_function=key_generation_function,
+            field_pyramid=field_pyramid, profile=profile,
+            memory_budget=memory_budget,
+            result_cache_size=result_cache_size, streaming=streaming,
+            stream_options=stream_options, memory_map=memory_map,
+            dtype=dtype )
+        self._get_output_type( dtype )
+        self.dtype = dtype
+        self.path_to_dir = path_to_dir
+        self.profile = profile
+        self.last_query_profile = None
+        self.memory_budget = memory_budget
+        self.result_cache = None
+        if result_cache_size:
+            self.result_cache = LRUCache(
+                parse_memory_size( result_cache_size ) )
         self.geos_index = geos_index
         if self.geos_index:
+            try:
+                import geosindex
+            except ImportError as e:
+                raise OpenPMDException( 'The geos index requires the '
+                    '`geosindex` package, which could not be imported '
+                    '(%s).' % e )
             self.geos_index_type = geos_index_type
             self.geos_index_storage_backend = geos_index_storage_backend
             self.geos_index_secondary_type = geos_index_secondary_type
@@ -91,57 +209,70 @@ class OpenPMDTimeSeries(InteractiveViewer):
                 self.key_generation_function = lambda iteration, species, type, dimension=None: f"/data/{iteration}/particles/{species}/{type}/" + (f"{dimension}" if dimension else "")
 
         # Initialize data reader
-        self.data_reader = DataReader(backend)
-
-        # Extract the iterations available in this timeseries
-        self.iterations = self.data_reader.list_iterations(path_to_dir)
-
-        # Check that there are files in this directory
-        if len(self.iterations) == 0:
-            print("Error: Found no valid files in the specified directory.\n"
-                  "Please check that this is the path to the openPMD files.")
-            return(None)
-
-        # Go through the files of the series, extract the time
-        # and a few parameters.
-        N_iterations = len(self.iterations)
-        self.t = np.zeros(N_iterations)
-
-        # - Extract parameters from the first file
-        t, params0 = self.data_reader.read_openPMD_params(self.iterations[0])
-        self.t[0] = t
-        self.extensions = params0['extensions']
-        self.avail_fields = params0['avail_fields']
-        if self.avail_fields is not None:
-            self.fields_metadata = params0['fields_metadata']
-            self.avail_geom = set( self.fields_metadata[field]['geometry']
-                                for field in self.avail_fields )
-        # Extract information of the particles
-        self.avail_species = params0['avail_species']
-        self.avail_record_components = \
-            params0['avail_record_components']
-
-        # - Extract the time for each file and, if requested, check
-        #   that the other files have the same parameters
-        for k in range(1, N_iterations):
-            t, params = self.data_reader.read_openPMD_params(
-                self.iterations[k], check_all_files)
-            self.t[k] = t
-            if check_all_files:
-                for key in params0.keys():
-                    if params != params0:
-                        print("Warning: File %s has different openPMD "
-                              "parameters than the rest of the time series."
-                              % self.iterations[k])
-                        break
-
-        # - Set the current iteration and time
-        self._current_i = 0
-        self.current_iteration = self.iterations[0]
-        self.current_t = self.t[0]
-        # - Find the min and the max of the time
-        self.tmin = self.t.min()
-        self.tmax = self.t.max()
+        self.data_reader = DataReader(backend, memory_map=memory_map)
+
+        # Register the (optional) precomputed field pyramid
+        self.field_pyramid = None
+        if field_pyramid is not None:
+            self.field_pyramid = FieldPyramid( field_pyramid )
+
+        self.streaming = streaming
+        if streaming:
+            # The iterations (and the openPMD parameters) are registered
+            # as they are read (see `stream_iterations`)
+            self.data_reader.open_stream( path_to_dir, stream_options )
+            self.iterations = np.zeros( 0, dtype=np.int64 )
+            self.t = np.zeros( 0 )
+            self.extensions = None
+            self.avail_fields = None
+            self.avail_species = None
+            self.avail_record_components = None
+            self._current_i = 0
+            self.current_iteration = None
+            self.current_t = None
+            self.tmin = None
+            self.tmax = None
+        else:
+            # Extract the iterations available in this timeseries
+            self.iterations = self.data_reader.list_iterations(path_to_dir)
+
+            # Check that there are files in this directory
+            if len(self.iterations) == 0:
+                print("Error: Found no valid files in the specified directory.\n"
+                      "Please check that this is the path to the openPMD files.")
+                return(None)
+
+            # Go through the files of the series, extract the time
+            # and a few parameters.
+            N_iterations = len(self.iterations)
+            self.t = np.zeros(N_iterations)
+
+            # - Extract parameters from the first file
+            t, params0 = self.data_reader.read_openPMD_params(self.iterations[0])
+            self.t[0] = t
+            self._set_openPMD_params( params0 )
+
+            # - Extract the time for each file and, if requested, check
+            #   that the other files have the same parameters
+            for k in range(1, N_iterations):
+                t, params = self.data_reader.read_openPMD_params(
+                    self.iterations[k], check_all_files)
+                self.t[k] = t
+                if check_all_files:
+                    for key in params0.keys():
+                        if params != params0:
+                            print("Warning: File %s has different openPMD "
+                                  "parameters than the rest of the time series."
+                                  % self.iterations[k])
+                            break
+
+            # - Set the current iteration and time
+            self._current_i = 0
+            self.current_iteration = self.iterations[0]
+            self.current_t = self.t[0]
+            # - Find the min and the max of the time
+            self.tmin = self.t.min()
+            self.tmax = self.t.max()
 
         # - Initialize a plotter object, which holds information about the time
         self.plotter = Plotter(self.t, self.iterations)
@@ -159,6 +290,346 @@ class OpenPMDTimeSeries(InteractiveViewer):
             self.b = 6.2*10e-4
 
 
+    def _set_openPMD_params( self, params ):
+        """
+        Register the openPMD parameters of the time series (available
+        fields, species, ...), as returned by `read_openPMD_params`
+        """
+        self.extensions = params['extensions']
+        self.avail_fields = params['avail_fields']
+        if self.avail_fields is not None:
+            self.fields_metadata = params['fields_metadata']
+            self.avail_geom = set( self.fields_metadata[field]['geometry']
+                                for field in self.avail_fields )
+        # Extract information of the particles
+        self.avail_species = params['avail_species']
+        self.avail_record_components = \
+            params['avail_record_components']
+
+    def stream_iterations( self ):
+        """
+        Iterate over the iterations of a streaming time series (see the
+        argument `streaming` of OpenPMDTimeSeries), as they are produced.
+
+        Each iteration is added to `iterations` (and `t`) when it is
+        read, and becomes the current iteration, so that `get_field`,
+        `get_particle`, etc. can be called for it inside the loop, e.g.
+
+        >>> for iteration in ts.stream_iterations():
+        >>>     z, w = ts.get_particle( ['z', 'w'], iteration=iteration,
+        >>>                             select={'uz': [10., None]} )
+
+        The data of an iteration cannot be read anymore once the next
+        iteration is requested.
+
+        Returns
+        -------
+        An iterator over the iteration numbers (int)
+        """
+        if not self.streaming:
+            raise OpenPMDException("`stream_iterations` requires a time "
+                "series opened with `streaming=True`.")
+        for iteration in self.data_reader.read_stream_iterations():
+            t, params = self.data_reader.read_openPMD_params( iteration )
+            if self.extensions is None:
+                self._set_openPMD_params( params )
+            self.iterations = np.append( self.iterations, iteration )
+            self.t = np.append( self.t, t )
+            self.tmin = self.t.min()
+            self.tmax = self.t.max()
+            self.plotter.t = self.t
+            self.plotter.iterations = self.iterations
+            self._find_output( None, iteration )
+            yield iteration
+
+    def _check_particle_arguments( self, var_list, species, select ):
+        """
+        Check the arguments `var_list`, `species` and `select` of
+        `get_particle` (and `render_particles`), and return the species
+        (inferred if there is only one species)
+        """
+        # Check that the species required are present
+        if self.avail_species is None:
+            raise OpenPMDException('No particle data in this time series')
+        # If there is only one species, infer that the user asks for that one
+        if species is None and len(self.avail_species) == 1:
+            species = self.avail_species[0]
+        if species not in self.avail_species:
+            species_list = '\n - '.join(self.avail_species)
+            raise OpenPMDException(
+                "The argument `species` is missing or erroneous.\n"
+                "The available species are: \n - %s\nPlease set the "
+                "argument `species` accordingly." % species_list)
+
+        # Check the list of variables
+        valid_var_list = True
+        if not isinstance(var_list, list):
+            valid_var_list = False
+        else:
+            for quantity in var_list:
+                if quantity not in self.avail_record_components[species]:
+                    valid_var_list = False
+        if not valid_var_list:
+            quantity_list = '\n - '.join(
+                self.avail_record_components[species])
+            raise OpenPMDException(
+                "The argument `var_list` is missing or erroneous.\n"
+                "It should be a list of strings representing species record "
+                "components.\n The available quantities for species '%s' are:"
+                "\n - %s\nPlease set the argument `var_list` "
+                "accordingly." % (species, quantity_list) )
+
+        # Check the format of the particle selection
+        if select is None or isinstance(select, ParticleTracker):
+            pass
+        elif isinstance(select, dict):
+            # Dictionary: Check that all selection quantities are available
+            valid_select_list = True
+            for quantity in select.keys():
+                if not (quantity in self.avail_record_components[species]):
+                    valid_select_list = False
+            if not valid_select_list:
+                quantity_list = '\n - '.join(
+                    self.avail_record_components[species])
+                raise OpenPMDException(
+                    "The argument `select` is erroneous.\n"
+                    "It should be a dictionary whose keys represent particle "
+                    "quantities.\n The available quantities are: "
+                    "\n - %s\nPlease set the argument `select` "
+                    "accordingly." % quantity_list)
+        else:
+            raise OpenPMDException("The argument `select` is erroneous.\n"
+            "It should be either a dictionary or a ParticleTracker object.")
+        return species
+
+    def _get_output_type( self, dtype, default=np.float64 ):
+        """
+        Return the numpy type of the arrays returned for the option `dtype`
+        of `get_particle` and `get_field` (None for the type in which the
+        data is stored), or `default` if neither `dtype` nor `self.dtype`
+        is set
+        """
+        if dtype is None:
+            dtype = getattr( self, 'dtype', None )
+        if dtype is None:
+            return default
+        if isinstance( dtype, str ) and dtype == 'native':
+            return None
+        if dtype in ['float32', 'float64', np.float32, np.float64]:
+            return np.dtype( dtype ).type
+        raise OpenPMDException("The argument `dtype` is erroneous.\n"
+            "It should be either 'native', 'float32' or 'float64'.")
+
+    def _bytes_per_particle( self, var_list, select, itemsize=8 ):
+        """
+        Estimate the memory used per particle by a read of `var_list`
+        followed by a selection `select`: one array per quantity (of
+        `itemsize` bytes per element), one float64 array for the selection
+        quantity being read, and the boolean mask
+        """
+        n_select = 1 if select else 0
+        return itemsize * len(var_list) + 9 * n_select
+
+    def _exceeds_memory_budget( self, iteration, species, var_list, select,
+                                itemsize=8 ):
+        """
+        Return whether reading `var_list` for all the particles of
+        `species` (and selecting them) would exceed `self.memory_budget`
+        """
+        if self.memory_budget is None:
+            return False
+        N = self.data_reader.read_species_size( iteration, species )
+        return N * self._bytes_per_particle( var_list, select, itemsize ) > \
+            parse_memory_size( self.memory_budget )
+
+    def _read_particles_in_batches( self, iteration, species, var_list,
+                                    select, read_batch, skip_offset=False,
+                                    max_output=None, output_type=np.float64 ):
+        """
+        Read the particle quantities `var_list` and apply the selection
+        `select` (dictionary or None), one batch of particles at a time
+
+        Parameters
+        ----------
+        read_batch: list of lists of tuples (start, count)
+            The ranges of particles of each batch
+
+        max_output: int, optional
+            The maximal size (in bytes) of the selected particles;
+            an OpenPMDException is raised (before they are gathered)
+            if it is exceeded
+
+        output_type: a numpy floating type, or None
+            The type of the returned arrays (see `_get_output_type`)
+
+        Returns
+        -------
+        A list of 1darrays (one per element of `var_list`)
+        """
+        select = select or {}
+        # Compute the selection mask of each batch
+        select_array_list = list()
+        for batch in read_batch:
+            self.read_chunk_range = list(map(self.batch_to_tuple, batch))
+            batch_total_particle = sum([x[1] for x in batch])
+
+            select_array = np.ones(batch_total_particle, dtype='bool')
+            allocated(select_array.nbytes, 'mask')
+            # Loop through the selection rules, and aggregate results in select_array
+            for quantity in select.keys():
+                q = self.data_reader.read_species_data(
+                    iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset)
+
+                with span('select'):
+                    # Check lower bound
+                    if select[quantity][0] is not None:
+                        select_array = np.logical_and(
+                            select_array,
+                            q > select[quantity][0])
+                    # Check upper bound
+                    if select[quantity][1] is not None:
+                        select_array = np.logical_and(
+                            select_array,
+                            q < select[quantity][1])
+
+                released(q.nbytes)
+                del q
+
+            select_array_list.append(select_array)
+
+        if max_output is not None:
+            n_selected = sum( int(np.count_nonzero(select_array))
+                              for select_array in select_array_list )
+            itemsize = np.dtype( output_type or np.float64 ).itemsize
+            if itemsize * len(var_list) * n_selected > max_output:
+                raise OpenPMDException(
+                    "The %d selected particles of species '%s' would "
+                    "exceed the memory budget (%d bytes).\nPlease use a "
+                    "narrower selection, or increase `memory_budget`."
+                    % (n_selected, species, max_output))
+
+        # Read and gather the selected particles of each batch
+        data_map = dict()
+        i = 0
+        for batch in read_batch:
+            self.read_chunk_range = list(map(self.batch_to_tuple, batch))
+
+            for quantity in var_list:
+                if quantity not in data_map.keys():
+                    data_map[quantity] = list()
+
+                data = self.data_reader.read_species_data(
+                    iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset,
+                    output_type )
+
+                with span('gather'):
+                    selected = data[select_array_list[i]]
+                allocated(selected.nbytes, 'gather')
+                released(data.nbytes)
+                data_map[quantity].append(selected)
+
+                del data
+
+            released(select_array_list[i].nbytes)
+            i += 1
+
+        data_list = []
+        for quantity in var_list:
+            data_list.append(np.concatenate(data_map[quantity]))
+        return data_list
+
+    def choose_read_strategy( self, blocks, n_particles, var_list, select,
+                              use_secondary=False ):
+        """
+        Choose how to read the blocks returned by the index
+        (used by `get_particle` with `strategy='auto'`)
+
+        The candidate plans are: a single read of all the particles
+        ('full'), one read per block ('direct_block'), one read per group
+        of nearby blocks ('read_groups', see `find_optimal_strategy`) and,
+        with a secondary index, one read per slice ('direct_slice').
+        Their cost is estimated with the same linear model as in
+        `find_optimal_strategy` (`self.b` per read and `self.k` per
+        particle), and the cheapest one is chosen. If the particles of
+        this plan do not fit in `memory_budget`, they are read in
+        batches instead ('batched').
+
+        Parameters
+        ----------
+        blocks: dict
+            The result of the index query: for each block, an object with
+            the attributes `start`, `end` and (secondary index) `q`
+
+        n_particles: int
+            The total number of particles of the species
+
+        var_list, select: list and dict
+            The arguments of `get_particle`
+
+        use_secondary: bool
+            Whether the slices of the secondary index can be read
+
+        Returns
+        -------
+        A tuple (name, read_chunk_range), where `read_chunk_range` is a
+        list of tuples (start, end, None)
+        """
+        plans = {}
+        plans['full'] = [ (0, n_particles, None) ]
+        plans['direct_block'] = sorted(
+            map(self.result_to_tuple, blocks.items()) )
+        self.read_strategy = list()
+        self.sorted_blocks = sorted(blocks.items(), key=lambda x: int(x[0]))
+        self.find_optimal_strategy(0, len(self.sorted_blocks) - 1, 0)
+        plans['read_groups'] = [ (self.sorted_blocks[i_start][1].start,
+                                  self.sorted_blocks[i_end][1].end, None)
+                                 for i_start, i_end in self.read_strategy ]
+        if use_secondary:
+            plans['direct_slice'] = sorted( self.result_to_tuple(item)
+                for block in blocks.values() for item in block.q.items() )
+
+        def cost( read_chunk_range ):
+            n_read = sum( int(end) - int(start)
+                          for start, end, _ in read_chunk_range )
+            return len(read_chunk_range) * self.b + n_read * self.k
+
+        name = min( plans, key=lambda name: cost(plans[name]) )
+        read_chunk_range = plans[name]
+        n_read = sum( int(end) - int(start)
+                      for start, end, _ in read_chunk_range )
+        annotate( 'estimated_selectivity', sum( int(block.end) -
+            int(block.start) for block in blocks.values() ) /
+            max( n_particles, 1 ) )
+        if self.memory_budget is not None and \
+                n_read * self._bytes_per_particle( var_list, select ) > \
+                parse_memory_size( self.memory_budget ):
+            name = 'batched'
+        return name, read_chunk_range
+
+    def split_into_batches( self, read_chunk_range, batch_size ):
+        """
+        Split the ranges `read_chunk_range` (tuples (start, end, step))
+        into batches of at most `batch_size` particles
+
+        Returns
+        -------
+        A list of batches, i.e. lists of tuples (start, count)
+        (see `batch_to_tuple`)
+        """
+        read_batch = [[]]
+        current_n = 0
+        for start, end, _ in read_chunk_range:
+            start, end = int(start), int(end)
+            while start < end:
+                if current_n == batch_size:
+                    read_batch.append([])
+                    current_n = 0
+                n = min( end - start, batch_size - current_n )
+                read_batch[-1].append( (start, n) )
+                current_n += n
+                start += n
+        return read_batch
+
     def result_to_tuple(self, result_obj):
         return result_obj[1].start, result_obj[1].end, None
 
@@ -212,6 +683,7 @@ class OpenPMDTimeSeries(InteractiveViewer):
             self.read_strategy.append((start, end))
             return 
 
+    @profiled_query
     def get_particle(self, var_list=None, species=None, t=None, iteration=None,
             select=None, plot=False, nbins=150,
             plot_range=[[None, None], [None, None]],
@@ -224,6 +696,9 @@ class OpenPMDTimeSeries(InteractiveViewer):
             limit_memory_usage=None,
             block_meta_path=None,
             memory_usage_factor=1.0,
+            strategy=None,
+            use_cache=True,
+            dtype=None,
             **kw):
         """
         Extract a list of particle variables an openPMD file.
@@ -299,6 +774,30 @@ class OpenPMDTimeSeries(InteractiveViewer):
             particles affects neighboring bins.
             `cic` (which is the default) leads to smoother results than `ngp`.
 
+        strategy : string, optional
+            If 'auto' (only used with `geos_index=True` and `select`), the
+            read strategy is chosen automatically, instead of following
+            `geos_index_read_groups`, `geos_index_direct_block_read` and
+            `geos_index_use_secondary`: the blocks returned by the index
+            are read in full, per block, per group of nearby blocks or
+            per secondary slice, whichever is the cheapest (see
+            `choose_read_strategy`), and in batches if this does not fit
+            in `memory_budget`.
+            Without the index, all the particles are read in any case:
+            they are read at once, or in batches if they do not fit in
+            `memory_budget`, whatever the value of `strategy`.
+            The strategy is recorded in the profile, as the annotation
+            'strategy'.
+
+        use_cache : bool, optional
+            Whether to use the result cache, when it is activated
+            (see the argument `result_cache_size` of OpenPMDTimeSeries)
+
+        dtype : string, optional
+            The type of the returned arrays: 'float32', 'float64' or
+            'native' (see the argument `dtype` of OpenPMDTimeSeries).
+            The particle identifiers ('id') are always uint64.
+
         **kw : dict, otional
            Additional options to be passed to matplotlib's
            hist or hist2d.
@@ -308,58 +807,20 @@ class OpenPMDTimeSeries(InteractiveViewer):
         A list of 1darray corresponding to the data requested in `var_list`
         (one 1darray per element of 'var_list', returned in the same order)
         """
-        # Check that the species required are present
-        if self.avail_species is None:
-            raise OpenPMDException('No particle data in this time series')
-        # If there is only one species, infer that the user asks for that one
-        if species is None and len(self.avail_species) == 1:
-            species = self.avail_species[0]
-        if species not in self.avail_species:
-            species_list = '\n - '.join(self.avail_species)
-            raise OpenPMDException(
-                "The argument `species` is missing or erroneous.\n"
-                "The available species are: \n - %s\nPlease set the "
-                "argument `species` accordingly." % species_list)
-
-        # Check the list of variables
-        valid_var_list = True
-        if not isinstance(var_list, list):
-            valid_var_list = False
-        else:
-            for quantity in var_list:
-                if quantity not in self.avail_record_components[species]:
-                    valid_var_list = False
-        if not valid_var_list:
-            quantity_list = '\n - '.join(
-                self.avail_record_components[species])
-            raise OpenPMDException(
-                "The argument `var_list` is missing or erroneous.\n"
-                "It should be a list of strings representing species record "
-                "components.\n The available quantities for species '%s' are:"
-                "\n - %s\nPlease set the argument `var_list` "
-                "accordingly." % (species, quantity_list) )
-
-        # Check the format of the particle selection
-        if select is None or isinstance(select, ParticleTracker):
-            pass
-        elif isinstance(select, dict):
-            # Dictionary: Check that all selection quantities are available
-            valid_select_list = True
-            for quantity in select.keys():
-                if not (quantity in self.avail_record_components[species]):
-                    valid_select_list = False
-            if not valid_select_list:
-                quantity_list = '\n - '.join(
-                    self.avail_record_components[species])
-                raise OpenPMDException(
-                    "The argument `select` is erroneous.\n"
-                    "It should be a dictionary whose keys represent particle "
-                    "quantities.\n The available quantities are: "
-                    "\n - %s\nPlease set the argument `select` "
-                    "accordingly." % quantity_list)
-        else:
-            raise OpenPMDException("The argument `select` is erroneous.\n"
-            "It should be either a dictionary or a ParticleTracker object.")
+        species = self._check_particle_arguments( var_list, species, select )
+        if dtype is None:
+            dtype = self.dtype
+        output_type = self._get_output_type( dtype )
+        itemsize = np.dtype( output_type or np.float64 ).itemsize
+
+        # Check the read strategy
+        if strategy not in [None, 'auto']:
+            raise OpenPMDException("The argument `strategy` is erroneous.\n"
+            "It should be either None or 'auto'.")
+        if strategy == 'auto' and self.geos_index:
+            # Let the secondary index restrict the blocks to their slices
+            geos_index_use_secondary = \
+                self.geos_index_secondary_type != "none"
 
         # Find the output that corresponds to the requested time/iteration
         # (Modifies self._current_i, self.current_iteration and self.current_t)
@@ -367,14 +828,49 @@ class OpenPMDTimeSeries(InteractiveViewer):
         # Get the corresponding iteration
         iteration = self.iterations[self._current_i]
 
+        # Use the quantities of the result cache (and read the other ones)
+        if self.result_cache is not None and use_cache \
+                and not isinstance( select, ParticleTracker ):
+            plot = plot and len(var_list) in [1, 2]
+            with_weights = plot and \
+                'w' in self.avail_record_components[species]
+            read_options = dict( skip_offset=skip_offset,
+                geos_index_use_secondary=geos_index_use_secondary,
+                geos_index_direct_block_read=geos_index_direct_block_read,
+                geos_index_read_groups=geos_index_read_groups,
+                limit_block_num=limit_block_num,
+                limit_memory_usage=limit_memory_usage,
+                block_meta_path=block_meta_path,
+                memory_usage_factor=memory_usage_factor,
+                strategy=strategy, dtype=dtype )
+            data_list = self._get_cached_particles(
+                var_list + ['w'] * with_weights, species, iteration,
+                select, read_options )
+            if plot and isinstance( data_list, list ):
+                w = data_list.pop() if with_weights else \
+                    np.ones_like(data_list[0])
+                self._plot_particles( data_list, w, var_list, species,
+                    iteration, nbins, plot_range, use_field_mesh,
+                    histogram_deposition, **kw )
+            return(data_list)
+
+        # With a plot, the weights are read with the other quantities
+        # (same selection and read strategy, within `memory_budget`)
+        plot = plot and len(var_list) in [1, 2]
+        read_weights = plot and 'w' not in var_list and \
+            'w' in self.avail_record_components[species]
+        if read_weights:
+            var_list = var_list + ['w']
+
         # Extract the list of particle quantities
         data_list = []
         if not self.geos_index or not select:
             if limit_memory_usage is not None:
                 # limit_memory_usage = 64GB
                 # Determine the number of particles
-                max_N = int(int(limit_memory_usage.replace("GB", "")) * 1024**3 / 8 / memory_usage_factor)
+                max_N = int(parse_memory_size(limit_memory_usage) / itemsize / memory_usage_factor)
                 # read block meta info
+                import pandas as pd
                 block_meta_df = pd.read_csv(block_meta_path, sep=',', header=None, names=['iteration', 'block_start', 'block_count'])
                 block_meta_df = block_meta_df[block_meta_df['iteration'] == iteration]
                 block_meta_df = block_meta_df.sort_values(by=['block_start'])
@@ -394,65 +890,40 @@ class OpenPMDTimeSeries(InteractiveViewer):
                     current_n += row['block_count']
                     read_batch[current_batch].append((row['block_start'], row['block_count']))
 
-                select_array_list = list()
-                for batch in read_batch:
-                    self.read_chunk_range = list(map(self.batch_to_tuple, batch))
-                    batch_total_particle = sum([x[1] for x in batch])
-
-                    select_array = np.ones(batch_total_particle, dtype='bool')
-                    # Loop through the selection rules, and aggregate results in select_array
-                    for quantity in select.keys():
-                        q = self.data_reader.read_species_data(
-                            iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset)
-                        
-                        start = time.time()
-                        # Check lower bound
-                        if select[quantity][0] is not None:
-                            select_array = np.logical_and(
-                                select_array,
-                                q > select[quantity][0])
-                        # Check upper bound
-                        if select[quantity][1] is not None:
-                            select_array = np.logical_and(
-                                select_array,
-                                q < select[quantity][1])
-                        end = time.time()
-                        print("calculate particle level select array. Time elapsed: ", end - start)
-
-                        del q
-
-                    select_array_list.append(select_array)
-                
-                data_map = dict()
-                i = 0
-                for batch in read_batch:
-                    self.read_chunk_range = list(map(self.batch_to_tuple, batch))
-
-                    for quantity in var_list:
-                        if quantity not in data_map.keys():
-                            data_map[quantity] = list()
-
-                        data = self.data_reader.read_species_data(
-                            iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset)
-                        
-                        start = time.time()
-                        data = data[select_array_list[i]]
-                        end = time.time()
-                        print("apply particle level select array. Time elapsed: ", end - start)
-                        data_map[quantity].append(data)
-                        
-                        del data
-
-                    i += 1
-
-                for quantity in data_map.keys():
-                    data_list.append(np.concatenate(data_map[quantity]))
+                data_list = self._read_particles_in_batches( iteration,
+                    species, var_list, select, read_batch, skip_offset,
+                    output_type=output_type )
+                annotate( 'strategy', 'batched' )
+
+            elif self._exceeds_memory_budget( iteration, species,
+                                              var_list, select, itemsize ):
+                # Read and select the particles in batches
+                budget = parse_memory_size( self.memory_budget )
+                N = self.data_reader.read_species_size( iteration, species )
+                if not isinstance( select, dict ):
+                    raise OpenPMDException(
+                        "Reading the %d particles of species '%s' would "
+                        "exceed the memory budget (%d bytes).\nPlease "
+                        "use the argument `select` (dictionary), or "
+                        "increase `memory_budget`." % (N, species, budget))
+                # Half of the budget for each batch (the other half
+                # is left for the selected particles)
+                batch_size = max( 1, budget // 2 //
+                    self._bytes_per_particle( var_list, select, itemsize ) )
+                read_batch = [ [(start, min(batch_size, N - start))]
+                               for start in range(0, N, batch_size) ]
+                data_list = self._read_particles_in_batches( iteration,
+                    species, var_list, select, read_batch,
+                    max_output=budget, output_type=output_type )
+                annotate( 'strategy', 'batched' )
 
             else:
                 # 1. default method
+                annotate( 'strategy', 'full' )
                 for quantity in var_list:
                     data_list.append( self.data_reader.read_species_data(
-                        iteration, species, quantity, self.extensions))
+                        iteration, species, quantity, self.extensions,
+                        output_type=output_type ) )
 
                 # Apply selection if needed
                 if isinstance( select, dict ):
@@ -461,10 +932,10 @@ class OpenPMDTimeSeries(InteractiveViewer):
                 elif isinstance( select, ParticleTracker ):
                     data_list = select.extract_tracked_particles( iteration,
                         self.data_reader, data_list, species, self.extensions )
-            print(len(data_list[0]))
 
         # Use the geos_index to select particles
         else:
+            from scipy import constants
             # 1. [multiple columns] use geos_index to coarse selection return [a list of [key/block, start, count]]
             if isinstance( select, dict ):
                 dict_record_comp = {'x': ['position', 'x'],
@@ -487,89 +958,82 @@ class OpenPMDTimeSeries(InteractiveViewer):
                 data_map = dict()
                 data_size = None
                 select_all_flag = True
-                start = time.time()
-                if self.geos_index_type=="minmax":
-                    select_all_flag = False
-                    for quantity in select.keys():
-                        key = self.key_generation_function(iteration=iteration, species=species, type=dict_record_comp[quantity][0], dimension=dict_record_comp[quantity][1])
-                        if dict_record_comp[quantity][0] == "momentum":
-                            result = self.query_geos_index.queryMinMaxData(key, select[quantity][0]/momentum_constant, select[quantity][1]/momentum_constant)
-                        else:
-                            result = self.query_geos_index.queryMinMaxData(key, select[quantity][0], select[quantity][1])
-                        # query_result includes max_6 members: dicts of position_xyz and momentum_xyz, then direct take interaction
-                        query_result.append(result)
-
-                elif self.geos_index_type == "rtree":
-                    select_map = dict()
-                    for quantity in select.keys():
-                        if dict_record_comp[quantity][0] not in select_map.keys():
-                            # initialize a new dict for the quantity, i.e. position or momentum, 3d envolope
-                            select_map[dict_record_comp[quantity][0]] = dict()
-                            select_map[dict_record_comp[quantity][0]]["minx"] = -np.inf
-                            select_map[dict_record_comp[quantity][0]]["maxx"] = np.inf
-                            select_map[dict_record_comp[quantity][0]]["miny"] = -np.inf
-                            select_map[dict_record_comp[quantity][0]]["maxy"] = np.inf
-                            select_map[dict_record_comp[quantity][0]]["minz"] = -np.inf
-                            select_map[dict_record_comp[quantity][0]]["maxz"] = np.inf
-
-                        if np.isinf(select[quantity][0]) and np.isinf(select[quantity][1]):
-                            continue
-                        
+                with span('query_index'):
+                    if self.geos_index_type=="minmax":
                         select_all_flag = False
-                        select_map[dict_record_comp[quantity][0]]["min" + dict_record_comp[quantity][1]] = select[quantity][0]
-                        select_map[dict_record_comp[quantity][0]]["max" + dict_record_comp[quantity][1]] = select[quantity][1]
-
-                        if dict_record_comp[quantity][0] == "momentum":
-                            select_map[dict_record_comp[quantity][0]]["min" + dict_record_comp[quantity][1]] /= momentum_constant
-                            select_map[dict_record_comp[quantity][0]]["max" + dict_record_comp[quantity][1]] /= momentum_constant
-
-                    for i, select_type in enumerate(select_map.keys()):
-                        key = self.key_generation_function(iteration=iteration, species=species, type=select_type)
-                        result = self.query_geos_index.queryRTreeXYZ(key, 
-                                                                        select_map[select_type]["minx"],
-                                                                        select_map[select_type]["maxx"],
-                                                                        select_map[select_type]["miny"],
-                                                                        select_map[select_type]["maxy"],
-                                                                        select_map[select_type]["minz"],
-                                                                        select_map[select_type]["maxz"])
-                        query_result.append(result)
-
-                end = time.time()
-                print("query index: Time elapsed: ", end - start)
+                        for quantity in select.keys():
+                            key = self.key_generation_function(iteration=iteration, species=species, type=dict_record_comp[quantity][0], dimension=dict_record_comp[quantity][1])
+                            if dict_record_comp[quantity][0] == "momentum":
+                                result = self.query_geos_index.queryMinMaxData(key, select[quantity][0]/momentum_constant, select[quantity][1]/momentum_constant)
+                            else:
+                                result = self.query_geos_index.queryMinMaxData(key, select[quantity][0], select[quantity][1])
+                            # query_result includes max_6 members: dicts of position_xyz and momentum_xyz, then direct take interaction
+                            query_result.append(result)
+
+                    elif self.geos_index_type == "rtree":
+                        select_map = dict()
+                        for quantity in select.keys():
+                            if dict_record_comp[quantity][0] not in select_map.keys():
+                                # initialize a new dict for the quantity, i.e. position or momentum, 3d envolope
+                                select_map[dict_record_comp[quantity][0]] = dict()
+                                select_map[dict_record_comp[quantity][0]]["minx"] = -np.inf
+                                select_map[dict_record_comp[quantity][0]]["maxx"] = np.inf
+                                select_map[dict_record_comp[quantity][0]]["miny"] = -np.inf
+                                select_map[dict_record_comp[quantity][0]]["maxy"] = np.inf
+                                select_map[dict_record_comp[quantity][0]]["minz"] = -np.inf
+                                select_map[dict_record_comp[quantity][0]]["maxz"] = np.inf
+
+                            if np.isinf(select[quantity][0]) and np.isinf(select[quantity][1]):
+                                continue
+                        
+                            select_all_flag = False
+                            select_map[dict_record_comp[quantity][0]]["min" + dict_record_comp[quantity][1]] = select[quantity][0]
+                            select_map[dict_record_comp[quantity][0]]["max" + dict_record_comp[quantity][1]] = select[quantity][1]
+
+                            if dict_record_comp[quantity][0] == "momentum":
+                                select_map[dict_record_comp[quantity][0]]["min" + dict_record_comp[quantity][1]] /= momentum_constant
+                                select_map[dict_record_comp[quantity][0]]["max" + dict_record_comp[quantity][1]] /= momentum_constant
+
+                        for i, select_type in enumerate(select_map.keys()):
+                            key = self.key_generation_function(iteration=iteration, species=species, type=select_type)
+                            result = self.query_geos_index.queryRTreeXYZ(key, 
+                                                                            select_map[select_type]["minx"],
+                                                                            select_map[select_type]["maxx"],
+                                                                            select_map[select_type]["miny"],
+                                                                            select_map[select_type]["maxy"],
+                                                                            select_map[select_type]["minz"],
+                                                                            select_map[select_type]["maxz"])
+                            query_result.append(result)
+
 
                 # intersect the result, use the first one as the base
                 if len(query_result) > 1:
-                    start = time.time()
-                    block_start_set = set(query_result[0].keys())
-                    for i in range(1, len(query_result)):
-                        # interact the result
-                        block_start_set = block_start_set.intersection(set(query_result[i].keys()))
-                    # remove the block that is not in the intersection
-                    for block_start in list(query_result[0].keys()):
-                        if block_start not in block_start_set:
-                            del query_result[0][block_start]
-
-                    # end = time.time()
-                    # print("intersect the first level index result. Time elapsed: ", end - start)
-                    # start = time.time()
-
-                    # Current block is in the other query result, but the secondary slice is not, remove it
-                    if self.geos_index_secondary_type != "none" and geos_index_use_secondary:
+                    with span('intersect_blocks'):
+                        block_start_set = set(query_result[0].keys())
+                        for i in range(1, len(query_result)):
+                            # interact the result
+                            block_start_set = block_start_set.intersection(set(query_result[i].keys()))
+                        # remove the block that is not in the intersection
                         for block_start in list(query_result[0].keys()):
-                            slice_start_set = set(query_result[0][block_start].q.keys())
-                            for i in range(1, len(query_result)):
-                                slice_start_set = slice_start_set.intersection(set(query_result[i][block_start].q.keys()))
+                            if block_start not in block_start_set:
+                                del query_result[0][block_start]
+
 
-                            for slice_start in list(query_result[0][block_start].q.keys()):
-                                if slice_start not in slice_start_set:
-                                    del query_result[0][block_start].q[slice_start]
-                    end = time.time()
-                    print("remove duplication. Time elapsed: ", end - start)
+                        # Current block is in the other query result, but the secondary slice is not, remove it
+                        if self.geos_index_secondary_type != "none" and geos_index_use_secondary:
+                            for block_start in list(query_result[0].keys()):
+                                slice_start_set = set(query_result[0][block_start].q.keys())
+                                for i in range(1, len(query_result)):
+                                    slice_start_set = slice_start_set.intersection(set(query_result[i][block_start].q.keys()))
+
+                                for slice_start in list(query_result[0][block_start].q.keys()):
+                                    if slice_start not in slice_start_set:
+                                        del query_result[0][block_start].q[slice_start]
 
                 if len(query_result[0]) == 0:
                     return list(), list()
 
-                print("The size of the query result: ", len(query_result[0]))
+                count('query_result_size', len(query_result[0]))
                 if limit_block_num and len(query_result[0]) > limit_block_num:
                     return f"The number of blocks is {len(query_result[0])}, please reduce the range of the selection"
 
@@ -577,23 +1041,30 @@ class OpenPMDTimeSeries(InteractiveViewer):
                 self.read_chunk_range = list()
                 # select_array = list()
                 # select_range = list()
+                strategy_name = None
+                # [auto] choose the cheapest of the strategies below
+                if strategy == 'auto':
+                    n_particles = self.data_reader.read_species_size(
+                        iteration, species )
+                    with span('plan.auto'):
+                        strategy_name, self.read_chunk_range = \
+                            self.choose_read_strategy( query_result[0],
+                                n_particles, var_list, select,
+                                use_secondary=geos_index_use_secondary )
+
                 # [fastest] group nearby blocks and read together
-                if geos_index_read_groups:
+                elif geos_index_read_groups:
+                    strategy_name = 'read_groups'
                     self.read_strategy = list()
 
-                    start = time.time()
-                    self.sorted_blocks = sorted(query_result[0].items(), key=lambda x: int(x[0]))
-                    end = time.time()
-                    print("sort block metadata by block start. Time elapsed: ", end - start)
+                    with span('plan.sort_blocks'):
+                        self.sorted_blocks = sorted(query_result[0].items(), key=lambda x: int(x[0]))
 
-                    start = time.time()
-                    self.find_optimal_strategy(0, len(self.sorted_blocks) - 1, 0)
-                    end = time.time()
-                    print("find optimal read solution. Time elapsed: ", end - start)
+                    with span('plan.find_strategy'):
+                        self.find_optimal_strategy(0, len(self.sorted_blocks) - 1, 0)
 
                     # offset = 0
                     for block_start_index, block_end_index in self.read_strategy:
-                        # print(block_start_index, block_end_index)
                         self.read_chunk_range.append((self.sorted_blocks[block_start_index][1].start, self.sorted_blocks[block_end_index][1].end, None))
                         # for i in range(block_start_index, block_end_index + 1):
                         #     select_range.append((offset, self.sorted_blocks[i][1].end - self.sorted_blocks[i][1].start + offset))
@@ -620,218 +1091,604 @@ class OpenPMDTimeSeries(InteractiveViewer):
 
                 # [middle] direct read block
                 elif geos_index_direct_block_read:
-                    start = time.time()
-                    self.read_chunk_range = list(map(self.result_to_tuple, query_result[0].items()))
+                    strategy_name = 'direct_block'
+                    with span('plan.direct_block'):
+                        self.read_chunk_range = list(map(self.result_to_tuple, query_result[0].items()))
 
-                    # generate the mask for the data, if use secondary slice
-                    # if self.geos_index_secondary_type != "none" and geos_index_use_secondary:
-                    #     self.sorted_blocks = sorted(query_result[0].items(), key=lambda x: int(x[0]))
-                    #     for block_start in list(query_result[0].keys()):
-                    #         select_array.append(np.zeros(query_result[0][block_start].end - query_result[0][block_start].start, dtype='bool'))
-                    #         for slice_key, slice_obj in query_result[0][block_start].q.items():
-                    #             select_array[-1][slice_obj.start - query_result[0][block_start].start: slice_obj.end - query_result[0][block_start].start] = True
-                    #     select_array = np.concatenate(select_array)
+                        # generate the mask for the data, if use secondary slice
+                        # if self.geos_index_secondary_type != "none" and geos_index_use_secondary:
+                        #     self.sorted_blocks = sorted(query_result[0].items(), key=lambda x: int(x[0]))
+                        #     for block_start in list(query_result[0].keys()):
+                        #         select_array.append(np.zeros(query_result[0][block_start].end - query_result[0][block_start].start, dtype='bool'))
+                        #         for slice_key, slice_obj in query_result[0][block_start].q.items():
+                        #             select_array[-1][slice_obj.start - query_result[0][block_start].start: slice_obj.end - query_result[0][block_start].start] = True
+                        #     select_array = np.concatenate(select_array)
 
-                    end = time.time()
-                    print("Direct block read. generate select array. Time elapsed: ", end - start)
 
                 # [slowest] direct read secondary slice
                 # not geos_index_read_groups and not geos_index_direct_block_read
                 elif self.geos_index_secondary_type != "none" and geos_index_use_secondary:
                     # which means to read by the secondary slice
                     # no mask
-                    start = time.time()
-                    for block_start in list(query_result[0].keys()):
-                        temp = query_result[0][block_start].q.items()
-                        self.read_chunk_range += list(map(self.result_to_tuple, temp))
-                    end = time.time()
-                    print("Direct slice read. generate select array. Time elapsed: ", end - start)
+                    strategy_name = 'direct_slice'
+                    with span('plan.direct_slice'):
+                        for block_start in list(query_result[0].keys()):
+                            temp = query_result[0][block_start].q.items()
+                            self.read_chunk_range += list(map(self.result_to_tuple, temp))
 
 
                 else:
                     print("Error: No valid geos_index read strategy")
                     return list(), list()
+                annotate( 'strategy', strategy_name )
+
+                if strategy_name == 'batched':
+                    # The ranges do not fit in memory: read them in batches
+                    # (with the offsets, since the selection is exact)
+                    budget = parse_memory_size( self.memory_budget )
+                    batch_size = max( 1, budget // 2 //
+                        self._bytes_per_particle( var_list, select, itemsize ) )
+                    data_list = self._read_particles_in_batches( iteration,
+                        species, var_list, select,
+                        self.split_into_batches( self.read_chunk_range,
+                                                 batch_size ),
+                        max_output=budget, output_type=output_type )
+                else:
+                    # read data based on the read_chunk_range
+                    count('n_read_ranges', len(self.read_chunk_range))
+                    for quantity in set(var_list + list(select.keys())):
+                        # (The quantities that are only used for the selection are read in double precision)
+                        data_map[quantity] = self.data_reader.read_species_data(iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset,
+                            output_type if quantity in var_list else np.float64)
+                        # if len(select_range) > 0 and not select_all_flag:
+                        #     start = time.time()
+                        #     data_map[quantity] = data_map[quantity][select_array]
+                        #     # data_map[quantity] = np.hstack([data_map[quantity][range_local[0]:range_local[1]] for range_local in select_range])
+                        #     end = time.time()
+                        #     print("apply particle level select array. Time elapsed: ", end - start)
+                        data_size = len(data_map[quantity])
+
+                    # Linear match the remaining data
+                    data_list = list()
+                    if select_all_flag:
+                        for key in var_list:
+                            data_list.append(data_map[key])
+                    else:     
+                        select_array_particle = np.ones(data_size, dtype='bool')
+                        for quantity in select.keys():
+                            # (The bounds are converted without modifying
+                            # `select`, which may be reused by the caller)
+                            bounds = list( select[quantity] )
+                            if skip_offset and quantity in {'ux', 'uy', 'uz'}:
+                                bounds = [ None if bound is None else
+                                           bound / momentum_constant
+                                           for bound in bounds ]
+
+                            with span('select'):
+                                # Check lower bound
+                                if bounds[0] is not None:
+                                    select_array_particle = np.logical_and(
+                                        select_array_particle,
+                                        data_map[quantity] > np.float64(bounds[0]))
+                                # Check upper bound
+                                if bounds[1] is not None:
+                                    select_array_particle = np.logical_and(
+                                        select_array_particle,
+                                        data_map[quantity] < np.float64(bounds[1]))
+
+                        with span('gather'):
+                            # Use select_array_particle to reduce each quantity
+                            for key in var_list:
+                                if len(data_map[key]) > 1:  # Do not apply selection on scalar records
+                                    data_map[key] = data_map[key][select_array_particle]
+
+                    if skip_offset:
+                        for quantity in select.keys():
+                            # read support data
+                            support_quantity_data = self.data_reader.read_species_support_data(iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset)
+
+                            with span('offset'):
+                                # if len(select_range) > 0:
+                                #     # support_quantity_data = support_quantity_data[select_array]
+                                #     # support_quantity_data = np.hstack([support_quantity_data[range_local[0]:range_local[1]] for range_local in select_range])
+                                #     total_length = sum(end - start for start, end in select_range)
+                                #     new_array_prealloc = np.empty(total_length, dtype=support_quantity_data.dtype)
+                                #     current_position = 0
+                                #     for start, end in select_range:
+                                #         length = end - start
+                                #         new_array_prealloc[current_position:current_position + length] = support_quantity_data[start:end]
+                                #         current_position += length
+
+                                #     del support_quantity_data
+                                #     support_quantity_data = new_array_prealloc
+
+                                support_quantity_data = support_quantity_data[select_array_particle]
+
+                                if quantity in {'ux', 'uy', 'uz'} and quantity in var_list:
+                                    if np.all( support_quantity_data != 0 ):
+                                        support_quantity_data *= constants.c
+                                        temp = np.full_like(support_quantity_data, 1.0)
+                                        temp /= support_quantity_data
+                                        data_map[quantity] *= temp
+                                elif quantity in {'x', 'y', 'z'} and quantity in var_list:
+                                    data_map[quantity] += support_quantity_data
+
+                            del support_quantity_data
 
-                # read data based on the read_chunk_range
-                for quantity in set(var_list + list(select.keys())):
-                    print("size of self.read_chunk_range: ", len(self.read_chunk_range))
-                    data_map[quantity] = self.data_reader.read_species_data(iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset)
-                    # if len(select_range) > 0 and not select_all_flag:
-                    #     start = time.time()
-                    #     data_map[quantity] = data_map[quantity][select_array]
-                    #     # data_map[quantity] = np.hstack([data_map[quantity][range_local[0]:range_local[1]] for range_local in select_range])
-                    #     end = time.time()
-                    #     print("apply particle level select array. Time elapsed: ", end - start)
-                    data_size = len(data_map[quantity])
-                    print(quantity, data_size)
-
-                # Linear match the remaining data
-                data_list = list()
-                if select_all_flag:
-                    for key in var_list:
-                        data_list.append(data_map[key])
-                else:     
-                    select_array_particle = np.ones(data_size, dtype='bool')
-                    for quantity in select.keys():
-                        if skip_offset and quantity in {'ux', 'uy', 'uz'}:
-                            select[quantity][0] /= momentum_constant
-                            select[quantity][1] /= momentum_constant
-
-                        start = time.time()
-                        # Check lower bound
-                        if select[quantity][0] is not None:
-                            print("The lower bound of", quantity, "is", select[quantity][0])
-                            select_array_particle = np.logical_and(
-                                select_array_particle,
-                                data_map[quantity] > select[quantity][0])
-                        # Check upper bound
-                        if select[quantity][1] is not None:
-                            print("The upper bound of", quantity, "is", select[quantity][1])
-                            select_array_particle = np.logical_and(
-                                select_array_particle,
-                                data_map[quantity] < select[quantity][1])
-                        end = time.time()
-                        print("calculate particle level select array. Time elapsed: ", end - start)
-
-                    start = time.time()
-                    # Use select_array_particle to reduce each quantity
                     for key in var_list:
                         if len(data_map[key]) > 1:  # Do not apply selection on scalar records
-                            data_map[key] = data_map[key][select_array_particle]
-                    end = time.time()
-                    print("apply particle level select array. Time elapsed: ", end - start)
-
-                if skip_offset:
-                    for quantity in select.keys():
-                        # read support data
-                        # start = time.time()
-                        support_quantity_data = self.data_reader.read_species_support_data(iteration, species, quantity, self.extensions, self.read_chunk_range, skip_offset)
-                        # end = time.time()
-                        # print(f"get support data for read {quantity}. Time elapsed: ", end - start)
-                        
-                        start_time = time.time()
-                        # if len(select_range) > 0:
-                        #     # support_quantity_data = support_quantity_data[select_array]
-                        #     # support_quantity_data = np.hstack([support_quantity_data[range_local[0]:range_local[1]] for range_local in select_range])
-                        #     total_length = sum(end - start for start, end in select_range)
-                        #     new_array_prealloc = np.empty(total_length, dtype=support_quantity_data.dtype)
-                        #     current_position = 0
-                        #     for start, end in select_range:
-                        #         length = end - start
-                        #         new_array_prealloc[current_position:current_position + length] = support_quantity_data[start:end]
-                        #         current_position += length
-
-                        #     del support_quantity_data
-                        #     support_quantity_data = new_array_prealloc
-
-                        support_quantity_data = support_quantity_data[select_array_particle]
-
-                        if quantity in {'ux', 'uy', 'uz'} and quantity in var_list:
-                            if np.all( support_quantity_data != 0 ):
-                                support_quantity_data *= constants.c
-                                temp = np.full_like(support_quantity_data, 1.0)
-                                temp /= support_quantity_data
-                                data_map[quantity] *= temp
-                        elif quantity in {'x', 'y', 'z'} and quantity in var_list:
-                            data_map[quantity] += support_quantity_data
-                        end_time = time.time()
-                        print("data apply support data. Time elapsed: ", end_time - start_time)
-
-                        del support_quantity_data
-
-                for key in var_list:
-                    if len(data_map[key]) > 1:  # Do not apply selection on scalar records
-                        data_list.append(data_map[key])
-                print("selected data length: ", len(data_list[0]))
+                            data_list.append(data_map[key])
 
                               
             else:
                 # todo particle tracing
                 pass
         # print()
+        if read_weights:
+            var_list = var_list[:-1]
+            w = data_list.pop()
+
         # Plotting
-        if plot and len(var_list) in [1, 2]:
+        if plot:
 
-            # Extract the weights, if they are available
-            if 'w' in self.avail_record_components[species]:
-                w = self.data_reader.read_species_data(
-                    iteration, species, 'w', self.extensions)
-                if isinstance( select, dict ):
-                    w, = apply_selection( iteration, self.data_reader,
-                        [w], select, species, self.extensions)
-                elif isinstance( select, ParticleTracker ):
-                    w, = select.extract_tracked_particles( iteration,
-                        self.data_reader, [w], species, self.extensions )
+            # Use the weights, if they are available
+            if 'w' in var_list:
+                w = data_list[ var_list.index('w') ]
             # Otherwise consider that all particles have a weight of 1
-            else:
+            elif not read_weights:
                 w = np.ones_like(data_list[0])
 
-            # Determine the size of the histogram bins
-            # - First pick default values
-            hist_range = [[None, None], [None, None]]
-            for i_data in range(len(data_list)):
-                data = data_list[i_data]
-
-                # Check if the user specified a value
-                if (plot_range[i_data][0] is not None) and \
-                        (plot_range[i_data][1] is not None):
-                    hist_range[i_data] = plot_range[i_data]
-                # Else use min and max of data
-                elif len(data) != 0:
-                    hist_range[i_data] = [ data.min(), data.max() ]
-                else:
+            self._plot_particles( data_list, w, var_list, species,
+                iteration, nbins, plot_range, use_field_mesh,
+                histogram_deposition, **kw )
+
+        # Output the data
+        return(data_list)
+
+    def _get_cached_particles( self, var_list, species, iteration, select,
+                               read_options ):
+        """
+        Return the particle quantities `var_list` (with the selection
+        `select`) from the result cache, after reading and caching those
+        that are not in it
+
+        Parameters
+        ----------
+        read_options: dict
+            The arguments of `get_particle` that determine how the data
+            is read (part of the key of the cached quantities)
+
+        Returns
+        -------
+        A list of 1darrays (copies of the cached ones)
+        """
+        # The selection and the options are normalized, so that they
+        # can be used as the key of the cache
+        if select:
+            select_key = tuple( sorted(
+                (quantity, tuple( None if bound is None else float(bound)
+                                  for bound in bounds ))
+                for quantity, bounds in select.items() ) )
+        else:
+            select_key = None
+        options_key = tuple( sorted(read_options.items()) )
+        keys = { quantity: (iteration, species, quantity, select_key,
+                            options_key) for quantity in var_list }
+
+        cached = { quantity: self.result_cache.get( keys[quantity] )
+                   for quantity in var_list }
+        missing = [ quantity for quantity in dict.fromkeys( var_list )
+                    if cached[quantity] is None ]
+        count( 'result_cache_hits', len(var_list) - len(missing) )
+        count( 'result_cache_misses', len(missing) )
+        if missing:
+            data_list = self.get_particle( missing, species=species,
+                iteration=iteration, select=copy.deepcopy(select),
+                use_cache=False, **read_options )
+            # Errors of the indexed read (no result, too many blocks)
+            if not isinstance( data_list, list ) \
+                    or len(data_list) != len(missing):
+                return data_list
+            for quantity, data in zip( missing, data_list ):
+                # Protect the cached array against in-place modifications
+                data.flags.writeable = False
+                self.result_cache.put( keys[quantity], data )
+                cached[quantity] = data
+        return [ cached[quantity].copy() for quantity in var_list ]
+
+    def clear_result_cache( self, iteration=None, species=None ):
+        """
+        Remove the results of `get_particle` from the result cache
+
+        Parameters
+        ----------
+        iteration: int, optional
+            Only remove the results at this iteration
+
+        species: string, optional
+            Only remove the results of this species
+        """
+        if self.result_cache is None:
+            return
+        if iteration is None and species is None:
+            self.result_cache.clear()
+            return
+        for key in self.result_cache.keys():
+            if (iteration is None or key[0] == iteration) and \
+                    (species is None or key[1] == species):
+                self.result_cache.pop( key )
+
+    def _plot_particles( self, data_list, w, var_list, species, iteration,
+                         nbins, plot_range, use_field_mesh,
+                         histogram_deposition, **kw ):
+        """
+        Plot the histogram of one or two particle quantities
+        (see the parameters of `get_particle`)
+        """
+        # Determine the size of the histogram bins
+        # - First pick default values
+        hist_range = [[None, None], [None, None]]
+        for i_data in range(len(data_list)):
+            data = data_list[i_data]
+
+            # Check if the user specified a value
+            if (plot_range[i_data][0] is not None) and \
+                    (plot_range[i_data][1] is not None):
+                hist_range[i_data] = plot_range[i_data]
+            # Else use min and max of data
+            elif len(data) != 0:
+                hist_range[i_data] = [ data.min(), data.max() ]
+            else:
+                hist_range[i_data] = [ -1., 1. ]
+
+            # Avoid error when the min and max are equal
+            if hist_range[i_data][0] == hist_range[i_data][1]:
+                if hist_range[i_data][0] == 0:
                     hist_range[i_data] = [ -1., 1. ]
+                else:
+                    hist_range[i_data][0] *= 0.99
+                    hist_range[i_data][1] *= 1.01
+
+        hist_bins = [ nbins for i_data in range(len(data_list)) ]
+        # - Then, if required by the user, modify this values by
+        #   fitting them to the spatial grid
+        if use_field_mesh and self.avail_fields is not None:
+            # Extract the grid resolution
+            grid_size_dict, grid_range_dict = \
+                self.data_reader.get_grid_parameters( iteration,
+                    self.avail_fields, self.fields_metadata )
+            # For each direction, modify the number of bins, so that
+            # the resolution is a multiple of the grid resolution
+            for i_var in range(len(var_list)):
+                var = var_list[i_var]
+                if var in grid_size_dict.keys():
+                    # Check that the user indeed allowed this dimension
+                    # to be determined automatically
+                    if (plot_range[i_var][0] is None) or \
+                            (plot_range[i_var][1] is None):
+                        hist_bins[i_var], hist_range[i_var] = \
+                            fit_bins_to_grid(hist_bins[i_var],
+                            grid_size_dict[var], grid_range_dict[var] )
+
+        # - In the case of only one quantity
+        if len(data_list) == 1:
+            # Do the plotting
+            self.plotter.hist1d(data_list[0], w, var_list[0], species,
+                    self._current_i, hist_bins[0], hist_range,
+                    deposition=histogram_deposition, **kw)
+        # - In the case of two quantities
+        elif len(data_list) == 2:
+            # Do the plotting
+            self.plotter.hist2d(data_list[0], data_list[1], w,
+                var_list[0], var_list[1], species,
+                self._current_i, hist_bins, hist_range,
+                deposition=histogram_deposition, **kw)
+
+    @profiled_query
+    def get_particle_iterations( self, var_list=None, species=None,
+            iterations=None, select=None, stack=False, skip_offset=False,
+            iterations_per_flush=None ):
+        """
+        Extract a list of particle variables at several iterations.
+
+        With the openpmd-api backend, all the chunks of all the iterations
+        are loaded with a single flush (or one flush per group of
+        `iterations_per_flush` iterations), instead of one flush per
+        chunk, per quantity and per iteration with `get_particle`. This
+        makes e.g. the evolution of the charge of a beam over thousands
+        of iterations (of a series with small particle records) much
+        faster to extract.
+
+        Parameters
+        ----------
+        var_list : list of string
+            A list of the particle variables to extract
+            (see `get_particle`)
+
+        species: string
+            A string indicating the name of the species
+            This is optional if there is only one species
+
+        iterations : list of int, optional
+            The iterations at which to obtain the data
+            Default: all the iterations of the time series
+
+        select: dict, optional
+            The selection of the particles (see `get_particle`)
+
+        stack: bool, optional
+            Whether to stack the data of the different iterations
+            (requires the same number of selected particles at each
+            iteration)
+
+        skip_offset: bool, optional
+            Accepted for compatibility with `get_particle`: the returned
+            quantities and the bounds of `select` are in physical units
+            in any case (the position offset and the mass that convert
+            them are loaded in the same flush as the data)
+
+        iterations_per_flush: int, optional
+            The number of iterations whose data is read with one flush
+            (this bounds the memory used by the reads that are in flight)
+            Default: all the iterations
+
+        Returns
+        -------
+        If `stack` is False, a dictionary whose keys are the iterations,
+        and whose values are lists of 1darrays (as returned by
+        `get_particle` at this iteration)
+        If `stack` is True, a list of 2darrays (one per element of
+        `var_list`) of shape (number of iterations, number of particles)
+        """
+        species = self._check_particle_arguments( var_list, species, select )
+        if isinstance( select, ParticleTracker ):
+            raise OpenPMDException("The argument `select` is erroneous.\n"
+                "`get_particle_iterations` only supports dictionaries.")
+        select = select or {}
+        if iterations is None:
+            iterations = self.iterations
+        iterations = [ int(iteration) for iteration in iterations ]
+        # (Each iteration is read once, even if it is repeated)
+        unique_iterations = list( dict.fromkeys( iterations ) )
+        for iteration in unique_iterations:
+            if iteration not in self.iterations:
+                raise OpenPMDException("The requested iteration %d does "
+                    "not exist.\nThe available iterations are:\n %s"
+                    % (iteration, self.iterations.tolist()))
+
+        # Read the quantities and the selection quantities together
+        # (in physical units, i.e. with the offset and normalization)
+        output_type = self._get_output_type( None )
+        quantities = list( dict.fromkeys( var_list + list(select.keys()) ) )
+        data = self.data_reader.read_species_data_iterations(
+            unique_iterations, species, quantities, self.extensions,
+            False, iterations_per_flush, output_type )
+
+        result = {}
+        for iteration in unique_iterations:
+            data_map = dict( zip( quantities, data.pop(iteration) ) )
+            data_list = [ data_map[quantity] for quantity in var_list ]
+            if select:
+                with span( 'select' ):
+                    select_array = np.ones( len(data_list[0]), dtype='bool' )
+                    for quantity, (lower, upper) in select.items():
+                        if lower is not None:
+                            select_array &= \
+                                data_map[quantity] > np.float64( lower )
+                        if upper is not None:
+                            select_array &= \
+                                data_map[quantity] < np.float64( upper )
+                    data_list = [ data_array[select_array]
+                                  for data_array in data_list ]
+            result[iteration] = data_list
+
+        if not stack:
+            return result
+        sizes = set( len( result[iteration][0] ) for iteration in iterations )
+        if len( sizes ) > 1:
+            raise OpenPMDException("The data cannot be stacked, since the "
+                "number of (selected) particles differs between the "
+                "iterations.\nPlease use `stack=False`.")
+        return [ np.stack( [ result[iteration][i] for iteration in iterations ] )
+                 for i in range( len(var_list) ) ]
+
+    @profiled_query
+    def render_particles( self, var_list=None, species=None, t=None,
+            iteration=None, select=None, plot=False,
+            plot_range=[[None, None], [None, None]], resolution=None,
+            norm='linear', histogram_deposition='cic', batch_size=None,
+            skip_offset=False, **kw ):
+        """
+        Bin two particle quantities into an image of fixed resolution,
+        reading and depositing the particles one batch at a time.
+
+        Unlike `get_particle`, the particle arrays are never gathered:
+        the memory used scales with the number of pixels (and the size
+        of a batch) instead of the number of particles, so that species
+        with billions of macroparticles can be plotted.
+
+        Parameters
+        ----------
+        var_list : list of 2 strings
+            The particle quantities along the horizontal and vertical axes
+
+        species, t, iteration :
+            See `get_particle`
+
+        skip_offset : bool, optional
+            Accepted for compatibility with `get_particle`: the particles
+            are rendered (and selected) in physical units in any case
+
+        select: dict, optional
+            The selection of the particles (see `get_particle`)
+
+        plot : bool, optional
+            Whether to plot the image
+
+        plot_range : list of lists, or 'visible'
+           A list containing 2 lists of 2 elements each
+           Indicates the extent of the image, along the 1st axis
+           (first list) and 2nd axis (second list). When an extent is not
+           given, it is that of the selected particles (which are then
+           read twice).
+           If 'visible', the range that is shown by the axes of the
+           current figure is used: this renders again, at the resolution
+           of the figure, the region into which a plot was zoomed.
+
+        resolution : list of 2 ints, optional
+            The number of pixels of the image along each axis
+            Default: the size in pixels of the axes of the current figure
+            when `plot` is True, and 500 x 500 otherwise
+
+        norm : string
+            Either 'linear' or 'log': the scale of the colormap
+            (when `plot` is True)
+
+        histogram_deposition : string
+            Either `ngp` (Nearest Grid Point) or `cic` (Cloud-In-Cell)
+            (see `get_particle`)
+
+        batch_size : int, optional
+            The number of particles that are read at a time
+            Default: 2**22, or half of `memory_budget` if it is set
+
+        **kw : dict, otional
+           Additional options to be passed to matplotlib's imshow
+           (and the argument `update` of `Plotter.show_particle_raster`)
+
+        Returns
+        -------
+        A ParticleRaster object, whose attribute `data` contains the
+        (weighted) number of particles in each pixel, and `extent`
+        the extent of the image
+        """
+        if not isinstance( var_list, list ) or len( var_list ) != 2:
+            raise OpenPMDException(
+                "The argument `var_list` should be a list of 2 particle "
+                "quantities.")
+        species = self._check_particle_arguments( var_list, species, select )
+        if isinstance( select, ParticleTracker ):
+            raise OpenPMDException("The argument `select` is erroneous.\n"
+                "`render_particles` only supports dictionaries.")
+        select = select or {}
 
+        # Find the output that corresponds to the requested time/iteration
+        # (Modifies self._current_i, self.current_iteration and self.current_t)
+        self._find_output(t, iteration)
+        # Get the corresponding iteration
+        iteration = self.iterations[self._current_i]
+
+        with_weights = 'w' in self.avail_record_components[species]
+        quantities = var_list + ['w'] * with_weights
+        itemsize = np.dtype(
+            self._get_output_type( None ) or np.float64 ).itemsize
+        if batch_size is None:
+            if self.memory_budget is not None:
+                batch_size = max( 1, parse_memory_size( self.memory_budget )
+                    // 2 // self._bytes_per_particle( quantities, select,
+                                                      itemsize ) )
+            else:
+                batch_size = default_batch_size
+        annotate( 'strategy', 'raster' )
+
+        # Determine the extent of the image
+        if plot_range == 'visible':
+            plot_range = self.plotter.visible_range()
+        hist_range = [ list( bounds ) for bounds in plot_range ]
+        missing = [ i for i in range(2) if None in hist_range[i] ]
+        if missing:
+            # Range of the selected particles (first pass)
+            for i in missing:
+                hist_range[i] = [ np.inf, -np.inf ]
+            for data_list in self._iter_particle_batches( iteration,
+                    species, [ var_list[i] for i in missing ], select,
+                    batch_size ):
+                for i, data in zip( missing, data_list ):
+                    if len(data) != 0:
+                        hist_range[i] = [ min( hist_range[i][0], data.min() ),
+                                          max( hist_range[i][1], data.max() ) ]
+                    released( data.nbytes )
+            for i in missing:
+                if hist_range[i][0] > hist_range[i][1]:
+                    # No selected particles
+                    hist_range[i] = [ -1., 1. ]
                 # Avoid error when the min and max are equal
-                if hist_range[i_data][0] == hist_range[i_data][1]:
-                    if hist_range[i_data][0] == 0:
-                        hist_range[i_data] = [ -1., 1. ]
+                elif hist_range[i][0] == hist_range[i][1]:
+                    if hist_range[i][0] == 0:
+                        hist_range[i] = [ -1., 1. ]
                     else:
-                        hist_range[i_data][0] *= 0.99
-                        hist_range[i_data][1] *= 1.01
-
-            hist_bins = [ nbins for i_data in range(len(data_list)) ]
-            # - Then, if required by the user, modify this values by
-            #   fitting them to the spatial grid
-            if use_field_mesh and self.avail_fields is not None:
-                # Extract the grid resolution
-                grid_size_dict, grid_range_dict = \
-                    self.data_reader.get_grid_parameters( iteration,
-                        self.avail_fields, self.fields_metadata )
-                # For each direction, modify the number of bins, so that
-                # the resolution is a multiple of the grid resolution
-                for i_var in range(len(var_list)):
-                    var = var_list[i_var]
-                    if var in grid_size_dict.keys():
-                        # Check that the user indeed allowed this dimension
-                        # to be determined automatically
-                        if (plot_range[i_var][0] is None) or \
-                                (plot_range[i_var][1] is None):
-                            hist_bins[i_var], hist_range[i_var] = \
-                                fit_bins_to_grid(hist_bins[i_var],
-                                grid_size_dict[var], grid_range_dict[var] )
-
-            # - In the case of only one quantity
-            if len(data_list) == 1:
-                # Do the plotting
-                self.plotter.hist1d(data_list[0], w, var_list[0], species,
-                        self._current_i, hist_bins[0], hist_range,
-                        deposition=histogram_deposition, **kw)
-            # - In the case of two quantities
-            elif len(data_list) == 2:
-                # Do the plotting
-                self.plotter.hist2d(data_list[0], data_list[1], w,
-                    var_list[0], var_list[1], species,
-                    self._current_i, hist_bins, hist_range,
-                    deposition=histogram_deposition, **kw)
+                        hist_range[i][0] *= 0.99
+                        hist_range[i][1] *= 1.01
+
+        # Deposit the particles, one batch at a time
+        if resolution is None:
+            resolution = self.plotter.axes_resolution() if plot \
+                else [ 500, 500 ]
+        raster = ParticleRaster( hist_range, resolution, histogram_deposition )
+        allocated( raster.data.nbytes, 'raster' )
+        for data_list in self._iter_particle_batches( iteration, species,
+                quantities, select, batch_size ):
+            with span( 'deposit' ):
+                raster.add( *data_list )
+            released( sum( data.nbytes for data in data_list ) )
 
-        # Output the data
-        return(data_list)
+        if plot:
+            self.plotter.show_particle_raster( raster, var_list[0],
+                var_list[1], species, self._current_i, norm=norm, **kw )
+        return raster
+
+    def _iter_particle_batches( self, iteration, species, var_list, select,
+                                batch_size ):
+        """
+        Read the particle quantities `var_list` and apply the selection
+        `select` (dictionary), one batch of `batch_size` particles at
+        a time (the quantities are read with the type given by `self.dtype`,
+        and the selection quantities in double precision; all of them
+        in physical units)
 
+        Returns
+        -------
+        An iterator over lists of 1darrays (one per element of `var_list`)
+        """
+        output_type = self._get_output_type( None )
+        N = self.data_reader.read_species_size( iteration, species )
+        for start in range( 0, N, batch_size ):
+            read_chunk_range = [ (start, min( start + batch_size, N ), None) ]
+            count( 'n_batches' )
+            # Compute the selection mask of the batch
+            select_array = None
+            for quantity, (lower, upper) in select.items():
+                q = self.data_reader.read_species_data( iteration, species,
+                    quantity, self.extensions, read_chunk_range )
+                with span( 'select' ):
+                    if select_array is None:
+                        select_array = np.ones( len(q), dtype='bool' )
+                    if lower is not None:
+                        select_array &= q > lower
+                    if upper is not None:
+                        select_array &= q < upper
+                released( q.nbytes )
+            # Read and select the quantities
+            data_list = []
+            for quantity in var_list:
+                data = self.data_reader.read_species_data( iteration,
+                    species, quantity, self.extensions, read_chunk_range,
+                    output_type=output_type )
+                if select_array is not None:
+                    with span( 'gather' ):
+                        selected = data[ select_array ]
+                    allocated( selected.nbytes, 'gather' )
+                    released( data.nbytes )
+                    data = selected
+                data_list.append( data )
+            yield data_list
+
+    @profiled_query
     def get_field(self, field=None, coord=None, t=None, iteration=None,
                   m='all', theta=0., slice_across=None,
                   slice_relative_position=None, plot=False,
-                  plot_range=[[None, None], [None, None]], **kw):
+                  plot_range=[[None, None], [None, None]],
+                  max_resolution=None, region=None, dtype=None, **kw):
         """
         Extract a given field from a file in the openPMD format.
 
@@ -893,6 +1750,30 @@ class OpenPMDTimeSeries(InteractiveViewer):
            along the 1st axis (first list) and 2nd axis (second list)
            Default: plots the full extent of the simulation box
 
+        max_resolution : int or dict, optional
+           Maximum number of points of the returned array, either along
+           every axis (int) or along some axes (dict, e.g. {'x': 400}).
+           Larger fields are block-averaged, by the smallest integer
+           factor that satisfies this limit. If a field pyramid was
+           registered (see `build_field_pyramid`), a level of the pyramid
+           is read and averaged instead of the full data, with the
+           same result.
+           This is useful for interactive visualization of large fields,
+           where the resolution of the screen is the limiting factor.
+
+        region : dict, optional
+           Region of interest, in meters, e.g. {'x': [xmin, xmax],
+           'z': [zmin, zmax]} (either bound can be None). Only the grid
+           points inside this region are returned, and `info` is cropped
+           accordingly. In cartesian geometry, only the corresponding
+           hyperslab is read from disk.
+           (In thetaMode, the keys can be 'r' and 'z', or 'x', 'y' and 'z'
+           when `theta` is None.)
+
+        dtype : string, optional
+           The type of the returned array: 'float32', 'float64' or 'native'
+           (see the argument `dtype` of OpenPMDTimeSeries)
+
         **kw : dict, otional
            Additional options to be passed to matplotlib's imshow.
 
@@ -925,6 +1806,19 @@ class OpenPMDTimeSeries(InteractiveViewer):
                     raise OpenPMDException(
                     'The `slice_across` argument is erroneous: contains %s\n'
                     'The available axes are: \n - %s' % (axis, axes_list) )
+        # Check the region of interest
+        if region is not None:
+            if self.fields_metadata[field]['geometry'] == 'thetaMode' \
+                    and theta is None:
+                region_axes = ['x', 'y', 'z']
+            else:
+                region_axes = self.fields_metadata[field]['axis_labels']
+            for axis in region:
+                if axis not in region_axes:
+                    axes_list = '\n - '.join(region_axes)
+                    raise OpenPMDException(
+                    'The `region` argument is erroneous: contains %s\n'
+                    'The available axes are: \n - %s' % (axis, axes_list) )
 
         # Check the coordinate, for vector fields
         if self.fields_metadata[field]['type'] == 'vector':
@@ -951,6 +1845,11 @@ class OpenPMDTimeSeries(InteractiveViewer):
                     "The requested mode '%s' is not available.\n"
                     "The available modes are: \n - %s" % (m, mode_list))
 
+        # The cartesian fields are returned in the type in which they are
+        # stored, and the thetaMode fields as float64, unless `dtype` is set
+        output_type = self._get_output_type( dtype, default=None )
+        circ_output_type = self._get_output_type( dtype )
+
         # Find the output that corresponds to the requested time/iteration
         # (Modifies self._current_i, self.current_iteration and self.current_t)
         self._find_output(t, iteration)
@@ -966,11 +1865,21 @@ class OpenPMDTimeSeries(InteractiveViewer):
         # Get the field data
         geometry = self.fields_metadata[field]['geometry']
         axis_labels = self.fields_metadata[field]['axis_labels']
+        # - From the precomputed pyramid, if possible
+        pyramid_result = None
+        if max_resolution is not None and self.field_pyramid is not None \
+                and region is None and geometry != "thetaMode" \
+                and self.field_pyramid.has_field(iteration, field_label):
+            pyramid_result = self.field_pyramid.read( iteration,
+                field_label, max_resolution,
+                slice_across, slice_relative_position )
+        if pyramid_result is not None:
+            F, info = pyramid_result
         # - For cartesian
-        if geometry in ["1dcartesian", "2dcartesian", "3dcartesian"]:
+        elif geometry in ["1dcartesian", "2dcartesian", "3dcartesian"]:
             F, info = self.data_reader.read_field_cartesian(
                 iteration, field, coord, axis_labels,
-                slice_relative_position, slice_across)
+                slice_relative_position, slice_across, region, output_type )
         # - For thetaMode
         elif geometry == "thetaMode":
             if (coord in ['x', 'y']) and \
@@ -978,35 +1887,118 @@ class OpenPMDTimeSeries(InteractiveViewer):
                 # For Cartesian components, combine r and t components
                 Fr, info = self.data_reader.read_field_circ(
                     iteration, field, 'r', slice_relative_position,
-                    slice_across, m, theta)
+                    slice_across, m, theta, output_type=circ_output_type )
                 Ft, info = self.data_reader.read_field_circ(
                     iteration, field, 't', slice_relative_position,
-                    slice_across, m, theta)
+                    slice_across, m, theta, output_type=circ_output_type )
                 F = combine_cylindrical_components(Fr, Ft, theta, coord, info)
             else:
                 # For cylindrical or scalar components, no special treatment
                 F, info = self.data_reader.read_field_circ(iteration,
                     field, coord, slice_relative_position,
-                    slice_across, m, theta)
+                    slice_across, m, theta, output_type=circ_output_type )
+            # The modes are recombined on the full grid: crop afterwards
+            if region is not None:
+                F = crop_field_to_region( F, info, region )
+
+        # Reduce the resolution, if the data was read at full resolution
+        if max_resolution is not None:
+            F, info = downsample_field( F, info, max_resolution )
+        # (e.g. for the levels of the pyramid)
+        if output_type is not None and F.dtype != output_type:
+            F = F.astype( output_type )
 
         # Plot the resulting field
-        # Deactivate plotting when there is no slice selection
         if plot:
-            if F.ndim == 1:
-                self.plotter.show_field_1d(F, info, field_label,
-                self._current_i, plot_range=plot_range, **kw)
-            elif F.ndim == 2:
-                self.plotter.show_field_2d(F, info, slice_across, m,
-                    field_label, geometry, self._current_i,
-                    plot_range=plot_range, **kw)
-            else:
-                raise OpenPMDException('Cannot plot %d-dimensional data.\n'
-                    'Use the argument `slice_across`, or set `plot=False`' % F.ndim)
+            self._plot_field( F, info, field, coord, slice_across, m,
+                              plot_range, **kw )
 
         # Return the result
         return(F, info)
 
-    def iterate( self, called_method, *args, **kwargs ):
+    def _plot_field( self, F, info, field, coord, slice_across, m,
+                     plot_range, **kw ):
+        """
+        Plot the 1D or 2D field array `F`
+        (see the parameters of `get_field`)
+        """
+        if self.fields_metadata[field]['type'] == 'vector':
+            field_label = field + coord
+        else:
+            field_label = field
+        geometry = self.fields_metadata[field]['geometry']
+        # Deactivate plotting when there is no slice selection
+        if F.ndim == 1:
+            self.plotter.show_field_1d(F, info, field_label,
+            self._current_i, plot_range=plot_range, **kw)
+        elif F.ndim == 2:
+            self.plotter.show_field_2d(F, info, slice_across, m,
+                field_label, geometry, self._current_i,
+                plot_range=plot_range, **kw)
+        else:
+            raise OpenPMDException('Cannot plot %d-dimensional data.\n'
+                'Use the argument `slice_across`, or set `plot=False`' % F.ndim)
+
+    def build_field_pyramid( self, filename, field=None, coord=None,
+                             iterations=None, min_size=64 ):
+        """
+        Precompute downsampled versions of a field and store them in a
+        sidecar HDF5 file, which is then used by `get_field` when the
+        argument `max_resolution` is passed.
+
+        Each level of the pyramid is obtained by averaging blocks of 2
+        points along every axis that has more than `min_size` points.
+        (Only cartesian geometries are supported.)
+
+        Parameters
+        ----------
+        filename: string
+            The path to the sidecar HDF5 file
+
+        field : string
+           Which field to process
+
+        coord : string, optional
+           Which component of the field to process (for vector fields)
+
+        iterations: list of int, optional
+            The iterations to process (default: all iterations)
+
+        min_size: int, optional
+            Axes that have `min_size` points or less are not downsampled
+        """
+        if self.avail_fields is None or field not in self.avail_fields:
+            raise OpenPMDException(
+                "The `field` argument is missing or erroneous.")
+        geometry = self.fields_metadata[field]['geometry']
+        if geometry == "thetaMode":
+            raise OpenPMDException(
+                "Field pyramids are only supported for cartesian geometries.")
+        if self.fields_metadata[field]['type'] == 'vector':
+            field_label = field + coord
+        else:
+            coord = None
+            field_label = field
+        axis_labels = self.fields_metadata[field]['axis_labels']
+        if iterations is None:
+            iterations = self.iterations
+
+        pyramid = FieldPyramid( filename )
+        for iteration in iterations:
+            F, info = self.data_reader.read_field_cartesian(
+                iteration, field, coord, axis_labels, None, None )
+            # Store the grid in SI units, with the first point as offset
+            grid_spacing = [ getattr(info, 'd' + label)
+                             for label in axis_labels ]
+            global_offset = [ getattr(info, label + 'min')
+                              for label in axis_labels ]
+            pyramid.write( iteration, field_label, F, axis_labels,
+                grid_spacing, global_offset, 1., [0.] * len(axis_labels),
+                min_size=min_size )
+        self.field_pyramid = pyramid
+
+    def iterate( self, called_method, *args, output_file=None, dtype=None,
+                 **kwargs ):
         """
         Repeated calls the method `called_method` for every iteration of this
         timeseries, with the arguments `*args` and `*kwargs`.
@@ -1017,36 +2009,81 @@ class OpenPMDTimeSeries(InteractiveViewer):
         If `called_method` returns a tuple/list, then `iterate` returns a
         tuple/list of lists (or arrays).
 
+        For a streaming time series (see the argument `streaming` of
+        OpenPMDTimeSeries), the iterations are processed as they are
+        produced, until the end of the stream.
+
         Parameters
         ----------
         *args, **kwargs: arguments and keyword arguments
             Arguments that would normally be passed to `called_method` for
             a single iteration. Do not pass the argument `t` or `iteration`.
+
+        output_file: string, optional
+            The path to an HDF5 file, to which the result at each iteration
+            is appended as soon as it is computed (see
+            `save_iteration_result`), so that the results can be read
+            (with `load_iteration_results`) while the time series is
+            being processed.
+
+        dtype: string, optional
+            The type of the particle and field data read by `called_method`
+            (see the argument `dtype` of OpenPMDTimeSeries), e.g. 'float32'
+            to compute the diagnostics of `LpaDiagnostics` with half of
+            the memory
         """
-        # Add the iteration key in the keyword aguments
-        kwargs['iteration'] = self.iterations[0]
-
-        # Check the shape of results
-        result = called_method(*args, **kwargs)
-        result_type = type( result )
-        if result_type in [tuple, list]:
-            returns_iterable = True
-            iterable_length = len(result)
-            accumulated_result = [ [element] for element in result ]
+        if dtype is None:
+            return self._iterate( called_method, args, kwargs, output_file )
+        # Set the type of the data for the duration of the iterations
+        self._get_output_type( dtype )
+        previous_dtype = self.dtype
+        self.dtype = dtype
+        try:
+            return self._iterate( called_method, args, kwargs, output_file )
+        finally:
+            self.dtype = previous_dtype
+
+    def _iterate( self, called_method, args, kwargs, output_file ):
+        """
+        Call `called_method` at each iteration (see `iterate`)
+        """
+        if self.streaming:
+            iterations = self.stream_iterations()
         else:
-            returns_iterable = False
-            accumulated_result = [ result ]
+            iterations = self.iterations
 
         # Call the method for all iterations
-        for iteration in tqdm(self.iterations[1:]):
+        from tqdm import tqdm
+        accumulated_result = None
+        for iteration in tqdm(iterations):
             kwargs['iteration'] = iteration
             result = called_method( *args, **kwargs )
+            if output_file is not None:
+                self._find_output( None, iteration )
+                save_iteration_result( output_file, iteration,
+                                       self.current_t, result )
+
+            # Check the shape of results
+            if accumulated_result is None:
+                result_type = type( result )
+                if result_type in [tuple, list]:
+                    returns_iterable = True
+                    iterable_length = len(result)
+                    accumulated_result = [ [] for element in result ]
+                else:
+                    returns_iterable = False
+                    accumulated_result = []
+
             if returns_iterable:
                 for i in range(iterable_length):
                     accumulated_result[i].append( result[i] )
             else:
                 accumulated_result.append( result )
 
+        # Empty stream
+        if accumulated_result is None:
+            return []
+
         # Try to stack the arrays
         if returns_iterable:
             for i in range(iterable_length):
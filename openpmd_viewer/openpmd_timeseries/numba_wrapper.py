@@ -14,6 +14,9 @@ try:
     import numba
     numba_installed = True
     jit = numba.njit(cache=True)
+    # Multi-threaded version, for loops written with `prange`
+    parallel_jit = numba.njit(cache=True, parallel=True)
+    prange = numba.prange
 
 except ImportError:
     numba_installed = False
@@ -28,3 +31,5 @@ except ImportError:
                 'Please consider installing `numba` (e.g. `pip install numba`)')
             return f(*args, **kwargs)
         return decorated_f
+    parallel_jit = jit
+    prange = range
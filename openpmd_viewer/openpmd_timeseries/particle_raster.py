@@ -0,0 +1,92 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines the ParticleRaster class, which bins two particle quantities
+into an image of fixed resolution (e.g. the size in pixels of the plot),
+one batch of particles at a time, so that the memory used to plot the
+phase space of a species scales with the number of pixels instead of
+the number of particles.
+
+Copyright 2024, openPMD-viewer contributors
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+from .numba_wrapper import numba_installed
+from .plotter import print_cic_unavailable
+if numba_installed:
+    from .utilities import histogram_cic_2d
+
+# Default number of particles per batch (i.e. 32 MB per quantity)
+default_batch_size = 2**22
+
+
+class ParticleRaster( object ):
+    """
+    Accumulation buffer of the 2D histogram of two particle quantities.
+
+    The batches of particles are deposited with `add`, and only the
+    particles that are inside `hist_range` contribute: rendering a
+    zoomed-in view simply uses a narrower `hist_range`, with the same
+    number of pixels.
+    """
+
+    def __init__( self, hist_range, resolution, deposition='cic' ):
+        """
+        Initialize an empty ParticleRaster
+
+        Parameters
+        ----------
+        hist_range: list of 2 lists of 2 floats
+            Extent of the histogram along each direction
+
+        resolution: list of 2 ints
+            Number of pixels along each direction
+
+        deposition: string
+            Either `ngp` (Nearest Grid Point) or `cic` (Cloud-In-Cell)
+        """
+        if deposition not in ['ngp', 'cic']:
+            raise ValueError('Unknown deposition method: %s' % deposition)
+        if deposition == 'cic' and not numba_installed:
+            print_cic_unavailable()
+            deposition = 'ngp'
+        self.hist_range = [ [ float(bound) for bound in bounds ]
+                            for bounds in hist_range ]
+        self.resolution = [ int(n) for n in resolution ]
+        self.deposition = deposition
+        self.data = np.zeros( self.resolution, dtype=np.float64 )
+        self.n_particles = 0
+
+    @property
+    def extent( self ):
+        """
+        Extent of the image, in the format of matplotlib's imshow
+        """
+        return self.hist_range[0] + self.hist_range[1]
+
+    def add( self, q1, q2, w=None ):
+        """
+        Deposit a batch of particles
+
+        Parameters
+        ----------
+        q1, q2: 1darrays of floats
+            The two quantities of each macroparticle
+
+        w: 1darray of floats, optional
+            The weight of each macroparticle (default: 1)
+        """
+        q1 = q1.astype( np.float64, copy=False )
+        q2 = q2.astype( np.float64, copy=False )
+        if w is None:
+            w = np.ones_like( q1 )
+        if self.deposition == 'ngp':
+            binned_data, _, _ = np.histogram2d(
+                q1, q2, self.resolution, self.hist_range, weights=w )
+        else:
+            binned_data = histogram_cic_2d( q1, q2, w,
+                self.resolution[0], self.hist_range[0][0],
+                self.hist_range[0][1], self.resolution[1],
+                self.hist_range[1][0], self.hist_range[1][1] )
+        self.data += binned_data
+        self.n_particles += len( q1 )
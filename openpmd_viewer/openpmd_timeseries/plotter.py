@@ -10,76 +10,19 @@ License: 3-Clause-BSD-LBNL
 """
 import numpy as np
 import math
-try:
-    import warnings
-    import matplotlib
-    import matplotlib.pyplot as plt
-    matplotlib_installed = True
-except ImportError:
-    matplotlib_installed = False
+import warnings
+import importlib.util
+# matplotlib is only imported when the first plot is made
+# (see `check_matplotlib`), since it is slow to import
+matplotlib_installed = importlib.util.find_spec('matplotlib') is not None
+matplotlib = None
+plt = None
+tick_formatter = None
 
 from .numba_wrapper import numba_installed
 if numba_installed:
     from .utilities import histogram_cic_1d, histogram_cic_2d
 
-# Redefine the default matplotlib formatter for ticks
-if matplotlib_installed:
-    from matplotlib.ticker import ScalarFormatter
-
-    class PowerOfThreeFormatter( ScalarFormatter ):
-        """
-        Formatter for matplotlib's axes ticks,
-        that prints numbers as e.g. 1.5e3, 3.2e6, 0.2e-9,
-        where the exponent is always a multiple of 3.
-
-        This helps a human reader to quickly identify the closest units
-        (e.g. nanometer) of the plotted quantity.
-
-        This class derives from `ScalarFormatter`, which
-        provides a nice `offset` feature.
-        """
-        def __init__( self, *args, **kwargs ):
-            ScalarFormatter.__init__( self, *args, **kwargs )
-            # Do not print the order of magnitude on the side of the axis
-            self.set_scientific(False)
-            # Reduce the threshold for printing an offset on side of the axis
-            self._offset_threshold = 2
-
-        def __call__(self, x, pos=None):
-            """
-            Function called for each tick of an axis (for matplotlib>=3.1)
-            Returns the string that appears in the plot.
-            """
-            return self.pprint_val( x, pos )
-
-        def pprint_val( self, x, pos=None):
-            """
-            Function called for each tick of an axis (for matplotlib<3.1)
-            Returns the string that appears in the plot.
-            """
-            # Calculate the exponent (power of 3)
-            xp = (x - self.offset)
-            if xp != 0:
-                exponent = int(3 * math.floor( math.log10(abs(xp)) / 3 ))
-            else:
-                exponent = 0
-            # Show 3 digits at most after decimal point
-            mantissa = round( xp * 10**(-exponent), 3)
-            # After rounding the exponent might change (e.g. 0.999 -> 1.)
-            if mantissa != 0 and math.log10(abs(mantissa)) == 3:
-                exponent += 3
-                mantissa /= 1000
-            string = "{:.3f}".format( mantissa )
-            if '.' in string:
-                # Remove trailing zeros and ., for integer mantissa
-                string = string.rstrip('0')
-                string = string.rstrip('.')
-            if exponent != 0:
-                string += "e{:d}".format( exponent )
-            return string
-
-    tick_formatter = PowerOfThreeFormatter()
-
 
 class Plotter(object):
 
@@ -108,8 +51,14 @@ class Plotter(object):
         self.t = t
         self.iterations = iterations
 
+        # Images of the 2D plots made with `update=True`, for each figure
+        # number: (layout, image, colorbar), where the layout determines
+        # whether the image can be updated in place
+        self._images = {}
+
     def hist1d(self, q1, w, quantity1, species, current_i, nbins, hist_range,
-               cmap='Blues', vmin=None, vmax=None, deposition='cic', **kw):
+               cmap='Blues', vmin=None, vmax=None, deposition='cic',
+               update=False, **kw):
         """
         Plot a 1D histogram of the particle quantity q1
         Sets the proper labels
@@ -145,6 +94,9 @@ class Plotter(object):
             particles affects neighboring bins.
             `cic` (which is the default) leads to smoother results than `ngp`.
 
+        update : bool, optional
+           Whether to clear the current figure before plotting
+
         **kw : dict, otional
            Additional options to be passed to matplotlib's bar function
         """
@@ -171,6 +123,8 @@ class Plotter(object):
             raise ValueError('Unknown deposition method: %s' % deposition)
 
         # Do the plot
+        if update:
+            plt.clf()
         bin_size = (hist_range[0][1] - hist_range[0][0]) / nbins
         bin_coords = hist_range[0][0] + bin_size * ( 0.5 + np.arange(nbins) )
         plt.bar( bin_coords, binned_data, width=bin_size, **kw )
@@ -186,7 +140,7 @@ class Plotter(object):
 
     def hist2d(self, q1, q2, w, quantity1, quantity2, species, current_i,
                 nbins, hist_range, cmap='Blues', vmin=None, vmax=None,
-                deposition='cic', **kw):
+                deposition='cic', update=False, **kw):
         """
         Plot a 2D histogram of the particle quantity q1
         Sets the proper labels
@@ -222,16 +176,18 @@ class Plotter(object):
             particles affects neighboring bins.
             `cic` (which is the default) leads to smoother results than `ngp`.
 
+        update : bool, optional
+           Whether to update the image of the current figure in place
+           (image data, extent, color limits and title), if it was
+           plotted with `update=True` and with the same quantities and
+           options. Otherwise, the figure is cleared before plotting.
+
         **kw : dict, otional
            Additional options to be passed to matplotlib's imshow function
         """
         # Check if matplotlib is available
         check_matplotlib()
 
-        # Find the iteration and time
-        iteration = self.iterations[current_i]
-        time = self.t[current_i]
-
         # Check deposition method
         if deposition == 'cic' and not numba_installed:
             print_cic_unavailable()
@@ -251,21 +207,115 @@ class Plotter(object):
             raise ValueError('Unknown deposition method: %s' % deposition)
 
         # Do the plot
-        plt.imshow( binned_data.T, extent=hist_range[0] + hist_range[1],
+        self._show_hist2d( binned_data, hist_range[0] + hist_range[1],
+            quantity1, quantity2, species, current_i, cmap, vmin, vmax,
+            'linear', update, **kw )
+
+    def show_particle_raster( self, raster, quantity1, quantity2, species,
+                              current_i, norm='linear', cmap='Blues',
+                              vmin=None, vmax=None, update=False, **kw ):
+        """
+        Plot the 2D histogram accumulated in a ParticleRaster
+        Sets the proper labels
+
+        Parameters
+        ----------
+        raster: a ParticleRaster object
+            The histogram of the particle quantities
+
+        quantity1, quantity2: strings
+            The name of the quantity to be plotted (for labeling purposes)
+
+        species: string
+            The name of the species from which the data is taken
+
+        current_i: int
+            The index of this iteration, within the iterations list
+
+        norm: string
+            Either 'linear' or 'log': the scale of the colormap
+
+        update : bool, optional
+           Whether to update the image of the current figure in place
+           (see `hist2d`)
+
+        **kw : dict, otional
+           Additional options to be passed to matplotlib's imshow function
+        """
+        # Check if matplotlib is available
+        check_matplotlib()
+        self._show_hist2d( raster.data, raster.extent, quantity1, quantity2,
+            species, current_i, cmap, vmin, vmax, norm, update, **kw )
+
+    def axes_resolution( self ):
+        """
+        Return the size in pixels [width, height] of the axes
+        of the current figure (or of the axes of a new plot)
+        """
+        check_matplotlib()
+        fig = plt.gcf()
+        if fig.axes:
+            bbox = fig.axes[0].get_window_extent()
+            width, height = bbox.width, bbox.height
+        else:
+            # (The colorbar takes 20% of the width of the axes)
+            params = fig.subplotpars
+            width = 0.8 * fig.get_figwidth() * fig.dpi * \
+                (params.right - params.left)
+            height = fig.get_figheight() * fig.dpi * \
+                (params.top - params.bottom)
+        return [ max( 1, int(round(width)) ), max( 1, int(round(height)) ) ]
+
+    def visible_range( self ):
+        """
+        Return the range [[xmin, xmax], [ymin, ymax]] that is shown
+        by the axes of the current figure (e.g. after zooming in)
+        """
+        check_matplotlib()
+        fig = plt.gcf()
+        if not fig.axes:
+            raise ValueError('The current figure has no axes.')
+        ax = fig.axes[0]
+        return [ list( ax.get_xlim() ), list( ax.get_ylim() ) ]
+
+    def _show_hist2d( self, binned_data, extent, quantity1, quantity2,
+                      species, current_i, cmap, vmin, vmax, norm, update,
+                      **kw ):
+        """
+        Plot the 2D histogram `binned_data` (see `hist2d`)
+        """
+        # Find the iteration and time
+        iteration = self.iterations[current_i]
+        time = self.t[current_i]
+
+        title = "%s:   t =  %.2e s   (iteration %d)" \
+            % (species, time, iteration)
+        layout = ('hist2d', quantity1, quantity2, norm, sorted(kw.items()))
+        if self._update_image( update, layout, binned_data.T, extent,
+                               cmap, vmin, vmax, title ):
+            return
+        if norm == 'log':
+            # (The empty bins are not colored)
+            kw['norm'] = matplotlib.colors.LogNorm( vmin, vmax )
+        elif norm == 'linear':
+            kw.update( vmin=vmin, vmax=vmax )
+        else:
+            raise ValueError('Unknown normalization: %s' % norm)
+        plt.imshow( binned_data.T, extent=extent,
              origin='lower', interpolation='nearest', aspect='auto',
-             cmap=cmap, vmin=vmin, vmax=vmax, **kw )
-        plt.colorbar()
+             cmap=cmap, **kw )
+        colorbar = plt.colorbar()
         plt.xlabel(quantity1, fontsize=self.fontsize)
         plt.ylabel(quantity2, fontsize=self.fontsize)
-        plt.title("%s:   t =  %.2e s   (iteration %d)"
-                  % (species, time, iteration), fontsize=self.fontsize)
+        plt.title(title, fontsize=self.fontsize)
         # Format the ticks
         ax = plt.gca()
         ax.get_xaxis().set_major_formatter( tick_formatter )
         ax.get_yaxis().set_major_formatter( tick_formatter )
+        self._register_image( update, layout, ax.images[-1], colorbar )
 
     def show_field_1d( self, F, info, field_label, current_i, plot_range,
-                            vmin=None, vmax=None, **kw ):
+                            vmin=None, vmax=None, update=False, **kw ):
         """
         Plot the given field in 1D
 
@@ -286,6 +336,9 @@ class Plotter(object):
         plot_range : list of lists
            Indicates the values between which to clip the plot,
            along the 1st axis (first list) and 2nd axis (second list)
+
+        update : bool, optional
+           Whether to clear the current figure before plotting
         """
         # Check if matplotlib is available
         check_matplotlib()
@@ -293,6 +346,8 @@ class Plotter(object):
         # Find the iteration and time
         iteration = self.iterations[current_i]
         time = self.t[current_i]
+        if update:
+            plt.clf()
 
         # Get the x axis
         xaxis = getattr( info, info.axes[0] )
@@ -326,7 +381,7 @@ class Plotter(object):
         ax.get_yaxis().set_major_formatter( tick_formatter )
 
     def show_field_2d(self, F, info, slice_across, m, field_label, geometry,
-                        current_i, plot_range, **kw):
+                        current_i, plot_range, update=False, **kw):
         """
         Plot the given field in 2D
 
@@ -355,6 +410,13 @@ class Plotter(object):
         plot_range : list of lists
            Indicates the values between which to clip the plot,
            along the 1st axis (first list) and 2nd axis (second list)
+
+        update : bool, optional
+           Whether to update the image of the current figure in place
+           (image data, extent, color limits and title), if it was
+           plotted with `update=True` in the same geometry and with the
+           same axes and options. Otherwise, the figure is cleared
+           before plotting.
         """
         # Check if matplotlib is available
         check_matplotlib()
@@ -363,18 +425,13 @@ class Plotter(object):
         iteration = self.iterations[current_i]
         time = self.t[current_i]
 
-        # Plot the data
+        # Get the data and the title
         if np.issubdtype(F.dtype, np.complexfloating):
             plot_data = abs(F)
             title = "|%s|" %field_label
         else:
             plot_data = F
             title = "%s" %field_label
-        plt.imshow(plot_data, extent=info.imshow_extent, origin='lower',
-                   interpolation='nearest', aspect='auto', **kw)
-        plt.colorbar()
-
-        # Get the title and labels
         # Cylindrical geometry
         if geometry == "thetaMode":
             mode = str(m)
@@ -383,6 +440,25 @@ class Plotter(object):
         # 2D Cartesian geometry
         else:
             title += " at %.2e s   (iteration %d)" % (time, iteration)
+
+        # Update the previous image, if possible
+        image_kw = { key: value for key, value in kw.items()
+                     if key not in ['cmap', 'vmin', 'vmax'] }
+        layout = ('field', geometry, info.axes[0], info.axes[1],
+                  sorted(image_kw.items()))
+        if self._update_image( update, layout, plot_data,
+                info.imshow_extent, kw.get('cmap'), kw.get('vmin'),
+                kw.get('vmax'), title, plot_range ):
+            return
+
+        # Plot the data
+        plt.imshow(plot_data, extent=info.imshow_extent, origin='lower',
+                   interpolation='nearest', aspect='auto', **kw)
+        colorbar = plt.colorbar()
+        self._register_image( update, layout, plt.gca().images[-1],
+                              colorbar )
+
+        # Get the title and labels
         plt.title(title, fontsize=self.fontsize)
 
         # Add the name of the axes
@@ -401,6 +477,58 @@ class Plotter(object):
         ax.get_xaxis().set_major_formatter( tick_formatter )
         ax.get_yaxis().set_major_formatter( tick_formatter )
 
+    def _update_image( self, update, layout, data, extent, cmap, vmin, vmax,
+                       title, plot_range=None ):
+        """
+        Update, in place, the image of the current figure that was plotted
+        with the same `layout`, and return True.
+
+        If there is no such image, clear the figure (when `update` is True)
+        and return False, so that the caller makes a new plot.
+        """
+        if not update:
+            return False
+        fig = plt.gcf()
+        previous = self._images.get( fig.number )
+        if previous is not None:
+            previous_layout, image, colorbar = previous
+            if previous_layout == layout and image.axes is not None \
+                    and image.axes.figure is fig:
+                ax = image.axes
+                image.set_data( data )
+                image.set_extent( extent )
+                if cmap is not None:
+                    image.set_cmap( cmap )
+                # Adapt the color limits to the data, except the given ones
+                image.autoscale()
+                if (vmin is not None) or (vmax is not None):
+                    image.set_clim( vmin, vmax )
+                colorbar.update_normal( image )
+                ax.set_title( title, fontsize=self.fontsize )
+                ax.set_xlim( extent[0], extent[1] )
+                ax.set_ylim( extent[2], extent[3] )
+                if plot_range is not None:
+                    if (plot_range[0][0] is not None) and \
+                            (plot_range[0][1] is not None):
+                        ax.set_xlim( plot_range[0][0], plot_range[0][1] )
+                    if (plot_range[1][0] is not None) and \
+                            (plot_range[1][1] is not None):
+                        ax.set_ylim( plot_range[1][0], plot_range[1][1] )
+                # (The modified artists mark the figure as stale, so that
+                # it is redrawn by pyplot in interactive mode)
+                return True
+        # The figure is rebuilt
+        self._images.pop( fig.number, None )
+        plt.clf()
+        return False
+
+    def _register_image( self, update, layout, image, colorbar ):
+        """
+        Keep the artists of a new plot made with `update=True`
+        """
+        if update:
+            self._images[ plt.gcf().number ] = (layout, image, colorbar)
+
 
 def print_cic_unavailable():
     warnings.warn(
@@ -409,15 +537,84 @@ def print_cic_unavailable():
         "Please considering installing numba (e.g. `pip install numba`)")
 
 
+def make_tick_formatter():
+    """
+    Return the matplotlib formatter of the axes ticks of the plots
+    (requires matplotlib to be imported)
+    """
+    from matplotlib.ticker import ScalarFormatter
+
+    class PowerOfThreeFormatter( ScalarFormatter ):
+        """
+        Formatter for matplotlib's axes ticks,
+        that prints numbers as e.g. 1.5e3, 3.2e6, 0.2e-9,
+        where the exponent is always a multiple of 3.
+
+        This helps a human reader to quickly identify the closest units
+        (e.g. nanometer) of the plotted quantity.
+
+        This class derives from `ScalarFormatter`, which
+        provides a nice `offset` feature.
+        """
+        def __init__( self, *args, **kwargs ):
+            ScalarFormatter.__init__( self, *args, **kwargs )
+            # Do not print the order of magnitude on the side of the axis
+            self.set_scientific(False)
+            # Reduce the threshold for printing an offset on side of the axis
+            self._offset_threshold = 2
+
+        def __call__(self, x, pos=None):
+            """
+            Function called for each tick of an axis (for matplotlib>=3.1)
+            Returns the string that appears in the plot.
+            """
+            return self.pprint_val( x, pos )
+
+        def pprint_val( self, x, pos=None):
+            """
+            Function called for each tick of an axis (for matplotlib<3.1)
+            Returns the string that appears in the plot.
+            """
+            # Calculate the exponent (power of 3)
+            xp = (x - self.offset)
+            if xp != 0:
+                exponent = int(3 * math.floor( math.log10(abs(xp)) / 3 ))
+            else:
+                exponent = 0
+            # Show 3 digits at most after decimal point
+            mantissa = round( xp * 10**(-exponent), 3)
+            # After rounding the exponent might change (e.g. 0.999 -> 1.)
+            if mantissa != 0 and math.log10(abs(mantissa)) == 3:
+                exponent += 3
+                mantissa /= 1000
+            string = "{:.3f}".format( mantissa )
+            if '.' in string:
+                # Remove trailing zeros and ., for integer mantissa
+                string = string.rstrip('0')
+                string = string.rstrip('.')
+            if exponent != 0:
+                string += "e{:d}".format( exponent )
+            return string
+
+    return PowerOfThreeFormatter()
+
+
 def check_matplotlib():
     """Raise error messages or warnings when potential issues when
-    potenial issues with matplotlib are detected."""
+    potenial issues with matplotlib are detected.
+    (matplotlib is imported at the first call.)"""
+    global matplotlib, plt, tick_formatter
 
     if not matplotlib_installed:
         raise RuntimeError( "Failed to import the openPMD-viewer plotter.\n"
             "(Make sure that matplotlib is installed.)")
 
-    elif ('MacOSX' in matplotlib.get_backend()):
+    if plt is None:
+        import matplotlib
+        import matplotlib.pyplot as plt
+        tick_formatter = make_tick_formatter()
+
+    if ('MacOSX' in matplotlib.get_backend()):
         warnings.warn("\n\nIt seems that you are using the matplotlib MacOSX "
         "backend. \n(This typically obtained when typing `%matplotlib`.)\n"
         "With recent version of Jupyter, the plots might not appear.\nIn this "
@@ -0,0 +1,242 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines the IterationPrefetcher class, which reads in the background
+the data that the slider will show at the adjacent iterations, so that
+stepping through a time series does not wait for the reads.
+
+Copyright 2024, openPMD-viewer contributors
+License: 3-Clause-BSD-LBNL
+"""
+import copy
+import threading
+import numpy as np
+from .cache import LRUCache
+from .utilities import parse_memory_size
+
+
+def freeze( value ):
+    """
+    Return a hashable version of `value`, where the dictionaries and
+    lists that it contains are converted to tuples
+    """
+    if isinstance( value, dict ):
+        return tuple( sorted( (key, freeze(item))
+                              for key, item in value.items() ) )
+    elif isinstance( value, (list, tuple) ):
+        return tuple( freeze(item) for item in value )
+    elif isinstance( value, np.generic ):
+        return value.item()
+    return value
+
+
+def open_reader( ts ):
+    """
+    Return a new time series, with the same class and options as `ts`
+    (e.g. `memory_budget`, `dtype`) but its own file handles, so that it
+    can read on another thread without changing the iteration that is
+    viewed with `ts` (`_current_i`, `current_iteration`)
+    """
+    # (A streamed series is read from its files)
+    kwargs = dict( ts._init_kwargs, check_all_files=False,
+                   streaming=False, stream_options=None )
+    reader = type( ts )( **kwargs )
+    reader.memory_budget = ts.memory_budget
+    return reader
+
+
+class IterationPrefetcher( object ):
+    """
+    Read the fields and particles at the iterations around the one that
+    is being viewed, on a worker thread, into a bounded cache.
+
+    Each call to `get` returns the data at one iteration (from the cache
+    if it was prefetched) and records which data is viewed (e.g. the
+    arguments of `get_field` for the current widgets) and in which
+    direction the time series is navigated. The worker thread then reads
+    the same data at the next `depth` iterations in this direction, and
+    at the previous iteration. It uses its own time series (and thus its
+    own file handles), created at the first prefetch with the same class
+    and options as the viewed one (e.g. `memory_budget`, `dtype`).
+    """
+
+    def __init__( self, ts, cache_size='1GB', depth=1, reader=None ):
+        """
+        Initialize an IterationPrefetcher
+
+        Parameters
+        ----------
+        ts: an OpenPMDTimeSeries object
+            The time series that is viewed
+
+        cache_size: int or string
+            The capacity (in bytes, or as a string such as '1GB')
+            of the cache of the prefetched data
+
+        depth: int
+            The number of iterations that are read ahead
+
+        reader: an OpenPMDTimeSeries object, optional
+            The time series that reads the data which is not in the
+            cache, in `get` (default: `ts`). When `get` is called on
+            another thread than the one that navigates `ts` (as in the
+            slider), this should be a series of this thread
+            (see `open_reader`).
+        """
+        self.ts = ts
+        self.reader = ts if reader is None else reader
+        self.depth = depth
+        self.cache = LRUCache( parse_memory_size( cache_size ) )
+        self.hits = 0
+        self.misses = 0
+        # Arguments of the data that is viewed, for each kind of data
+        self._requests = {}
+        self._current_index = None
+        self._direction = 1
+        # Reads to be done by the worker (most urgent first),
+        # and the read that it is doing
+        self._pending = []
+        self._in_progress = None
+        self._condition = threading.Condition()
+        self._thread = None
+        self._stopped = False
+        self._series = None
+
+    def get( self, kind, iteration, **kwargs ):
+        """
+        Return the data at `iteration`, and prefetch the same data at
+        the adjacent iterations
+
+        Parameters
+        ----------
+        kind: string
+            Either 'field' or 'particle'
+
+        iteration: int
+            The iteration that is viewed
+
+        kwargs:
+            The arguments of `get_field` or `get_particle`
+            (except `iteration`, `t` and `plot`)
+
+        Returns
+        -------
+        The result of `get_field` or `get_particle`
+        (This is the cached object, which should not be modified.)
+        """
+        # (The type of the series is passed explicitly, so that it is
+        # part of the key and used by the worker)
+        if self.ts.dtype is not None and 'dtype' not in kwargs:
+            kwargs = dict( kwargs, dtype=self.ts.dtype )
+        key = self._key( kind, iteration, kwargs )
+        # Wait if the worker is reading this data
+        with self._condition:
+            while self._in_progress == key:
+                self._condition.wait()
+        result = self.cache.get( key )
+        if result is not None:
+            self.hits += 1
+        else:
+            self.misses += 1
+            # (The budget may have been changed after the creation)
+            self.reader.memory_budget = self.ts.memory_budget
+            result = self._read( self.reader, kind, iteration, kwargs )
+            self.cache.put( key, result )
+
+        index = int( np.argmin( abs(self.ts.iterations - iteration) ) )
+        with self._condition:
+            if self._current_index is not None \
+                    and index != self._current_index:
+                self._direction = 1 if index > self._current_index else -1
+            self._current_index = index
+            self._requests[kind] = kwargs
+            self._schedule()
+        return result
+
+    def wait( self ):
+        """
+        Wait until the worker has read all the scheduled data
+        """
+        with self._condition:
+            while self._pending or self._in_progress is not None:
+                self._condition.wait()
+
+    def stop( self ):
+        """
+        Stop the worker thread
+        """
+        with self._condition:
+            self._stopped = True
+            self._pending = []
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def _key( self, kind, iteration, kwargs ):
+        return ( kind, int(iteration), freeze(kwargs) )
+
+    def _read( self, ts, kind, iteration, kwargs ):
+        """
+        Read the data with the OpenPMDTimeSeries `ts`
+        """
+        # (`get_particle` may modify the selection)
+        kwargs = copy.deepcopy( kwargs )
+        if kind == 'field':
+            return ts.get_field( iteration=iteration, **kwargs )
+        elif kind == 'particle':
+            return ts.get_particle( iteration=iteration, **kwargs )
+        raise ValueError( 'Unknown kind of data: %s' % kind )
+
+    def _schedule( self ):
+        """
+        Replace the reads of the worker by those around the current
+        iteration (called with the lock of the condition held)
+        """
+        n_iterations = len( self.ts.iterations )
+        offsets = [ self._direction * k for k in range(1, self.depth + 1) ]
+        offsets.append( -self._direction )
+        pending = []
+        for offset in offsets:
+            index = self._current_index + offset
+            if not 0 <= index < n_iterations:
+                continue
+            iteration = self.ts.iterations[index]
+            for kind, kwargs in self._requests.items():
+                key = self._key( kind, iteration, kwargs )
+                if key != self._in_progress and key not in self.cache:
+                    pending.append( (key, kind, iteration, kwargs) )
+        self._pending = pending
+        if pending and not self._stopped:
+            if self._thread is None:
+                self._thread = threading.Thread( target=self._run,
+                                                 daemon=True )
+                self._thread.start()
+            self._condition.notify_all()
+
+    def _run( self ):
+        """
+        Loop of the worker thread
+        """
+        while True:
+            with self._condition:
+                while not self._pending and not self._stopped:
+                    self._condition.wait()
+                if self._stopped:
+                    return
+                key, kind, iteration, kwargs = self._pending.pop(0)
+                self._in_progress = key
+            try:
+                if self._series is None:
+                    self._series = open_reader( self.ts )
+                # (The budget may have been changed after the creation)
+                self._series.memory_budget = self.ts.memory_budget
+                self.cache.put( key,
+                    self._read( self._series, kind, iteration, kwargs ) )
+            except Exception:
+                # The error is raised again if the data is viewed
+                pass
+            finally:
+                with self._condition:
+                    self._in_progress = None
+                    self._condition.notify_all()
@@ -0,0 +1,263 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines a lightweight instrumentation of the reading functions:
+the phases of a query (e.g. index query, read, select) are timed with
+`span`, and quantities such as the number of bytes read are accumulated
+with `count`. The memory that the readers allocate (output buffers,
+masks, temporaries) is tallied with `allocated` and `released`, which
+gives the peak and total memory of each query, and decisions taken
+during the query (e.g. the read strategy) are recorded with `annotate`.
+All these functions are
+no-ops unless a query is being profiled, i.e. unless the
+OpenPMDTimeSeries was created with `profile=True`.
+
+Copyright 2024, openPMD-viewer contributors
+License: 3-Clause-BSD-LBNL
+"""
+import json
+import time
+import functools
+import threading
+
+# The profile of the query that is running in the current thread (if any)
+_local = threading.local()
+
+
+class QueryProfile( object ):
+    """
+    Timings and counters recorded during one call to e.g. `get_particle`
+
+    Attributes
+    ----------
+    - query: string
+        The name of the profiled method
+
+    - total_time: float
+        The duration of the call, in seconds
+
+    - spans: dict
+        For each phase, a dictionary with the cumulated time (in seconds)
+        and the number of times that the phase was entered
+
+    - counters: dict
+        Cumulated quantities (e.g. 'bytes_read', 'n_chunks', 'n_flushes')
+
+    - memory: dict
+        The memory tallied during the query (in bytes): 'current' (still
+        allocated at the end), 'peak', 'total' (sum of all the
+        allocations) and 'allocations' (total per label, e.g. 'read')
+
+    - annotations: dict
+        Values that describe the query (e.g. 'strategy': 'read_groups')
+    """
+
+    def __init__( self, query ):
+        self.query = query
+        self.total_time = None
+        self.spans = {}
+        self.counters = {}
+        self.memory = { 'current': 0, 'peak': 0, 'total': 0,
+                        'allocations': {} }
+        self.annotations = {}
+
+    def add_time( self, name, duration ):
+        """
+        Add `duration` (in seconds) to the phase `name`
+        """
+        if name in self.spans:
+            self.spans[name]['time'] += duration
+            self.spans[name]['count'] += 1
+        else:
+            self.spans[name] = {'time': duration, 'count': 1}
+
+    def add( self, name, value=1 ):
+        """
+        Add `value` to the counter `name`
+        """
+        self.counters[name] = self.counters.get( name, 0 ) + value
+
+    def allocate( self, nbytes, label ):
+        """
+        Register the allocation of `nbytes` bytes (e.g. for 'read', 'mask')
+        """
+        memory = self.memory
+        memory['current'] += nbytes
+        memory['total'] += nbytes
+        memory['peak'] = max( memory['peak'], memory['current'] )
+        memory['allocations'][label] = \
+            memory['allocations'].get( label, 0 ) + nbytes
+
+    def release( self, nbytes ):
+        """
+        Register that `nbytes` bytes are not used anymore
+        """
+        self.memory['current'] = max( self.memory['current'] - nbytes, 0 )
+
+    def to_dict( self ):
+        """
+        Return the profile as a (JSON-serializable) dictionary
+        """
+        return { 'query': self.query, 'total_time': self.total_time,
+                 'spans': { name: dict(span) for name, span
+                            in self.spans.items() },
+                 'counters': dict( self.counters ),
+                 'memory': dict( self.memory,
+                            allocations=dict(self.memory['allocations']) ),
+                 'annotations': dict( self.annotations ) }
+
+    def to_dataframe( self ):
+        """
+        Return the timings of the phases as a pandas DataFrame,
+        with one row per phase (columns: phase, time, count)
+        """
+        import pandas as pd
+        return pd.DataFrame(
+            [ (name, span['time'], span['count'])
+              for name, span in self.spans.items() ],
+            columns=['phase', 'time', 'count'] )
+
+    def to_json_line( self, **context ):
+        """
+        Return the profile as a single line of JSON
+
+        Parameters
+        ----------
+        **context: dict
+            Additional entries (e.g. the parameters of a benchmark)
+            that are stored along with the profile
+        """
+        record = dict( context )
+        record.update( self.to_dict() )
+        return json.dumps( record )
+
+    def write_json_line( self, filename, **context ):
+        """
+        Append the profile, as a line of JSON, to the file `filename`
+        (see `to_json_line`)
+        """
+        with open( filename, 'a' ) as f:
+            f.write( self.to_json_line(**context) + '\n' )
+
+    def __repr__( self ):
+        lines = [ '%s: %.6f s' % (self.query, self.total_time or 0.) ]
+        for name, span in self.spans.items():
+            lines.append( '  %-20s %.6f s (x%d)' %
+                          (name, span['time'], span['count']) )
+        for name, value in self.counters.items():
+            lines.append( '  %-20s %s' % (name, value) )
+        lines.append( '  %-20s peak %d B, total %d B' % ('memory',
+                      self.memory['peak'], self.memory['total']) )
+        for name, value in self.annotations.items():
+            lines.append( '  %-20s %s' % (name, value) )
+        return '\n'.join( lines )
+
+
+class _Span( object ):
+    """Context manager that records its duration in a QueryProfile"""
+    __slots__ = ('profile', 'name', 'start')
+
+    def __init__( self, profile, name ):
+        self.profile = profile
+        self.name = name
+
+    def __enter__( self ):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__( self, *exc_info ):
+        self.profile.add_time( self.name, time.perf_counter() - self.start )
+        return False
+
+
+class _NullSpan( object ):
+    """Context manager that does nothing (when profiling is off)"""
+    __slots__ = ()
+
+    def __enter__( self ):
+        return self
+
+    def __exit__( self, *exc_info ):
+        return False
+
+
+_null_span = _NullSpan()
+
+
+def current_profile():
+    """
+    Return the QueryProfile of the query running in this thread, or None
+    """
+    return getattr( _local, 'profile', None )
+
+
+def span( name ):
+    """
+    Return a context manager that times the phase `name`
+    (or does nothing if no query is being profiled)
+    """
+    profile = getattr( _local, 'profile', None )
+    if profile is None:
+        return _null_span
+    return _Span( profile, name )
+
+
+def count( name, value=1 ):
+    """
+    Add `value` to the counter `name` of the current profile, if any
+    """
+    profile = getattr( _local, 'profile', None )
+    if profile is not None:
+        profile.add( name, value )
+
+
+def allocated( nbytes, label='read' ):
+    """
+    Register, in the current profile (if any), the allocation of
+    `nbytes` bytes for the purpose `label`
+    """
+    profile = getattr( _local, 'profile', None )
+    if profile is not None:
+        profile.allocate( nbytes, label )
+
+
+def released( nbytes ):
+    """
+    Register, in the current profile (if any), that `nbytes` bytes
+    are not used anymore
+    """
+    profile = getattr( _local, 'profile', None )
+    if profile is not None:
+        profile.release( nbytes )
+
+
+def annotate( name, value ):
+    """
+    Set the annotation `name` of the current profile (if any) to `value`
+    """
+    profile = getattr( _local, 'profile', None )
+    if profile is not None:
+        profile.annotations[name] = value
+
+
+def profiled_query( method ):
+    """
+    Decorator for the methods of OpenPMDTimeSeries: when the attribute
+    `profile` of the object is True, a QueryProfile is recorded during
+    the call and stored in the attribute `last_query_profile`.
+    """
+    @functools.wraps( method )
+    def profiled_method( self, *args, **kwargs ):
+        # Not profiled, or nested in an already profiled call
+        if not self.profile or getattr( _local, 'profile', None ) is not None:
+            return method( self, *args, **kwargs )
+        profile = QueryProfile( method.__name__ )
+        _local.profile = profile
+        start = time.perf_counter()
+        try:
+            return method( self, *args, **kwargs )
+        finally:
+            profile.total_time = time.perf_counter() - start
+            _local.profile = None
+            self.last_query_profile = profile
+    return profiled_method
@@ -8,12 +8,15 @@ Authors: Remi Lehe, Richard Pausch
 License: 3-Clause-BSD-LBNL
 """
 
-import time
 import copy
 import math
+import threading
+from collections import OrderedDict
 import numpy as np
-from .numba_wrapper import jit
+from .profiler import span, allocated, released
+from .numba_wrapper import jit, parallel_jit, prange, numba_installed
 from .data_order import RZorder, order_error_msg
+from .field_metainfo import FieldMetaInformation
 
 def sanitize_slicing(slice_across, slice_relative_position):
     """
@@ -53,6 +56,95 @@ def sanitize_slicing(slice_across, slice_relative_position):
     # a user's notebook)
     return copy.copy(slice_across), copy.copy(slice_relative_position)
 
+def region_to_index_range( region, axis_labels, shape, grid_spacing,
+                           global_offset, grid_unitSI, position ):
+    """
+    Convert a region of interest, given in physical units, into ranges
+    of indices along each axis of a field array.
+
+    Parameters
+    ----------
+    region: dict or None
+        A dictionary of the form {'x': [xmin, xmax], 'z': [zmin, zmax]}
+        (in meters). Axes that are not in the dictionary, or whose bounds
+        are None, are not restricted.
+
+    axis_labels: list of strings
+        The name of the dimensions of the array (e.g. ['x', 'y', 'z'])
+
+    shape, grid_spacing, global_offset, grid_unitSI, position:
+        The properties of the grid, as defined in the openPMD standard
+
+    Returns
+    -------
+    A list of tuples (start, stop), one per axis, such that the grid points
+    with indices start <= i < stop are within the region.
+    (At least one point is kept along each axis.)
+    """
+    index_range = []
+    for i_axis, label in enumerate(axis_labels):
+        n_points = shape[i_axis]
+        start, stop = 0, n_points
+        if region is not None and label in region:
+            step = grid_spacing[i_axis] * grid_unitSI
+            first = (global_offset[i_axis] + position[i_axis] *
+                     grid_spacing[i_axis]) * grid_unitSI
+            lower, upper = region[label]
+            if lower is not None:
+                start = int( math.ceil( (lower - first) / step - 1.e-6 ) )
+            if upper is not None:
+                stop = int( math.floor( (upper - first) / step + 1.e-6 ) ) + 1
+            start = min( max( start, 0 ), n_points - 1 )
+            stop = min( max( stop, start + 1 ), n_points )
+        index_range.append( (start, stop) )
+    return index_range
+
+
+def crop_field_to_region( F, info, region ):
+    """
+    Crop the field array `F` (in memory) to a region of interest,
+    and restrict the FieldMetaInformation `info` accordingly.
+
+    This is used when the region cannot be selected at read time
+    (e.g. for thetaMode fields, which are reconstructed from the modes).
+
+    Parameters
+    ----------
+    F: ndarray
+        The field array
+
+    info: a FieldMetaInformation object
+        The meta-information of `F` (modified in place)
+
+    region: dict
+        See the docstring of `region_to_index_range`
+
+    Returns
+    -------
+    The cropped field array
+    """
+    index = []
+    for i_axis in range(F.ndim):
+        label = info.axes[i_axis]
+        if label not in region:
+            index.append( slice(None) )
+            continue
+        axis_points = getattr( info, label )
+        step = getattr( info, 'd' + label )
+        lower, upper = region[label]
+        i_start, i_stop = 0, len(axis_points)
+        if lower is not None:
+            i_start = np.searchsorted( axis_points, lower - 1.e-6 * step )
+        if upper is not None:
+            i_stop = np.searchsorted( axis_points, upper + 1.e-6 * step,
+                                      side='right' )
+        i_start = min( i_start, len(axis_points) - 1 )
+        i_stop = max( i_stop, i_start + 1 )
+        info._restrict_axis( label, i_start, i_stop )
+        index.append( slice(i_start, i_stop) )
+    return F[ tuple(index) ]
+
+
 def apply_selection(iteration, data_reader, data_list,
                     select, species, extensions):
     """
@@ -92,34 +184,35 @@ def apply_selection(iteration, data_reader, data_list,
     # should be selected or not.
     Ntot = len(data_list[0])
     select_array = np.ones(Ntot, dtype='bool')
+    allocated(select_array.nbytes, 'mask')
 
     # Loop through the selection rules, and aggregate results in select_array
     for quantity in select.keys():
         q = data_reader.read_species_data(
             iteration, species, quantity, extensions)
 
-        start = time.time()
-        # Check lower bound
-        if select[quantity][0] is not None:
-            select_array = np.logical_and(
-                select_array,
-                q > select[quantity][0])
-        # Check upper bound
-        if select[quantity][1] is not None:
-            select_array = np.logical_and(
-                select_array,
-                q < select[quantity][1])
-        end = time.time()
-        print("calculate particle level select array. Time elapsed: ", end - start)
-
-
-    start = time.time()
-    # Use select_array to reduce each quantity
-    for i in range(len(data_list)):
-        if len(data_list[i]) > 1:  # Do not apply selection on scalar records
-            data_list[i] = data_list[i][select_array]
-    end = time.time()
-    print("apply particle level select array. Time elapsed: ", end - start)
+        with span('select'):
+            # Check lower bound
+            if select[quantity][0] is not None:
+                select_array = np.logical_and(
+                    select_array,
+                    q > select[quantity][0])
+            # Check upper bound
+            if select[quantity][1] is not None:
+                select_array = np.logical_and(
+                    select_array,
+                    q < select[quantity][1])
+        released(q.nbytes)
+
+    with span('gather'):
+        # Use select_array to reduce each quantity
+        for i in range(len(data_list)):
+            if len(data_list[i]) > 1:  # Do not apply selection on scalar records
+                selected = data_list[i][select_array]
+                allocated(selected.nbytes, 'gather')
+                released(data_list[i].nbytes)
+                data_list[i] = selected
+    released(select_array.nbytes)
 
     return(data_list)
 
@@ -128,6 +221,159 @@ def apply_selection_gc(iteration, data_reader, data_list, select, species, exten
     pass
 
 
+def parse_memory_size( size ):
+    """
+    Convert a memory size to a number of bytes
+
+    Parameters
+    ----------
+    size: int, float or string
+        Either a number of bytes, or a string with a unit,
+        e.g. '64GB', '512 MB' or '1.5TiB' (the units are binary,
+        i.e. 1 GB = 1024**3 bytes, as in `limit_memory_usage`)
+
+    Returns
+    -------
+    An int (number of bytes)
+    """
+    if not isinstance( size, str ):
+        return int( size )
+    units = { 'B': 1, 'KB': 1024, 'MB': 1024**2,
+              'GB': 1024**3, 'TB': 1024**4 }
+    string = size.strip().upper().replace( 'IB', 'B' )
+    for unit in sorted( units, key=len, reverse=True ):
+        if string.endswith( unit ):
+            try:
+                return int( float( string[:-len(unit)] ) * units[unit] )
+            except ValueError:
+                break
+    try:
+        return int( float( string ) )
+    except ValueError:
+        raise ValueError( 'Invalid memory size: %s' % size )
+
+
+def save_iteration_result( filename, iteration, t, result ):
+    """
+    Append the result of a method at one iteration (see the argument
+    `output_file` of `OpenPMDTimeSeries.iterate`) to an HDF5 file
+
+    The result is stored in the group '/iterations/<iteration>' (whose
+    attribute 't' is the time), as the dataset 'result', or as the
+    datasets '0', '1', ... if the result is a tuple or a list. The file
+    is closed after each iteration, so that it can be read at any time.
+
+    A FieldMetaInformation (e.g. returned by `get_field`) is stored as
+    a group that contains the coordinates of the grid points along each
+    axis (and which is read back as a dictionary, e.g. {'z': array}).
+
+    Parameters
+    ----------
+    filename: string
+        The path to the HDF5 file (created if needed)
+
+    iteration: int
+        The iteration of the result (an existing result is replaced)
+
+    t: float (in seconds)
+        The time of this iteration
+
+    result: scalar, array, FieldMetaInformation, or tuple/list of these
+        The result of the method
+    """
+    import h5py
+    # Convert the result before modifying the file, so that a result
+    # that cannot be stored does not leave an incomplete group
+    if isinstance( result, (tuple, list) ):
+        elements = { str(i): _to_hdf5_data( element, iteration )
+                     for i, element in enumerate( result ) }
+    else:
+        elements = { 'result': _to_hdf5_data( result, iteration ) }
+
+    with h5py.File( filename, 'a' ) as f:
+        iterations_group = f.require_group( 'iterations' )
+        name = str( int(iteration) )
+        # Write the group under a temporary name, and only move it to
+        # its final location once it is complete
+        incomplete_group = f.require_group( 'incomplete' )
+        if name in incomplete_group:
+            del incomplete_group[name]
+        group = incomplete_group.create_group( name )
+        try:
+            group.attrs['t'] = t
+            if isinstance( result, (tuple, list) ):
+                group.attrs['length'] = len( result )
+            for key, data in elements.items():
+                if isinstance( data, dict ):
+                    # Coordinates of a FieldMetaInformation
+                    subgroup = group.create_group( key )
+                    subgroup.attrs['axes'] = list( data.keys() )
+                    for label, coords in data.items():
+                        subgroup[label] = coords
+                else:
+                    group[key] = data
+        except Exception:
+            del incomplete_group[name]
+            raise
+        if name in iterations_group:
+            del iterations_group[name]
+        f.move( group.name, iterations_group.name + '/' + name )
+        if len( incomplete_group ) == 0:
+            del f['incomplete']
+
+
+def _to_hdf5_data( element, iteration ):
+    """
+    Convert one element of the result of `save_iteration_result` to an
+    array, or to a dictionary of arrays (for a FieldMetaInformation)
+    """
+    if isinstance( element, FieldMetaInformation ):
+        return { element.axes[axis]: getattr( element, element.axes[axis] )
+                 for axis in sorted( element.axes.keys() ) }
+    data = np.asarray( element )
+    if data.dtype.kind not in 'biufc':
+        raise TypeError( 'The result at iteration %d cannot be saved: '
+            'objects of type %s cannot be stored in an HDF5 file (only '
+            'numbers, arrays and FieldMetaInformation objects can).'
+            % (iteration, type(element).__name__) )
+    return data
+
+
+def load_iteration_results( filename ):
+    """
+    Read the results saved by `save_iteration_result`
+
+    Returns
+    -------
+    A tuple (iterations, t, results) where `iterations` and `t` are
+    1darrays (sorted by iteration), and `results` is a list of the
+    result at each iteration (a tuple, for tuples and lists)
+    """
+    import h5py
+    iterations = []
+    t = []
+    results = []
+
+    def read( data ):
+        if isinstance( data, h5py.Group ):
+            # Coordinates of a FieldMetaInformation
+            return { label: data[label][()] for label in data.attrs['axes'] }
+        return data[()]
+
+    with h5py.File( filename, 'r' ) as f:
+        groups = f['iterations']
+        for name in sorted( groups.keys(), key=int ):
+            group = groups[name]
+            iterations.append( int(name) )
+            t.append( group.attrs['t'] )
+            if 'length' in group.attrs:
+                results.append( tuple( read( group[str(i)] )
+                    for i in range( group.attrs['length'] ) ) )
+            else:
+                results.append( read( group['result'] ) )
+    return np.array( iterations ), np.array( t ), results
+
+
 def try_array( L ):
     """
     Attempt to convert L to a single array.
@@ -204,11 +450,14 @@ def combine_cylindrical_components( Fr, Ft, theta, coord, info ):
     info: FieldMetaInformation object
         Contains info on the coordinate system
     """
+    # (The result has the same type as Fr and Ft, e.g. float32)
     if theta is not None:
+        cos = float( np.cos(theta) )
+        sin = float( np.sin(theta) )
         if coord == 'x':
-            F = np.cos(theta) * Fr - np.sin(theta) * Ft
+            F = cos * Fr - sin * Ft
         elif coord == 'y':
-            F = np.sin(theta) * Fr + np.cos(theta) * Ft
+            F = sin * Fr + cos * Ft
         # Revert the sign below the axis
         if info.axes[0] == 'r':
             F[ : int(F.shape[0]/2) ] *= -1
@@ -226,6 +475,8 @@ def combine_cylindrical_components( Fr, Ft, theta, coord, info ):
         # The lines below replace this placeholder value.
         cos = np.where( r!=0, info.x[:,np.newaxis]*inv_r, 1. )
         sin = np.where( r!=0, info.y[np.newaxis,:]*inv_r, 0. )
+        cos = cos.astype( Fr.dtype )
+        sin = sin.astype( Fr.dtype )
         if coord == 'x':
             F = cos[:,:,np.newaxis] * Fr - sin[:,:,np.newaxis] * Ft
         elif coord == 'y':
@@ -311,56 +562,288 @@ def histogram_cic_2d( q1, q2, w,
     return( hist_data )
 
 
-@jit
-def construct_3d_from_circ( F3d, Fcirc, x_array, y_array, modes,
-    nx, ny, nz, nr, nmodes, inv_dr, rmax, coord_order): 
+def recombine_circ_modes( Fcirc, info, coord_order, m=0, theta=0.,
+        slice_across=None, slice_relative_position=None,
+        max_resolution_3d=None, output_type=np.float64 ):
     """
-    Reconstruct the field from a quasi-cylindrical simulation (`Fcirc`), as
-    a 3D cartesian array (`F3d`).
+    Recombine the azimuthal modes of a thetaMode field, either in the
+    plane of observation given by `theta`, or on a 3D Cartesian grid.
+
+    Parameters
+    ----------
+    Fcirc: 3darray
+        The array of all modes, in the order given by `coord_order`
+        (This array is not modified.)
+
+    info: a FieldMetaInformation object
+        The meta-information of the (r, z) grid, created with thetaMode=True
+        (This object is modified, so that it corresponds to the result.)
+
+    coord_order: RZorder
+        The order of the axes of `Fcirc`
+
+    m, theta, slice_across, slice_relative_position, max_resolution_3d:
+        See the docstring of `read_field_circ` in the data readers
+
+    output_type: a numpy floating type, or None
+        The type of the returned array
+        (when None, the type of `Fcirc`, if it is a floating type)
+
+    Returns
+    -------
+    A tuple with
+       F : a 3darray or 2darray containing the required field,
+           depending on whether `theta` is None or not
+       info : a FieldMetaInformation object
     """
-    for ix in range(nx):
-        x = x_array[ix]
-        for iy in range(ny):
-            y = y_array[iy]
-            r = np.sqrt( x**2 + y**2 )
-            ir = nr - 1 - int( (rmax - r) * inv_dr + 0.5 )
-
-            # Handle out-of-bounds
-            if ir < 0:
-                ir = 0
-            if ir >= nr:
-                ir = nr-1
-
-            # Calculate linear projection from ir and ir-1
-            if ir>0:
-                s0 = ir + 0.5 - r* inv_dr
-                s1 = 1. - s0
+    if coord_order is RZorder.mrz:
+        Nm, Nr, Nz = Fcirc.shape
+    elif coord_order is RZorder.mzr:
+        Nm, Nz, Nr = Fcirc.shape
+    else:
+        raise Exception(order_error_msg)
+    if output_type is None:
+        output_type = np.result_type( Fcirc.dtype, np.float32 )
+
+    # Convert to a 3D Cartesian array if theta is None
+    if theta is None:
+
+        # Get cylindrical info
+        rmax = info.rmax
+        inv_dr = 1./info.dr
+        if m == 'all':
+            modes = [ mode for mode in range(0, int(Nm / 2) + 1) ]
+        else:
+            modes = [ m ]
+        modes = np.array( modes, dtype='int' )
+        nmodes = len(modes)
+
+        # If necessary, reduce resolution of 3D reconstruction
+        if max_resolution_3d is not None:
+            max_res_lon, max_res_transv = max_resolution_3d
+            if Nz > max_res_lon:
+                # Calculate excess of elements along z
+                excess_z = int(np.round(Nz/max_res_lon))
+                # Preserve only one every excess_z elements
                 if coord_order is RZorder.mrz:
-                    Fcirc_proj = s1*Fcirc[:, ir, :] + s0*Fcirc[:, ir-1, :]
-                elif coord_order is RZorder.mzr:
-                    Fcirc_proj = s1*Fcirc[:, :, ir] + s0*Fcirc[:, :, ir-1]
+                    Fcirc = Fcirc[:, :, ::excess_z]
                 else:
-                    raise Exception(order_error_msg)
-            else:
+                    Fcirc = Fcirc[:, ::excess_z, :]
+                # Update info accordingly
+                info._restrict_axis( 'z', None, None, excess_z )
+            if Nr > max_res_transv/2:
+                # Calculate excess of elements along r
+                excess_r = int(np.round(Nr/(max_res_transv/2)))
+                # Preserve only one every excess_r elements
+                if coord_order is RZorder.mrz:
+                    Fcirc = Fcirc[:, ::excess_r, :]
+                else:
+                    Fcirc = Fcirc[:, :, ::excess_r]
+                # Update info and necessary parameters accordingly
+                info._restrict_axis( 'r', None, None, excess_r )
+                inv_dr = 1./info.dr
+                # Update Nr after reducing radial resolution.
                 if coord_order is RZorder.mrz:
-                    Fcirc_proj = Fcirc[:, ir, :]
-                elif coord_order is RZorder.mzr:
-                    Fcirc_proj = Fcirc[:, :, ir]
+                    Nr = Fcirc.shape[1]
                 else:
-                    raise Exception(order_error_msg)
+                    Nr = Fcirc.shape[2]
 
-            # Loop over all modes and recontruct data
-            if r == 0:
-                expItheta = 1. + 0.j
-            else:
-                expItheta = (x+1.j*y)/r
+        # Convert cylindrical data to Cartesian data
+        info._convert_cylindrical_to_3Dcartesian()
+        nx, ny, nz = len(info.x), len(info.y), len(info.z)
+        F_total = np.zeros( (nx, ny, nz), dtype=output_type )
+        construct_3d_from_circ( F_total, Fcirc, info.x, info.y, modes,
+            nx, ny, nz, Nr, nmodes, inv_dr, rmax, coord_order)
 
-            for im in range(nmodes):
-                mode = modes[im]
-                if mode==0:
-                    F3d[ix, iy, :] += Fcirc_proj[0, :]
-                else:
-                    cos = (expItheta**mode).real
-                    sin = (expItheta**mode).imag
-                    F3d[ix, iy, :] += Fcirc_proj[2*mode-1,:]*cos + \
-                        Fcirc_proj[2*mode,:]*sin
+    else:
+
+        # Recombine the modes in the plane of observation
+        if m == 'all':
+            # Sum of all the modes
+            mult_above_axis = [1]
+            mult_below_axis = [1]
+            for mode in range(1, int(Nm / 2) + 1):
+                cos = np.cos( mode * theta )
+                sin = np.sin( mode * theta )
+                mult_above_axis += [cos, sin]
+                mult_below_axis += [ (-1) ** mode * cos, (-1) ** mode * sin ]
+            F_above = np.tensordot( np.array(mult_above_axis),
+                                    Fcirc, axes=(0, 0) )
+            F_below = np.tensordot( np.array(mult_below_axis),
+                                    Fcirc, axes=(0, 0) )
+        elif m == 0:
+            # Extract mode 0
+            F_above = Fcirc[0]
+            F_below = Fcirc[0]
+        else:
+            # Extract higher mode
+            F = np.cos( m * theta ) * Fcirc[2 * m - 1] \
+                + np.sin( m * theta ) * Fcirc[2 * m]
+            F_above = F
+            F_below = (-1) ** m * F
+        # Mirror the data below the axis
+        if coord_order is RZorder.mrz:
+            F_total = np.zeros( (2 * Nr, Nz ), dtype=output_type )
+            F_total[Nr:, :] = F_above
+            F_total[:Nr, :] = F_below[::-1, :]
+        else:
+            F_total = np.zeros( (Nz, 2 * Nr ), dtype=output_type )
+            F_total[:, Nr:] = F_above
+            F_total[:, :Nr] = F_below[:, ::-1]
+
+    # Perform slicing if needed
+    if slice_across is not None:
+        # Slice field and clear metadata
+        inverted_axes_dict = {info.axes[key]: key for key in info.axes.keys()}
+        for count, slice_across_item in enumerate(slice_across):
+            slicing_index = inverted_axes_dict[slice_across_item]
+            coord_array = getattr( info, slice_across_item )
+            # Number of cells along the slicing direction
+            n_cells = len(coord_array)
+            # Index of the slice (prevent stepping out of the array)
+            i_cell = int( 0.5 * (slice_relative_position[count] + 1.) * n_cells )
+            i_cell = max( i_cell, 0 )
+            i_cell = min( i_cell, n_cells - 1)
+            F_total = np.take( F_total, [i_cell], axis=slicing_index )
+        F_total = np.squeeze(F_total)
+        # Remove the sliced labels from the FieldMetaInformation
+        for slice_across_item in slice_across:
+            info._remove_axis(slice_across_item)
+
+    return F_total, info
+
+
+# Tables used by `construct_3d_from_circ`, for the last few grids
+# (keyed by the grid and the modes, since they do not depend on the data)
+# The lock protects the cache from the concurrent reads of the prefetch
+# and slider threads.
+_circ_tables_cache = OrderedDict()
+_circ_tables_cache_size = 4
+_circ_tables_lock = threading.Lock()
+
+
+def get_circ_reconstruction_tables( x_array, y_array, modes,
+                                    nr, inv_dr, rmax ):
+    """
+    Compute (or retrieve from the cache) the tables that map each (x, y)
+    point of a 3D Cartesian grid onto the quasi-cylindrical grid.
+
+    Parameters
+    ----------
+    x_array, y_array: 1darrays
+        The positions of the Cartesian grid points along x and y
+
+    modes: 1darray of int
+        The azimuthal modes that are recombined
+
+    nr: int
+        The number of radial grid points of the quasi-cylindrical data
+
+    inv_dr, rmax: floats
+        The inverse of the radial spacing, and the last radial position
+
+    Returns
+    -------
+    A tuple (ir_lo, ir_hi, s_lo, s_hi, components, coefficients), where
+    ir_lo, ir_hi, s_lo and s_hi (of length nx*ny) are the two radial
+    indices used for the linear interpolation at each (x, y) point and
+    their weights, `components` contains the indices of the modal
+    components (along the first axis of the data) that are summed, and
+    `coefficients` (of shape (len(components), nx*ny)) contains the
+    corresponding factors 1, cos(m*theta) or sin(m*theta).
+    """
+    key = ( x_array.tobytes(), y_array.tobytes(),
+            np.asarray(modes).tobytes(), nr, inv_dr, rmax )
+    with _circ_tables_lock:
+        if key in _circ_tables_cache:
+            _circ_tables_cache.move_to_end( key )
+            return _circ_tables_cache[key]
+
+    # (The grid positions may be in extended precision, e.g. when
+    # the grid attributes of an HDF5 file are stored as long double)
+    x = np.repeat( x_array.astype(np.float64), len(y_array) )
+    y = np.tile( y_array.astype(np.float64), len(x_array) )
+    r = np.sqrt( x**2 + y**2 )
+
+    # Radial index (and interpolation weights between ir-1 and ir)
+    ir = nr - 1 - np.floor( (rmax - r) * inv_dr + 0.5 ).astype(np.int64)
+    ir = np.clip( ir, 0, nr - 1 )
+    ir_lo = np.maximum( ir - 1, 0 )
+    s_lo = np.where( ir > 0, ir + 0.5 - r * inv_dr, 0. )
+    s_hi = 1. - s_lo
+
+    # Azimuthal factors of each modal component
+    theta = np.arctan2( y, x )
+    components = []
+    coefficients = []
+    for mode in modes:
+        if mode == 0:
+            components.append( 0 )
+            coefficients.append( np.ones_like(r) )
+        else:
+            components += [ 2 * mode - 1, 2 * mode ]
+            coefficients += [ np.cos(mode * theta), np.sin(mode * theta) ]
+    tables = ( ir_lo, ir, s_lo, s_hi, np.array(components, dtype=np.int64),
+               np.array(coefficients) )
+
+    with _circ_tables_lock:
+        _circ_tables_cache[key] = tables
+        if len(_circ_tables_cache) > _circ_tables_cache_size:
+            _circ_tables_cache.popitem( last=False )
+    return tables
+
+
+@parallel_jit
+def _construct_3d_from_tables( F3d, Fcirc, ir_lo, ir_hi, s_lo, s_hi,
+                               components, coefficients ):
+    """
+    Multi-threaded kernel of `construct_3d_from_circ`, where F3d has shape
+    (nx*ny, nz) and Fcirc is in the (m, r, z) order.
+    """
+    nz = F3d.shape[1]
+    for ixy in prange( F3d.shape[0] ):
+        i_lo = ir_lo[ixy]
+        i_hi = ir_hi[ixy]
+        w_lo = s_lo[ixy]
+        w_hi = s_hi[ixy]
+        for ic in range( len(components) ):
+            c = components[ic]
+            coef = coefficients[ic, ixy]
+            for iz in range( nz ):
+                F3d[ixy, iz] += coef * ( w_hi * Fcirc[c, i_hi, iz]
+                                         + w_lo * Fcirc[c, i_lo, iz] )
+
+
+def construct_3d_from_circ( F3d, Fcirc, x_array, y_array, modes,
+    nx, ny, nz, nr, nmodes, inv_dr, rmax, coord_order):
+    """
+    Reconstruct the field from a quasi-cylindrical simulation (`Fcirc`), as
+    a 3D cartesian array (`F3d`).
+
+    The interpolation tables only depend on the grid, and are thus
+    cached across iterations (see `get_circ_reconstruction_tables`).
+    """
+    ir_lo, ir_hi, s_lo, s_hi, components, coefficients = \
+        get_circ_reconstruction_tables( x_array, y_array,
+            np.asarray(modes)[:nmodes], nr, inv_dr, rmax )
+
+    # Bring the data in the (m, r, z) order
+    if coord_order is RZorder.mrz:
+        Fmrz = Fcirc
+    elif coord_order is RZorder.mzr:
+        Fmrz = np.swapaxes( Fcirc, 1, 2 )
+    else:
+        raise Exception(order_error_msg)
+    F3d_flat = F3d.reshape( nx * ny, nz )
+
+    if numba_installed:
+        _construct_3d_from_tables( F3d_flat, np.ascontiguousarray(Fmrz),
+            ir_lo, ir_hi, s_lo, s_hi, components, coefficients )
+    else:
+        # Batched contraction over the (x, y) points, one component at a time
+        for ic, c in enumerate(components):
+            F3d_flat += coefficients[ic][:, np.newaxis] * (
+                s_hi[:, np.newaxis] * Fmrz[c][ir_hi]
+                + s_lo[:, np.newaxis] * Fmrz[c][ir_lo] )
+    if not np.shares_memory( F3d_flat, F3d ):
+        F3d[...] = F3d_flat.reshape( nx, ny, nz )
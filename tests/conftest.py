@@ -0,0 +1,51 @@
+"""
+This file is part of the openPMD-viewer.
+
+It defines the fixtures that are shared by the tests, in particular
+`synthetic_data`, which writes a synthetic openPMD time series
+(see benchmark/synthetic_data.py) in a temporary directory.
+
+License: 3-Clause-BSD-LBNL
+"""
+import collections
+import pytest
+from benchmark.synthetic_data import SyntheticDataset
+
+# Default arguments of SyntheticDataset for the tests: small particle
+# blocks and fields, so that the tests are fast
+DEFAULT_DATASET = dict( n_particles=2000, n_blocks=4, field_shape=(4, 4, 8),
+                        iterations=[0] )
+
+SyntheticData = collections.namedtuple( 'SyntheticData',
+                                        ['dataset', 'path', 'backend'] )
+
+
+@pytest.fixture(scope='module')
+def synthetic_data( request, tmp_path_factory ):
+    """
+    Write a SyntheticDataset in a temporary directory
+
+    The arguments of SyntheticDataset (which default to `DEFAULT_DATASET`)
+    and the backend that should read the data (which determines the
+    writer: h5py files for 'h5py', openpmd-api bp files for 'openpmd-api')
+    are passed through an indirect parametrization, e.g.
+    @pytest.mark.parametrize( 'synthetic_data',
+        [ dict(n_particles=1000, backend='openpmd-api') ], indirect=True )
+
+    Returns
+    -------
+    A SyntheticData tuple (dataset, path, backend)
+    """
+    options = dict( DEFAULT_DATASET, **getattr( request, 'param', {} ) )
+    backend = options.pop( 'backend', 'h5py' )
+    if backend == 'h5py':
+        pytest.importorskip( 'h5py' )
+    else:
+        pytest.importorskip( 'openpmd_api' )
+    dataset = SyntheticDataset( **options )
+    path = str( tmp_path_factory.mktemp( 'synthetic_data' ) )
+    if backend == 'h5py':
+        dataset.write( path, writer='h5py' )
+    else:
+        dataset.write( path, writer='openpmd-api', file_format='bp' )
+    return SyntheticData( dataset, path, backend )
@@ -0,0 +1,75 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks that `LpaDiagnostics.get_beam_summary` gives the same results
+as the individual diagnostics, while reading the particles only once.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_beam_summary.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer.addons import LpaDiagnostics
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+
+pytestmark = pytest.mark.parametrize('synthetic_data',
+    [dict(n_blocks=2, iterations=[0, 10])], indirect=True)
+
+
+@pytest.fixture(scope='module')
+def ts(synthetic_data):
+    "A time series of synthetic particles"
+    return LpaDiagnostics(synthetic_data.path, backend='h5py', profile=True)
+
+
+@pytest.mark.parametrize('select', [None, {'uz': [1., None]},
+                                    {'uz': [1.e6, None]}])
+def test_beam_summary(ts, select):
+    "Check the diagnostics against the individual methods"
+    summary = ts.get_beam_summary(iteration=10, select=select)
+    # The particle quantities are read only once
+    n_chunks = ts.last_query_profile.counters['n_chunks']
+    ts.get_particle(['ux', 'uy', 'uz', 'w', 'mass', 'x', 'y', 'charge', 'z'],
+                    iteration=10, select=select)
+    assert ts.last_query_profile.counters['n_chunks'] == n_chunks
+    kw = dict(iteration=10, select=select)
+    np.testing.assert_allclose(summary['energy_spread'],
+                               ts.get_energy_spread(**kw))
+    np.testing.assert_allclose(summary['mean_gamma'],
+                               ts.get_mean_gamma(**kw))
+    np.testing.assert_allclose(summary['divergence'],
+                               ts.get_divergence(**kw))
+    np.testing.assert_allclose(summary['emittance'], ts.get_emittance(**kw))
+    np.testing.assert_allclose(summary['charge'], ts.get_charge(**kw))
+    if select is None or select['uz'][0] < 1.e6:
+        np.testing.assert_allclose(summary['current'],
+                                   ts.get_current(**kw)[0])
+
+
+def test_beam_summary_time_series(ts):
+    "Check the summary over several iterations"
+    summary = ts.get_beam_summary(iteration=[0, 10],
+                                  diagnostics=['charge', 'emittance'])
+    assert set(summary.keys()) == {'iteration', 't', 'charge', 'emittance'}
+    assert summary['emittance'].shape == (2, 2)
+    np.testing.assert_allclose(summary['emittance'][0],
+                               ts.get_emittance(iteration=0))
+    assert np.array_equal(summary['t'], ts.t)
+    summary = ts.get_beam_summary(iteration=[10, 0, 10],
+                                  diagnostics=['charge'])
+    assert np.array_equal(summary['t'], ts.t[[1, 0, 1]])
+    # Same error as `get_particle` for an iteration that does not exist
+    with pytest.raises(OpenPMDException):
+        ts.get_beam_summary(iteration=[0, 5], diagnostics=['charge'])
+    with pytest.raises(ValueError):
+        ts.get_beam_summary(iteration=0, diagnostics=['luminosity'])
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,116 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the in-process benchmark runner: the table of strategies
+(test types of batchTest.py), the loading of the selected queries,
+and the warm/cold modes.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_benchmark_runner.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import os
+import copy
+import tempfile
+import numpy as np
+import pytest
+from benchmark.runner import STRATEGIES, BenchmarkRunner, load_queries
+
+
+def test_strategies():
+    "Check a few entries of the table of strategies"
+    assert sorted(STRATEGIES.keys()) == list(range(1, 27))
+    assert STRATEGIES[1] == {'geos_index': False}
+    # Test type 9: R-tree, file, secondary Min-Max, read groups
+    strategy = STRATEGIES[9]
+    assert strategy['geos_index_type'] == 'rtree'
+    assert strategy['geos_index_storage_backend'] == 'file'
+    assert strategy['geos_index_secondary_type'] == 'minmax'
+    assert strategy['geos_index_use_secondary']
+    assert not strategy['geos_index_direct_block_read']
+    assert strategy['geos_index_read_groups']
+    # Test type 14: Min-Max, RocksDB, no secondary, read groups
+    strategy = STRATEGIES[14]
+    assert strategy['geos_index_type'] == 'minmax'
+    assert strategy['geos_index_storage_backend'] == 'rocksdb'
+    assert strategy['geos_index_secondary_type'] == 'none'
+    assert strategy['geos_index_read_groups']
+    # Test type 25: R-tree, file, read groups, without offset
+    strategy = STRATEGIES[25]
+    assert strategy['geos_index_type'] == 'rtree'
+    assert strategy['geos_index_read_groups'] and strategy['skip_offset']
+
+
+def test_load_queries():
+    "Check the parsing of the queries selected by select_n.py"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        query_path = os.path.join(tmpdir, 'selected_1_queries.csv')
+        with open(query_path, 'w') as f:
+            f.write('target_percentage,current_percentage,iteration,'
+                    'species,select_set,expand_set,envelope\n')
+            f.write('0.01,0.0102,500,electrons,"(\'ux\', \'x\')",'
+                    '"(\'x\',)","{\'ux\': [0.1, 0.2], \'x\': [-1, 1]}"\n')
+        queries = load_queries(query_path)
+    assert queries == [{'query_seq': 0, 'target_percentage': 0.01,
+                        'select_set': ['ux', 'x'],
+                        'envelope': {'ux': [0.1, 0.2], 'x': [-1, 1]}}]
+
+
+class CountingRunner(BenchmarkRunner):
+    "Runner that records the calls instead of reading data"
+
+    def __init__(self):
+        BenchmarkRunner.__init__(self, bp_file_path=None)
+        self.calls = []
+
+    def run_query(self, query, test_type):
+        self.calls.append(('query', test_type, query['query_seq']))
+        return {'total_time': 0., 'query_result_size': 0}
+
+
+def test_warm_and_cold_modes():
+    "Check the warm-up runs and the calls to the cold-cache hook"
+    queries = [{'query_seq': 0}, {'query_seq': 1}]
+
+    runner = CountingRunner()
+    df = runner.run(queries, [1, 2], mode='warm', repeat=2, verbose=False)
+    assert len(df) == 8
+    # One warm-up run per query and strategy
+    assert len(runner.calls) == 12
+
+    runner = CountingRunner()
+    df = runner.run(queries, [1], mode='cold', repeat=2, verbose=False,
+                    hook=lambda: runner.calls.append('drop'))
+    assert runner.calls == ['drop', ('query', 1, 0)] * 2 + \
+        ['drop', ('query', 1, 1)] * 2
+    assert list(df['mode']) == ['cold'] * 4
+    assert list(df['repeat']) == [0, 1, 0, 1]
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(backend='openpmd-api')], indirect=True)
+def test_run_query_skip_offset(synthetic_data, monkeypatch):
+    "Check that repeated queries without offset use the same envelope"
+    particles = synthetic_data.dataset.get_particles(0)
+    uz_median = float(np.median(particles['uz']))
+    query = {'query_seq': 0, 'target_percentage': 0.5,
+             'select_set': ['x', 'uz'],
+             'envelope': {'uz': [uz_median, None], 'x': [None, np.inf]}}
+    envelope = copy.deepcopy(query['envelope'])
+    # Strategy without offset that does not require the index
+    monkeypatch.setitem(STRATEGIES, 27,
+                        {'geos_index': False, 'skip_offset': True})
+    runner = BenchmarkRunner(synthetic_data.path, iteration=0)
+    rows = [runner.run_query(query, test_type) for test_type in [27, 27, 1]]
+    assert query['envelope'] == envelope
+    n_selected = np.count_nonzero(particles['uz'] > uz_median)
+    assert [row['query_result_size'] for row in rows] == [n_selected] * 3
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
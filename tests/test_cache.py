@@ -0,0 +1,54 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the size-bounded LRU cache that keeps data in memory
+between successive calls.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_cache.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+from openpmd_viewer.openpmd_timeseries.cache import LRUCache
+
+
+def test_eviction_by_size():
+    "Check that the least recently used entries are evicted first"
+    cache = LRUCache(max_bytes=3 * 800)
+    for i in range(3):
+        cache.put(i, np.zeros(100))
+    # Access 0, so that 1 becomes the least recently used entry
+    assert cache.get(0) is not None
+    cache.put(3, np.zeros(100))
+    assert cache.keys() == [2, 0, 3]
+    assert cache.nbytes == 3 * 800
+
+
+def test_oversized_entries_are_not_stored():
+    "Check that entries larger than the capacity are skipped"
+    cache = LRUCache(max_bytes=100)
+    cache.put('a', (np.zeros(100), 'metadata'))
+    assert 'a' not in cache
+    assert cache.get('a', 'missing') == 'missing'
+    assert cache.nbytes == 0
+
+
+def test_replace_and_pop():
+    "Check the accounting of the size when entries are replaced or removed"
+    cache = LRUCache(max_bytes=10000)
+    cache.put('a', np.zeros(10))
+    cache.put('a', np.zeros(20))
+    assert cache.nbytes == 160
+    assert cache.pop('a').shape == (20,)
+    assert len(cache) == 0 and cache.nbytes == 0
+
+
+if __name__ == '__main__':
+    test_eviction_by_size()
+    test_oversized_entries_are_not_stored()
+    test_replace_and_pop()
@@ -0,0 +1,108 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the reconstruction of 3D Cartesian fields from
+quasi-cylindrical (thetaMode) data.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_circ_reconstruction.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from openpmd_viewer.openpmd_timeseries.data_order import RZorder
+from openpmd_viewer.openpmd_timeseries.utilities import \
+    construct_3d_from_circ, get_circ_reconstruction_tables
+
+
+def reference_reconstruction(Fcirc, x_array, y_array, modes, inv_dr, rmax):
+    "Point-by-point reconstruction, for data in the (m, r, z) order"
+    nr = Fcirc.shape[1]
+    F3d = np.zeros((len(x_array), len(y_array), Fcirc.shape[2]))
+    for ix, x in enumerate(x_array):
+        for iy, y in enumerate(y_array):
+            r = np.sqrt(x**2 + y**2)
+            ir = nr - 1 - int((rmax - r) * inv_dr + 0.5)
+            ir = min(max(ir, 0), nr - 1)
+            if ir > 0:
+                s0 = ir + 0.5 - r * inv_dr
+                proj = (1 - s0) * Fcirc[:, ir, :] + s0 * Fcirc[:, ir-1, :]
+            else:
+                proj = Fcirc[:, ir, :]
+            expItheta = (x + 1.j * y) / r if r > 0 else 1.
+            for mode in modes:
+                if mode == 0:
+                    F3d[ix, iy] += proj[0]
+                else:
+                    F3d[ix, iy] += proj[2*mode-1] * (expItheta**mode).real \
+                        + proj[2*mode] * (expItheta**mode).imag
+    return F3d
+
+
+def check_reconstruction(coord_order):
+    nr, nz, dr = 12, 7, 0.5
+    r = (np.arange(nr) + 0.5) * dr
+    x = np.concatenate((-r[::-1], r))
+    modes = np.array([0, 1, 2])
+    Fmrz = np.random.random((5, nr, nz))
+    if coord_order is RZorder.mrz:
+        Fcirc = Fmrz
+    else:
+        Fcirc = np.ascontiguousarray(Fmrz.transpose(0, 2, 1))
+    F3d = np.zeros((2 * nr, 2 * nr, nz))
+    construct_3d_from_circ(F3d, Fcirc, x, x, modes, 2 * nr, 2 * nr, nz,
+                           nr, len(modes), 1. / dr, r[-1], coord_order)
+    assert np.allclose(F3d, reference_reconstruction(
+        Fmrz, x, x, modes, 1. / dr, r[-1]))
+
+
+def test_reconstruction_mrz():
+    "Check the reconstruction for data in the (m, r, z) order"
+    check_reconstruction(RZorder.mrz)
+
+
+def test_reconstruction_mzr():
+    "Check the reconstruction for data in the (m, z, r) order"
+    check_reconstruction(RZorder.mzr)
+
+
+def test_tables_are_cached():
+    "Check that the tables are reused for the same grid and modes"
+    x = np.linspace(-1., 1., 9)
+    modes = np.array([0, 1])
+    tables = get_circ_reconstruction_tables(x, x, modes, 5, 4., 1.)
+    assert get_circ_reconstruction_tables(x.copy(), x, modes, 5, 4., 1.) \
+        is tables
+    assert get_circ_reconstruction_tables(x, x, np.array([1]), 5, 4., 1.) \
+        is not tables
+
+
+
+def test_tables_from_several_threads():
+    "Check the cache of the tables with concurrent reconstructions"
+    grids = [np.linspace(-1., 1., n) for n in range(5, 13)]
+    references = [get_circ_reconstruction_tables(x, x, np.array([0, 1]),
+                                                 5, 4., 1.)
+                  for x in grids]
+
+    def reconstruct(i):
+        x = grids[i % len(grids)]
+        tables = get_circ_reconstruction_tables(x, x, np.array([0, 1]),
+                                                5, 4., 1.)
+        return all(np.array_equal(a, b)
+                   for a, b in zip(tables, references[i % len(grids)]))
+
+    with ThreadPoolExecutor(max_workers=8) as executor:
+        assert all(executor.map(reconstruct, range(400)))
+
+
+if __name__ == '__main__':
+    test_reconstruction_mrz()
+    test_reconstruction_mzr()
+    test_tables_are_cached()
+    test_tables_from_several_threads()
@@ -0,0 +1,126 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the `dtype` option of `get_particle`, `get_field` and `iterate`,
+with a series whose data is stored as float32: the arrays are returned
+with the requested type, and the selection of the particles does not
+depend on it.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_dtype.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.addons import LpaDiagnostics
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+
+ITERATIONS = [0, 10]
+
+
+def float32_datasets( **kwargs ):
+    """
+    Parametrize the `synthetic_data` fixture with a float32 series,
+    written for (and read with) each available backend
+    """
+    return pytest.mark.parametrize('synthetic_data',
+        [ dict(n_particles=5000, iterations=ITERATIONS, dtype=np.float32,
+               backend=backend, **kwargs) for backend in available_backends ],
+        ids=available_backends, indirect=True)
+
+
+@float32_datasets()
+def test_particle_dtype(synthetic_data):
+    "Check the particle data against the default (float64) read"
+    select = {'uz': [0., None], 'x': [None, 1.e-6]}
+    var_list = ['x', 'uz', 'w']
+    path, backend = synthetic_data.path, synthetic_data.backend
+    ts = OpenPMDTimeSeries(path, backend=backend)
+    reference = ts.get_particle(var_list, iteration=10, select=select)
+    assert all( data.dtype == np.float64 for data in reference )
+
+    for dtype in ['float32', 'native']:
+        data_list = ts.get_particle(var_list, iteration=10,
+                                    select=select, dtype=dtype)
+        # Same selection, and same values (up to the rounding)
+        for data, data_reference in zip(data_list, reference):
+            assert data.dtype == np.float32
+            assert np.array_equal(data,
+                                  data_reference.astype(np.float32))
+
+    # Batched reads, with a memory budget in which the selected
+    # particles only fit as float32
+    ts.memory_budget = 5000 * 4 * len(var_list)
+    data_list = ts.get_particle(var_list, iteration=10, select=select,
+                                dtype='float32')
+    for data, data_reference in zip(data_list, reference):
+        assert data.dtype == np.float32
+        assert np.array_equal(data, data_reference.astype(np.float32))
+    with pytest.raises(OpenPMDException):
+        ts.get_particle(var_list, iteration=10, select=select)
+    ts.memory_budget = None
+
+    # Type of the series, and of `iterate`
+    ts.dtype = 'float32'
+    w, = ts.get_particle(['w'], iteration=0)
+    assert w.dtype == np.float32
+    ts.dtype = None
+    w, = ts.iterate(ts.get_particle, ['w'], dtype='float32')
+    assert w.dtype == np.float32 and w.shape == (len(ITERATIONS), 5000)
+    assert ts.dtype is None
+    with pytest.raises(OpenPMDException):
+        ts.get_particle(['w'], iteration=0, dtype='float16')
+
+    # The result cache distinguishes the types
+    ts = OpenPMDTimeSeries(path, backend=backend,
+                           result_cache_size='16MB')
+    assert ts.get_particle(['w'], iteration=0)[0].dtype == np.float64
+    assert ts.get_particle(['w'], iteration=0,
+                           dtype='float32')[0].dtype == np.float32
+
+    # Diagnostics, computed with double-precision accumulators
+    ts = LpaDiagnostics(path, backend=backend)
+    charge = ts.iterate(ts.get_charge, select=select)
+    charge_float32 = ts.iterate(ts.get_charge, select=select,
+                                dtype='float32')
+    assert np.allclose(charge_float32, charge, rtol=1.e-6)
+
+
+@float32_datasets(field_shape=(4, 6, 8))
+def test_field_dtype(synthetic_data):
+    "Check the type of the cartesian fields"
+    ts = OpenPMDTimeSeries(synthetic_data.path,
+                           backend=synthetic_data.backend)
+    # Cartesian fields: type of the file by default
+    F, _ = ts.get_field('E', 'x', iteration=10, slice_across='y')
+    assert F.dtype == np.float32
+    F64, _ = ts.get_field('E', 'x', iteration=10, slice_across='y',
+                          dtype='float64')
+    assert F64.dtype == np.float64
+    assert np.array_equal(F64, F)
+
+
+@float32_datasets(field_geometry='thetaMode', field_shape=(8, 16))
+def test_circ_field_dtype(synthetic_data):
+    "Check the type of the thetaMode fields"
+    ts = OpenPMDTimeSeries(synthetic_data.path,
+                           backend=synthetic_data.backend)
+    # thetaMode fields: float64 by default
+    for theta in [0.3, None]:
+        F, _ = ts.get_field('E', 'x', iteration=0, theta=theta)
+        assert F.dtype == np.float64
+        F32, _ = ts.get_field('E', 'x', iteration=0, theta=theta,
+                              dtype='native')
+        assert F32.dtype == np.float32
+        assert np.allclose(F32, F, rtol=1.e-5, atol=1.e-5 * abs(F).max())
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,84 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the FieldMetaInformation object, whose coordinates are only
+computed when they are accessed: the values of its attributes, the
+cropping and subsampling of its axes, and its copies.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_field_metainfo.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import copy
+import pickle
+import numpy as np
+import pytest
+from openpmd_viewer import FieldMetaInformation
+
+
+def test_attributes():
+    "Check the coordinates, resolutions, bounds and imshow extent"
+    info = FieldMetaInformation({0: 'x', 1: 'z'}, (10, 20), [0.5, 2.],
+                                [-1., 3.], 1.e-6, [0.5, 0.])
+    # The coordinates are computed on first access, and then cached
+    assert info._coords == {}
+    x = np.linspace(-0.75e-6, 3.75e-6, 10)
+    z = np.linspace(3.e-6, 41.e-6, 20)
+    assert np.allclose(info.x, x, rtol=1.e-12, atol=0)
+    assert info.x is info.x
+    assert np.allclose(info.z, z, rtol=1.e-12, atol=0)
+    assert np.isclose(info.dx, 0.5e-6) and np.isclose(info.dz, 2.e-6)
+    assert info.xmin == info.x[0] and info.xmax == info.x[-1]
+    assert info.zmin == info.z[0] and info.zmax == info.z[-1]
+    assert np.allclose(info.imshow_extent,
+                       [2.e-6, 42.e-6, -1.e-6, 4.e-6])
+    with pytest.raises(AttributeError):
+        info.y
+    # Attributes can still be set explicitly
+    info.x = x[:5]
+    assert len(info.x) == 5
+
+
+def test_thetaMode_axis():
+    "Check the mirrored r axis, its cropping and subsampling"
+    info = FieldMetaInformation({0: 'r', 1: 'z'}, (8, 20), [1., 1.],
+                                [0., 0.], 1., [0.5, 0.], thetaMode=True)
+    r = np.linspace(0.5, 7.5, 8)
+    r = np.concatenate((-r[::-1], r))
+    assert np.array_equal(info.r, r)
+    assert info.rmin == -7.5 and info.rmax == 7.5
+    info._restrict_axis('r', 2, 14)
+    info._restrict_axis('r', 1, None, 3)
+    assert np.array_equal(info.r, r[2:14][1::3])
+    assert info.dr == 3.
+    assert info.rmin == r[3] and info.rmax == r[12]
+    # Conversion to the 3D Cartesian grid
+    info._convert_cylindrical_to_3Dcartesian()
+    assert info.axes == {0: 'x', 1: 'y', 2: 'z'}
+    assert np.array_equal(info.x, info.y) and info.x is not info.y
+    assert not hasattr(info, 'r') and not hasattr(info, 'imshow_extent')
+    # Removal of the axes
+    info.restrict_to_1Daxis('z')
+    assert info.axes == {0: 'z'} and not hasattr(info, 'x')
+
+
+def test_copy():
+    "Check that the copies of the object are independent"
+    info = FieldMetaInformation({0: 'x', 1: 'z'}, (10, 20), [1., 1.],
+                                [0., 0.], 1., [0., 0.])
+    for new_info in [copy.copy(info), copy.deepcopy(info),
+                     pickle.loads(pickle.dumps(info))]:
+        new_info._restrict_axis('z', 5, 10)
+        assert np.array_equal(new_info.z, info.z[5:10])
+        assert len(info.z) == 20
+
+
+if __name__ == '__main__':
+    test_attributes()
+    test_thetaMode_axis()
+    test_copy()
@@ -0,0 +1,132 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the block-averaging functions used by the field pyramid, and
+that `get_field(..., max_resolution=...)` gives the same result with and
+without a pyramid.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_field_pyramid.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import os
+import numpy as np
+import pytest
+from openpmd_viewer import FieldMetaInformation, OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+from openpmd_viewer.openpmd_timeseries.field_pyramid import block_average, \
+    build_pyramid_levels, downsample_field, downsampling_factors
+
+
+def test_block_average():
+    "Check block averaging, including incomplete trailing blocks"
+    F = np.arange(7 * 4, dtype=float).reshape(7, 4)
+    G = block_average(F, [2, 4])
+    assert G.shape == (3, 1)
+    assert np.allclose(G[:, 0], F[:6].reshape(3, 8).mean(axis=1))
+
+
+def test_pyramid_levels():
+    "Check that levels stop at `min_size`, independently along each axis"
+    F = np.random.random((256, 32))
+    levels = build_pyramid_levels(F, min_size=64)
+    assert [ tuple(factors) for factors, _ in levels ] == [(2, 1), (4, 1)]
+    assert levels[-1][1].shape == (64, 32)
+
+
+def test_downsample_field_grid():
+    "Check that the grid of the downsampled field is at the block centers"
+    info = FieldMetaInformation({0: 'x', 1: 'z'}, (16, 8), [1., 2.],
+                                [0., 0.], 1., [0., 0.])
+    F = np.random.random((16, 8))
+    G, new_info = downsample_field(F, info, {'x': 4})
+    assert G.shape == (4, 8)
+    assert np.allclose(new_info.x, info.x.reshape(4, 4).mean(axis=1))
+    assert np.allclose(new_info.z, info.z)
+
+
+def test_downsampling_factors():
+    "Check that `max_resolution` is a maximum number of points"
+    axes = {0: 'x', 1: 'z'}
+    assert downsampling_factors((1000, 100), axes, 400) == [3, 1]
+    assert downsampling_factors((1000, 100), axes, 500) == [2, 1]
+    assert downsampling_factors((1000, 100), axes, {'z': 30}) == [1, 4]
+    F = np.zeros((1000, 100))
+    info = FieldMetaInformation(axes, F.shape, [1., 1.], [0., 0.], 1.,
+                                [0., 0.])
+    G, _ = downsample_field(F, info, 400)
+    assert G.shape == (333, 100)
+
+
+@pytest.mark.skipif('h5py' not in available_backends,
+                    reason='field pyramids require h5py')
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=100, n_blocks=1, field_shape=(8, 12, 100))],
+    indirect=True)
+def test_get_field_pyramid(synthetic_data, tmp_path, monkeypatch):
+    "Check the fields read from the pyramid against the full-resolution read"
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py')
+    F_full, info_full = ts.get_field('E', 'x', iteration=0)
+    ts.build_field_pyramid(os.path.join(tmp_path, 'pyramid.h5'), 'E', 'x',
+                           min_size=16)
+
+    # max_resolution, expected shape, and whether a level is used
+    # (the levels have the factors 2, 4 and 8 along z)
+    cases = [ ({'z': 25}, (8, 12, 25), True),
+              (13, (8, 12, 12), True),
+              (30, (8, 12, 25), True),
+              (40, (8, 12, 33), False) ]
+    for max_resolution, shape, from_pyramid in cases:
+        reference, info_reference = downsample_field(F_full, info_full,
+                                                     max_resolution)
+        with monkeypatch.context() as m:
+            if from_pyramid:
+                # The full-resolution data must not be read
+                def read_full(*args, **kwargs):
+                    raise AssertionError('full-resolution read')
+                m.setattr(ts.data_reader, 'read_field_cartesian',
+                          read_full)
+            F, info = ts.get_field('E', 'x', iteration=0,
+                                   max_resolution=max_resolution)
+        assert F.shape == shape == reference.shape
+        assert np.allclose(F, reference)
+        for label in 'xyz':
+            assert np.allclose(getattr(info, label),
+                               getattr(info_reference, label))
+
+    # Slice across an axis that is not downsampled in the pyramid
+    F, info = ts.get_field('E', 'x', iteration=0, slice_across='x',
+                           max_resolution=13)
+    F_slice, info_slice = ts.get_field('E', 'x', iteration=0,
+                                       slice_across='x')
+    reference, info_reference = downsample_field(F_slice, info_slice, 13)
+    assert F.shape == reference.shape == (12, 12)
+    assert np.allclose(F, reference)
+    assert np.allclose(info.z, info_reference.z)
+
+    # Slice across axes that are downsampled in the pyramid: the result
+    # is the same as without pyramid
+    reference_ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py')
+    ts.build_field_pyramid(os.path.join(tmp_path, 'pyramid_xyz.h5'),
+                           'E', 'x', min_size=4)
+    for slice_across, max_resolution in [('z', 6), (['x', 'z'], 6),
+                                         ('x', {'z': 25})]:
+        F, info = ts.get_field('E', 'x', iteration=0,
+            slice_across=slice_across, max_resolution=max_resolution)
+        reference, info_reference = reference_ts.get_field('E', 'x',
+            iteration=0, slice_across=slice_across,
+            max_resolution=max_resolution)
+        assert F.shape == reference.shape
+        assert np.allclose(F, reference)
+        for label in info.axes.values():
+            assert np.allclose(getattr(info, label),
+                               getattr(info_reference, label))
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,118 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks that the openpmd-api field reader only reads the chunks that
+intersect the requested slice, and masks the regions without chunks.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_field_read_engine.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import os
+import tempfile
+import numpy as np
+import pytest
+
+io = pytest.importorskip('openpmd_api')
+from openpmd_viewer.openpmd_timeseries.data_reader.io_reader.utilities \
+    import get_data, boxes_overlap
+
+
+def write_chunked_field(path, data, n_chunks, skipped_chunk=None):
+    """Write `data` in `n_chunks` chunks along the first axis"""
+    series = io.Series(os.path.join(path, 'data_%T.json'), io.Access.create)
+    it = series.iterations[0]
+    rc = it.meshes['E']['x']
+    rc.reset_dataset(io.Dataset(data.dtype, list(data.shape)))
+    step = data.shape[0] // n_chunks
+    for i_chunk in range(n_chunks):
+        if i_chunk == skipped_chunk:
+            continue
+        chunk = np.ascontiguousarray(data[i_chunk*step:(i_chunk+1)*step])
+        rc.store_chunk(chunk, [i_chunk*step] + [0]*(data.ndim-1),
+                       list(chunk.shape))
+    series.flush()
+    del series
+
+
+def read_component(path):
+    series = io.Series(os.path.join(path, 'data_%T.json'),
+                       io.Access.read_only)
+    return series, series.iterations[0].meshes['E']['x']
+
+
+def test_full_and_sliced_read():
+    "Check full reads and slices of a chunked 3D dataset"
+    data = np.random.random((8, 6, 5))
+    with tempfile.TemporaryDirectory() as path:
+        write_chunked_field(path, data, n_chunks=4)
+        series, rc = read_component(path)
+        assert np.array_equal(get_data(series, rc), data)
+        assert np.array_equal(get_data(series, rc, 3, 0), data[3])
+        assert np.array_equal(get_data(series, rc, 2, 1), data[:, 2, :])
+        assert np.array_equal(
+            get_data(series, rc, [5, 4], [0, 2]), data[5, :, 4])
+
+
+def test_missing_chunk_is_masked():
+    "Check that regions without chunks are NaN, and only those"
+    data = np.random.random((8, 6))
+    with tempfile.TemporaryDirectory() as path:
+        write_chunked_field(path, data, n_chunks=4, skipped_chunk=1)
+        series, rc = read_component(path)
+        F = get_data(series, rc)
+        assert np.all(np.isnan(F[2:4]))
+        assert np.array_equal(F[:2], data[:2])
+        assert np.array_equal(F[4:], data[4:])
+        # A slice across the missing chunk
+        F = get_data(series, rc, 3, 1)
+        assert np.all(np.isnan(F[2:4]))
+        assert np.array_equal(F[4:], data[4:, 3])
+
+
+def test_boxes_overlap():
+    "Check the detection of overlapping chunks"
+    lower = np.array([[0, 0], [4, 0], [0, 3], [4, 3]])
+    upper = lower + [4, 3]
+    assert not boxes_overlap(lower, upper)
+    assert boxes_overlap(np.vstack([lower, [[3, 2]]]),
+                         np.vstack([upper, [[5, 4]]]))
+
+
+@pytest.mark.skipif(not io.variants['adios2'],
+                    reason='overlapping chunks require ADIOS2')
+def test_overlapping_chunks_are_masked():
+    "Check the gap left by overlapping chunks of the same total volume"
+    data = np.random.random((8, 6))
+    with tempfile.TemporaryDirectory() as path:
+        series = io.Series(os.path.join(path, 'data_%T.bp'),
+                           io.Access.create)
+        rc = series.iterations[0].meshes['E']['x']
+        rc.reset_dataset(io.Dataset(data.dtype, list(data.shape)))
+        # Rows 0-4 and 2-6 (48 values, as the dataset): rows 6-8 are empty
+        chunks = [np.ascontiguousarray(data[0:4]),
+                  np.ascontiguousarray(data[2:6])]
+        rc.store_chunk(chunks[0], [0, 0], [4, 6])
+        rc.store_chunk(chunks[1], [2, 0], [4, 6])
+        series.flush()
+        series.close()
+
+        series = io.Series(os.path.join(path, 'data_%T.bp'),
+                           io.Access.read_only)
+        rc = series.iterations[0].meshes['E']['x']
+        F = get_data(series, rc)
+        assert np.array_equal(F[:6], data[:6])
+        assert np.all(np.isnan(F[6:]))
+        series.close()
+
+
+if __name__ == '__main__':
+    test_full_and_sliced_read()
+    test_missing_chunk_is_masked()
+    test_boxes_overlap()
+    test_overlapping_chunks_are_masked()
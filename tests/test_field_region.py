@@ -0,0 +1,72 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the conversion of a region of interest (in physical units)
+into ranges of indices, and the cropping of fields to such a region.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_field_region.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+from openpmd_viewer import FieldMetaInformation
+from openpmd_viewer.openpmd_timeseries.utilities import \
+    region_to_index_range, crop_field_to_region
+
+
+def test_region_to_index_range():
+    "Check that the index ranges contain exactly the points in the region"
+    shape = [100, 50]
+    spacing = [0.5, 2.]
+    offset = [-10., 3.]
+    position = [0.5, 0.]
+    info = FieldMetaInformation({0: 'x', 1: 'z'}, shape, spacing,
+                                offset, 1.e-6, position)
+    region = {'x': [-2.e-6, 5.e-6], 'z': [None, 40.e-6]}
+    index_range = region_to_index_range(region, ['x', 'z'], shape,
+                                        spacing, offset, 1.e-6, position)
+    for (start, stop), label in zip(index_range, ['x', 'z']):
+        coords = getattr(info, label)
+        lower, upper = region[label]
+        inside = np.ones(len(coords), dtype=bool)
+        if lower is not None:
+            inside &= coords >= lower
+        if upper is not None:
+            inside &= coords <= upper
+        assert np.array_equal(np.nonzero(inside)[0],
+                              np.arange(start, stop))
+
+
+def test_region_on_grid_points():
+    "Check that bounds located exactly on grid points are included"
+    index_range = region_to_index_range({'z': [1., 3.]}, ['z'], [10],
+                                        [1.], [0.], 1., [0.])
+    assert index_range == [(1, 4)]
+    # A region outside of the box still returns one point
+    index_range = region_to_index_range({'z': [20., 30.]}, ['z'], [10],
+                                        [1.], [0.], 1., [0.])
+    assert index_range == [(9, 10)]
+
+
+def test_crop_field_to_region():
+    "Check in-memory cropping of a field and its metainformation"
+    info = FieldMetaInformation({0: 'r', 1: 'z'}, (8, 20), [1., 1.],
+                                [0., 0.], 1., [0.5, 0.], thetaMode=True)
+    F = np.random.random((16, 20))
+    G = crop_field_to_region(F, info, {'r': [-2., 2.], 'z': [5., 9.]})
+    assert G.shape == (4, 5)
+    assert np.array_equal(G, F[6:10, 5:10])
+    assert np.allclose(info.r, [-1.5, -0.5, 0.5, 1.5])
+    assert info.zmin == 5. and info.zmax == 9.
+    assert np.allclose(info.imshow_extent, [4.5, 9.5, -2., 2.])
+
+
+if __name__ == '__main__':
+    test_region_to_index_range()
+    test_region_on_grid_points()
+    test_crop_field_to_region()
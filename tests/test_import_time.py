@@ -0,0 +1,68 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks that `import openpmd_viewer` does not import the optional
+and heavy dependencies (see benchmark/import_time.py), and that these
+dependencies are still imported when they are needed.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_import_time.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import sys
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+from benchmark.import_time import loaded_deferred_modules, \
+    measure_import_time
+
+# Maximal median import time (in seconds): generous compared to the
+# typical import time (about 0.5 s, mostly numba), for slow CI machines
+IMPORT_TIME_TARGET = 2.
+
+
+def test_deferred_imports():
+    "Check that the heavy packages are not imported at startup"
+    assert loaded_deferred_modules() == []
+
+
+def test_import_time():
+    "Check that the import time is below the target"
+    times = measure_import_time( repeat=3 )
+    assert len( times ) == 3
+    assert np.median( times ) < IMPORT_TIME_TARGET
+
+
+@pytest.mark.parametrize( 'synthetic_data',
+    [ dict(n_particles=100, n_blocks=2) ], indirect=True )
+def test_missing_geosindex( monkeypatch, synthetic_data ):
+    "Check that geosindex is only required with `geos_index=True`"
+    # Make `import geosindex` fail
+    monkeypatch.setitem( sys.modules, 'geosindex', None )
+    path = synthetic_data.path
+    ts = OpenPMDTimeSeries( path, backend='h5py' )
+    x, = ts.get_particle( ['x'], iteration=0 )
+    assert x.size == 100
+    with pytest.raises(OpenPMDException):
+        OpenPMDTimeSeries( path, backend='h5py', geos_index=True,
+                           geos_index_save_path=path )
+
+
+@pytest.mark.parametrize( 'synthetic_data',
+    [ dict(n_particles=100, n_blocks=2) ], indirect=True )
+def test_plot_after_deferred_import( synthetic_data ):
+    "Check that matplotlib is imported for the first plot"
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    ts = OpenPMDTimeSeries( synthetic_data.path, backend='h5py' )
+    ts.get_particle( ['z', 'uz'], iteration=0, plot=True )
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
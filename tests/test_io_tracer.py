@@ -0,0 +1,79 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the recording of the chunk requests by the IOTracer,
+and the offline replay of a trace under a different read plan.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_io_tracer.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import os
+import tempfile
+import numpy as np
+import h5py
+from openpmd_viewer.openpmd_timeseries.data_reader.io_tracer import \
+    IOTracer, load_trace, chunk_dtype
+from openpmd_viewer.openpmd_timeseries.data_reader.h5py_reader.utilities \
+    import get_data
+from benchmark.replay_trace import replay
+
+
+def test_trace_h5py_reads():
+    "Check that the h5py reads are recorded, and that the trace round-trips"
+    with tempfile.TemporaryDirectory() as tmpdir:
+        with h5py.File(os.path.join(tmpdir, 'data.h5'), 'w') as f:
+            f['E/x'] = np.arange(200.).reshape(10, 20)
+            f['rho'] = np.arange(30.)
+            for name in ['E/x', 'rho']:
+                f[name].attrs['unitSI'] = 1.
+            # Reads outside of a tracer are not recorded
+            get_data(f['rho'])
+            with IOTracer() as tracer:
+                get_data(f['E/x'], i_slice=4, pos_slice=0)
+                get_data(f['E/x'], region=[(2, 5), (0, 20)])
+                get_data(f['rho'])
+            get_data(f['rho'])
+        chunks = tracer.to_array()
+        assert tracer.record_names == ['/E/x', '/rho']
+        assert list(chunks['record']) == [0, 0, 1]
+        assert list(chunks['flush_group']) == [0, 1, 2]
+        assert np.array_equal(chunks['offset'][0, :2], [4, 0])
+        assert np.array_equal(chunks['count'][0, :2], [1, 20])
+        assert np.array_equal(chunks['offset'][1, :2], [2, 0])
+        assert np.array_equal(chunks['count'][1, :2], [3, 20])
+        assert list(chunks['nbytes']) == [160, 480, 240]
+        # Save and load the trace
+        filename = os.path.join(tmpdir, 'trace.npz')
+        tracer.save(filename)
+        loaded_chunks, record_names = load_trace(filename)
+        assert record_names == tracer.record_names
+        assert np.array_equal(loaded_chunks, chunks)
+
+
+def test_replay_coalescing():
+    "Check the estimated speedup when neighbouring chunks are coalesced"
+    chunks = np.zeros(4, dtype=chunk_dtype)
+    chunks['ndim'] = 1
+    chunks['offset'][:, 0] = [0, 100, 200, 1000]
+    chunks['count'][:, 0] = 90
+    chunks['nbytes'] = 720
+    chunks['flush_group'] = np.arange(4)
+    chunks['latency'] = 1.e-3
+    # The chunks within 10 elements of each other are merged,
+    # and all the chunks are read in one flush
+    result = replay(chunks, gap=10, flush='single', model=(1.e-3, 0., 0.))
+    assert result['n_chunks'] == (4, 2)
+    assert result['n_flushes'] == (4, 1)
+    assert result['bytes_read'] == (2880, 290 * 8 + 720)
+    assert np.isclose(result['speedup'], 4.)
+
+
+if __name__ == '__main__':
+    test_trace_h5py_reads()
+    test_replay_coalescing()
@@ -0,0 +1,114 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the memory accounting of the queries (peak and total memory
+in the query profiles) and the memory budget of `get_particle`, which
+switches to batched reads instead of reading all the particles at once.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_memory_budget.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+from openpmd_viewer.openpmd_timeseries.utilities import parse_memory_size
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+
+N_PARTICLES = 4000
+
+
+def test_parse_memory_size():
+    "Check the conversion of memory sizes to bytes"
+    assert parse_memory_size(1000) == 1000
+    assert parse_memory_size('64GB') == 64 * 1024**3
+    assert parse_memory_size('1.5 MiB') == int(1.5 * 1024**2)
+    assert parse_memory_size('512') == 512
+    with pytest.raises(ValueError):
+        parse_memory_size('a lot')
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES)], indirect=True)
+@pytest.mark.parametrize('backend', available_backends)
+def test_memory_budget(synthetic_data, backend):
+    "Check that batched reads give the same result as a full read"
+    particles = synthetic_data.dataset.get_particles(0)
+    x_min, x_max = np.percentile(particles['x'], [10, 30])
+    select = {'x': [x_min, x_max]}
+    var_list = ['x', 'z', 'uz']
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend, profile=True)
+    reference = ts.get_particle(var_list, iteration=0, select=select)
+    memory = ts.last_query_profile.memory
+    assert memory['peak'] >= 8 * len(var_list) * N_PARTICLES
+    assert memory['total'] >= memory['peak']
+    assert memory['allocations']['mask'] == N_PARTICLES
+
+    # Budget that requires several batches
+    ts.memory_budget = 20 * N_PARTICLES
+    result = ts.get_particle(var_list, iteration=0, select=select)
+    for data, data_reference in zip(result, reference):
+        assert np.array_equal(data, data_reference)
+    assert ts.last_query_profile.memory['peak'] < memory['peak']
+
+    # Without a selection, the read cannot fit in the budget
+    with pytest.raises(OpenPMDException):
+        ts.get_particle(var_list, iteration=0)
+    # Selected particles that exceed the budget
+    ts.memory_budget = '1KB'
+    with pytest.raises(OpenPMDException):
+        ts.get_particle(var_list, iteration=0, select=select)
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES)], indirect=True)
+def test_memory_budget_plot(synthetic_data):
+    "Check that the weights of the plot are read within the budget"
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    particles = synthetic_data.dataset.get_particles(0)
+    x_min, x_max = np.percentile(particles['x'], [10, 30])
+    select = {'x': [x_min, x_max]}
+    budget = 20 * N_PARTICLES
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py', profile=True,
+                           memory_budget=budget)
+    x, z = ts.get_particle(['x', 'z'], iteration=0, select=select, plot=True)
+    assert ts.last_query_profile.annotations['strategy'] == 'batched'
+    assert ts.last_query_profile.memory['peak'] <= budget
+    assert len(x) == len(z) == np.count_nonzero(
+        (particles['x'] > x_min) & (particles['x'] < x_max))
+    # Weights that are also returned
+    x, w = ts.get_particle(['x', 'w'], iteration=0, select=select, plot=True)
+    assert len(w) == len(x)
+
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES, backend='openpmd-api')], indirect=True)
+def test_memory_budget_skip_offset(synthetic_data):
+    "Check that `skip_offset` does not change the result of batched reads"
+    particles = synthetic_data.dataset.get_particles(0)
+    uz_median = np.median(particles['uz'])
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='openpmd-api',
+                           profile=True)
+    for select in [{'uz': [uz_median, None]}, {'uz': [None, uz_median]}]:
+        reference = ts.get_particle(['x', 'uz'], iteration=0,
+                                    select=select, skip_offset=True)
+        ts.memory_budget = 10 * N_PARTICLES
+        result = ts.get_particle(['x', 'uz'], iteration=0,
+                                 select=select, skip_offset=True)
+        assert ts.last_query_profile.annotations['strategy'] == 'batched'
+        ts.memory_budget = None
+        assert len(result[1]) == N_PARTICLES // 2
+        for data, data_reference in zip(result, reference):
+            assert np.array_equal(data, data_reference)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
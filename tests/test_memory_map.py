@@ -0,0 +1,90 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the `memory_map` option of OpenPMDTimeSeries (h5py backend):
+the fields that are stored contiguously are returned as read-only views
+of the memory-mapped file, with the same values as a normal read, while
+the chunked fields are still read normally.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_memory_map.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import os
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+
+pytestmark = pytest.mark.skipif('h5py' not in available_backends,
+                                reason='memory_map requires h5py')
+
+
+def make_contiguous( filename, field_path, dtype, unitSI ):
+    """
+    Rewrite the (chunked) dataset `field_path` of the file `filename`
+    contiguously, with the type `dtype` and the conversion factor `unitSI`
+    """
+    import h5py
+    with h5py.File( filename, 'r+' ) as f:
+        dset = f[field_path]
+        data = dset[...]
+        attrs = dict( dset.attrs )
+        del f[field_path]
+        dset = f.create_dataset( field_path, data=(data / unitSI).astype(dtype) )
+        for key, value in attrs.items():
+            dset.attrs[key] = value
+        dset.attrs['unitSI'] = unitSI
+        assert dset.chunks is None
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=100, field_shape=(8, 6, 16), iterations=[0, 10])],
+    indirect=True)
+def test_memory_map(synthetic_data):
+    "Check the memory-mapped fields against a normal read"
+    path = synthetic_data.path
+    for iteration in [0, 10]:
+        filename = os.path.join(path, 'data%08d.h5' % iteration)
+        make_contiguous(filename, '/data/%d/meshes/E/x' % iteration,
+                        np.float32, 1.)
+        make_contiguous(filename, '/data/%d/meshes/E/y' % iteration,
+                        np.float64, 2.)
+    reference = OpenPMDTimeSeries(path, backend='h5py')
+    ts = OpenPMDTimeSeries(path, backend='h5py', memory_map=True,
+                           profile=True)
+
+    _, info = reference.get_field('E', 'x', iteration=10)
+    region = {'z': [info.zmin, 0.5 * (info.zmin + info.zmax)]}
+    for kwargs in [ {}, {'slice_across': 'y'},
+                    {'slice_across': ['x', 'y']}, {'region': region} ]:
+        for coord in 'xyz':
+            F, info = ts.get_field('E', coord, iteration=10, **kwargs)
+            F_reference, info_reference = reference.get_field(
+                'E', coord, iteration=10, **kwargs)
+            assert np.array_equal(F, F_reference)
+            assert F.dtype == F_reference.dtype
+            assert np.array_equal(info.z, info_reference.z)
+            # Only the contiguous dataset without conversion is a view
+            assert F.flags.writeable == (coord != 'x')
+            assert isinstance(F, np.memmap) == (coord == 'x')
+
+    # Nothing is read from the memory-mapped dataset
+    ts.get_field('E', 'x', iteration=0)
+    counters = ts.last_query_profile.counters
+    assert counters['n_mapped_chunks'] == 1
+    assert counters.get('bytes_read', 0) == 0
+
+    if 'openpmd-api' in available_backends:
+        with pytest.raises(RuntimeError):
+            OpenPMDTimeSeries(path, backend='openpmd-api',
+                              memory_map=True)
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
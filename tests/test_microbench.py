@@ -0,0 +1,62 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the microbenchmark suite (benchmark/microbench.py): the
+timing of a registered kernel, the storage of the results and the
+detection of slowdowns between two runs.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_microbench.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import json
+import tempfile
+from benchmark.microbench import BENCHMARKS, run_suite, save_results, \
+    compare_results
+
+
+def test_registered_kernels():
+    "Check that the core kernels are covered, at several sizes"
+    for name in ['gc_get_data', 'apply_selection', 'histogram_cic_1d',
+                 'histogram_cic_2d', 'construct_3d_from_circ',
+                 'get_extraction_indices', 'find_optimal_strategy',
+                 'emittance_from_coord']:
+        setup, sizes = BENCHMARKS[name]
+        assert len(sizes) > 1
+
+
+def test_run_and_save():
+    "Check a quick run of one benchmark, and the result file"
+    results = run_suite(names=['histogram_cic_1d'], quick=True, repeat=2,
+                        min_time=0.01, verbose=False)
+    assert list(results.keys()) == ['histogram_cic_1d[100000]']
+    assert 0 < results['histogram_cic_1d[100000]']['min'] \
+        <= results['histogram_cic_1d[100000]']['median']
+    with tempfile.TemporaryDirectory() as results_dir:
+        filename = save_results(results, results_dir, commit='abc123')
+        with open(filename) as f:
+            record = json.load(f)
+    assert record['commit'] == 'abc123'
+    assert record['results'] == json.loads(json.dumps(results))
+
+
+def test_compare_results():
+    "Check that slowdowns beyond the threshold are flagged"
+    def run(times):
+        return {'results': {key: {'min': t} for key, t in times.items()}}
+    base = run({'a[10]': 1., 'b[10]': 1., 'c[10]': 1.})
+    new = run({'a[10]': 1.1, 'b[10]': 1.5, 'c[10]': 0.5, 'd[10]': 1.})
+    rows = compare_results(base, new, threshold=1.2)
+    flags = {key: flag for key, _, _, _, flag in rows}
+    assert flags == {'a[10]': '', 'b[10]': 'SLOWER', 'c[10]': 'faster'}
+
+
+if __name__ == '__main__':
+    test_registered_kernels()
+    test_run_and_save()
+    test_compare_results()
@@ -0,0 +1,92 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks `get_particle_iterations`, which reads particle quantities at
+several iterations at once: the data is the same as with `get_particle`,
+and with openpmd-api, all the iterations are read with a single flush.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_particle_iterations.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+from openpmd_viewer.openpmd_timeseries.data_reader.io_tracer import IOTracer
+
+ITERATIONS = [0, 10, 20, 30, 40]
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(iterations=ITERATIONS, backend=backend)
+     for backend in available_backends], ids=available_backends,
+    indirect=True)
+def test_particle_iterations(synthetic_data):
+    "Check the data against `get_particle` at each iteration"
+    select = {'uz': [0., None]}
+    var_list = ['z', 'uz', 'w']
+    backend = synthetic_data.backend
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend,
+                           profile=True)
+
+    result = ts.get_particle_iterations(var_list, select=select)
+    assert list(result.keys()) == ITERATIONS
+    n_flushes = 0
+    for iteration in ITERATIONS:
+        reference = ts.get_particle(var_list, iteration=iteration,
+                                    select=select)
+        n_flushes += ts.last_query_profile.counters.get('n_flushes', 0)
+        for data, data_reference in zip(result[iteration], reference):
+            assert np.array_equal(data, data_reference)
+
+    # Stacked data (same number of particles at each iteration)
+    z, w = ts.get_particle_iterations(['z', 'w'],
+        iterations=ITERATIONS[1:4], stack=True)
+    assert z.shape == (3, 2000)
+    assert np.array_equal(w[1], ts.get_particle(['w'], iteration=20)[0])
+    with pytest.raises(OpenPMDException):
+        ts.get_particle_iterations(['z'], iterations=[5])
+
+    if backend == 'openpmd-api':
+        # One flush for all the iterations, or per group of iterations
+        ts.get_particle_iterations(var_list, select=select)
+        assert ts.last_query_profile.counters['n_flushes'] == 1
+        assert n_flushes >= 5 * len(ITERATIONS)
+        with IOTracer() as tracer:
+            ts.get_particle_iterations(var_list, select=select,
+                                       iterations_per_flush=2)
+        assert ts.last_query_profile.counters['n_flushes'] == 3
+        trace = tracer.to_array()
+        assert len(np.unique(trace['flush_group'])) == 3
+        names = [tracer.record_names[i] for i in trace['record']]
+        assert 'electrons/momentum/z' in names
+        assert 'electrons/mass' in names
+
+        # With `skip_offset`, the data and the bounds are still in
+        # physical units
+        uz_median = np.median(synthetic_data.dataset.get_particles(0)['uz'])
+        select = {'uz': [uz_median, None]}
+        result = ts.get_particle_iterations(['uz', 'w'], select=select,
+                                            skip_offset=True)
+        for iteration in ITERATIONS:
+            reference = ts.get_particle(['uz', 'w'], iteration=iteration,
+                                        select=select, skip_offset=True)
+            assert len(reference[1]) == 1000
+            for data, data_reference in zip(result[iteration], reference):
+                assert np.array_equal(data, data_reference)
+
+    # Repeated iterations
+    z, = ts.get_particle_iterations(['z'], iterations=[10, 20, 10],
+                                    stack=True)
+    assert z.shape == (3, 2000)
+    assert np.array_equal(z[0], z[2])
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,108 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks `render_particles`, which bins the particles into an image
+one batch at a time: the image is the same as the histogram of the
+particles returned by `get_particle`, and the memory used does not
+scale with the number of particles.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_particle_raster.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+
+N_PARTICLES = 10000
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES)], indirect=True)
+def test_render_particles(synthetic_data):
+    "Check the image against the histogram of the particles"
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py', profile=True)
+    x, z, w = ts.get_particle(['x', 'z', 'w'], iteration=0)
+    select = {'x': [np.percentile(x, 20), None]}
+    selected = x > select['x'][0]
+
+    # Given extent, several batches
+    hist_range = [[z.min(), z.max()], [x.min(), 0.]]
+    raster = ts.render_particles(['z', 'x'], iteration=0,
+        select=select, plot_range=hist_range, resolution=[40, 30],
+        histogram_deposition='ngp', batch_size=999)
+    reference, _, _ = np.histogram2d(z[selected], x[selected],
+        [40, 30], hist_range, weights=w[selected])
+    assert raster.data.shape == (40, 30)
+    assert np.allclose(raster.data, reference)
+    assert raster.n_particles == np.count_nonzero(selected)
+    profile = ts.last_query_profile
+    assert profile.counters['n_batches'] == 11
+    assert profile.memory['peak'] < 8 * N_PARTICLES
+
+    # Extent of the selected particles
+    raster = ts.render_particles(['z', 'x'], iteration=0,
+        select=select, resolution=[40, 30], histogram_deposition='ngp',
+        batch_size=999)
+    assert raster.extent == [z[selected].min(), z[selected].max(),
+                             x[selected].min(), x[selected].max()]
+    assert np.isclose(raster.data.sum(), w[selected].sum())
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES)], indirect=True)
+def test_plot_raster(synthetic_data):
+    "Check the plot of the image, and the rendering of a zoomed view"
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py')
+    fig = plt.figure(12, figsize=(4, 3), dpi=100)
+    raster = ts.render_particles(['z', 'uz'], iteration=0, plot=True,
+                                 norm='log', update=True)
+    # One pixel per point of the axes
+    width, height = fig.axes[0].get_window_extent().size
+    assert raster.data.shape == (round(width), round(height))
+    image = fig.axes[0].images[0]
+    assert isinstance(image.norm, matplotlib.colors.LogNorm)
+
+    # Zoom in, and render the visible range again
+    zmin, zmax = raster.extent[:2]
+    fig.axes[0].set_xlim(zmin, 0.5 * (zmin + zmax))
+    zoomed = ts.render_particles(['z', 'uz'], iteration=0, plot=True,
+        norm='log', plot_range='visible', update=True)
+    assert zoomed.extent[:2] == [zmin, 0.5 * (zmin + zmax)]
+    assert zoomed.data.sum() < raster.data.sum()
+    assert list(fig.axes[0].images) == [image]
+    plt.close('all')
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES, position_offset=1.e-5,
+          backend='openpmd-api')], indirect=True)
+def test_render_particles_skip_offset(synthetic_data):
+    "Check that `skip_offset` renders the particles in physical units"
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='openpmd-api')
+    particles = synthetic_data.dataset.get_particles(0)
+    uz_median = np.median(particles['uz'])
+    kw = dict(iteration=0, select={'uz': [uz_median, None]},
+              resolution=[20, 20], histogram_deposition='ngp')
+    raster = ts.render_particles(['z', 'uz'], **kw)
+    selected = particles['uz'] > uz_median
+    assert np.allclose(raster.extent,
+        [particles['z'][selected].min(), particles['z'][selected].max(),
+         particles['uz'][selected].min(), particles['uz'][selected].max()])
+    for var_list in [['z', 'uz'], ['x', 'ux']]:
+        raster = ts.render_particles(var_list, **kw)
+        raster_raw = ts.render_particles(var_list, skip_offset=True, **kw)
+        assert raster_raw.n_particles == raster.n_particles == N_PARTICLES // 2
+        assert raster_raw.extent == raster.extent
+        assert np.allclose(raster_raw.data, raster.data)
+
+if __name__ == '__main__':
+    pytest.main([__file__])
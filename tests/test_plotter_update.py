@@ -0,0 +1,60 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the in-place update of the 2D plots (`update=True`, as used
+by the slider): the image and colorbar of the figure are reused when
+the layout of the plot is unchanged, and rebuilt otherwise.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_plotter_update.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=1000, n_blocks=2, field_shape=(8, 8, 16),
+          iterations=[0, 10])], indirect=True)
+def test_update_field_plot(synthetic_data):
+    "Check that the field image is updated in place"
+    matplotlib = pytest.importorskip('matplotlib')
+    matplotlib.use('Agg')
+    import matplotlib.pyplot as plt
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py')
+    fig = plt.figure(10)
+
+    F0, _ = ts.get_field('E', coord='x', iteration=0, slice_across='y',
+                         plot=True, update=True)
+    image = fig.axes[0].images[0]
+    F1, _ = ts.get_field('E', coord='x', iteration=10, slice_across='y',
+                         plot=True, update=True, vmin=-1., vmax=1.)
+    # Same artists (one image and its colorbar), with the new data
+    assert len(fig.axes) == 2 and list(fig.axes[0].images) == [image]
+    assert np.array_equal(image.get_array(), F1)
+    assert image.get_clim() == (-1., 1.)
+    assert 'iteration 10' in fig.axes[0].get_title()
+
+    # A different slice changes the axes of the plot: new image
+    ts.get_field('E', coord='x', iteration=10, slice_across='x',
+                 plot=True, update=True)
+    assert len(fig.axes) == 2 and fig.axes[0].images[0] is not image
+
+    # Particle histograms
+    fig = plt.figure(11)
+    ts.get_particle(['z', 'x'], iteration=0, plot=True, update=True)
+    image = fig.axes[0].images[0]
+    ts.get_particle(['z', 'x'], iteration=10, plot=True, update=True)
+    assert len(fig.axes) == 2 and list(fig.axes[0].images) == [image]
+    assert 'iteration 10' in fig.axes[0].get_title()
+    plt.close('all')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,112 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the IterationPrefetcher used by the slider: the data at the
+adjacent iterations is read in the background, in the direction of
+navigation, and is identical to the data read directly.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_prefetch.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.addons import LpaDiagnostics
+from openpmd_viewer.openpmd_timeseries.prefetch import IterationPrefetcher, \
+    open_reader
+
+ITERATIONS = [0, 10, 20, 30, 40]
+
+pytestmark = pytest.mark.parametrize('synthetic_data',
+    [dict(iterations=ITERATIONS)], indirect=True)
+
+
+def test_prefetch(synthetic_data):
+    "Check the prefetched fields and particles"
+    field_kw = dict(field='E', coord='x', m='all', theta=0.,
+                    slice_across='y', slice_relative_position=0.)
+    particle_kw = dict(species='electrons', var_list=['z', 'uz'],
+                       select={'x': [-1.e-6, 1.e-6]})
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py')
+    prefetcher = IterationPrefetcher(ts, cache_size='64MB')
+
+    # First view: direct reads, then prefetch of iteration 10
+    prefetcher.get('field', 0, **field_kw)
+    prefetcher.get('particle', 0, **particle_kw)
+    assert prefetcher.misses == 2
+    prefetcher.wait()
+    assert len(prefetcher.cache) == 4
+
+    # Stepping forward uses the prefetched data
+    for iteration in ITERATIONS[1:]:
+        F, info = prefetcher.get('field', iteration, **field_kw)
+        data_list = prefetcher.get('particle', iteration, **particle_kw)
+        F_ref, info_ref = ts.get_field(iteration=iteration, **field_kw)
+        data_ref = ts.get_particle(iteration=iteration, **particle_kw)
+        assert np.array_equal(F, F_ref)
+        assert np.array_equal(info.z, info_ref.z)
+        for data, data_reference in zip(data_list, data_ref):
+            assert np.array_equal(data, data_reference)
+        prefetcher.wait()
+    assert prefetcher.hits == 2 * (len(ITERATIONS) - 1)
+
+    # Changing the viewed data prefetches the new data
+    field_kw['coord'] = 'z'
+    prefetcher.cache.clear()
+    prefetcher.get('field', 20, **field_kw)
+    prefetcher.get('field', 10, **field_kw)
+    prefetcher.wait()
+    # (backward navigation: iteration 0 is read ahead)
+    assert ('field', 0, prefetcher._key('field', 0, field_kw)[2]) \
+        in prefetcher.cache
+    prefetcher.stop()
+
+
+def test_prefetch_options(synthetic_data):
+    "Check that the worker reads with the options of the viewed series"
+    particle_kw = dict(species='electrons', var_list=['z', 'uz'],
+                       select={'uz': [0., None]})
+    ts = LpaDiagnostics(synthetic_data.path, backend='h5py', dtype='float32',
+                        memory_budget='16MB')
+    prefetcher = IterationPrefetcher(ts, cache_size='64MB')
+    prefetcher.get('particle', 0, **particle_kw)
+    prefetcher.wait()
+    assert isinstance(prefetcher._series, LpaDiagnostics)
+    assert prefetcher._series.memory_budget == '16MB'
+    # Same type for the prefetched data and the direct reads
+    data_list = prefetcher.get('particle', 10, **particle_kw)
+    assert prefetcher.hits == 1
+    data_ref = ts.get_particle(iteration=10, **particle_kw)
+    for data, data_reference in zip(data_list, data_ref):
+        assert data.dtype == np.float32
+        assert np.array_equal(data, data_reference)
+    prefetcher.stop()
+
+
+def test_prefetch_reader(synthetic_data):
+    "Check that the reads of another thread leave the viewed iteration"
+    field_kw = dict(field='E', coord='x', slice_across='y')
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend='h5py',
+                           memory_budget='16MB')
+    ts._find_output(None, 40)
+    reader = open_reader(ts)
+    assert reader.memory_budget == '16MB'
+    prefetcher = IterationPrefetcher(ts, cache_size='64MB', reader=reader)
+    for iteration in [0, 20]:
+        F, info = prefetcher.get('field', iteration, **field_kw)
+        assert np.array_equal(F, ts.get_field(iteration=iteration,
+                                              **field_kw)[0])
+        ts._find_output(None, 40)
+        prefetcher.get('particle', iteration, var_list=['z'])
+        assert ts.current_iteration == 40 and ts._current_i == 4
+    prefetcher.stop()
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,124 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the recording of query profiles (timings of the phases
+and counters), which is off by default.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_profiler.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import json
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+from openpmd_viewer.openpmd_timeseries.profiler import profiled_query, \
+    span, count, current_profile
+
+
+class DummySeries(object):
+    "Minimal object with the attributes used by `profiled_query`"
+
+    def __init__(self, profile):
+        self.profile = profile
+        self.last_query_profile = None
+
+    @profiled_query
+    def get_data(self, n_reads):
+        for i in range(n_reads):
+            with span('read'):
+                count('bytes_read', 8)
+        with span('select'):
+            pass
+        return current_profile()
+
+
+def test_profiling_is_off_by_default():
+    "Check that nothing is recorded when profiling is off"
+    ts = DummySeries(profile=False)
+    assert ts.get_data(3) is None
+    assert ts.last_query_profile is None
+    # Outside of a profiled query, spans and counters are no-ops
+    with span('read'):
+        count('bytes_read', 8)
+    assert current_profile() is None
+
+
+def test_profile_of_last_query():
+    "Check the spans and counters of the last profiled call"
+    ts = DummySeries(profile=True)
+    ts.get_data(3)
+    profile = ts.last_query_profile
+    assert profile.query == 'get_data'
+    assert profile.spans['read']['count'] == 3
+    assert profile.spans['select']['count'] == 1
+    assert profile.counters == {'bytes_read': 24}
+    assert profile.total_time >= profile.spans['read']['time']
+    # The profile is not active anymore after the call
+    assert current_profile() is None
+    # A new call replaces the profile
+    ts.get_data(1)
+    assert ts.last_query_profile.counters == {'bytes_read': 8}
+
+
+def test_json_line():
+    "Check the export of a profile as a line of JSON"
+    ts = DummySeries(profile=True)
+    ts.get_data(2)
+    line = ts.last_query_profile.to_json_line(test_type=1)
+    assert '\n' not in line
+    record = json.loads(line)
+    assert record['test_type'] == 1
+    assert record['query'] == 'get_data'
+    assert record['counters']['bytes_read'] == 16
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=2000, n_blocks=4, n_field_blocks=4, backend=backend)
+     for backend in available_backends], ids=available_backends,
+    indirect=True)
+def test_profile_of_series(synthetic_data):
+    "Check the profiles of `get_particle` and `get_field` on synthetic data"
+    backend = synthetic_data.backend
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend)
+    ts.get_particle(['x'], iteration=0)
+    assert ts.last_query_profile is None
+
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend,
+                           profile=True)
+    x, uz = ts.get_particle(['x', 'uz'], iteration=0,
+                            select={'uz': [0., None]})
+    profile = ts.last_query_profile
+    assert profile.query == 'get_particle'
+    assert profile.annotations['strategy'] == 'full'
+    assert profile.spans['select']['count'] == 1
+    # Three reads: `x`, `uz`, and `uz` for the selection
+    assert profile.counters['bytes_read'] >= 3 * 8 * 2000
+    if backend == 'openpmd-api':
+        # One flush for the 4 blocks of each record, and one for the
+        # position offset or the mass that converts it
+        assert profile.counters['n_chunks'] == 3 * (4 + 1)
+        assert profile.counters['n_flushes'] == 3 * 2
+    else:
+        assert profile.counters['n_chunks'] == 3
+        assert 'n_flushes' not in profile.counters
+
+    # Full field, and a slice of it (only the slice is read)
+    for slice_across in [None, 'y']:
+        F, info = ts.get_field('E', 'x', iteration=0,
+                               slice_across=slice_across)
+        profile = ts.last_query_profile
+        assert profile.query == 'get_field'
+        assert profile.counters['bytes_read'] == F.nbytes
+        if backend == 'openpmd-api':
+            assert profile.counters['n_chunks'] == 4
+            assert profile.counters['n_flushes'] == 1
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -1,29 +1,70 @@
-import os
-import sys
+"""
+This test file is part of the openPMD-viewer.
 
-sys.path.insert(0, os.getcwd())
+It reads a large synthetic series with a narrow selection on `ux`, with
+a full read and with batched reads (memory budget), and checks that the
+batched reads give the same particles, reading the same number of bytes
+in more flushes, with a lower peak memory.
 
-import time
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_read_speed_large.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
 from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
 
-bp_file_path = '/nvme/gc/openPMD/'
-geos_index_path = "/data/gc/rocksdb-index/GEOSIndex/build-with-blosc/bp10000"
+N_PARTICLES = 1000000
+ITERATION = 10000
 
-species = "hydrogen"
-iteration = 10000
 
-geos_ts = OpenPMDTimeSeries(bp_file_path, backend='openpmd-api', geos_index=True, geos_index_type="minmax",
-                                 geos_index_storage_backend="file", geos_index_save_path=geos_index_path)
-start = time.time()
-result_2 = geos_ts.get_particle(['ux'], species=species, iteration=iteration, geos_index_read_groups=True, skip_offset=True, select={'ux': [-0.0019551650236630095, -0.0019533063791186537]})
-end = time.time()
-print("Total time elapsed: ", end - start)
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES, n_blocks=64, iterations=[ITERATION],
+          backend=backend)
+     for backend in available_backends], ids=available_backends,
+    indirect=True)
+def test_read_speed_large(synthetic_data):
+    "Check the batched reads against the full read"
+    backend = synthetic_data.backend
+    particles = synthetic_data.dataset.get_particles(ITERATION)
+    select = {'ux': list(np.percentile(particles['ux'], [20, 20.1]))}
+    n_selected = np.count_nonzero((particles['ux'] > select['ux'][0]) &
+                                  (particles['ux'] < select['ux'][1]))
 
-start = time.time()
-result_1 = geos_ts.get_particle(['ux'], species=species, iteration=iteration, geos_index_read_groups=True, select={'ux': [-0.0019551650236630095, -0.0019533063791186537]})
-end = time.time()
-print("Total time elapsed: ", end - start)
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend,
+                           profile=True)
+    ux, = ts.get_particle(['ux'], species='electrons', iteration=ITERATION,
+                          select=select)
+    profile = ts.last_query_profile
+    assert len(ux) == n_selected > 0
 
-import numpy as np
-print(len(result_1[0]), len(result_2[0]))
-print(np.array_equal(result_1[0], result_2[0]))
\ No newline at end of file
+    ts.memory_budget = '2MB'
+    ux_batched, = ts.get_particle(['ux'], species='electrons',
+                                  iteration=ITERATION, select=select)
+    profile_batched = ts.last_query_profile
+    assert profile_batched.annotations['strategy'] == 'batched'
+    assert np.array_equal(ux, ux_batched)
+    assert profile_batched.memory['peak'] < profile.memory['peak']
+    # Each particle is read once, in several batches
+    counters = profile.counters
+    counters_batched = profile_batched.counters
+    assert counters_batched['bytes_read'] == counters['bytes_read']
+    if backend == 'openpmd-api':
+        # Full read: two reads of `ux` (data and selection), each with
+        # one flush for its blocks and one for the mass. Batched read:
+        # the same two reads in each batch.
+        assert counters['n_flushes'] == 4
+        assert counters_batched['n_flushes'] > counters['n_flushes']
+        assert counters_batched['n_flushes'] % 2 == 0
+    else:
+        assert counters_batched['n_chunks'] > counters['n_chunks'] == 2
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
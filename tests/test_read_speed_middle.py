@@ -1,19 +1,61 @@
-import os
-import sys
+"""
+This test file is part of the openPMD-viewer.
 
-sys.path.insert(0, os.getcwd())
+It reads a medium-size synthetic series, written in many blocks, with a
+narrow selection on one component of the momentum, and checks the
+selected particles against the generated data, and the number of chunks
+and flushes of the reads.
 
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_read_speed_middle.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
 from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+
+N_PARTICLES = 100000
+N_BLOCKS = 32
+ITERATION = 9000
+
 
-bp_file_path = '/nvme/gc/middle/data_b13206/'
-geos_index_path = "/data/gc/rocksdb-index/GEOSIndex/cmake-build-debug/bp09000"
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES, n_blocks=N_BLOCKS, block_jitter=0.5,
+          iterations=[ITERATION], backend=backend)
+     for backend in available_backends], ids=available_backends,
+    indirect=True)
+def test_read_speed_middle(synthetic_data):
+    "Check a narrow selection on `ux`"
+    backend = synthetic_data.backend
+    particles = synthetic_data.dataset.get_particles(ITERATION)
+    select = {'ux': list(np.percentile(particles['ux'], [50, 50.1]))}
+    selected = (particles['ux'] > select['ux'][0]) & \
+        (particles['ux'] < select['ux'][1])
 
-species = "hydrogen"
-iteration = 9000
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend,
+                           profile=True)
+    ux, w = ts.get_particle(['ux', 'w'], species='electrons',
+                            iteration=ITERATION, select=select)
+    assert len(ux) == np.count_nonzero(selected) > 0
+    assert np.allclose(ux, particles['ux'][selected], rtol=1.e-12)
+    assert np.allclose(w, particles['w'][selected], rtol=1.e-12)
 
-geos_ts = OpenPMDTimeSeries(bp_file_path, backend='openpmd-api', geos_index=True, geos_index_type="minmax",
-                                 geos_index_storage_backend="file", geos_index_save_path=geos_index_path)
+    # One read of `ux`, `w`, and `ux` for the selection
+    counters = ts.last_query_profile.counters
+    if backend == 'openpmd-api':
+        # The blocks of each record (of irregular sizes) are loaded with
+        # a single flush, and the mass with another one (for `ux` only)
+        assert counters['n_chunks'] == 3 * N_BLOCKS + 2
+        assert counters['n_flushes'] == 3 + 2
+    else:
+        assert counters['n_chunks'] == 3
 
-x_in_envelope = geos_ts.get_particle(['ux'], species=species, iteration=iteration, geos_index_read_groups=True, select={'ux': [0.0031552064001916886, 0.0031580667993416738]})
 
-print(len(x_in_envelope[0]))
\ No newline at end of file
+if __name__ == '__main__':
+    pytest.main([__file__])
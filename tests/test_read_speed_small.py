@@ -1,33 +1,78 @@
-import os
-import sys
+"""
+This test file is part of the openPMD-viewer.
 
-sys.path.insert(0, os.getcwd())
+It reads a small synthetic series with a selection on the three
+components of the momentum (an envelope of the momentum distribution),
+and checks the selected particles against the generated data, as well
+as the number of chunks and flushes of the reads, for a full read and
+for a batched read.
 
-from openpmd_viewer import OpenPMDTimeSeries
-
-bp_file_path = '/nvme/gc/diag2/'
-geos_index_path = "/data/gc/rocksdb-index/GEOSIndex/cmake-build-debug/diag2"
-
-species = "electrons"
-iteration = 500
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_read_speed_small.py
+$ py.test
+$ python setup.py test
 
-# ts = OpenPMDTimeSeries(bp_file_path, backend='openpmd-api')
-# result_0 = ts.get_particle(['ux'], species=species, iteration=iteration,
-#                 select={'ux': [5.282296854337066e-06, 1.1545774343591047e-05], 'uy': [0.00010659756255792407, 0.00021095902110522736], 'uz': [1.4626885514144121e-05, 2.9286875203982146e-05]})
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
 
-geos_ts = OpenPMDTimeSeries(bp_file_path, backend='openpmd-api', geos_index=True, geos_index_type="minmax",
-                                 geos_index_storage_backend="file", geos_index_save_path=geos_index_path)
+N_PARTICLES = 10000
+N_BLOCKS = 8
+ITERATION = 500
 
 
-result_1 = geos_ts.get_particle(['ux'], species=species, iteration=iteration, select={'ux': [5.282296854337066e-06, 1.1545774343591047e-05], 'uy': [0.00010659756255792407, 0.00021095902110522736], 'uz': [1.4626885514144121e-05, 2.9286875203982146e-05]})
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES, n_blocks=N_BLOCKS,
+          iterations=[ITERATION], backend=backend)
+     for backend in available_backends], ids=available_backends,
+    indirect=True)
+def test_read_speed_small(synthetic_data):
+    "Check a selection on the three components of the momentum"
+    backend = synthetic_data.backend
+    particles = synthetic_data.dataset.get_particles(ITERATION)
+    select = { u: list(np.percentile(particles[u], [30, 70]))
+               for u in ['ux', 'uy', 'uz'] }
+    selected = np.ones(N_PARTICLES, dtype=bool)
+    for u, (lower, upper) in select.items():
+        selected &= (particles[u] > lower) & (particles[u] < upper)
+    assert 0 < np.count_nonzero(selected) < N_PARTICLES
 
-result_2 = geos_ts.get_particle(['ux'], species=species, iteration=iteration, skip_offset=True, select={'ux': [5.282296854337066e-06, 1.1545774343591047e-05], 'uy': [0.00010659756255792407, 0.00021095902110522736], 'uz': [1.4626885514144121e-05, 2.9286875203982146e-05]})
+    ts = OpenPMDTimeSeries(synthetic_data.path, backend=backend,
+                           profile=True)
+    ux, = ts.get_particle(['ux'], species='electrons', iteration=ITERATION,
+                          select=select)
+    assert ts.last_query_profile.annotations['strategy'] == 'full'
+    assert np.allclose(ux, particles['ux'][selected], rtol=1.e-12)
+    # One read of `ux`, and one of each selected quantity
+    n_reads = 4
+    counters = ts.last_query_profile.counters
+    assert counters['bytes_read'] >= 8 * N_PARTICLES * n_reads
+    if backend == 'openpmd-api':
+        # The blocks of each record are loaded with a single flush
+        # (and the mass, which normalizes the momentum, with another one)
+        assert counters['n_chunks'] == n_reads * (N_BLOCKS + 1)
+        assert counters['n_flushes'] == 2 * n_reads
+    else:
+        assert counters['n_chunks'] == n_reads
 
-# print(len(result_0[0]), len(result_1[0]), len(result_2[0]))
+    # Same particles when they are read in batches
+    ts.memory_budget = 8 * N_PARTICLES
+    ux_batched, = ts.get_particle(['ux'], species='electrons',
+                                  iteration=ITERATION, select=select)
+    assert ts.last_query_profile.annotations['strategy'] == 'batched'
+    assert np.array_equal(ux, ux_batched)
+    # Each particle is read once, in several batches
+    counters_batched = ts.last_query_profile.counters
+    assert counters_batched['bytes_read'] == counters['bytes_read']
+    assert counters_batched['n_chunks'] > counters['n_chunks'] \
+        if backend == 'h5py' else \
+        counters_batched['n_flushes'] > counters['n_flushes']
 
-# print(result_0[0][0], result_1[0][0], result_2[0][0])
 
-import numpy as np
-# print(np.array_equal(result_0[0], result_1[0]))
-# print(np.array_equal(result_0[0], result_2[0]))
-print(np.array_equal(result_1[0], result_2[0]))
+if __name__ == '__main__':
+    pytest.main([__file__])
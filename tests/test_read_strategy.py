@@ -0,0 +1,97 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the automatic choice of the read strategy of `get_particle`
+(argument `strategy='auto'`), on synthetic blocks of particles.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_read_strategy.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+from collections import namedtuple
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+
+# Same attributes as the blocks and slices returned by the index
+Block = namedtuple('Block', ['start', 'end', 'q'])
+
+N_PARTICLES = 100000
+
+
+def make_blocks(ranges, slices=None):
+    "Return a dictionary of blocks, as returned by the index"
+    blocks = {}
+    for i, (start, end) in enumerate(ranges):
+        q = {}
+        if slices is not None:
+            q = {s: Block(s, e, {}) for s, e in slices[i]}
+        blocks[str(start)] = Block(start, end, q)
+    return blocks
+
+
+pytestmark = pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=N_PARTICLES)], indirect=True)
+
+
+@pytest.fixture(scope='module')
+def ts(synthetic_data):
+    "A time series of synthetic particles"
+    return OpenPMDTimeSeries(synthetic_data.path, backend='h5py', profile=True)
+
+
+def test_choose_read_strategy(ts):
+    "Check the plans chosen for different distributions of blocks"
+    ts.k, ts.b = 1.e-7, 1.e-3
+    # Nearby blocks: read as one group
+    blocks = make_blocks([(0, 100), (110, 200), (210, 300)])
+    name, ranges = ts.choose_read_strategy(blocks, N_PARTICLES, ['x'], {})
+    assert name == 'read_groups' and ranges == [(0, 300, None)]
+    # Blocks that cover (almost) everything: full read
+    blocks = make_blocks([(0, 50000), (50010, N_PARTICLES)])
+    name, ranges = ts.choose_read_strategy(blocks, N_PARTICLES, ['x'], {})
+    assert name == 'full' and ranges == [(0, N_PARTICLES, None)]
+    # Large blocks with small selected slices: read the slices
+    blocks = make_blocks([(0, 40000), (60000, N_PARTICLES)],
+                         slices=[[(0, 10)], [(60000, 60010)]])
+    name, ranges = ts.choose_read_strategy(blocks, N_PARTICLES, ['x'], {},
+                                           use_secondary=True)
+    assert name == 'direct_slice'
+    assert ranges == [(0, 10, None), (60000, 60010, None)]
+    # Plan that does not fit in memory: batched
+    ts.memory_budget = 1000
+    name, ranges = ts.choose_read_strategy(blocks, N_PARTICLES, ['x'], {})
+    assert name == 'batched'
+    ts.memory_budget = None
+
+
+def test_split_into_batches(ts):
+    "Check that the batches cover the ranges"
+    read_batch = ts.split_into_batches([(0, 5, None), (10, 12, None)], 3)
+    assert read_batch == [[(0, 3)], [(3, 2), (10, 1)], [(11, 1)]]
+
+
+def test_auto_strategy_without_index(ts):
+    "Check the strategy recorded in the profile, without index"
+    select = {'x': [None, 0.]}
+    x_full, = ts.get_particle(['x'], iteration=0, select=select,
+                              strategy='auto')
+    assert ts.last_query_profile.annotations['strategy'] == 'full'
+    ts.memory_budget = 10 * N_PARTICLES
+    x_batched, = ts.get_particle(['x'], iteration=0, select=select,
+                                 strategy='auto')
+    assert ts.last_query_profile.annotations['strategy'] == 'batched'
+    assert np.array_equal(x_full, x_batched)
+    ts.memory_budget = None
+    with pytest.raises(OpenPMDException):
+        ts.get_particle(['x'], iteration=0, strategy='fastest')
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,70 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the cache of the results of `get_particle`
+(argument `result_cache_size` of OpenPMDTimeSeries).
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_result_cache.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(n_particles=1000, n_blocks=2, iterations=[0, 10])], indirect=True)
+@pytest.mark.parametrize('backend', available_backends)
+def test_result_cache(synthetic_data, backend):
+    "Check that cached columns are shared, copied and invalidated"
+    path = synthetic_data.path
+    ts = OpenPMDTimeSeries(path, backend=backend, profile=True,
+                           result_cache_size='1MB')
+    reference = OpenPMDTimeSeries(path, backend=backend)
+    z_mid = float(np.median(synthetic_data.dataset.get_particles(0)['z']))
+    select = {'z': [None, z_mid]}
+
+    ux, uy = ts.get_particle(['ux', 'uy'], iteration=0, select=select)
+    counters = ts.last_query_profile.counters
+    assert counters['result_cache_misses'] == 2
+    assert counters.get('bytes_read', 0) > 0
+    # Overlapping var_list: only uz is read
+    uy2, uz = ts.get_particle(['uy', 'uz'], iteration=0,
+                              select={'z': [None, np.float64(z_mid)]})
+    counters = ts.last_query_profile.counters
+    assert counters['result_cache_hits'] == 1
+    assert counters['result_cache_misses'] == 1
+    assert np.array_equal(uy, uy2)
+    for data, quantity in zip([ux, uy, uz], ['ux', 'uy', 'uz']):
+        data_reference, = reference.get_particle([quantity],
+            iteration=0, select=select)
+        assert np.array_equal(data, data_reference)
+
+    # The returned arrays are copies
+    ux[:] = 0
+    ux2, = ts.get_particle(['ux'], iteration=0, select=select)
+    assert 'bytes_read' not in ts.last_query_profile.counters
+    assert not np.all(ux2 == 0)
+
+    # A different selection or iteration is not a hit
+    ts.get_particle(['ux'], iteration=10, select=select)
+    ts.get_particle(['ux'], iteration=0, select={'z': [z_mid, None]})
+    assert ts.last_query_profile.counters['result_cache_misses'] == 1
+
+    # Invalidation
+    n_entries = len(ts.result_cache)
+    ts.clear_result_cache(iteration=10)
+    assert len(ts.result_cache) == n_entries - 1
+    ts.clear_result_cache()
+    assert len(ts.result_cache) == 0
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
@@ -0,0 +1,76 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the LatestRequestExecutor used by the slider: the reads run
+on a worker thread, a newer request supersedes the older ones of the
+same kind, and only the result of the latest request is plotted.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_slider_refresh.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import time
+import asyncio
+import threading
+from openpmd_viewer.openpmd_timeseries.interactive import \
+    LatestRequestExecutor
+
+
+def test_synchronous_refresh():
+    "Check that the requests are run directly without an event loop"
+    drawn = []
+    refresher = LatestRequestExecutor()
+    refresher.submit('field', lambda: 1, drawn.append)
+    refresher.submit('field', lambda: 2, drawn.append)
+    assert drawn == [1, 2]
+    refresher.shutdown()
+
+
+def test_latest_request_only():
+    "Check that only the latest request of each kind is plotted"
+    read_started = []
+    drawn = []
+    main_thread = threading.get_ident()
+    refresher = LatestRequestExecutor()
+
+    def make_read(kind, value):
+        def read():
+            read_started.append((kind, value))
+            time.sleep(0.05)
+            return value
+        return read
+
+    def make_draw(kind):
+        def draw(value):
+            # The plots are made in the event loop (main thread)
+            assert threading.get_ident() == main_thread
+            drawn.append((kind, value))
+        return draw
+
+    async def drag_slider():
+        # Each callback returns immediately
+        start = time.perf_counter()
+        for value in range(10):
+            refresher.submit('field', make_read('field', value),
+                             make_draw('field'))
+        refresher.submit('particle', make_read('particle', 0),
+                         make_draw('particle'))
+        assert time.perf_counter() - start < 0.05
+        await asyncio.sleep(0.5)
+
+    asyncio.run(drag_slider())
+    refresher.shutdown()
+    assert sorted(drawn) == [('field', 9), ('particle', 0)]
+    # The superseded requests that had not started were cancelled
+    assert len(read_started) < 5
+    assert read_started[-2:] == [('field', 9), ('particle', 0)]
+
+
+if __name__ == '__main__':
+    test_synchronous_refresh()
+    test_latest_request_only()
@@ -0,0 +1,168 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the streaming mode of OpenPMDTimeSeries (`streaming=True`),
+in which the iterations are read linearly, as they are produced: with
+a finished (file-based) BP series, and with a BP file that is written
+by another thread while it is read, which stands in for a running
+simulation (e.g. an ADIOS2 SST stream).
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_streaming.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import os
+import time
+import tempfile
+import threading
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.addons import LpaDiagnostics
+from openpmd_viewer.openpmd_timeseries.main import OpenPMDException
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+from openpmd_viewer.openpmd_timeseries.utilities import \
+    load_iteration_results, save_iteration_result
+
+ITERATIONS = [0, 10, 20, 30]
+
+pytestmark = pytest.mark.skipif('openpmd-api' not in available_backends,
+                                reason='streaming requires openpmd-api')
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(iterations=ITERATIONS, backend='openpmd-api')], indirect=True)
+def test_streaming_diagnostics(synthetic_data, tmp_path):
+    "Check the diagnostics of a streamed series against a normal read"
+    select = {'uz': [0., None]}
+    path = synthetic_data.path
+    reference = LpaDiagnostics(path, backend='openpmd-api')
+    charge_reference = reference.iterate(reference.get_charge,
+                                         select=select)
+
+    ts = LpaDiagnostics(path, backend='openpmd-api', streaming=True)
+    assert len(ts.iterations) == 0
+    output_file = os.path.join(tmp_path, 'charge.h5')
+    charge = ts.iterate(ts.get_charge, select=select,
+                        output_file=output_file)
+    assert np.array_equal(charge, charge_reference)
+    assert np.array_equal(ts.iterations, ITERATIONS)
+    assert np.array_equal(ts.t, reference.t)
+
+    # Results appended to the file
+    iterations, t, results = load_iteration_results(output_file)
+    assert np.array_equal(iterations, ITERATIONS)
+    assert np.array_equal(t, reference.t)
+    assert np.array_equal(results, charge_reference)
+
+    # Only for streaming time series
+    with pytest.raises(OpenPMDException):
+        next(reference.stream_iterations())
+
+
+@pytest.mark.parametrize('synthetic_data',
+    [dict(iterations=ITERATIONS, backend='openpmd-api')], indirect=True)
+def test_output_file_field_meta_information(synthetic_data, tmp_path):
+    "Check the results with a FieldMetaInformation saved by `iterate`"
+    ts = LpaDiagnostics(synthetic_data.path, backend='openpmd-api')
+    # Current (1D grid) and field (3D grid)
+    for method, kwargs in [(ts.get_current, {}),
+                           (ts.get_field, {'field': 'E', 'coord': 'x'})]:
+        output_file = os.path.join(tmp_path, method.__name__ + '.h5')
+        data, info = ts.iterate(method, output_file=output_file, **kwargs)
+        iterations, t, results = load_iteration_results(output_file)
+        assert np.array_equal(iterations, ITERATIONS)
+        for k, (data_k, coords_k) in enumerate(results):
+            assert np.array_equal(data_k, data[k])
+            labels = [info[k].axes[axis] for axis in sorted(info[k].axes)]
+            assert list(coords_k.keys()) == labels
+            for label in labels:
+                assert np.array_equal(coords_k[label],
+                                      getattr(info[k], label))
+
+
+def test_output_file_invalid_result(tmp_path):
+    "Check that a result that cannot be saved leaves the file unchanged"
+    output_file = os.path.join(tmp_path, 'results.h5')
+    save_iteration_result(output_file, 0, 0., (np.arange(3), 1.))
+    for result in [(np.arange(3), {'a': 1}), object(), 'text']:
+        with pytest.raises(TypeError):
+            save_iteration_result(output_file, 10, 1.e-15, result)
+    iterations, t, results = load_iteration_results(output_file)
+    assert np.array_equal(iterations, [0])
+    assert np.array_equal(results[0][0], np.arange(3))
+    # Replaced result
+    save_iteration_result(output_file, 0, 0., np.ones(2))
+    iterations, t, results = load_iteration_results(output_file)
+    assert np.array_equal(results[0], np.ones(2))
+
+
+def write_stream(filename, delay, started):
+    """
+    Write the iterations of a particle species, one every `delay` seconds
+    (`started` is set once the first iteration is written)
+    """
+    import openpmd_api as io
+    series = io.Series(filename, io.Access.create,
+        '{"iteration_encoding": "variable_based",'
+        ' "adios2": {"engine": {"type": "bp5"}}}')
+    for k, iteration in enumerate(ITERATIONS):
+        it = series.write_iterations()[iteration]
+        it.time = k * 1.e-15
+        it.dt = 1.e-15
+        it.time_unit_SI = 1.
+        species = it.particles['electrons']
+        data = np.linspace(0., 1., 100) + k
+        dataset = io.Dataset(data.dtype, data.shape)
+        for record_name in ['position', 'positionOffset', 'momentum']:
+            for coord in 'xyz':
+                component = species[record_name][coord]
+                component.reset_dataset(dataset)
+                if record_name == 'positionOffset':
+                    component.make_constant(0.)
+                else:
+                    component.store_chunk(data)
+        for record_name, value in [('weighting', k + 1.), ('mass', 9.1e-31),
+                                   ('charge', -1.6e-19)]:
+            component = species[record_name][io.Record_Component.SCALAR]
+            component.reset_dataset(dataset)
+            component.make_constant(value)
+        it.close()
+        started.set()
+        time.sleep(delay)
+    series.close()
+
+
+def test_running_stream():
+    "Check that the iterations are read while the series is written"
+    with tempfile.TemporaryDirectory() as path:
+        filename = os.path.join(path, 'stream.bp')
+        started = threading.Event()
+        writer = threading.Thread(target=write_stream,
+                                  args=(filename, 0.2, started))
+        writer.start()
+        # (The simulation has created the file)
+        assert started.wait(timeout=60)
+        ts = OpenPMDTimeSeries(filename, backend='openpmd-api',
+            streaming=True, stream_options={'adios2': {'engine': {
+                'parameters': {'OpenTimeoutSecs': '30'}}}})
+        read_iterations = []
+        for iteration in ts.stream_iterations():
+            k = ITERATIONS.index(iteration)
+            x, w = ts.get_particle(['x', 'w'], iteration=iteration,
+                                   select={'x': [None, 0.5 + k]})
+            assert np.allclose(w, k + 1.) and len(x) == 50
+            # The iterations are read one by one
+            assert ts.current_iteration == iteration
+            read_iterations.append(iteration)
+        writer.join()
+        assert read_iterations == ITERATIONS
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])
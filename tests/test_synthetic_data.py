@@ -0,0 +1,102 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks that the synthetic datasets (benchmark/synthetic_data.py)
+are read back correctly, for the different writers and backends,
+so that they can be used by the performance tests.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_synthetic_data.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import tempfile
+import numpy as np
+import pytest
+from openpmd_viewer import OpenPMDTimeSeries
+from openpmd_viewer.openpmd_timeseries.data_reader import available_backends
+from benchmark.synthetic_data import SyntheticDataset, block_sizes
+
+writers = [('h5py', 'h5')]
+if 'openpmd-api' in available_backends:
+    writers += [('openpmd-api', 'bp'), ('openpmd-api', 'h5')]
+
+
+def test_block_sizes():
+    "Check that the blocks cover all the elements"
+    rng = np.random.default_rng(0)
+    assert list(block_sizes(10, 4, 0., rng)) == [3, 3, 2, 2]
+    sizes = block_sizes(1000, 7, 1., rng)
+    assert sizes.sum() == 1000 and len(sizes) == 7
+
+
+@pytest.mark.parametrize('writer, file_format', writers)
+@pytest.mark.parametrize('backend', available_backends)
+def test_particles(writer, file_format, backend):
+    "Check the particles and the selection on a synthetic dataset"
+    if backend == 'h5py' and file_format != 'h5':
+        pytest.skip('h5py only reads HDF5 files')
+    dataset = SyntheticDataset(n_particles=2000, n_blocks=5,
+                               block_jitter=0.5, field_shape=(8, 8, 16),
+                               iterations=[0, 100])
+    with tempfile.TemporaryDirectory() as path:
+        dataset.write(path, writer=writer, file_format=file_format)
+        ts = OpenPMDTimeSeries(path, backend=backend)
+        assert list(ts.iterations) == [0, 100]
+        particles = dataset.get_particles(100)
+        x, uz, w = ts.get_particle(['x', 'uz', 'w'], iteration=100,
+                                   species='electrons')
+        assert np.allclose(x, particles['x'])
+        assert np.allclose(uz, particles['uz'])
+        assert np.allclose(w, particles['w'])
+        # Particles are sorted along z
+        z, = ts.get_particle(['z'], iteration=0)
+        assert np.all(np.diff(z) >= 0)
+        # Selection
+        x_min, x_max = np.percentile(particles['x'], [20, 30])
+        x, = ts.get_particle(['x'], iteration=100,
+                             select={'x': [x_min, x_max]})
+        inside = (particles['x'] > x_min) & (particles['x'] < x_max)
+        assert np.allclose(np.sort(x), np.sort(particles['x'][inside]))
+
+
+@pytest.mark.parametrize('writer, file_format', writers)
+@pytest.mark.parametrize('field_geometry', ['3dcartesian', 'thetaMode'])
+def test_fields(writer, file_format, field_geometry):
+    "Check the cartesian and thetaMode fields of a synthetic dataset"
+    dataset = SyntheticDataset(n_particles=100, n_blocks=2,
+                               field_geometry=field_geometry,
+                               field_shape=(6, 8, 12), n_modes=3,
+                               n_field_blocks=3)
+    fields = dataset.get_fields(0)
+    backend = 'h5py' if file_format == 'h5' else 'openpmd-api'
+    with tempfile.TemporaryDirectory() as path:
+        dataset.write(path, writer=writer, file_format=file_format)
+        ts = OpenPMDTimeSeries(path, backend=backend)
+        if field_geometry == '3dcartesian':
+            F, info = ts.get_field('E', 'y', iteration=0)
+            assert np.allclose(F, fields['E/y'])
+            F, info = ts.get_field('rho', iteration=0, slice_across='x',
+                                   slice_relative_position=0.)
+            assert np.allclose(F, fields['rho'][3])
+        else:
+            F, info = ts.get_field('rho', iteration=0, m=0)
+            assert np.allclose(F[8:], fields['rho'][0])
+            F, info = ts.get_field('E', 'z', iteration=0, m='all',
+                                   theta=None, max_resolution_3d=[8, 12])
+            assert F.shape == (16, 16, 12)
+
+
+if __name__ == '__main__':
+    test_block_sizes()
+    for writer, file_format in writers:
+        for backend in available_backends:
+            if backend == 'h5py' and file_format != 'h5':
+                continue
+            test_particles(writer, file_format, backend)
+        for field_geometry in ['3dcartesian', 'thetaMode']:
+            test_fields(writer, file_format, field_geometry)
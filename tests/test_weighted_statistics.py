@@ -0,0 +1,102 @@
+"""
+This test file is part of the openPMD-viewer.
+
+It checks the weighted statistics of the LPA diagnostics (moments,
+quantiles and streaming quantiles) against direct numpy computations.
+
+Usage:
+This file is meant to be run from the root directory of openPMD-viewer,
+by any of the following commands
+$ python tests/test_weighted_statistics.py
+$ py.test
+$ python setup.py test
+
+License: 3-Clause-BSD-LBNL
+"""
+import numpy as np
+import pytest
+from openpmd_viewer.addons.pic.lpa_diagnostics import w_moments, w_std, \
+    w_quantile, w_median, emittance_from_coord, QuantileSketch
+
+
+def sorted_quantile(a, w, quantile):
+    "Weighted quantile, computed with a full sort"
+    ind_sorted = np.argsort(a)
+    sorted_weights = w[ind_sorted]
+    centers = np.cumsum(sorted_weights) - 0.5 * sorted_weights
+    return np.interp(quantile, centers / np.sum(w), a[ind_sorted])
+
+
+def test_moments():
+    "Check the single-pass moments (with a large offset)"
+    rng = np.random.default_rng(0)
+    a = 1.e3 + 1.e-3 * rng.standard_normal(10000)
+    b = 0.5 * a + rng.standard_normal(10000)
+    w = rng.random(10000)
+    sum_w, a_ave, b_ave, var_a, var_b, cov_ab = w_moments(a, b, w)
+    assert np.isclose(sum_w, np.sum(w))
+    assert np.isclose(a_ave, np.average(a, weights=w), rtol=1.e-14)
+    assert np.isclose(b_ave, np.average(b, weights=w))
+    assert np.isclose(var_a, np.cov(a, aweights=w, bias=True), rtol=1.e-8)
+    assert np.isclose(var_b, np.cov(b, aweights=w, bias=True))
+    assert np.isclose(cov_ab, np.cov(a, b, aweights=w, bias=True)[0, 1],
+                      rtol=1.e-8)
+    assert np.isclose(w_std(a, w), np.sqrt(np.cov(a, aweights=w, bias=True)),
+                      rtol=1.e-8)
+    # Empty input
+    assert np.isnan(w_std(np.zeros(0), np.zeros(0)))
+
+
+def test_emittance():
+    "Check the emittance against the definition"
+    rng = np.random.default_rng(1)
+    x, y, ux, uy = rng.standard_normal((4, 5000))
+    ux += 0.3 * x
+    w = rng.random(5000)
+    emit_x, emit_y = emittance_from_coord(x, y, ux, uy, w)
+    for emit, q, u in [(emit_x, x, ux), (emit_y, y, uy)]:
+        cov = np.cov(q, u, aweights=w, bias=True)
+        assert np.isclose(emit, np.sqrt(np.linalg.det(cov)))
+
+
+@pytest.mark.parametrize('n', [1, 7, 1000, 100000])
+def test_quantile(n):
+    "Check the selection-based quantiles against a full sort"
+    rng = np.random.default_rng(n)
+    a = rng.standard_normal(n)
+    w = rng.random(n)
+    for quantile in [0., 0.1, 0.5, 0.9, 1.]:
+        assert np.isclose(w_quantile(a, w, quantile),
+                          sorted_quantile(a, w, quantile))
+    # Sorted input, and values with many duplicates
+    assert np.isclose(w_median(np.sort(a), w),
+                      sorted_quantile(np.sort(a), w, 0.5))
+    assert w_median(np.ones(n), w) == 1.
+
+
+def test_quantile_sketch():
+    "Check the streaming quantiles"
+    rng = np.random.default_rng(2)
+    a = rng.standard_normal(200000)
+    w = rng.random(200000)
+    # Exact, as long as the sketch is not compressed
+    sketch = QuantileSketch(compression=1000)
+    sketch.update(a[:500], w[:500])
+    assert np.isclose(sketch.quantile(0.3), w_quantile(a[:500], w[:500], 0.3))
+    # Approximate, with batches and merged sketches
+    sketch = QuantileSketch(compression=1000)
+    other = QuantileSketch(compression=1000)
+    for i in range(10):
+        sketch.update(a[i * 10000:(i + 1) * 10000],
+                      w[i * 10000:(i + 1) * 10000])
+        other.update(a[100000 + i * 10000:100000 + (i + 1) * 10000],
+                     w[100000 + i * 10000:100000 + (i + 1) * 10000])
+    sketch.merge(other)
+    assert len(sketch.values) <= 1000
+    for quantile in [0.05, 0.5, 0.95]:
+        assert abs(sketch.quantile(quantile)
+                   - w_quantile(a, w, quantile)) < 0.01
+
+
+if __name__ == '__main__':
+    pytest.main([__file__])